@@ -1,5 +1,6 @@
 -- SQL для создания таблицы pending_news в Supabase
--- Выполните этот SQL в Supabase SQL Editor
+-- Устарело: схему и индексы создает python main.py migrate (src/migrations.py).
+-- Оставлено для ручного восстановления через Supabase SQL Editor
 
 CREATE TABLE IF NOT EXISTS pending_news (
     id SERIAL PRIMARY KEY,
@@ -14,9 +15,17 @@ CREATE TABLE IF NOT EXISTS pending_news (
     digest_type VARCHAR(20),
     is_approved BOOLEAN DEFAULT true,
     is_deleted BOOLEAN DEFAULT false,
+    views INTEGER DEFAULT 0,
+    forwards INTEGER DEFAULT 0,
+    engagement_updated_at TIMESTAMP,
     UNIQUE(channel_id, message_id)
 );
 
+-- Для уже созданной таблицы: счетчики вовлеченности
+ALTER TABLE pending_news ADD COLUMN IF NOT EXISTS views INTEGER DEFAULT 0;
+ALTER TABLE pending_news ADD COLUMN IF NOT EXISTS forwards INTEGER DEFAULT 0;
+ALTER TABLE pending_news ADD COLUMN IF NOT EXISTS engagement_updated_at TIMESTAMP;
+
 -- Создаем индексы для быстрого поиска
 CREATE INDEX IF NOT EXISTS idx_pending_news_scheduled_for ON pending_news(scheduled_for);
 CREATE INDEX IF NOT EXISTS idx_pending_news_digest_type ON pending_news(digest_type);
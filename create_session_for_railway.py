@@ -6,6 +6,7 @@
 
 import asyncio
 from telethon import TelegramClient
+from telethon.sessions import StringSession
 import os
 from dotenv import load_dotenv
 
@@ -25,9 +26,11 @@ async def create_session():
     me = await client.get_me()
     print(f"👤 Вошли как: {me.first_name} (@{me.username})")
     
+    session_string = StringSession.save(client.session)
     await client.disconnect()
     print("🎉 Готово! Файл 'railway_session.session' создан")
-    print("📂 Скопируйте этот файл в Railway через git или другим способом")
+    print("🔑 Добавьте в Railway переменную TELEGRAM_SESSION_STRING:")
+    print(session_string)
 
 if __name__ == '__main__':
     asyncio.run(create_session()) 
\ No newline at end of file
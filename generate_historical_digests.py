@@ -17,6 +17,7 @@ from src.telegram_reader import get_telegram_reader
 from src.claude_summarizer import get_claude_summarizer
 from src.telegram_bot import get_telegram_bot
 from src.database import ChannelsDB
+from src.message_archive import get_message_archive
 
 # Настройка логирования
 logging.basicConfig(
@@ -38,6 +39,7 @@ class HistoricalDigestGenerator:
         self.claude_summarizer = None
         self.telegram_bot = None
         self.channels_db = ChannelsDB()
+        self.archive = get_message_archive()
         
     async def initialize(self):
         """Инициализация компонентов"""
@@ -51,6 +53,36 @@ class HistoricalDigestGenerator:
         self.telegram_bot = await get_telegram_bot()
         
         logger.info("✅ Все компоненты инициализированы")
+    
+    @staticmethod
+    def _utc_bounds(target_date: date, start_hour: int, end_hour: int):
+        """Границы периода в UTC для часов по московскому времени (МСК = UTC+3)"""
+        msk_start = datetime.combine(target_date, time(start_hour, 0))
+        msk_end = datetime.combine(target_date, time(end_hour, 0))
+        return (msk_start - timedelta(hours=3)).replace(tzinfo=timezone.utc), \
+               (msk_end - timedelta(hours=3)).replace(tzinfo=timezone.utc)
+    
+    async def backfill(self, start_date: date, end_date: date) -> Dict[str, int]:
+        """
+        Выгрузка истории всех активных каналов в локальный архив
+        
+        Args:
+            start_date: Первый день периода (включительно)
+            end_date: Последний день периода (включительно)
+        """
+        channels = self.channels_db.get_active_channels()
+        usernames = [ch.get('username', '') for ch in channels if ch.get('username')]
+        if not usernames:
+            logger.warning("⚠️ Нет активных каналов для выгрузки")
+            return {}
+        
+        utc_start, _ = self._utc_bounds(start_date, 0, 0)
+        utc_end, _ = self._utc_bounds(end_date + timedelta(days=1), 0, 0)
+        
+        logger.info(f"📦 Backfill: {len(usernames)} каналов за {start_date} - {end_date}")
+        exported = await self.telegram_reader.export_history(usernames, utc_start, utc_end, self.archive)
+        logger.info(f"✅ Backfill завершен: {sum(exported.values())} сообщений из {len(exported)} каналов")
+        return exported
         
     async def get_historical_messages(self, target_date: date, 
                                     start_hour: int, end_hour: int) -> List[Dict]:
@@ -74,13 +106,8 @@ class HistoricalDigestGenerator:
         
         all_messages = []
         
-        # Создаем временные границы в UTC (учитывая МСК = UTC+3)
-        msk_start = datetime.combine(target_date, time(start_hour, 0))
-        msk_end = datetime.combine(target_date, time(end_hour, 0))
-        
-        # Конвертируем в UTC
-        utc_start = msk_start - timedelta(hours=3)
-        utc_end = msk_end - timedelta(hours=3)
+        # Временные границы в UTC (учитывая МСК = UTC+3)
+        utc_start, utc_end = self._utc_bounds(target_date, start_hour, end_hour)
         
         logger.info(f"🕐 Временные границы UTC: {utc_start} - {utc_end}")
         
@@ -92,13 +119,16 @@ class HistoricalDigestGenerator:
             try:
                 logger.info(f"📱 Обрабатываем канал: {username}")
                 
-                # Используем новый метод для получения сообщений по диапазону дат
-                messages = await self.telegram_reader.get_channel_messages_by_date_range(
-                    username,
-                    start_date=utc_start,
-                    end_date=utc_end,
-                    limit=200  # Увеличиваем лимит для исторических данных
-                )
+                # Если период уже выгружен backfill-ом - читаем из архива без запросов к Telegram
+                if self.archive.covers(username, utc_start, utc_end):
+                    messages = self.archive.get_messages(username, utc_start, utc_end)
+                    logger.info(f"🗄️ {username}: {len(messages)} сообщений из архива")
+                else:
+                    messages = await self.telegram_reader.get_channel_messages_by_date_range(
+                        username,
+                        start_date=utc_start,
+                        end_date=utc_end
+                    )
                 
                 logger.info(f"✅ {username}: найдено {len(messages)} сообщений в диапазоне")
                 all_messages.extend(messages)
@@ -287,6 +317,15 @@ async def main():
     try:
         await generator.initialize()
         
+        # Один проход выгрузки истории за весь период вместо запросов на каждое окно
+        if '--no-backfill' not in sys.argv:
+            first_date = min(item[0] for item in digest_schedule)
+            last_date = max(item[0] for item in digest_schedule)
+            try:
+                await generator.backfill(first_date, last_date)
+            except Exception as e:
+                logger.warning(f"⚠️ Backfill не удался, читаем окна напрямую из Telegram: {e}")
+        
         logger.info("🎯 Начинаем генерацию 6 исторических дайджестов...")
         logger.info("=" * 60)
         
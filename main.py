@@ -47,6 +47,9 @@ def log_startup_info():
 # Выполняем логирование при импорте
 log_startup_info()
 
+# Код возврата run_collect, если цикл уже идет в другом процессе (EX_TEMPFAIL)
+RUN_ALREADY_ACTIVE = 75
+
 async def run_collect():
     """Запуск сбора и публикации новостей"""
     logger.info("📡 Starting news collection cycle...")
@@ -64,6 +67,12 @@ async def run_collect():
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         
+        if result.get("already_running"):
+            logger.info(f"⏳ {result['error']}, повторный запуск поставлен в очередь")
+            print(f"⏳ {result['error']}")
+            print("🔁 Запрос учтен: после текущего цикла будет выполнен еще один")
+            return RUN_ALREADY_ACTIVE
+        
         logger.info(f"⏱️ Collection cycle completed in {duration:.2f} seconds")
         
         if result["success"]:
@@ -163,6 +172,157 @@ def run_init():
         print("💡 Проверьте переменные окружения Supabase")
         return 1
 
+def run_migrate(args):
+    """Применение миграций схемы (migrate [status | <версия>])"""
+    logger.info("🔧 Starting schema migrations...")
+    
+    try:
+        from src.migrations import migrate, get_status
+        
+        if args and args[0] == 'status':
+            for item in get_status():
+                applied = item['applied_at'].strftime('%Y-%m-%d %H:%M:%S') if item['applied_at'] else 'не применена'
+                print(f"  {item['version']:03d} {item['name']:<24} {applied}")
+            return 0
+        
+        target = int(args[0]) if args else None
+        applied = migrate(target)
+        if applied:
+            print(f"✅ Применены миграции: {', '.join(f'{v:03d}' for v in applied)}")
+        else:
+            print("✅ Схема актуальна, новых миграций нет")
+        return 0
+        
+    except Exception as e:
+        logger.error(f"❌ Schema migration failed: {e}")
+        print(f"❌ Ошибка миграции схемы: {e}")
+        return 1
+
+def run_stats_repair(days: int = 7):
+    """Пересчет статистики дашборда из первичных таблиц"""
+    logger.info(f"🔧 Starting dashboard stats repair for {days} days...")
+    
+    try:
+        from src.database import StatsDB
+        
+        if StatsDB.repair(days):
+            print(f"✅ Статистика дашборда пересчитана за {days} дн.")
+            return 0
+        print("❌ Ошибка пересчета статистики")
+        return 1
+        
+    except Exception as e:
+        logger.error(f"❌ Dashboard stats repair failed: {e}")
+        print(f"❌ Ошибка пересчета статистики: {e}")
+        return 1
+
+def run_retention():
+    """Очистка старых данных по срокам хранения из настроек"""
+    logger.info("🧹 Starting data retention cleanup...")
+    
+    try:
+        from src.retention import run_retention as retention
+        
+        result = retention()
+        print(f"✅ Текст удален у {result['processed_text_pruned']} обработанных сообщений")
+        print(f"✅ Удалено {result['pending_news_deleted']} старых накопленных новостей")
+        return 0
+        
+    except Exception as e:
+        logger.error(f"❌ Data retention cleanup failed: {e}")
+        print(f"❌ Ошибка очистки старых данных: {e}")
+        return 1
+
+def run_export(args):
+    """Выгрузка корпуса новостей в файл (export --format csv|jsonl|parquet ...)"""
+    import argparse
+    from datetime import datetime
+    
+    parser = argparse.ArgumentParser(prog='main.py export', description='Выгрузка корпуса новостей')
+    parser.add_argument('--format', default='csv', choices=['csv', 'jsonl', 'parquet'])
+    parser.add_argument('--output', help='путь к файлу (по умолчанию имя с датой в текущей папке)')
+    parser.add_argument('--since', type=datetime.fromisoformat, help='с даты (YYYY-MM-DD или ISO 8601)')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='до даты, не включая')
+    parser.add_argument('--channel', type=int, action='append', dest='channel_ids', help='id канала (можно несколько)')
+    parser.add_argument('--no-compress', action='store_true', help='без gzip (CSV/JSONL) и zstd (Parquet)')
+    options = parser.parse_args(args)
+    
+    logger.info(f"📦 Starting corpus export: {options}")
+    
+    try:
+        from src.exporter import CorpusExport
+        
+        export = CorpusExport(fmt=options.format, compress=not options.no_compress, since=options.since,
+                              until=options.until, channel_ids=options.channel_ids)
+        path = options.output or export.filename
+        rows = export.write_to(path)
+        print(f"✅ Выгружено {rows} строк в {path}")
+        return 0
+        
+    except Exception as e:
+        logger.error(f"❌ Corpus export failed: {e}")
+        print(f"❌ Ошибка выгрузки: {e}")
+        return 1
+
+def run_worker(args):
+    """Воркер очереди заданий (worker [--concurrency N] [--types collect,publish])"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='main.py worker', description='Воркер очереди заданий')
+    parser.add_argument('--concurrency', type=int, help='заданий одновременно (по умолчанию JOB_WORKER_CONCURRENCY)')
+    parser.add_argument('--types', help='только эти типы заданий через запятую (по умолчанию все)')
+    options = parser.parse_args(args)
+
+    logger.info(f"👷 Starting job queue worker: {options}")
+
+    try:
+        from src.job_queue import Worker
+        from src.config import JOB_WORKER_CONCURRENCY
+
+        job_types = [t.strip() for t in options.types.split(',') if t.strip()] if options.types else None
+        worker = Worker(concurrency=options.concurrency or JOB_WORKER_CONCURRENCY, job_types=job_types)
+        asyncio.run(worker.run())
+        return 0
+
+    except Exception as e:
+        logger.error(f"❌ Job queue worker failed: {e}")
+        logger.error(f"📋 Full traceback: {traceback.format_exc()}")
+        print(f"❌ Ошибка воркера: {e}")
+        return 1
+
+def run_enqueue(args):
+    """Постановка задания в очередь (enqueue collect|publish|backfill_date|resummarize ...)"""
+    import argparse
+    import json
+    from datetime import date
+
+    parser = argparse.ArgumentParser(prog='main.py enqueue', description='Постановка задания в очередь')
+    parser.add_argument('job_type', choices=['collect', 'publish', 'backfill_date', 'resummarize'])
+    parser.add_argument('--payload', type=json.loads, default={}, help='параметры задания в JSON')
+    parser.add_argument('--since', type=date.fromisoformat, help='backfill_date: первый день периода')
+    parser.add_argument('--until', type=date.fromisoformat, help='backfill_date: последний день (включительно)')
+    parser.add_argument('--run-at', type=datetime.fromisoformat, help='не раньше этого времени (ISO 8601)')
+    options = parser.parse_args(args)
+
+    logger.info(f"📥 Enqueue requested: {options}")
+
+    try:
+        from src.job_queue import enqueue, enqueue_backfill, JOB_BACKFILL_DATE
+
+        if options.job_type == JOB_BACKFILL_DATE and options.since:
+            jobs = enqueue_backfill(options.since, options.until or options.since)
+        else:
+            jobs = [enqueue(options.job_type, options.payload, run_at=options.run_at)]
+
+        for job in jobs:
+            print(f"{'✅ Поставлено' if job.get('created') else 'ℹ️ Уже в очереди'}: задание #{job.get('id')}")
+        return 0
+
+    except Exception as e:
+        logger.error(f"❌ Enqueue failed: {e}")
+        print(f"❌ Ошибка постановки задания: {e}")
+        return 1
+
 if __name__ == "__main__":
     logger.info("🎯 Main script execution started")
     print("EdTech News Digest Bot v2.0.0 (Supabase Only)")
@@ -193,6 +353,47 @@ if __name__ == "__main__":
             logger.info(f"🏁 Database initialization finished with exit code: {exit_code}")
             sys.exit(exit_code)
             
+        elif command == "migrate":
+            logger.info("🎯 Executing: schema migrations")
+            print("🔧 Миграции схемы базы данных...")
+            exit_code = run_migrate(sys.argv[2:])
+            logger.info(f"🏁 Schema migrations finished with exit code: {exit_code}")
+            sys.exit(exit_code)
+            
+        elif command == "stats-repair":
+            logger.info("🎯 Executing: dashboard stats repair")
+            days = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+            exit_code = run_stats_repair(days)
+            logger.info(f"🏁 Stats repair finished with exit code: {exit_code}")
+            sys.exit(exit_code)
+            
+        elif command == "retention":
+            logger.info("🎯 Executing: data retention cleanup")
+            print("🧹 Очистка старых данных...")
+            exit_code = run_retention()
+            logger.info(f"🏁 Retention cleanup finished with exit code: {exit_code}")
+            sys.exit(exit_code)
+            
+        elif command == "export":
+            logger.info("🎯 Executing: corpus export")
+            print("📦 Выгрузка корпуса новостей...")
+            exit_code = run_export(sys.argv[2:])
+            logger.info(f"🏁 Corpus export finished with exit code: {exit_code}")
+            sys.exit(exit_code)
+            
+        elif command == "worker":
+            logger.info("🎯 Executing: job queue worker")
+            print("👷 Запуск воркера очереди заданий...")
+            exit_code = run_worker(sys.argv[2:])
+            logger.info(f"🏁 Job queue worker finished with exit code: {exit_code}")
+            sys.exit(exit_code)
+            
+        elif command == "enqueue":
+            logger.info("🎯 Executing: enqueue job")
+            exit_code = run_enqueue(sys.argv[2:])
+            logger.info(f"🏁 Enqueue finished with exit code: {exit_code}")
+            sys.exit(exit_code)
+            
         elif command == "scheduler":
             logger.info("🎯 Executing: scheduler")
             print("⏰ Запуск планировщика...")
@@ -207,9 +408,9 @@ if __name__ == "__main__":
             
         else:
             logger.error(f"❌ Unknown command received: {command}")
-            logger.error("💡 Available commands: collect, admin, init")
+            logger.error("💡 Available commands: collect, admin, init, migrate, stats-repair, retention, export, worker, enqueue, scheduler")
             print(f"❌ Неизвестная команда: {command}")
-            print("💡 Доступные команды: collect, admin, init, scheduler")
+            print("💡 Доступные команды: collect, admin, init, migrate, stats-repair, retention, export, worker, enqueue, scheduler")
             sys.exit(1)
     else:
         logger.info("ℹ️ No command specified, showing help")
@@ -217,7 +418,13 @@ if __name__ == "__main__":
         print("  python main.py collect    - Сбор и публикация новостей")
         print("  python main.py admin      - Запуск админ-панели")
         print("  python main.py init       - Инициализация базы данных")
+        print("  python main.py migrate [status|версия] - Миграции схемы базы данных")
         print("  python main.py scheduler  - Запуск планировщика")
+        print("  python main.py worker [--concurrency N] [--types collect,publish] - Воркер очереди заданий")
+        print("  python main.py enqueue <тип> [--payload JSON] - Постановка задания в очередь")
+        print("  python main.py stats-repair [дней] - Пересчет статистики дашборда")
+        print("  python main.py retention  - Очистка старых данных по срокам хранения")
+        print("  python main.py export [--format csv|jsonl|parquet] - Выгрузка корпуса новостей")
         print()
         print("📋 Для начала работы:")
         print("  1. Настройте переменные окружения в .env файле")
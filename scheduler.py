@@ -2,14 +2,25 @@
 """
 Планировщик автоматических запусков EdTech News Digest
 Запускает сбор новостей в заданное время каждый день
+
+Задания работают в одном event loop. Для каждого задания вычисляется точное время
+следующего слота в Europe/Moscow, и планировщик спит до ближайшего из них. Слот
+захватывается строкой (job, slot) в scheduler_fires, поэтому одно срабатывание не
+выполнится дважды ни в одном процессе, ни после перезапуска. Слот, пропущенный во
+время простоя, догоняется при старте, если опоздание меньше grace задания.
+Сбор и публикация не выполняются здесь: слот ставит задание в очередь (src/job_queue.py),
+а выполняют его процессы python main.py worker
+
+За PRECOLLECT_PLAN_AHEAD минут до каждого слота публикации планируется сбор, который
+должен закончиться к слоту: старт выбирается по длительности недавних циклов из run_logs,
+а дедлайн передается в задание - опаздывающий цикл пропускает каналы с низким приоритетом
 """
 import os
 import sys
 import asyncio
 import logging
-import schedule
-import time
-from datetime import datetime, timezone
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
 import pytz
 
 # Добавляем путь к src модулям
@@ -18,6 +29,9 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 # Московский часовой пояс
 MOSCOW_TZ = pytz.timezone('Europe/Moscow')
 
+# Максимальный сон: после него слоты пересчитываются (переход часов, засыпание хоста)
+MAX_SLEEP_SECONDS = 300
+
 # Настройка логирования
 os.makedirs('logs', exist_ok=True)
 logging.basicConfig(
@@ -31,205 +45,312 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+def parse_times(times: List[str]) -> List[Tuple[int, int]]:
+    """Времена HH:MM в отсортированный список (час, минута); неверные пропускаются"""
+    parsed = set()
+    for time_str in times:
+        try:
+            moment = datetime.strptime(time_str.strip(), '%H:%M')
+            parsed.add((moment.hour, moment.minute))
+        except ValueError:
+            logger.error(f"❌ Неверный формат времени: {time_str}. Ожидается HH:MM")
+    return sorted(parsed)
+
+def _slots_around(times: List[Tuple[int, int]], now: datetime) -> List[datetime]:
+    """Слоты вчера, сегодня и завтра по московскому времени"""
+    today = now.astimezone(MOSCOW_TZ).date()
+    return [
+        MOSCOW_TZ.localize(datetime(day.year, day.month, day.day, hour, minute))
+        for day in (today - timedelta(days=1), today, today + timedelta(days=1))
+        for hour, minute in times
+    ]
+
+def last_slot(times: List[Tuple[int, int]], now: datetime) -> Optional[datetime]:
+    """Последний слот не позже now"""
+    past = [slot for slot in _slots_around(times, now) if slot <= now]
+    return max(past) if past else None
+
+def next_slot(times: List[Tuple[int, int]], now: datetime) -> Optional[datetime]:
+    """Первый слот позже now"""
+    future = [slot for slot in _slots_around(times, now) if slot > now]
+    return min(future) if future else None
+
 def get_schedule_times():
     """Получаем время запуска из настроек (московское время)"""
     try:
         from src.database import SettingsDB
         digest_times = SettingsDB.get_setting('digest_times', '12:00,18:00')
         times = [t.strip() for t in digest_times.split(',') if t.strip()]
-        logger.info(f"📅 Время публикации из настроек (MSK): {times}")
+        logger.debug(f"📅 Время публикации из настроек (MSK): {times}")
         return times
     except Exception as e:
         logger.error(f"❌ Ошибка получения времени из настроек: {e}")
         # Fallback к значениям по умолчанию
         return ['12:00', '18:00']
 
-def schedule_moscow_time(time_str: str, job_func):
-    """Планирование задания на московское время"""
+def get_publish_times() -> List[Tuple[int, int]]:
+    """Слоты публикации; без корректных времен в настройках - 12:00 и 18:00"""
+    times = parse_times(get_schedule_times())
+    if not times:
+        logger.warning("⚠️ Не удалось настроить публикацию! Используем значения по умолчанию")
+        times = parse_times(['12:00', '18:00'])
+    return times
+
+async def enqueue_job(job_type: str) -> bool:
+    """Постановка задания в очередь; выполняет его воркер (python main.py worker)"""
+    from src.job_queue import enqueue
+
+    # Пока воркер остановлен или не успевает, слоты схлопываются в одно ожидающее задание
+    job = await asyncio.to_thread(enqueue, job_type, dedupe_key=f"{job_type}:scheduled")
+    if job.get('created'):
+        logger.info(f"📥 {job_type}: задание #{job['id']} поставлено в очередь")
+    else:
+        logger.warning(f"⚠️ {job_type}: предыдущее задание #{job.get('id')} еще не взято воркером")
+    return True
+
+async def run_news_collection() -> bool:
+    """Сбор новостей (накопление)"""
+    from src.job_queue import JOB_COLLECT
+    return await enqueue_job(JOB_COLLECT)
+
+async def publish_accumulated_news() -> bool:
+    """Публикация накопленного дайджеста"""
+    from src.job_queue import JOB_PUBLISH
+    return await enqueue_job(JOB_PUBLISH)
+
+def get_precollect_times() -> List[Tuple[int, int]]:
+    """Слоты планирования сбора: за PRECOLLECT_PLAN_AHEAD минут до каждого слота публикации"""
+    from src.config import PRECOLLECT_PLAN_AHEAD
+    shifted = set()
+    for hour, minute in get_publish_times():
+        total = (hour * 60 + minute - PRECOLLECT_PLAN_AHEAD) % (24 * 60)
+        shifted.add((total // 60, total % 60))
+    return sorted(shifted)
+
+async def plan_precollection() -> bool:
+    """Сбор с дедлайном перед ближайшим слотом публикации"""
+    from src.config import (PRECOLLECT_MARGIN, PRECOLLECT_PERCENTILE,
+                            PRECOLLECT_HISTORY_RUNS, PRECOLLECT_DEFAULT_SECONDS)
+    from src.database import RunLogsDB
+    from src.job_queue import JOB_COLLECT, PRECOLLECT_PRIORITY, enqueue, precollect_dedupe_key
+
+    now = datetime.now(MOSCOW_TZ)
+    slot = next_slot(get_publish_times(), now)
+    if slot is None:
+        return False
+
     try:
-        # Парсим время
-        hour, minute = map(int, time_str.split(':'))
-        
-        def moscow_job():
-            """Обертка для выполнения задания с проверкой московского времени"""
-            moscow_now = datetime.now(MOSCOW_TZ)
-            current_hour = moscow_now.hour
-            current_minute = moscow_now.minute
-            
-            # Проверяем что сейчас нужное время в Москве (с допуском в 1 минуту)
-            if abs(current_hour - hour) == 0 and abs(current_minute - minute) <= 1:
-                logger.info(f"🕐 Запуск задания в московское время: {moscow_now.strftime('%H:%M MSK')}")
-                job_func()
-            else:
-                logger.debug(f"⏰ Пропуск: текущее время MSK {current_hour:02d}:{current_minute:02d}, ожидаем {hour:02d}:{minute:02d}")
-        
-        return moscow_job
+        expected = await asyncio.to_thread(RunLogsDB.get_cycle_duration,
+                                           PRECOLLECT_PERCENTILE, PRECOLLECT_HISTORY_RUNS)
     except Exception as e:
-        logger.error(f"❌ Ошибка создания московского расписания для {time_str}: {e}")
-        return job_func
+        logger.warning(f"⚠️ Не удалось получить длительность циклов: {e}")
+        expected = None
+    expected = expected or PRECOLLECT_DEFAULT_SECONDS
 
-def run_news_collection():
-    """Запуск сбора новостей (накопление)"""
-    logger.info("🚀 Запуск автоматического сбора новостей (накопление)...")
-    
-    try:
-        # Импортируем функцию сбора
-        from main import run_collect
-        
-        # Создаем новый event loop для асинхронного выполнения
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
+    deadline = slot - timedelta(seconds=PRECOLLECT_MARGIN)
+    start = max(deadline - timedelta(seconds=expected), now)
+    payload = {
+        'deadline': deadline.astimezone(pytz.utc).isoformat(),
+        'expected_seconds': round(expected),
+        'slot': slot.isoformat(),
+    }
+    job = await asyncio.to_thread(enqueue, JOB_COLLECT, payload, run_at=start.astimezone(pytz.utc),
+                                  dedupe_key=precollect_dedupe_key(slot), priority=PRECOLLECT_PRIORITY)
+    logger.info(f"🗓️ Сбор к публикации {slot:%H:%M} MSK: старт {start:%H:%M:%S}, дедлайн {deadline:%H:%M:%S} "
+                f"(цикл ~{expected:.0f} с), задание #{job.get('id')}")
+    return True
+
+async def repair_dashboard_stats() -> bool:
+    """Сверка счетчиков дашборда с первичными таблицами (исправляет пропущенные приращения)"""
+    from src.database import StatsDB
+    return await asyncio.to_thread(StatsDB.repair)
+
+async def run_retention() -> bool:
+    """Очистка старых данных по срокам хранения и свертка статистики каналов"""
+    from src.retention import run_retention as retention
+    await asyncio.to_thread(retention)
+    return True
+
+class Job:
+    """Задание с ежедневными слотами по московскому времени"""
+
+    def __init__(self, name: str, times: Callable[[], List[Tuple[int, int]]],
+                 run: Callable[[], Awaitable[bool]], grace: timedelta):
+        self.name = name
+        self.times = times
+        self.run = run
+        # Насколько поздно слот еще можно выполнить (догон после простоя)
+        self.grace = grace
+        self.current_times: List[Tuple[int, int]] = []
+        # Последний слот, который уже обработан этим процессом
+        self.last_handled: Optional[datetime] = None
+        self.running = False
+
+    def refresh(self, now: datetime):
+        """Перечитать слоты; при смене расписания слоты в прошлом не догоняются"""
+        times = self.times()
+        if self.current_times and times != self.current_times:
+            logger.info(f"🔄 Расписание {self.name}: {self._format(times)} MSK")
+            self.last_handled = last_slot(times, now)
+        self.current_times = times
+
+    def due_slot(self, now: datetime) -> Optional[datetime]:
+        """Слот, который пора выполнить, если он еще не обработан и не просрочен"""
+        slot = last_slot(self.current_times, now)
+        if slot is None or (self.last_handled and slot <= self.last_handled):
+            return None
+        if now - slot > self.grace:
+            logger.info(f"⏭️ {self.name}: слот {slot:%Y-%m-%d %H:%M} MSK пропущен (опоздание больше {self.grace})")
+            self.last_handled = slot
+            return None
+        return slot
+
+    @staticmethod
+    def _format(times: List[Tuple[int, int]]) -> str:
+        return ', '.join(f"{hour:02d}:{minute:02d}" for hour, minute in times)
+
+def build_jobs() -> List[Job]:
+    """Задания планировщика (все времена в московском часовом поясе)"""
+    from src.config import PRECOLLECT_PLAN_AHEAD
+    hourly = [(hour, 0) for hour in range(24)]
+    return [
+        # Почасовой сбор новостей (накопление)
+        Job('collect', lambda: hourly, run_news_collection, timedelta(minutes=50)),
+        # Публикация дайджестов по digest_times из настроек
+        Job('publish', get_publish_times, publish_accumulated_news, timedelta(hours=2)),
+        # Сбор с дедлайном к каждому слоту публикации
+        Job('precollect', get_precollect_times, plan_precollection, timedelta(minutes=PRECOLLECT_PLAN_AHEAD)),
+        # Пересчет статистики дашборда
+        Job('stats_repair', lambda: [(0, 45), (6, 45), (12, 45), (18, 45)], repair_dashboard_stats, timedelta(hours=6)),
+        # Очистка старых данных и свертка статистики каналов
+        Job('retention', lambda: [(3, 30)], run_retention, timedelta(hours=12)),
+    ]
+
+class Scheduler:
+    """Цикл планировщика: сон до ближайшего слота, захват слота, запуск задания задачей"""
+
+    def __init__(self, jobs: List[Job]):
+        self.jobs = jobs
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks = set()
+
+    def on_settings_change(self, table: str, op: str, key):
+        """Подписчик ленты изменений (поток ленты): пересобрать расписание при смене digest_times"""
+        if table == 'settings' and key in ('digest_times', None) and self._loop:
+            logger.info("🔔 Изменилось время публикации, расписание будет пересобрано")
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def start_change_feed(self):
+        """Запуск ленты изменений каналов и настроек (LISTEN/NOTIFY, при недоступности - опрос)"""
         try:
-            start_time = datetime.now()
-            result_code = loop.run_until_complete(run_collect())
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            
-            if result_code == 0:
-                logger.info(f"✅ Автоматический сбор завершен успешно за {duration:.2f}с")
-            else:
-                logger.error(f"❌ Автоматический сбор завершился с ошибкой (код: {result_code})")
-                
-        finally:
-            loop.close()
-            
-    except Exception as e:
-        logger.error(f"❌ Критическая ошибка автоматического сбора: {e}")
-        import traceback
-        logger.error(f"📋 Traceback: {traceback.format_exc()}")
+            from src.change_feed import get_change_feed
+            feed = get_change_feed()
+            feed.subscribe(self.on_settings_change)
+            feed.start()
+        except Exception as e:
+            logger.error(f"❌ Не удалось запустить ленту изменений: {e}, расписание перечитывается раз в {MAX_SLEEP_SECONDS} с")
 
-def publish_accumulated_news():
-    """Публикация накопленного дайджеста"""
-    logger.info("📤 Запуск публикации накопленного дайджеста...")
-    
-    try:
-        from src.news_collector import NewsCollector
-        
-        # Создаем новый event loop для асинхронного выполнения
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
+    async def _claim(self, job: Job, slot: datetime) -> bool:
+        from src.database import SchedulerFiresDB
         try:
-            start_time = datetime.now()
-            collector = NewsCollector()
-            
-            # Инициализация
-            loop.run_until_complete(collector.initialize())
-            
-            # Публикация накопленного
-            result = loop.run_until_complete(collector.publish_accumulated_digest())
-            
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            
-            if result['success']:
-                logger.info(f"✅ Публикация завершена успешно за {duration:.2f}с")
-                logger.info(f"📰 Опубликовано новостей: {result.get('news_count', 0)}")
-            else:
-                logger.error(f"❌ Публикация завершилась с ошибкой: {result.get('error', 'Unknown')}")
-                
-        finally:
-            loop.close()
-            
-    except Exception as e:
-        logger.error(f"❌ Критическая ошибка публикации: {e}")
-        import traceback
-        logger.error(f"📋 Traceback: {traceback.format_exc()}")
+            return await asyncio.to_thread(SchedulerFiresDB.claim, job.name, slot)
+        except Exception as e:
+            # Без базы защищает только память процесса - лучше выполнить, чем пропустить
+            logger.warning(f"⚠️ Не удалось захватить слот {job.name} {slot:%H:%M}: {e}, запускаем без записи")
+            return True
 
-def setup_schedule():
-    """Настройка расписания (все времена в московском часовом поясе)"""
-    logger.info("⏰ Настройка расписания автоматических запусков (московское время)...")
-    
-    # Очищаем предыдущие задания
-    schedule.clear()
-    
-    # Настраиваем почасовой сбор новостей (накопление)
-    schedule.every().hour.do(run_news_collection)
-    logger.info("📅 Настроен почасовой сбор новостей")
-    
-    # Получаем время публикации из настроек (московское время)
-    times = get_schedule_times()
-    
-    # Настраиваем публикацию для каждого времени в московском часовом поясе
-    for time_str in times:
+    async def _finish(self, job: Job, slot: datetime, status: str, error: str = None):
+        from src.database import SchedulerFiresDB
+        await asyncio.to_thread(SchedulerFiresDB.finish, job.name, slot, status, error)
+
+    async def fire(self, job: Job, slot: datetime):
+        """Один слот задания: не больше одного выполнения на (job, slot) во всех процессах"""
+        if not await self._claim(job, slot):
+            logger.info(f"ℹ️ {job.name}: слот {slot:%Y-%m-%d %H:%M} MSK уже выполнен или выполняется")
+            return
+        if job.running:
+            logger.warning(f"⚠️ {job.name}: предыдущий запуск еще идет, слот {slot:%H:%M} MSK пропущен")
+            await self._finish(job, slot, 'skipped', 'previous run still in progress')
+            return
+
+        logger.info(f"🕐 {job.name}: слот {slot:%Y-%m-%d %H:%M} MSK, запуск в {datetime.now(MOSCOW_TZ):%H:%M:%S}")
+        job.running = True
         try:
-            # Проверяем формат времени
-            datetime.strptime(time_str, '%H:%M')
-            
-            # Создаем обертку для московского времени
-            moscow_job = schedule_moscow_time(time_str, publish_accumulated_news)
-            
-            # Планируем проверку каждую минуту (schedule будет проверять московское время)
-            schedule.every().minute.do(moscow_job)
-            logger.info(f"📅 Настроена публикация дайджеста в {time_str} MSK каждый день")
-            
-        except ValueError:
-            logger.error(f"❌ Неверный формат времени: {time_str}. Ожидается HH:MM")
-    
-    # Если не удалось настроить публикацию, используем значения по умолчанию
-    if not times or len(times) == 0:
-        logger.warning("⚠️ Не удалось настроить публикацию! Используем значения по умолчанию")
-        for default_time in ["12:00", "18:00"]:
-            moscow_job = schedule_moscow_time(default_time, publish_accumulated_news)
-            schedule.every().minute.do(moscow_job)
-        logger.info("📅 Настроена публикация по умолчанию: 12:00 и 18:00 MSK")
-    
-    logger.info(f"✅ Настроено {len(schedule.jobs)} автоматических заданий в московском времени")
-    
-    # Показываем текущее время
-    moscow_now = datetime.now(MOSCOW_TZ)
-    logger.info(f"🕐 Текущее московское время: {moscow_now.strftime('%Y-%m-%d %H:%M:%S MSK')}")
+            ok = await job.run()
+            await self._finish(job, slot, 'completed' if ok else 'failed')
+        except Exception as e:
+            logger.error(f"❌ Критическая ошибка задания {job.name}: {e}")
+            import traceback
+            logger.error(f"📋 Traceback: {traceback.format_exc()}")
+            await self._finish(job, slot, 'failed', str(e))
+        finally:
+            job.running = False
+
+    def _spawn(self, job: Job, slot: datetime):
+        # Длинный сбор не задерживает слот публикации: каждое срабатывание - отдельная задача
+        task = asyncio.create_task(self.fire(job, slot), name=f"{job.name}@{slot:%H:%M}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
 
-def log_next_runs():
-    """Логируем информацию о следующих запусках"""
-    if schedule.jobs:
+    def log_next_runs(self, now: datetime):
+        """Логируем информацию о следующих запусках"""
         logger.info("📋 Следующие запланированные запуски:")
-        for job in schedule.jobs:
-            next_run = job.next_run
-            if next_run:
-                # Форматируем время с учетом часового пояса
-                formatted_time = next_run.strftime('%Y-%m-%d %H:%M:%S')
-                logger.info(f"   ⏰ {formatted_time}")
-    else:
-        logger.warning("⚠️ Нет запланированных заданий")
+        for job in self.jobs:
+            upcoming = next_slot(job.current_times, now)
+            if upcoming:
+                logger.info(f"   ⏰ {job.name:<13} {upcoming:%Y-%m-%d %H:%M} MSK")
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        # Загрузка реестра и чтение расписаний (get_publish_times -> SettingsDB) - запросы к базе,
+        # поэтому выполняются в потоке, не блокируя задания в event loop
+        await asyncio.to_thread(self.start_change_feed)
+
+        now = datetime.now(MOSCOW_TZ)
+        for job in self.jobs:
+            await asyncio.to_thread(job.refresh, now)
+            logger.info(f"📅 {job.name}: {Job._format(job.current_times)} MSK")
+        self.log_next_runs(now)
+        logger.info("🔄 Планировщик запущен. Ожидание заданий...")
+
+        while True:
+            now = datetime.now(MOSCOW_TZ)
+            for job in self.jobs:
+                await asyncio.to_thread(job.refresh, now)
+                slot = job.due_slot(now)
+                if slot:
+                    job.last_handled = slot
+                    self._spawn(job, slot)
+
+            upcoming = [next_slot(job.current_times, now) for job in self.jobs]
+            wake_at = min(slot for slot in upcoming if slot)
+            delay = min(max((wake_at - datetime.now(MOSCOW_TZ)).total_seconds(), 0), MAX_SLEEP_SECONDS)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                self._wake.clear()
+                logger.info("🔄 Обновление расписания...")
+            except asyncio.TimeoutError:
+                pass
 
 def main():
     """Основная функция планировщика"""
     logger.info("🤖 Запуск планировщика EdTech News Digest...")
     logger.info("=" * 60)
-    
+
     # Показываем время в московском часовом поясе
     moscow_now = datetime.now(MOSCOW_TZ)
     logger.info(f"📅 Время запуска (MSK): {moscow_now.strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info(f"🌍 Часовой пояс: Europe/Moscow (UTC+3)")
-    
+
     # Также показываем локальное время сервера для сравнения
     local_now = datetime.now()
     logger.info(f"🖥️ Локальное время сервера: {local_now.strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info("=" * 60)
-    
-    # Настраиваем расписание
-    setup_schedule()
-    log_next_runs()
-    
-    logger.info("🔄 Планировщик запущен. Ожидание заданий...")
-    
+
     try:
-        while True:
-            # Проверяем и выполняем запланированные задания
-            schedule.run_pending()
-            
-            # Спим 60 секунд между проверками
-            time.sleep(60)
-            
-            # Каждые 6 часов обновляем расписание (на случай изменения настроек)
-            current_time = datetime.now()
-            if current_time.minute == 0 and current_time.hour % 6 == 0:
-                logger.info("🔄 Обновление расписания...")
-                setup_schedule()
-                log_next_runs()
-                
+        asyncio.run(Scheduler(build_jobs()).run())
     except KeyboardInterrupt:
         logger.info("⏹️ Планировщик остановлен пользователем")
     except Exception as e:
@@ -239,4 +360,4 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Сравнение планов горячих запросов с индексами миграций 002/004 и без них
+
+    python scripts/benchmark_indexes.py            # планы с текущими индексами
+    python scripts/benchmark_indexes.py --compare  # плюс планы без этих индексов
+
+Для --compare индексы удаляются внутри транзакции, запросы выполняются через
+EXPLAIN ANALYZE, затем транзакция откатывается - схема не меняется. Но DROP INDEX
+берет ACCESS EXCLUSIVE на таблицу индекса (channels, run_logs, pending_news,
+processed_messages) до отката: на все время замеров блокируются и запись, и чтение.
+Поэтому --compare запускайте на копии базы или реплике (DATABASE_URL копии), а не
+на рабочей базе. Без --compare запросы только читают данные и ничего не блокируют.
+"""
+
+import argparse
+import os
+import sys
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config import DATABASE_URL
+
+# Индексы миграций 002 и 004 (src/migrations.py)
+MIGRATION_INDEXES = [
+    'idx_processed_messages_processed_at',
+    'idx_run_logs_started_at',
+    'idx_channels_active_priority',
+    'idx_pending_news_queue',
+    'idx_processed_messages_search',
+]
+
+# Запросы дашборда, сборщика и публикации в том виде, в каком их выполняет код
+HOT_QUERIES = [
+    ('Активные каналы (сборщик)',
+     'SELECT * FROM channels WHERE is_active = true ORDER BY priority DESC, created_at ASC'),
+    ('Очередь публикации',
+     'SELECT * FROM pending_news WHERE is_deleted = false ORDER BY relevance_score DESC, collected_at DESC'),
+    ('Последние запуски (дашборд)',
+     'SELECT * FROM run_logs ORDER BY started_at DESC LIMIT 10'),
+    ('Последний запуск',
+     'SELECT * FROM run_logs ORDER BY started_at DESC LIMIT 1'),
+    ('Обработанные за сутки',
+     "SELECT COUNT(*) FROM processed_messages WHERE processed_at > CURRENT_TIMESTAMP - INTERVAL '24 hours'"),
+    ('Пересчет статистики за 7 дней',
+     "SELECT date_trunc('hour', processed_at), COUNT(*) FROM processed_messages "
+     "WHERE processed_at >= CURRENT_TIMESTAMP - INTERVAL '7 days' GROUP BY 1"),
+    ('Поиск (первая страница)',
+     "SELECT * FROM search_news('искусственный интеллект', 21)"),
+    # Частый термин: ранжируются не больше SEARCH_MAX_CANDIDATES совпадений (миграции 011, 013)
+    ('Поиск частого термина (страница 100)',
+     "SELECT * FROM search_news('образование', 101)"),
+]
+
+def _walk(node, found):
+    """Типы узлов плана с именами индексов"""
+    label = node['Node Type']
+    if node.get('Index Name'):
+        label += f" ({node['Index Name']})"
+    found.append(label)
+    for child in node.get('Plans', []):
+        _walk(child, found)
+    return found
+
+def explain(cursor, sql: str) -> dict:
+    cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}')
+    result = cursor.fetchone()['QUERY PLAN'][0]
+    plan = result['Plan']
+    return {
+        'nodes': ' -> '.join(_walk(plan, [])),
+        'cost': plan['Total Cost'],
+        'time_ms': result['Execution Time'],
+        'buffers': plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+    }
+
+def run_queries(cursor) -> list:
+    return [(title, explain(cursor, sql)) for title, sql in HOT_QUERIES]
+
+def print_plans(header: str, results: list):
+    print(f"\n{header}")
+    print("=" * 100)
+    for title, plan in results:
+        print(f"{title:<32} {plan['time_ms']:>9.2f} мс  cost {plan['cost']:>10.1f}  buffers {plan['buffers']:>6}")
+        print(f"    {plan['nodes']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='EXPLAIN ANALYZE горячих запросов с индексами и без')
+    parser.add_argument('--compare', action='store_true',
+                        help='дополнительно выполнить запросы без индексов миграций (в откатываемой транзакции)')
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        print("❌ DATABASE_URL не задан")
+        return 1
+
+    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND indexname = ANY(%s)
+        ''', (MIGRATION_INDEXES,))
+        present = [row['indexname'] for row in cursor.fetchall()]
+        missing = sorted(set(MIGRATION_INDEXES) - set(present))
+        if missing:
+            print(f"⚠️ Нет индексов: {', '.join(missing)} - выполните python main.py migrate")
+
+        with_indexes = run_queries(cursor)
+        conn.rollback()
+        print_plans("📈 С индексами миграций", with_indexes)
+
+        if args.compare and present:
+            cursor.execute("SET LOCAL lock_timeout = '2s'")
+            for name in present:
+                cursor.execute(f'DROP INDEX {name}')
+            without_indexes = run_queries(cursor)
+            conn.rollback()
+            print_plans("📉 Без индексов миграций (транзакция откачена)", without_indexes)
+
+            print("\n⚡ Ускорение")
+            print("=" * 100)
+            for (title, before), (_, after) in zip(without_indexes, with_indexes):
+                speedup = before['time_ms'] / after['time_ms'] if after['time_ms'] else float('inf')
+                print(f"{title:<32} {before['time_ms']:>9.2f} мс -> {after['time_ms']:>9.2f} мс  (x{speedup:.1f})")
+    finally:
+        conn.rollback()
+        conn.close()
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
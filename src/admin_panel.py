@@ -9,8 +9,9 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask import session as flask_session
+from markupsafe import Markup, escape
 
 # Настройка логирования
 os.makedirs('logs', exist_ok=True)
@@ -30,18 +31,24 @@ logger.info("🚀 Starting Admin Panel - SUPABASE ONLY MODE")
 try:
     logger.info("📦 Attempting relative import...")
     from .database import (
-        ChannelsDB, SettingsDB, ProcessedMessagesDB, PendingNewsDB,
-        create_connection, test_db, init_database, get_database_info
+        ChannelsDB, SettingsDB, ProcessedMessagesDB, PendingNewsDB, StatsDB, ChannelStatsDB, StorageDB, SearchDB, JobsDB, RunLogsDB,
+        create_connection, test_db, init_database, get_database_info, SEARCH_MAX_CANDIDATES
     )
     from .config import FLASK_SECRET_KEY, FLASK_PORT, TARGET_CHANNEL
+    from .pipeline_metrics import COUNTERS, latency_percentiles
+    from .exporter import CorpusExport
+    from .job_queue import enqueue, enqueue_backfill, JOB_COLLECT, JOB_PUBLISH, JOB_RESUMMARIZE, MAX_BACKFILL_DAYS
     logger.info("✅ Relative import successful")
 except ImportError:
     logger.info("📦 Falling back to absolute import...")
     from database import (
-        ChannelsDB, SettingsDB, ProcessedMessagesDB, PendingNewsDB,
-        create_connection, test_db, init_database, get_database_info
+        ChannelsDB, SettingsDB, ProcessedMessagesDB, PendingNewsDB, StatsDB, ChannelStatsDB, StorageDB, SearchDB, JobsDB, RunLogsDB,
+        create_connection, test_db, init_database, get_database_info, SEARCH_MAX_CANDIDATES
     )
     from config import FLASK_SECRET_KEY, FLASK_PORT, TARGET_CHANNEL
+    from pipeline_metrics import COUNTERS, latency_percentiles
+    from exporter import CorpusExport
+    from job_queue import enqueue, enqueue_backfill, JOB_COLLECT, JOB_PUBLISH, JOB_RESUMMARIZE, MAX_BACKFILL_DAYS
     logger.info("✅ Absolute import successful")
 
 # Инициализация Flask приложения
@@ -65,168 +72,65 @@ def get_db():
     """Получение подключения к базе данных"""
     return create_connection()
 
-def get_dashboard_stats_rest_api():
-    """Получение статистики через REST API (fallback)"""
-    logger.info("📡 Getting dashboard statistics via REST API...")
-    
-    try:
-        from .database import supabase_db
-        
-        # Получаем каналы
-        channels = supabase_db.execute_rest_query('channels', 'GET')
-        active_channels = len([c for c in channels if c.get('is_active', True)])
-        total_channels = len(channels)
-        
-        # Обработанные сообщения (пока заглушка, так как сложный запрос)
-        try:
-            messages = supabase_db.execute_rest_query('processed_messages', 'GET')
-            recent_messages = len(messages)  # Упрощенно - все сообщения
-        except:
-            recent_messages = 0
-        
-        # Настройки (заглушка)
-        published_news = 0
-        last_run = None
-        
-        stats = {
-            'active_channels': active_channels,
-            'total_channels': total_channels,
-            'recent_messages': recent_messages,
-            'published_news': published_news,
-            'last_run': last_run
-        }
-        
-        logger.info(f"✅ REST API statistics: active={active_channels}, total={total_channels}")
-        return stats
-        
-    except Exception as e:
-        logger.error(f"❌ REST API fallback failed: {e}")
-        return {
-            'active_channels': 0,
-            'total_channels': 0,
-            'recent_messages': 0,
-            'published_news': 0,
-            'last_run': None,
-            'error': f'REST API error: {str(e)}'
-        }
-
 def get_dashboard_stats():
-    """Получение статистики для дашборда"""
+    """
+    Получение статистики для дашборда
+
+    Счетчики ведут сборщик и публикатор (StatsDB.record), поэтому дашборд - одно чтение
+    сводки dashboard_stats + stats_hourly вместо подсчета по таблицам
+    """
     logger.info("📊 Getting dashboard statistics...")
     
-    conn = None
     try:
-        logger.info("🔗 Getting database connection...")
-        conn = get_db()
-        
-        if conn is None:
-            logger.warning("⚠️ PostgreSQL connection unavailable, using REST API fallback...")
-            return get_dashboard_stats_rest_api()
-            
-        cursor = conn.cursor()
-        logger.info("✅ Database connection established")
-        
-        # Проверяем существование таблиц
-        logger.info("🔍 Checking if tables exist...")
-        cursor.execute("""
-            SELECT table_name FROM information_schema.tables 
-            WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
-        """)
-        tables = [row['table_name'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()]
-        logger.info(f"📋 Available tables: {tables}")
-        
-        if 'channels' not in tables:
-            logger.error("❌ Table 'channels' does not exist!")
-            # Пытаемся создать таблицы
-            try:
-                logger.info("⚡ Attempting to create missing tables...")
-                init_database()
-                logger.info("✅ Tables created successfully")
-            except Exception as init_error:
-                logger.error(f"❌ Failed to create tables: {init_error}")
-                raise
-        
-        # Общее количество каналов
-        logger.info("📈 Querying active channels count...")
-        cursor.execute('SELECT COUNT(*) FROM channels WHERE is_active = true')
-        result = cursor.fetchone()
-        active_channels = result['count'] if isinstance(result, dict) else result[0]
-        
-        # Общее количество каналов
-        cursor.execute('SELECT COUNT(*) FROM channels')
-        result = cursor.fetchone()
-        total_channels = result['count'] if isinstance(result, dict) else result[0]
-        
-        # Количество обработанных сообщений за последние 24 часа
-        cursor.execute('''
-            SELECT COUNT(*) FROM processed_messages 
-            WHERE processed_at > CURRENT_TIMESTAMP - INTERVAL '24 hours'
-        ''')
-        result = cursor.fetchone()
-        recent_messages = result['count'] if isinstance(result, dict) else result[0]
-        
-        # Количество опубликованных новостей за последние 24 часа
-        cursor.execute('''
-            SELECT COUNT(*) FROM processed_messages 
-            WHERE published = true AND processed_at > CURRENT_TIMESTAMP - INTERVAL '24 hours'
-        ''')
-        result = cursor.fetchone()
-        published_news = result['count'] if isinstance(result, dict) else result[0]
-        
-        # Последний запуск
-        cursor.execute('SELECT * FROM run_logs ORDER BY started_at DESC LIMIT 1')
-        last_run = cursor.fetchone()
-        
-        # Количество успешных запусков за последние 24 часа
-        cursor.execute('''
-            SELECT COUNT(*) FROM run_logs 
-            WHERE status = 'completed' AND started_at > CURRENT_TIMESTAMP - INTERVAL '24 hours'
-        ''')
-        result = cursor.fetchone()
-        successful_runs_24h = result['count'] if isinstance(result, dict) else result[0]
-        
-        # Количество опубликованных новостей за последние 24 часа из run_logs
-        cursor.execute('''
-            SELECT COALESCE(SUM(news_published), 0) as total FROM run_logs 
-            WHERE status = 'completed' AND started_at > CURRENT_TIMESTAMP - INTERVAL '24 hours'
-        ''')
-        result = cursor.fetchone()
-        news_published_24h = result['total'] if isinstance(result, dict) else result[0]
-        
-        # Количество собранных сообщений за последние 24 часа из run_logs
-        cursor.execute('''
-            SELECT COALESCE(SUM(messages_collected), 0) as total FROM run_logs 
-            WHERE started_at > CURRENT_TIMESTAMP - INTERVAL '24 hours'
-        ''')
-        result = cursor.fetchone()
-        messages_collected_24h = result['total'] if isinstance(result, dict) else result[0]
-        
-        stats = {
-            'active_channels': active_channels,
-            'total_channels': total_channels,
-            'recent_messages': recent_messages,
-            'published_news': published_news,
-            'successful_runs_24h': successful_runs_24h,
-            'news_published_24h': news_published_24h,
-            'messages_collected_24h': messages_collected_24h,
-            'last_run': dict(last_run) if last_run else None
-        }
-        
+        stats = StatsDB.get_dashboard_stats()
         logger.info(f"📊 Dashboard stats: {stats}")
         return stats
         
     except Exception as e:
         logger.error(f"❌ Error getting dashboard stats: {e}")
-        import traceback
-        logger.error(f"📋 Traceback: {traceback.format_exc()}")
-        return {
-            'active_channels': 0,
-            'total_channels': 0,
-            'recent_messages': 0,
-            'published_news': 0,
-            'last_run': None,
-            'error': str(e)
-        }
+        return {**StatsDB.EMPTY, 'error': str(e)}
+
+def format_bytes(value) -> str:
+    """Размер в байтах для людей: 1.5 MB"""
+    value = float(value or 0)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if value < 1024 or unit == 'GB':
+            return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+        value /= 1024
+
+app.jinja_env.filters['bytes'] = format_bytes
+
+def highlight_html(headline: Optional[str]) -> Markup:
+    """Фрагмент ts_headline в HTML: текст экранируется, совпадения в <mark>"""
+    html = str(escape(headline or ''))
+    return Markup(html.replace(SearchDB.HIGHLIGHT_START, '<mark>').replace(SearchDB.HIGHLIGHT_STOP, '</mark>'))
+
+def search_params() -> Dict[str, Any]:
+    """Параметры поиска из query string (общие для /search и /api/search)"""
+    return {
+        'query': request.args.get('q', '').strip(),
+        'limit': min(max(request.args.get('limit', 20, type=int), 1), 100),
+        'cursor': request.args.get('cursor') or None,
+        'days': request.args.get('days', type=int) or None,
+        'channel_id': request.args.get('channel_id', type=int) or None
+    }
+
+def search_result_item(row: Dict) -> Dict[str, Any]:
+    """Строка search_news для ответа: ссылка на сообщение и подсвеченный фрагмент"""
+    username = (row.get('channel_username') or '').lstrip('@')
+    return {
+        'id': row['id'],
+        'channel_id': row['channel_id'],
+        'channel': username,
+        'message_id': row['message_id'],
+        'url': f"https://t.me/{username}/{row['message_id']}" if username else None,
+        'summary': row.get('summary'),
+        'headline_html': str(highlight_html(row.get('headline'))),
+        'processed_at': str(row['processed_at']) if row.get('processed_at') else None,
+        'relevance_score': row.get('relevance_score'),
+        'in_queue': bool(row.get('in_queue')),
+        'rank': row['rank']
+    }
 
 # Маршруты (Routes)
 
@@ -286,11 +190,12 @@ def dashboard():
     # Получаем последние настройки
     try:
         logger.info("⚙️ Getting current settings...")
+        all_settings = SettingsDB.get_all_settings()
         current_settings = {
-            'max_news_count': SettingsDB.get_setting('max_news_count', '7'),
-            'target_channel': SettingsDB.get_setting('target_channel', TARGET_CHANNEL),
-            'digest_times': SettingsDB.get_setting('digest_times', '12:00,18:00'),
-            'hours_lookback': SettingsDB.get_setting('hours_lookback', '12')
+            'max_news_count': all_settings.get('max_news_count', '7'),
+            'target_channel': all_settings.get('target_channel', TARGET_CHANNEL),
+            'digest_times': all_settings.get('digest_times', '12:00,18:00'),
+            'hours_lookback': all_settings.get('hours_lookback', '12')
         }
         logger.info("✅ Current settings retrieved")
     except Exception as e:
@@ -306,30 +211,8 @@ def dashboard():
     recent_logs = []
     try:
         logger.info("📜 Getting recent run logs...")
-        conn = get_db()
-        if conn is not None:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM run_logs 
-                ORDER BY started_at DESC 
-                LIMIT 10
-            ''')
-            recent_logs = [dict(row) for row in cursor.fetchall()]
-            logger.info(f"✅ Retrieved {len(recent_logs)} recent logs")
-        else:
-            logger.warning("⚠️ No PostgreSQL connection, using REST API fallback for logs...")
-            try:
-                from .database import supabase_db
-                logs_data = supabase_db.execute_rest_query('run_logs', 'GET')
-                if logs_data:
-                    # Сортируем по started_at и берем последние 10
-                    sorted_logs = sorted(logs_data, key=lambda x: x.get('started_at', ''), reverse=True)
-                    recent_logs = sorted_logs[:10]
-                    logger.info(f"✅ Retrieved {len(recent_logs)} recent logs via REST API")
-                else:
-                    logger.warning("⚠️ No logs data from REST API")
-            except Exception as api_error:
-                logger.error(f"❌ REST API fallback for logs failed: {api_error}")
+        recent_logs = RunLogsDB.get_recent(10)
+        logger.info(f"✅ Retrieved {len(recent_logs)} recent logs")
     except Exception as e:
         logger.error(f"❌ Error getting recent logs: {e}")
         recent_logs = []
@@ -508,12 +391,15 @@ def settings():
     logger.info("⚙️ Settings page accessed")
     
     try:
+        all_settings = SettingsDB.get_all_settings()
         current_settings = {
-            'max_news_count': SettingsDB.get_setting('max_news_count', '7'),
-            'target_channel': SettingsDB.get_setting('target_channel', TARGET_CHANNEL),
-            'digest_times': SettingsDB.get_setting('digest_times', '12:00,18:00'),
-            'hours_lookback': SettingsDB.get_setting('hours_lookback', '12'),
-            'summary_max_length': SettingsDB.get_setting('summary_max_length', '150')
+            'max_news_count': all_settings.get('max_news_count', '7'),
+            'target_channel': all_settings.get('target_channel', TARGET_CHANNEL),
+            'digest_times': all_settings.get('digest_times', '12:00,18:00'),
+            'hours_lookback': all_settings.get('hours_lookback', '12'),
+            'summary_max_length': all_settings.get('summary_max_length', '150'),
+            'retention_text_days': all_settings.get('retention_text_days', '30'),
+            'retention_pending_days': all_settings.get('retention_pending_days', '14')
         }
         logger.info("✅ Current settings retrieved")
     except Exception as e:
@@ -535,13 +421,27 @@ def update_settings():
         digest_times = request.form.get('digest_times', '12:00,18:00')
         hours_lookback = request.form.get('hours_lookback', '12')
         summary_max_length = request.form.get('summary_max_length', '150')
-        
-        # Обновляем настройки
-        SettingsDB.set_setting('max_news_count', max_news_count, 'Максимальное количество новостей в дайджесте')
-        SettingsDB.set_setting('target_channel', target_channel, 'Целевой канал для публикации')
-        SettingsDB.set_setting('digest_times', digest_times, 'Время публикации дайджестов')
-        SettingsDB.set_setting('hours_lookback', hours_lookback, 'Сколько часов назад искать новости')
-        SettingsDB.set_setting('summary_max_length', summary_max_length, 'Максимальная длина суммаризации')
+        retention_text_days = request.form.get('retention_text_days', '30')
+        retention_pending_days = request.form.get('retention_pending_days', '14')
+        
+        # Обновляем настройки одним запросом
+        SettingsDB.set_settings_many({
+            'max_news_count': max_news_count,
+            'target_channel': target_channel,
+            'digest_times': digest_times,
+            'hours_lookback': hours_lookback,
+            'summary_max_length': summary_max_length,
+            'retention_text_days': retention_text_days,
+            'retention_pending_days': retention_pending_days
+        }, {
+            'max_news_count': 'Максимальное количество новостей в дайджесте',
+            'target_channel': 'Целевой канал для публикации',
+            'digest_times': 'Время публикации дайджестов',
+            'hours_lookback': 'Сколько часов назад искать новости',
+            'summary_max_length': 'Максимальная длина суммаризации',
+            'retention_text_days': 'Через сколько дней удалять текст обработанных сообщений',
+            'retention_pending_days': 'Через сколько дней удалять неопубликованные новости'
+        })
         
         flash('Настройки успешно обновлены', 'success')
         logger.info("✅ Settings updated successfully")
@@ -603,11 +503,11 @@ def create_pending_table():
     logger.info("🔧 Creating pending_news table requested")
     
     try:
-        conn = get_db()
-        if conn is None:
-            # В Railway у нас нет прямого PostgreSQL доступа, только REST API
-            # Создаем подробные инструкции для Supabase SQL Editor
-            sql_content = '''-- SQL для создания таблицы pending_news в Supabase
+        with get_db() as conn:
+            if conn is None:
+                # В Railway у нас нет прямого PostgreSQL доступа, только REST API
+                # Создаем подробные инструкции для Supabase SQL Editor
+                sql_content = '''-- SQL для создания таблицы pending_news в Supabase
 -- Скопируйте и выполните этот SQL в Supabase SQL Editor
 
 CREATE TABLE IF NOT EXISTS pending_news (
@@ -623,6 +523,9 @@ CREATE TABLE IF NOT EXISTS pending_news (
     digest_type VARCHAR(20),
     is_approved BOOLEAN DEFAULT true,
     is_deleted BOOLEAN DEFAULT false,
+    views INTEGER DEFAULT 0,
+    forwards INTEGER DEFAULT 0,
+    engagement_updated_at TIMESTAMP,
     UNIQUE(channel_id, message_id)
 );
 
@@ -632,39 +535,42 @@ CREATE INDEX IF NOT EXISTS idx_pending_news_digest_type ON pending_news(digest_t
 CREATE INDEX IF NOT EXISTS idx_pending_news_is_deleted ON pending_news(is_deleted);
 CREATE INDEX IF NOT EXISTS idx_pending_news_relevance_score ON pending_news(relevance_score);'''
             
-            flash(f"⚠️ PostgreSQL недоступен в Railway. Создайте таблицу вручную через Supabase SQL Editor:\n\n{sql_content}", 'warning')
-            logger.warning("❌ PostgreSQL unavailable, manual table creation required")
-            return redirect(url_for('pending_news'))
+                flash(f"⚠️ PostgreSQL недоступен в Railway. Создайте таблицу вручную через Supabase SQL Editor:\n\n{sql_content}", 'warning')
+                logger.warning("❌ PostgreSQL unavailable, manual table creation required")
+                return redirect(url_for('pending_news'))
             
-        cursor = conn.cursor()
+            cursor = conn.cursor()
         
-        # SQL для создания таблицы pending_news
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pending_news (
-                id SERIAL PRIMARY KEY,
-                channel_id INTEGER NOT NULL REFERENCES channels(id) ON DELETE CASCADE,
-                message_id BIGINT NOT NULL,
-                channel_name TEXT NOT NULL,
-                message_text TEXT NOT NULL,
-                summary TEXT NOT NULL,
-                relevance_score INTEGER DEFAULT 5,
-                collected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                scheduled_for DATE,
-                digest_type VARCHAR(20),
-                is_approved BOOLEAN DEFAULT true,
-                is_deleted BOOLEAN DEFAULT false,
-                UNIQUE(channel_id, message_id)
-            )
-        ''')
+            # SQL для создания таблицы pending_news
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pending_news (
+                    id SERIAL PRIMARY KEY,
+                    channel_id INTEGER NOT NULL REFERENCES channels(id) ON DELETE CASCADE,
+                    message_id BIGINT NOT NULL,
+                    channel_name TEXT NOT NULL,
+                    message_text TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    relevance_score INTEGER DEFAULT 5,
+                    collected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    scheduled_for DATE,
+                    digest_type VARCHAR(20),
+                    is_approved BOOLEAN DEFAULT true,
+                    is_deleted BOOLEAN DEFAULT false,
+                    views INTEGER DEFAULT 0,
+                    forwards INTEGER DEFAULT 0,
+                    engagement_updated_at TIMESTAMP,
+                    UNIQUE(channel_id, message_id)
+                )
+            ''')
         
-        # Создаем индексы
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_news_scheduled_for ON pending_news(scheduled_for)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_news_digest_type ON pending_news(digest_type)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_news_is_deleted ON pending_news(is_deleted)')
+            # Создаем индексы
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_news_scheduled_for ON pending_news(scheduled_for)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_news_digest_type ON pending_news(digest_type)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_news_is_deleted ON pending_news(is_deleted)')
         
-        conn.commit()
-        flash("✅ Таблица pending_news создана успешно!", 'success')
-        logger.info("✅ pending_news table created successfully")
+            conn.commit()
+            flash("✅ Таблица pending_news создана успешно!", 'success')
+            logger.info("✅ pending_news table created successfully")
         
     except Exception as e:
         flash(f"❌ Ошибка создания таблицы: {str(e)}", 'error')
@@ -674,37 +580,31 @@ CREATE INDEX IF NOT EXISTS idx_pending_news_relevance_score ON pending_news(rele
 
 @app.route('/publish-digest', methods=['POST'])
 def publish_digest():
-    """Публикация накопленного дайджеста"""
+    """Постановка публикации накопленного дайджеста в очередь заданий"""
     logger.info("📤 Manual digest publication requested")
     
     try:
-        import asyncio
-        from src.news_collector import NewsCollector
-        
-        # Создаем новый event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            collector = NewsCollector()
-            # Инициализация
-            loop.run_until_complete(collector.initialize())
-            # Публикация
-            result = loop.run_until_complete(collector.publish_accumulated_digest())
-            
-            if result['success']:
-                flash(f"✅ Дайджест опубликован! Новостей: {result.get('news_count', 0)}", 'success')
-                logger.info(f"✅ Manual digest published: {result.get('news_count', 0)} news")
-            else:
-                flash(f"❌ Ошибка публикации: {result.get('error', 'Unknown')}", 'error')
-                logger.error(f"❌ Manual digest publication failed: {result.get('error', 'Unknown')}")
-                
-        finally:
-            loop.close()
+        job = enqueue(JOB_PUBLISH, dedupe_key=f'{JOB_PUBLISH}:manual')
+        if job.get('created'):
+            flash(f"📥 Публикация поставлена в очередь (задание #{job['id']}), дайджест уйдет в канал в ближайшие секунды", 'success')
+        else:
+            flash(f"ℹ️ Публикация уже ждет в очереди (задание #{job.get('id')})", 'info')
             
     except Exception as e:
-        flash(f"❌ Критическая ошибка: {str(e)}", 'error')
-        logger.error(f"❌ Critical error in manual digest publication: {e}")
+        flash(f"❌ Не удалось поставить публикацию в очередь: {str(e)}", 'error')
+        logger.error(f"❌ Error enqueuing digest publication: {e}")
+    
+    return redirect(url_for('pending_news'))
+
+@app.route('/pending-news/<int:news_id>/resummarize', methods=['POST'])
+def resummarize_pending_news(news_id):
+    """Повторная суммаризация новости через очередь заданий"""
+    try:
+        job = enqueue(JOB_RESUMMARIZE, {'news_ids': [news_id]}, dedupe_key=f'{JOB_RESUMMARIZE}:{news_id}')
+        flash(f"📥 Новость поставлена на повторную суммаризацию (задание #{job.get('id')})", 'success')
+    except Exception as e:
+        flash(f"❌ Не удалось поставить задание: {str(e)}", 'error')
+        logger.error(f"❌ Error enqueuing resummarize for {news_id}: {e}")
     
     return redirect(url_for('pending_news'))
 
@@ -714,36 +614,10 @@ def logs():
     logger.info("📋 Logs page accessed")
     
     try:
-        conn = get_db()
-        if conn is None:
-            logger.warning("⚠️ PostgreSQL недоступен, используем REST API fallback для логов")
-            try:
-                from .database import supabase_db
-                logs_data = supabase_db.execute_rest_query('run_logs', 'GET')
-                if logs_data:
-                    # Сортируем по started_at и берем последние 50
-                    sorted_logs = sorted(logs_data, key=lambda x: x.get('started_at', ''), reverse=True)
-                    run_logs = sorted_logs[:50]
-                    logger.info(f"✅ Retrieved {len(run_logs)} log entries via REST API")
-                else:
-                    run_logs = []
-                    flash('Логи пока недоступны', 'info')
-            except Exception as api_error:
-                logger.error(f"❌ REST API fallback for logs failed: {api_error}")
-                run_logs = []
-                flash('Ошибка получения логов через REST API', 'error')
-        else:
-            cursor = conn.cursor()
-            
-            # Получаем последние запуски
-            cursor.execute('''
-                SELECT * FROM run_logs 
-                ORDER BY started_at DESC 
-                LIMIT 50
-            ''')
-            run_logs = [dict(row) for row in cursor.fetchall()]
-            
-            logger.info(f"✅ Retrieved {len(run_logs)} log entries")
+        run_logs = RunLogsDB.get_recent(50)
+        logger.info(f"✅ Retrieved {len(run_logs)} log entries")
+        if not run_logs:
+            flash('Логи пока недоступны', 'info')
         
     except Exception as e:
         logger.error(f"❌ Error getting logs: {e}")
@@ -752,6 +626,108 @@ def logs():
     
     return render_template('logs.html', logs=run_logs)
 
+@app.route('/search')
+def search():
+    """Поиск по собранным новостям"""
+    params = search_params()
+    logger.info(f"🔎 Search page accessed: {params['query']!r}")
+    
+    results, next_cursor, truncated = [], None, False
+    if params['query']:
+        try:
+            found = SearchDB.search(**params)
+            results = [search_result_item(row) for row in found['results']]
+            next_cursor = found['next_cursor']
+            truncated = found['truncated']
+        except Exception as e:
+            logger.error(f"❌ Search error: {e}")
+            flash(f'Ошибка поиска (выполните python main.py migrate): {e}', 'error')
+    
+    try:
+        channels_list = ChannelsDB.get_active_channels()
+    except Exception as e:
+        logger.error(f"❌ Error getting channels for search: {e}")
+        channels_list = []
+    
+    return render_template('search.html', params=params, results=results, next_cursor=next_cursor,
+                           truncated=truncated, max_candidates=SEARCH_MAX_CANDIDATES, channels=channels_list)
+
+@app.route('/api/search')
+def api_search():
+    """
+    Поиск по собранным новостям (JSON)
+
+    Параметры: q, limit (1-100), cursor (next_cursor предыдущей страницы), days, channel_id.
+    truncated=true - ранжировались только SEARCH_MAX_CANDIDATES самых свежих совпадений
+    """
+    params = search_params()
+    try:
+        found = SearchDB.search(**params)
+        return jsonify({
+            'status': 'ok',
+            'query': params['query'],
+            'results': [search_result_item(row) for row in found['results']],
+            'next_cursor': found['next_cursor'],
+            'truncated': found['truncated'],
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"❌ Error in /api/search: {e}")
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/export')
+def export_corpus():
+    """
+    Потоковая выгрузка корпуса новостей (src/exporter.py)
+
+    Параметры: format (csv, jsonl, parquet), compress (1/0), since и until (YYYY-MM-DD или
+    ISO 8601, по processed_at), channel_id (можно несколько)
+    """
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        export = CorpusExport(
+            fmt=request.args.get('format', 'csv'),
+            compress=request.args.get('compress', '1') != '0',
+            since=datetime.fromisoformat(since) if since else None,
+            until=datetime.fromisoformat(until) if until else None,
+            channel_ids=request.args.getlist('channel_id', type=int)
+        )
+    except (ValueError, RuntimeError) as e:
+        return jsonify({'status': 'error', 'error': str(e), 'timestamp': datetime.now().isoformat()}), 400
+    
+    logger.info(f"📦 Export requested: {request.args.to_dict(flat=False)}")
+    return Response(
+        stream_with_context(export.chunks()),
+        mimetype=export.mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{export.filename}"'}
+    )
+
+@app.route('/storage')
+def storage():
+    """Размеры таблиц и сроки хранения данных"""
+    logger.info("💾 Storage page accessed")
+    
+    try:
+        tables = StorageDB.get_table_sizes()
+    except Exception as e:
+        logger.error(f"❌ Error getting table sizes: {e}")
+        tables = []
+        flash(f'Ошибка получения размеров таблиц (выполните python main.py migrate): {e}', 'error')
+    
+    all_settings = SettingsDB.get_all_settings()
+    retention = {
+        'text_days': all_settings.get('retention_text_days', '30'),
+        'pending_days': all_settings.get('retention_pending_days', '14')
+    }
+    total_bytes = sum(table.get('total_bytes') or 0 for table in tables)
+    
+    return render_template('storage.html', tables=tables, total_bytes=total_bytes, retention=retention)
+
 # API endpoint for stats (for frontend auto-refresh)
 @app.route('/api/stats')
 def api_stats():
@@ -763,6 +739,9 @@ def api_stats():
             'active_channels': stats.get('active_channels', 0),
             'total_channels': stats.get('total_channels', 0),
             'messages_today': stats.get('messages_today', 0),
+            'successful_runs_24h': stats.get('successful_runs_24h', 0),
+            'news_published_24h': stats.get('news_published_24h', 0),
+            'messages_collected_24h': stats.get('messages_collected_24h', 0),
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
@@ -773,6 +752,40 @@ def api_stats():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/api/charts')
+def api_charts():
+    """
+    Дневные ряды конвейера для графиков дашборда (channel_stats_hourly/daily)
+
+    Параметры: days (1-365, по умолчанию 90), channel_id - только один канал
+    """
+    try:
+        days = min(max(request.args.get('days', 90, type=int), 1), 365)
+        channel_id = request.args.get('channel_id', type=int)
+        
+        rows = {str(row['day'])[:10]: row for row in ChannelStatsDB.get_daily_series(days, channel_id)}
+        
+        # Дни без запусков - нули, чтобы ось X была непрерывной
+        today = datetime.now().date()
+        dates = [(today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+        series = {name: [int(rows.get(day, {}).get(name) or 0) for day in dates] for name in COUNTERS}
+        latency = [latency_percentiles(rows.get(day, {}).get('llm_latency_hist')) for day in dates]
+        
+        return jsonify({
+            'status': 'ok',
+            'days': dates,
+            'series': series,
+            'llm_latency_ms': {key: [item[key] for item in latency] for key in ('p50', 'p90', 'p99')},
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"❌ Error in /api/charts: {e}")
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
 # Health check endpoint для Railway
 @app.route('/health')
 def health():
@@ -792,23 +805,22 @@ def health():
         }
         
         # Пробуем подключиться к БД для проверки
+        from .database import supabase_db, RestQuery
+        
+        def count_channels_pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM channels')
+            result = cursor.fetchone()
+            return result['count'] if isinstance(result, dict) else result[0]
+        
         try:
-            conn = get_db()
-            if conn is None:
-                # Используем REST API fallback
-                from .database import supabase_db
-                channels_data = supabase_db.execute_rest_query('channels', 'GET')
-                channels_count = len(channels_data) if channels_data else 0
-            else:
-                cursor = conn.cursor()
-                cursor.execute('SELECT COUNT(*) FROM channels')
-                result = cursor.fetchone()
-                channels_count = result['count'] if isinstance(result, dict) else result[0]
-            
+            channels_count = supabase_db.run(count_channels_pg, lambda: RestQuery('channels').count(), idempotent=True)
             basic_info.update({
                 'database': 'connected',
                 'database_exists': True,
-                'channels_count': channels_count
+                'channels_count': channels_count,
+                'pg_pool': supabase_db.get_pool_stats(),
+                'rest_api': supabase_db.get_rest_stats()
             })
             
         except Exception as db_error:
@@ -818,6 +830,16 @@ def health():
                 'channels_count': 0
             })
         
+        # Текущий бэкенд (postgres/rest), переключения и фоновые проверки
+        basic_info['backend'] = supabase_db.get_backend_stats()
+        
+        # Записи, отложенные локально во время недоступности базы
+        try:
+            from .write_buffer import get_write_buffer
+            basic_info['write_buffer'] = get_write_buffer().get_stats()
+        except Exception as buffer_error:
+            basic_info['write_buffer'] = {'error': str(buffer_error)}
+        
         return jsonify(basic_info)
         
     except Exception as e:
@@ -829,55 +851,84 @@ def health():
 
 @app.route('/run-collect', methods=['GET', 'POST'])
 def run_collect():
-    """Запуск сбора новостей"""
-    logger.info("🚀 Запуск сбора новостей из админ-панели...")
+    """Постановка сбора новостей в очередь заданий"""
+    logger.info("🚀 Запрос сбора новостей из админ-панели...")
+    wants_json = request.accept_mimetypes.best == 'application/json'
     
     try:
-        import asyncio
-        import sys
-        import os
-        
-        # Добавляем путь к main.py
-        main_path = os.path.join(os.path.dirname(os.path.dirname(__file__)))
-        if main_path not in sys.path:
-            sys.path.append(main_path)
-        
-        # Импортируем функцию из main.py
-        from main import run_collect as main_run_collect
-        
-        # Запускаем сбор новостей
-        logger.info("🔄 Запуск асинхронной функции сбора новостей...")
-        
-        # Создаем новый event loop для асинхронного выполнения
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            result_code = loop.run_until_complete(main_run_collect())
-            
-            if result_code == 0:
-                flash("✅ Сбор новостей завершен успешно!", "success")
-                logger.info("✅ Сбор новостей завершен успешно")
-            else:
-                flash("❌ Ошибка при сборе новостей. Проверьте логи.", "error")
-                logger.error("❌ Сбор новостей завершился с ошибкой")
-                
-        finally:
-            loop.close()
-        
-    except ImportError as ie:
-        error_msg = f"Ошибка импорта: {str(ie)}"
-        logger.error(f"❌ {error_msg}")
-        flash(f"❌ {error_msg}", "error")
+        # Повторные нажатия схлопываются в одно ожидающее задание; если сбор уже идет,
+        # ожидающее задание станет повторным запуском под арендой сбора
+        job = enqueue(JOB_COLLECT, dedupe_key=f'{JOB_COLLECT}:manual')
+        
+        if wants_json:
+            return jsonify({
+                'status': 'queued' if job.get('created') else 'already_queued',
+                'job_id': job.get('id'),
+                'timestamp': datetime.now().isoformat()
+            }), 202
+        
+        if job.get('created'):
+            flash(f"📥 Сбор новостей поставлен в очередь (задание #{job['id']}). Ход выполнения - на странице заданий.", "success")
+        else:
+            flash(f"ℹ️ Сбор уже ждет в очереди (задание #{job.get('id')})", "info")
         
     except Exception as e:
-        error_msg = f"Ошибка запуска сбора новостей: {str(e)}"
+        error_msg = f"Ошибка постановки сбора в очередь: {str(e)}"
         logger.error(f"❌ {error_msg}")
+        if wants_json:
+            return jsonify({'status': 'error', 'error': str(e), 'timestamp': datetime.now().isoformat()}), 500
         flash(f"❌ {error_msg}", "error")
     
     # Возвращаемся на главную страницу
     return redirect(url_for('dashboard'))
 
+@app.route('/jobs')
+def jobs():
+    """Очередь заданий: статусы, последние задания, повтор dead"""
+    status = request.args.get('status') or None
+    
+    try:
+        counts = JobsDB.get_counts()
+        recent = JobsDB.get_recent(100, status)
+    except Exception as e:
+        logger.error(f"❌ Error getting jobs: {e}")
+        counts, recent = {}, []
+        flash(f'Ошибка получения заданий (выполните python main.py migrate): {e}', 'error')
+    
+    return render_template('jobs.html', counts=counts, jobs=recent, status=status,
+                           max_backfill_days=MAX_BACKFILL_DAYS)
+
+@app.route('/jobs/<int:job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    """Повтор задания из dead"""
+    try:
+        if JobsDB.retry(job_id):
+            flash(f"🔁 Задание #{job_id} снова в очереди", 'success')
+        else:
+            flash(f"ℹ️ Задание #{job_id} не в dead или такое же уже ждет в очереди", 'info')
+    except Exception as e:
+        flash(f"❌ Ошибка повтора задания: {str(e)}", 'error')
+        logger.error(f"❌ Error retrying job {job_id}: {e}")
+    
+    return redirect(url_for('jobs', status=request.args.get('status')))
+
+@app.route('/jobs/backfill', methods=['POST'])
+def enqueue_backfill_jobs():
+    """Выгрузка истории каналов за период: одно задание на день"""
+    try:
+        start = datetime.strptime(request.form['start_date'], '%Y-%m-%d').date()
+        end_value = request.form.get('end_date')
+        end = datetime.strptime(end_value, '%Y-%m-%d').date() if end_value else start
+        created = sum(1 for job in enqueue_backfill(start, end) if job.get('created'))
+        flash(f"📥 Поставлено заданий выгрузки: {created} (за {start} - {end})", 'success')
+    except (KeyError, ValueError) as e:
+        flash(f"❌ Неверный период: {str(e)}", 'error')
+    except Exception as e:
+        flash(f"❌ Ошибка постановки выгрузки: {str(e)}", 'error')
+        logger.error(f"❌ Error enqueuing backfill: {e}")
+    
+    return redirect(url_for('jobs'))
+
 if __name__ == '__main__':
     logger.info(f"🚀 Starting Flask development server on port {FLASK_PORT}")
     app.run(host='0.0.0.0', port=FLASK_PORT, debug=True)
\ No newline at end of file
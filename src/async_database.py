@@ -0,0 +1,822 @@
+#!/usr/bin/env python3
+"""
+Асинхронный доступ к базе данных Supabase для event loop сборщика
+asyncpg для PostgreSQL и httpx.AsyncClient для REST API (PostgREST fallback).
+Синхронный API из database.py остается для Flask админки
+"""
+
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, date
+from typing import List, Dict, Optional, Any, Iterable, Set
+
+import asyncpg
+import httpx
+
+try:
+    from .config import SUPABASE_URL, SUPABASE_KEY, DATABASE_URL, PG_POOL_MIN_SIZE, PG_POOL_MAX_SIZE, PG_POOL_CHECKOUT_TIMEOUT
+    from .database import settings_cache, supabase_db, SETTINGS_VERSION_KEY, record_stats_payload
+    from .backend_router import RestAPIError, is_unavailable_error
+    from .write_buffer import get_write_buffer, PENDING_NEWS, PROCESSED_MESSAGES
+except ImportError:
+    from config import SUPABASE_URL, SUPABASE_KEY, DATABASE_URL, PG_POOL_MIN_SIZE, PG_POOL_MAX_SIZE, PG_POOL_CHECKOUT_TIMEOUT
+    from database import settings_cache, supabase_db, SETTINGS_VERSION_KEY, record_stats_payload
+    from backend_router import RestAPIError, is_unavailable_error
+    from write_buffer import get_write_buffer, PENDING_NEWS, PROCESSED_MESSAGES
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/database.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Ошибки подключения, при которых переходим на REST API
+CONNECTION_ERRORS = (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+
+def _is_unavailable(error: BaseException) -> bool:
+    """База недоступна (см. is_unavailable_error) с учетом ошибок asyncpg и httpx"""
+    return isinstance(error, CONNECTION_ERRORS + (httpx.TransportError,)) or is_unavailable_error(error)
+
+def _as_date(value) -> date:
+    """Дата для колонок DATE (asyncpg не приводит datetime к date сам)"""
+    if value is None:
+        return datetime.now().date()
+    return value.date() if isinstance(value, datetime) else value
+
+class AsyncSupabaseDB:
+    """
+    Асинхронные подключения к Supabase
+
+    Пул asyncpg и HTTP клиент привязаны к event loop, поэтому пересоздаются,
+    если вызов пришел из другого цикла (планировщик запускает задачи в новых циклах)
+    """
+
+    def __init__(self):
+        self.rest_api_url = f"{SUPABASE_URL}/rest/v1" if SUPABASE_URL else None
+        self.headers = {
+            'apikey': SUPABASE_KEY,
+            'Authorization': f'Bearer {SUPABASE_KEY}',
+            'Content-Type': 'application/json',
+            'Prefer': 'return=representation'
+        }
+        self._pool: Optional[asyncpg.Pool] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loop = None
+
+    def _bind_to_loop(self):
+        """Сброс подключений, созданных в другом event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._pool is not None:
+                try:
+                    self._pool.terminate()
+                except Exception as e:
+                    logger.debug(f"🔍 Ошибка закрытия пула прошлого event loop: {e}")
+            self._pool = None
+            self._http = None
+            self._loop = loop
+
+    async def _get_pool(self) -> Optional[asyncpg.Pool]:
+        """
+        Пул текущего event loop; неудачное создание учитывается в общем router,
+        повторная попытка - пока router не переключился на REST API или после его проверки
+        """
+        self._bind_to_loop()
+        if self._pool is not None or not DATABASE_URL:
+            return self._pool
+
+        try:
+            self._pool = await asyncpg.create_pool(
+                DATABASE_URL,
+                min_size=PG_POOL_MIN_SIZE,
+                max_size=PG_POOL_MAX_SIZE,
+                timeout=5,
+                # Supabase pooler (pgbouncer в режиме transaction) не поддерживает подготовленные запросы
+                statement_cache_size=0,
+                server_settings={'application_name': 'edu_digest_bot_async'}
+            )
+            logger.info("✅ Асинхронный пул PostgreSQL создан")
+        except Exception as e:
+            logger.warning(f"⚠️ Асинхронное подключение к PostgreSQL неудачно: {e}, используем REST API")
+            self._pool = None
+            supabase_db.router.record_failure(e)
+        return self._pool
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Подключение asyncpg на время блока async with (None - используем REST API)
+
+        Состояние бэкенда общее с синхронным слоем (supabase_db.router): пока PostgreSQL
+        признан недоступным, пул не трогается, а сбои подключения отсюда тоже учитываются.
+        """
+        router = supabase_db.router
+        pool = await self._get_pool() if router.postgres_available else None
+        conn = None
+        if pool is not None:
+            try:
+                conn = await pool.acquire(timeout=PG_POOL_CHECKOUT_TIMEOUT)
+            except CONNECTION_ERRORS as e:
+                logger.warning(f"⚠️ Не удалось получить подключение из пула: {e}, используем REST API")
+                if not isinstance(e, asyncio.TimeoutError):
+                    # Таймаут ожидания - пул занят, сервер жив
+                    router.record_failure(e)
+
+        if conn is None:
+            router.record_call(router.REST)
+            yield None
+            return
+
+        try:
+            yield conn
+        except CONNECTION_ERRORS as e:
+            router.record_failure(e)
+            raise
+        finally:
+            await pool.release(conn)
+        router.record_success()
+        router.record_call(router.POSTGRES)
+
+    def _get_http(self) -> httpx.AsyncClient:
+        self._bind_to_loop()
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=10,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+                transport=httpx.AsyncHTTPTransport(retries=3)
+            )
+        return self._http
+
+    async def rest_query(self, table: str, method: str = 'GET', data: Any = None,
+                         filters: Dict = None, params: Dict = None, headers: Dict = None):
+        """Асинхронный запрос к REST API (поведение как у SupabaseDB.execute_rest_query)"""
+        if method not in ('GET', 'POST', 'PATCH', 'DELETE'):
+            raise ValueError(f"Unsupported method: {method}")
+
+        query = {key: f"eq.{value}" for key, value in (filters or {}).items()}
+        query.update(params or {})
+
+        response = await self._get_http().request(
+            method, f"{self.rest_api_url}/{table}", params=query,
+            json=data if method in ('POST', 'PATCH') else None, headers=headers
+        )
+
+        if response.status_code in (200, 201, 204):
+            try:
+                return response.json() if response.content else []
+            except ValueError:
+                return []
+        if response.status_code == 409:
+            raise ValueError(f"Конфликт данных: {response.text}")
+
+        logger.error(f"❌ REST API error {response.status_code}: {response.text}")
+        raise RestAPIError(response.status_code)
+
+    async def close(self):
+        """Закрытие пула и HTTP клиента текущего event loop"""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+# Глобальный экземпляр
+async_db = AsyncSupabaseDB()
+
+class AsyncChannelsDB:
+    @staticmethod
+    async def get_active_channels() -> List[Dict]:
+        """Получение списка активных каналов по приоритету"""
+        try:
+            async with async_db.connection() as conn:
+                if conn is None:
+                    # REST API fallback
+                    result = await async_db.rest_query('channels', 'GET', filters={'is_active': 'true'},
+                                                       params={'order': 'priority.desc,created_at.asc'})
+                    return result or []
+
+                rows = await conn.fetch('''
+                    SELECT * FROM channels
+                    WHERE is_active = true
+                    ORDER BY priority DESC, created_at ASC
+                ''')
+                return [dict(row) for row in rows]
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения каналов: {e}")
+            return []
+
+class AsyncSettingsDB:
+    @staticmethod
+    async def get_all_settings() -> Dict[str, str]:
+        """Все настройки (общий с синхронным API кеш, см. database.SettingsCache)"""
+        if settings_cache.fresh:
+            return dict(settings_cache.values)
+
+        try:
+            async with async_db.connection() as conn:
+                if conn is None:
+                    # REST API fallback
+                    if settings_cache.values is not None:
+                        result = await async_db.rest_query('settings', 'GET', filters={'key': SETTINGS_VERSION_KEY},
+                                                           params={'select': 'value'})
+                        if settings_cache.confirm(result[0]['value'] if result else None):
+                            return dict(settings_cache.values)
+                    result = await async_db.rest_query('settings', 'GET', params={'select': 'key,value'})
+                    settings_cache.store({row['key']: row['value'] for row in result or []})
+                    return dict(settings_cache.values)
+
+                if settings_cache.values is not None:
+                    version = await conn.fetchval('SELECT value FROM settings WHERE key = $1', SETTINGS_VERSION_KEY)
+                    if settings_cache.confirm(version):
+                        return dict(settings_cache.values)
+                rows = await conn.fetch('SELECT key, value FROM settings')
+                settings_cache.store({row['key']: row['value'] for row in rows})
+                return dict(settings_cache.values)
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения настроек: {e}")
+            return dict(settings_cache.values or {})
+
+    @staticmethod
+    async def get_setting(key: str, default: str = None) -> Optional[str]:
+        """Получение значения настройки"""
+        value = (await AsyncSettingsDB.get_all_settings()).get(key)
+        return value if value is not None else default
+
+class AsyncProcessedMessagesDB:
+    @staticmethod
+    async def get_processed_ids(channel_id: int, message_ids: Iterable[int]) -> Set[int]:
+        """Какие из сообщений канала уже обработаны (один запрос на пачку)"""
+        message_ids = list(message_ids)
+        if not message_ids:
+            return set()
+
+        try:
+            async with async_db.connection() as conn:
+                if conn is None:
+                    # REST API fallback
+                    result = await async_db.rest_query('processed_messages', 'GET', params={
+                        'select': 'message_id',
+                        'channel_id': f"eq.{channel_id}",
+                        'message_id': f"in.({','.join(str(i) for i in message_ids)})"
+                    })
+                    return {row['message_id'] for row in result or []}
+
+                rows = await conn.fetch('''
+                    SELECT message_id FROM processed_messages
+                    WHERE channel_id = $1 AND message_id = ANY($2::bigint[])
+                ''', channel_id, message_ids)
+                return {row['message_id'] for row in rows}
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка проверки сообщений: {e}")
+            return set()
+
+    @staticmethod
+    async def is_message_processed(channel_id: int, message_id: int) -> bool:
+        """Проверка, было ли сообщение уже обработано"""
+        return message_id in await AsyncProcessedMessagesDB.get_processed_ids(channel_id, [message_id])
+
+    @staticmethod
+    async def mark_message_processed(channel_id: int, message_id: int,
+                                     message_text: str = None, summary: str = None) -> int:
+        """Отметка сообщения как обработанного (0 - база недоступна, отметка в локальном буфере)"""
+        ids = await AsyncProcessedMessagesDB.mark_processed_many([{
+            'channel_id': channel_id,
+            'message_id': message_id,
+            'message_text': message_text,
+            'summary': summary
+        }])
+        return ids[0] or 0
+
+    @staticmethod
+    async def mark_processed_many(messages: List[Dict], conn=None,
+                                  buffer_on_failure: bool = True) -> List[Optional[int]]:
+        """Отметка пачки сообщений как обработанных (см. ProcessedMessagesDB.mark_processed_many)"""
+        if not messages:
+            return []
+
+        keys = [(m['channel_id'], m['message_id']) for m in messages]
+        # ON CONFLICT DO UPDATE не обновляет строку дважды за запрос - повторы схлопываем (последний побеждает)
+        messages = list({key: m for key, m in zip(keys, messages)}.values())
+
+        if conn is None:
+            try:
+                try:
+                    async with async_db.connection() as own_conn:
+                        if own_conn is not None:
+                            ids = await AsyncProcessedMessagesDB.mark_processed_many(messages, own_conn)
+                            by_key = dict(zip([(m['channel_id'], m['message_id']) for m in messages], ids))
+                            return [by_key.get(key) for key in keys]
+                except CONNECTION_ERRORS as e:
+                    # Upsert идемпотентен - повторяем через REST API
+                    logger.warning(f"⚠️ Сбой PostgreSQL во время отметки сообщений: {e}, повторяем через REST API")
+
+                # REST API fallback - один POST с массивом, дубли обновляются
+                now = datetime.now().isoformat()
+                result = await async_db.rest_query('processed_messages', 'POST', data=[
+                    {
+                        'channel_id': m['channel_id'],
+                        'message_id': m['message_id'],
+                        'message_text': m.get('message_text'),
+                        'summary': m.get('summary'),
+                        'processed_at': now
+                    }
+                    for m in messages
+                ], params={'on_conflict': 'channel_id,message_id'},
+                   headers={'Prefer': 'return=representation,resolution=merge-duplicates'})
+            except Exception as e:
+                # В буфер - только при недоступности базы; отвергнутые данные повтор не исправит
+                if not buffer_on_failure or not _is_unavailable(e):
+                    raise
+                logger.error(f"❌ Ошибка отметки сообщений: {e}")
+                get_write_buffer().append(PROCESSED_MESSAGES, messages)
+                return [None] * len(keys)
+            ids = {(row['channel_id'], row['message_id']): row['id'] for row in result or []}
+            return [ids.get(key) for key in keys]
+
+        rows = await conn.fetch('''
+            INSERT INTO processed_messages (channel_id, message_id, message_text, summary, processed_at)
+            SELECT channel_id, message_id, message_text, summary, CURRENT_TIMESTAMP
+            FROM unnest($1::int[], $2::bigint[], $3::text[], $4::text[])
+                AS v(channel_id, message_id, message_text, summary)
+            ON CONFLICT (channel_id, message_id) DO UPDATE SET
+                message_text = EXCLUDED.message_text,
+                summary = EXCLUDED.summary,
+                processed_at = CURRENT_TIMESTAMP
+            RETURNING channel_id, message_id, id
+        ''', [m['channel_id'] for m in messages], [m['message_id'] for m in messages],
+            [m.get('message_text') for m in messages], [m.get('summary') for m in messages])
+        ids = {(row['channel_id'], row['message_id']): row['id'] for row in rows}
+        return [ids.get(key) for key in keys]
+
+class AsyncPendingNewsDB:
+    @staticmethod
+    async def add_pending_news(channel_id: int, message_id: int, channel_name: str,
+                               message_text: str, summary: str, relevance_score: int = 5,
+                               scheduled_for: datetime = None, digest_type: str = None,
+                               views: int = 0, forwards: int = 0) -> int:
+        """Добавление новости в очередь на публикацию"""
+        outcomes = await AsyncPendingNewsDB.add_pending_news_many([{
+            'channel_id': channel_id,
+            'message_id': message_id,
+            'channel_name': channel_name,
+            'message_text': message_text,
+            'summary': summary,
+            'relevance_score': relevance_score,
+            'scheduled_for': scheduled_for,
+            'digest_type': digest_type,
+            'views': views,
+            'forwards': forwards
+        }], mark_processed=False)
+        return outcomes[0]['id'] or 0
+
+    @staticmethod
+    async def add_pending_news_many(news: List[Dict], mark_processed: bool = True,
+                                    buffer_on_failure: bool = True) -> List[Dict]:
+        """
+        Добавление пачки новостей в очередь (см. PendingNewsDB.add_pending_news_many)
+
+        Returns:
+            {'channel_id', 'message_id', 'id', 'status': 'inserted' | 'duplicate' | 'buffered' | 'error'}
+            по каждой новости
+        """
+        if not news:
+            return []
+
+        keys = [(n['channel_id'], n['message_id']) for n in news]
+
+        def outcomes(inserted: Dict, status_missing: str) -> List[Dict]:
+            return [
+                {
+                    'channel_id': key[0],
+                    'message_id': key[1],
+                    'id': inserted.get(key),
+                    'status': 'inserted' if key in inserted else status_missing
+                }
+                for key in keys
+            ]
+
+        processed = [
+            {'channel_id': n['channel_id'], 'message_id': n['message_id'],
+             'message_text': n.get('message_text'), 'summary': n.get('summary')}
+            for n in news
+        ]
+
+        async def via_rest() -> Dict:
+            # REST API fallback - массив одним POST, дубли пропускаются.
+            # Две таблицы пишутся разными запросами, оба идемпотентны
+            now = datetime.now().isoformat()
+            result = await async_db.rest_query('pending_news', 'POST', data=[
+                {
+                    'channel_id': n['channel_id'],
+                    'message_id': n['message_id'],
+                    'channel_name': n['channel_name'],
+                    'message_text': n.get('message_text'),
+                    'summary': n.get('summary'),
+                    'relevance_score': n.get('relevance_score', 5),
+                    'collected_at': now,
+                    'scheduled_for': _as_date(n.get('scheduled_for')).isoformat(),
+                    'digest_type': n.get('digest_type'),
+                    'is_approved': True,
+                    'is_deleted': False,
+                    'views': n.get('views') or 0,
+                    'forwards': n.get('forwards') or 0
+                }
+                for n in news
+            ], params={'on_conflict': 'channel_id,message_id'},
+               headers={'Prefer': 'return=representation,resolution=ignore-duplicates'})
+            if mark_processed:
+                await AsyncProcessedMessagesDB.mark_processed_many(processed, buffer_on_failure=buffer_on_failure)
+            return {(row['channel_id'], row['message_id']): row['id'] for row in result or []}
+
+        try:
+            inserted = None
+            try:
+                async with async_db.connection() as conn:
+                    if conn is not None:
+                        # Очередь и отметка обработанных - одна транзакция
+                        async with conn.transaction():
+                            rows = await conn.fetch('''
+                                INSERT INTO pending_news
+                                (channel_id, message_id, channel_name, message_text, summary,
+                                 relevance_score, scheduled_for, digest_type, views, forwards)
+                                SELECT * FROM unnest($1::int[], $2::bigint[], $3::text[], $4::text[], $5::text[],
+                                                     $6::int[], $7::date[], $8::varchar[], $9::int[], $10::int[])
+                                ON CONFLICT (channel_id, message_id) DO NOTHING
+                                RETURNING channel_id, message_id, id
+                            ''', [n['channel_id'] for n in news], [n['message_id'] for n in news],
+                                [n['channel_name'] for n in news], [n.get('message_text') for n in news],
+                                [n.get('summary') for n in news], [n.get('relevance_score', 5) for n in news],
+                                [_as_date(n.get('scheduled_for')) for n in news], [n.get('digest_type') for n in news],
+                                [n.get('views') or 0 for n in news], [n.get('forwards') or 0 for n in news])
+
+                            if mark_processed:
+                                await AsyncProcessedMessagesDB.mark_processed_many(processed, conn)
+
+                        inserted = {(row['channel_id'], row['message_id']): row['id'] for row in rows}
+            except CONNECTION_ERRORS as e:
+                # Обе записи идемпотентны (дубли пропускаются/обновляются) - повторяем через REST API
+                logger.warning(f"⚠️ Сбой PostgreSQL во время записи очереди: {e}, повторяем через REST API")
+
+            if inserted is None:
+                inserted = await via_rest()
+            return outcomes(inserted, 'duplicate')
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетного добавления pending news: {e}")
+            if not _is_unavailable(e):
+                # Ошибка данных (нарушение ограничения и т.п.) - в буфере пачка застряла бы навсегда
+                raise
+            if buffer_on_failure:
+                get_write_buffer().append(PENDING_NEWS, news, mark_processed=mark_processed)
+                return outcomes({}, 'buffered')
+            return outcomes({}, 'error')
+
+    @staticmethod
+    async def get_pending_news() -> List[Dict]:
+        """Получение накопленных новостей для дайджеста"""
+        try:
+            async with async_db.connection() as conn:
+                if conn is None:
+                    # REST API fallback
+                    result = await async_db.rest_query('pending_news', 'GET', filters={'is_deleted': 'false'},
+                                                       params={'order': 'relevance_score.desc,collected_at.desc'})
+                    return result or []
+
+                rows = await conn.fetch('''
+                    SELECT * FROM pending_news
+                    WHERE is_deleted = false
+                    ORDER BY relevance_score DESC, collected_at DESC
+                ''')
+                return [dict(row) for row in rows]
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения pending news: {e}")
+            return []
+
+    @staticmethod
+    async def delete_pending_news_many(news_ids: List[int]) -> int:
+        """Мягкое удаление опубликованных новостей одним запросом"""
+        if not news_ids:
+            return 0
+
+        try:
+            async with async_db.connection() as conn:
+                if conn is None:
+                    # REST API fallback
+                    result = await async_db.rest_query('pending_news', 'PATCH', data={'is_deleted': True}, params={
+                        'id': f"in.({','.join(str(i) for i in news_ids)})"
+                    })
+                    return len(result or [])
+
+                status = await conn.execute(
+                    'UPDATE pending_news SET is_deleted = true WHERE id = ANY($1::int[])', news_ids
+                )
+                return int(status.split()[-1])
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка удаления pending news: {e}")
+            return 0
+
+    @staticmethod
+    async def update_engagement(updates: List[Dict]) -> int:
+        """Обновление просмотров и репостов пачкой"""
+        if not updates:
+            return 0
+
+        try:
+            async with async_db.connection() as conn:
+                if conn is None:
+                    # REST API fallback - PostgREST не умеет UPDATE из VALUES, обновляем параллельно по одной
+                    now = datetime.now().isoformat()
+                    await asyncio.gather(*(
+                        async_db.rest_query('pending_news', 'PATCH', data={
+                            'views': item['views'],
+                            'forwards': item['forwards'],
+                            'engagement_updated_at': now
+                        }, filters={'id': item['id']})
+                        for item in updates
+                    ))
+                    return len(updates)
+
+                status = await conn.execute('''
+                    UPDATE pending_news AS p SET
+                        views = v.views,
+                        forwards = v.forwards,
+                        engagement_updated_at = CURRENT_TIMESTAMP
+                    FROM unnest($1::int[], $2::int[], $3::int[]) AS v(id, views, forwards)
+                    WHERE p.id = v.id
+                ''', [item['id'] for item in updates], [item['views'] for item in updates],
+                    [item['forwards'] for item in updates])
+                return int(status.split()[-1])
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления вовлеченности pending news: {e}")
+            return 0
+
+    @staticmethod
+    async def get_news_many(news_ids: List[int]) -> List[Dict]:
+        """Накопленные новости по id (для повторной суммаризации)"""
+        if not news_ids:
+            return []
+
+        async with async_db.connection() as conn:
+            if conn is None:
+                return await async_db.rest_query('pending_news', 'GET', params={
+                    'id': f"in.({','.join(str(i) for i in news_ids)})"
+                }) or []
+
+            rows = await conn.fetch('SELECT * FROM pending_news WHERE id = ANY($1::int[])', news_ids)
+            return [dict(row) for row in rows]
+
+    @staticmethod
+    async def update_summaries(updates: List[Dict]) -> int:
+        """
+        Новые саммари накопленных новостей; то же саммари пишется в processed_messages,
+        чтобы поиск и выгрузка видели актуальный текст
+
+        Args:
+            updates: Список словарей {'id', 'channel_id', 'message_id', 'summary'}
+        """
+        if not updates:
+            return 0
+
+        async with async_db.connection() as conn:
+            if conn is None:
+                # REST API fallback - по одной строке в каждую таблицу
+                await asyncio.gather(*(
+                    async_db.rest_query('pending_news', 'PATCH', data={'summary': item['summary']},
+                                        filters={'id': item['id']})
+                    for item in updates
+                ))
+                await asyncio.gather(*(
+                    async_db.rest_query('processed_messages', 'PATCH', data={'summary': item['summary']},
+                                        filters={'channel_id': item['channel_id'], 'message_id': item['message_id']})
+                    for item in updates
+                ))
+                return len(updates)
+
+            async with conn.transaction():
+                status = await conn.execute('''
+                    UPDATE pending_news AS p SET summary = v.summary
+                    FROM unnest($1::int[], $2::text[]) AS v(id, summary)
+                    WHERE p.id = v.id
+                ''', [item['id'] for item in updates], [item['summary'] for item in updates])
+                await conn.execute('''
+                    UPDATE processed_messages AS pm SET summary = v.summary
+                    FROM unnest($1::int[], $2::bigint[], $3::text[]) AS v(channel_id, message_id, summary)
+                    WHERE pm.channel_id = v.channel_id AND pm.message_id = v.message_id
+                ''', [item['channel_id'] for item in updates], [item['message_id'] for item in updates],
+                    [item['summary'] for item in updates])
+            return int(status.split()[-1])
+
+class AsyncRunLogsDB:
+    @staticmethod
+    async def create_run_log() -> Optional[int]:
+        """Создание записи о запуске сбора новостей"""
+        try:
+            async with async_db.connection() as conn:
+                if conn is None:
+                    result = await async_db.rest_query('run_logs', 'POST', data={
+                        'started_at': datetime.now().isoformat(),
+                        'status': 'started'
+                    })
+                    return result[0]['id'] if result else None
+
+                return await conn.fetchval('''
+                    INSERT INTO run_logs (started_at, status)
+                    VALUES (CURRENT_TIMESTAMP, 'started')
+                    RETURNING id
+                ''')
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания лога запуска: {e}")
+            return None
+
+    @staticmethod
+    async def update_run_log(run_id: int, status: str, channels_processed: int = 0,
+                             messages_collected: int = 0, news_published: int = 0,
+                             error_message: str = None):
+        """Завершение записи о запуске"""
+        data = {
+            'completed_at': datetime.now().isoformat(),
+            'status': status,
+            'channels_processed': channels_processed,
+            'messages_collected': messages_collected,
+            'news_published': news_published,
+            'error_message': error_message
+        }
+
+        try:
+            async with async_db.connection() as conn:
+                if conn is None:
+                    await async_db.rest_query('run_logs', 'PATCH', data=data, filters={'id': run_id})
+                    return
+
+                await conn.execute('''
+                    UPDATE run_logs SET
+                        completed_at = CURRENT_TIMESTAMP,
+                        status = $1,
+                        channels_processed = $2,
+                        messages_collected = $3,
+                        news_published = $4,
+                        error_message = $5
+                    WHERE id = $6
+                ''', status, channels_processed, messages_collected, news_published,
+                    error_message, run_id)
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления лога запуска: {e}")
+
+class AsyncStatsDB:
+    @staticmethod
+    async def record(messages_processed: int = 0, messages_collected: int = 0, news_published: int = 0,
+                     runs_completed: int = 0, runs_failed: int = 0, run_id: int = None):
+        """Прибавка к счетчикам дашборда (см. StatsDB.record)"""
+        args = (messages_processed, messages_collected, news_published, runs_completed, runs_failed, run_id)
+        try:
+            async with async_db.connection() as conn:
+                if conn is None:
+                    await async_db.rest_query('rpc/record_stats', 'POST', data=record_stats_payload(*args))
+                    return
+
+                await conn.execute('SELECT record_stats($1, $2, $3, $4, $5, $6)', *args)
+
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось обновить статистику дашборда: {e}")
+
+    @staticmethod
+    async def record_channel_stats(rows: List[Dict]):
+        """Прибавка счетчиков конвейера по каналам (см. ChannelStatsDB.record_many)"""
+        if not rows:
+            return
+        try:
+            async with async_db.connection() as conn:
+                if conn is None:
+                    await async_db.rest_query('rpc/record_channel_stats', 'POST', data={'p_rows': rows})
+                    return
+
+                await conn.execute('SELECT record_channel_stats($1::jsonb)', json.dumps(rows))
+
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось записать статистику каналов: {e}")
+
+# Аренда запусков между процессами (таблица run_locks и функции, миграция 007)
+class AsyncRunLockDB:
+    @staticmethod
+    async def acquire(name: str, holder: str, ttl: int, request_rerun: bool) -> Dict:
+        """{'acquired': bool, 'holder', 'acquired_at', 'expires_at', 'rerun_requested'} (см. acquire_run_lock)"""
+        async with async_db.connection() as conn:
+            if conn is None:
+                return await async_db.rest_query('rpc/acquire_run_lock', 'POST', data={
+                    'p_name': name, 'p_holder': holder, 'p_ttl_seconds': ttl, 'p_request_rerun': request_rerun
+                })
+
+            result = await conn.fetchval('SELECT acquire_run_lock($1, $2, $3, $4)', name, holder, ttl, request_rerun)
+            return json.loads(result)
+
+    @staticmethod
+    async def heartbeat(name: str, holder: str, ttl: int) -> bool:
+        """Продление аренды; False - аренда потеряна (просрочена и захвачена другим процессом)"""
+        async with async_db.connection() as conn:
+            if conn is None:
+                return bool(await async_db.rest_query('rpc/heartbeat_run_lock', 'POST', data={
+                    'p_name': name, 'p_holder': holder, 'p_ttl_seconds': ttl
+                }))
+
+            return await conn.fetchval('SELECT heartbeat_run_lock($1, $2, $3)', name, holder, ttl)
+
+    @staticmethod
+    async def finish(name: str, holder: str, ttl: int) -> bool:
+        """Освобождение аренды; True - за время запуска пришли запросы и нужен еще один запуск"""
+        async with async_db.connection() as conn:
+            if conn is None:
+                return bool(await async_db.rest_query('rpc/finish_run_lock', 'POST', data={
+                    'p_name': name, 'p_holder': holder, 'p_ttl_seconds': ttl
+                }))
+
+            return await conn.fetchval('SELECT finish_run_lock($1, $2, $3)', name, holder, ttl)
+
+    @staticmethod
+    async def release(name: str, holder: str) -> bool:
+        """Освобождение аренды без дополнительного запуска (миграция 012); False - аренда уже не наша"""
+        async with async_db.connection() as conn:
+            if conn is None:
+                return bool(await async_db.rest_query('rpc/release_run_lock', 'POST', data={
+                    'p_name': name, 'p_holder': holder
+                }))
+
+            return await conn.fetchval('SELECT release_run_lock($1, $2)', name, holder)
+
+# Очередь заданий (таблица jobs и функции, миграция 008): выполнение воркером src/job_queue.py
+def _decode_job(row: Dict) -> Dict:
+    """asyncpg отдает jsonb строкой - payload и result разбираются в словари"""
+    job = dict(row)
+    for key in ('payload', 'result'):
+        if isinstance(job.get(key), str):
+            job[key] = json.loads(job[key])
+    return job
+
+class AsyncJobsDB:
+    @staticmethod
+    async def claim(worker: str, limit: int, lease_seconds: int, job_types: Optional[List[str]] = None) -> List[Dict]:
+        """Захват до limit заданий (см. claim_jobs)"""
+        async with async_db.connection() as conn:
+            if conn is None:
+                rows = await async_db.rest_query('rpc/claim_jobs', 'POST', data={
+                    'p_worker': worker, 'p_limit': limit, 'p_lease_seconds': lease_seconds, 'p_types': job_types
+                })
+                return [_decode_job(row) for row in rows or []]
+
+            rows = await conn.fetch('SELECT * FROM claim_jobs($1, $2, $3, $4)', worker, limit, lease_seconds, job_types)
+            return [_decode_job(row) for row in rows]
+
+    @staticmethod
+    async def heartbeat(job_id: int, worker: str, lease_seconds: int) -> bool:
+        """Продление аренды задания; False - аренда истекла и задание мог забрать другой воркер"""
+        async with async_db.connection() as conn:
+            if conn is None:
+                return bool(await async_db.rest_query('rpc/extend_job_lease', 'POST', data={
+                    'p_id': job_id, 'p_worker': worker, 'p_lease_seconds': lease_seconds
+                }))
+
+            return await conn.fetchval('SELECT extend_job_lease($1, $2, $3)', job_id, worker, lease_seconds)
+
+    @staticmethod
+    async def complete(job_id: int, worker: str, result: Optional[Dict] = None) -> bool:
+        """Успешное завершение; result сохраняется в jobs.result"""
+        # default=str - даты и прочие значения результата пишутся строками
+        payload = json.loads(json.dumps(result, default=str)) if result is not None else None
+        async with async_db.connection() as conn:
+            if conn is None:
+                return bool(await async_db.rest_query('rpc/complete_job', 'POST', data={
+                    'p_id': job_id, 'p_worker': worker, 'p_result': payload
+                }))
+
+            return await conn.fetchval('SELECT complete_job($1, $2, $3::jsonb)', job_id, worker,
+                                       json.dumps(payload) if payload is not None else None)
+
+    @staticmethod
+    async def fail(job_id: int, worker: str, error: str, retry_seconds: Optional[float]) -> Optional[str]:
+        """Ошибка попытки: queued (повтор через retry_seconds), dead, merged или None (аренда потеряна)"""
+        async with async_db.connection() as conn:
+            if conn is None:
+                return await async_db.rest_query('rpc/fail_job', 'POST', data={
+                    'p_id': job_id, 'p_worker': worker, 'p_error': error, 'p_retry_seconds': retry_seconds
+                })
+
+            return await conn.fetchval('SELECT fail_job($1, $2, $3, $4)', job_id, worker, error, retry_seconds)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Маршрутизация запросов между PostgreSQL и REST API
+Автомат состояния (circuit breaker): пока PostgreSQL здоров, запросы идут в него;
+после сбоев подключения запросы сразу уходят в REST API, а фоновая проверка
+возвращает PostgreSQL, как только он снова отвечает
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Any, Optional
+
+import psycopg2
+import requests
+from psycopg2 import extensions
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/database.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+def is_backend_failure(error: BaseException) -> bool:
+    """
+    Ошибка говорит о недоступности PostgreSQL (а не о проблеме конкретного запроса)
+
+    Отмена запроса по statement_timeout тоже OperationalError, но сервер при этом жив.
+    """
+    if isinstance(error, extensions.QueryCanceledError):
+        return False
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+class RestAPIError(Exception):
+    """Ответ REST API с ошибкой; status_code - HTTP статус"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"REST API error: {status_code}")
+        self.status_code = status_code
+
+def is_unavailable_error(error: BaseException) -> bool:
+    """
+    База недоступна (запись имеет смысл отложить и повторить), а не отвергла сами данные
+
+    Сбой подключения к PostgreSQL, сетевая ошибка или таймаут REST API, ответ 5xx/408/429.
+    Нарушения ограничений, неверные данные и остальные 4xx повтор не исправит.
+    """
+    if is_backend_failure(error):
+        return True
+    if isinstance(error, RestAPIError):
+        return error.status_code >= 500 or error.status_code in (408, 429)
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError))
+
+class BackendRouter:
+    """
+    Состояние бэкенда базы данных
+
+    postgres - запросы идут в PostgreSQL
+    rest     - PostgreSQL недоступен, запросы идут в REST API до успешной фоновой проверки
+    disabled - PostgreSQL не настроен (нет DATABASE_URL), только REST API
+    """
+
+    POSTGRES = 'postgres'
+    REST = 'rest'
+    DISABLED = 'disabled'
+
+    def __init__(self, probe: Callable[[], bool], failure_threshold: int = 2, probe_interval: float = 15.0):
+        """
+        Args:
+            probe: Проверка PostgreSQL (True - отвечает), вызывается из фонового потока
+            failure_threshold: Сколько сбоев подряд переключает на REST API
+            probe_interval: Пауза между фоновыми проверками, сек
+        """
+        self.probe = probe
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self._state = self.POSTGRES
+        self._consecutive_failures = 0
+        self._last_error: Optional[str] = None
+        self._state_changed_at = datetime.now()
+        self._lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+        self._stats = {
+            'postgres_calls': 0,
+            'rest_calls': 0,
+            'failovers': 0,
+            'trips': 0,
+            'recoveries': 0,
+            'probes': 0
+        }
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def postgres_available(self) -> bool:
+        return self._state == self.POSTGRES
+
+    def record_call(self, backend: str):
+        """Учет запроса, выполненного на бэкенде postgres или rest"""
+        with self._lock:
+            self._stats[f'{backend}_calls'] += 1
+
+    def record_failover(self):
+        """Запрос начат в PostgreSQL и повторен через REST API"""
+        with self._lock:
+            self._stats['failovers'] += 1
+
+    def record_success(self):
+        """Успешная работа с PostgreSQL сбрасывает счетчик сбоев"""
+        if self._consecutive_failures:
+            with self._lock:
+                self._consecutive_failures = 0
+
+    def record_failure(self, error: Any):
+        """Сбой подключения к PostgreSQL; после failure_threshold сбоев подряд - переход на REST API"""
+        with self._lock:
+            self._last_error = str(error)
+            if self._state != self.POSTGRES:
+                return
+            self._consecutive_failures += 1
+            if self._consecutive_failures < self.failure_threshold:
+                return
+        self.trip(error)
+
+    def trip(self, error: Any):
+        """Немедленный переход на REST API и запуск фоновой проверки"""
+        with self._lock:
+            self._last_error = str(error)
+            if self._state != self.POSTGRES:
+                return
+            self._set_state(self.REST)
+            self._stats['trips'] += 1
+
+        logger.warning(f"🔌 PostgreSQL недоступен ({error}), запросы идут через REST API")
+        self._start_probe()
+
+    def disable(self, reason: str):
+        """PostgreSQL не используется совсем"""
+        with self._lock:
+            self._last_error = reason
+            self._set_state(self.DISABLED)
+
+    def _set_state(self, state: str):
+        self._state = state
+        self._consecutive_failures = 0
+        self._state_changed_at = datetime.now()
+
+    def _start_probe(self):
+        with self._lock:
+            if self._probe_thread is not None and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name='pg-probe', daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        """Фоновая проверка PostgreSQL до восстановления"""
+        while self._state == self.REST:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                self._stats['probes'] += 1
+            try:
+                healthy = self.probe()
+            except Exception as e:
+                logger.debug(f"🔍 Проверка PostgreSQL неудачна: {e}")
+                healthy = False
+
+            if healthy:
+                with self._lock:
+                    if self._state == self.REST:
+                        self._set_state(self.POSTGRES)
+                        self._stats['recoveries'] += 1
+                logger.info("✅ PostgreSQL снова доступен, возвращаем запросы в PostgreSQL")
+                return
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Состояние и счетчики для /health"""
+        with self._lock:
+            return {
+                'state': self._state,
+                'since': self._state_changed_at.isoformat(),
+                'consecutive_failures': self._consecutive_failures,
+                'last_error': self._last_error,
+                **self._stats
+            }
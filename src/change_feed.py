@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Лента изменений каналов и настроек для долгоживущих процессов
+Триггеры channels/settings шлют NOTIFY (миграция 001 в src/migrations.py), фоновый поток слушает его
+на отдельном подключении и точечно обновляет реестр активных каналов и кеш настроек.
+Если PostgreSQL недоступен, реестр раз в CHANGE_FEED_POLL_INTERVAL секунд сверяет
+отпечаток каналов и settings_version и перечитывает только изменившееся
+"""
+
+import json
+import logging
+import os
+import select
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+try:
+    from .config import CHANGE_FEED_DATABASE_URL, CHANGE_FEED_POLL_INTERVAL
+    from .database import (ChannelsDB, SettingsDB, settings_cache, CHANGE_FEED_CHANNEL)
+except ImportError:
+    from config import CHANGE_FEED_DATABASE_URL, CHANGE_FEED_POLL_INTERVAL
+    from database import (ChannelsDB, SettingsDB, settings_cache, CHANGE_FEED_CHANNEL)
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/change_feed.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повторным подключением LISTEN, сек
+RECONNECT_DELAY = 30
+
+# Подписчик: callback(table, op, key); key=None - полная перезагрузка таблицы
+ChangeCallback = Callable[[str, str, Optional[str]], None]
+
+class ChangeFeed:
+    """Реестр активных каналов и кеш настроек, обновляемые по LISTEN/NOTIFY или опросу"""
+
+    def __init__(self, dsn: str = CHANGE_FEED_DATABASE_URL, poll_interval: float = CHANGE_FEED_POLL_INTERVAL):
+        self.dsn = dsn
+        self.poll_interval = poll_interval
+        self._channels: Dict[int, Dict] = {}
+        self._channels_fingerprint: Optional[str] = None
+        self._subscribers: List[ChangeCallback] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.listening = False
+        self.started = False
+
+    def subscribe(self, callback: ChangeCallback):
+        """Подписка на изменения (вызывается из фонового потока ленты)"""
+        self._subscribers.append(callback)
+
+    def _emit(self, table: str, op: str, key: Optional[str]):
+        for callback in list(self._subscribers):
+            try:
+                callback(table, op, key)
+            except Exception as e:
+                logger.error(f"❌ Ошибка подписчика ленты изменений: {e}")
+
+    def start(self):
+        """Первичная загрузка реестра и запуск фонового потока"""
+        if self.started:
+            return
+        self._reload_channels()
+        SettingsDB.get_all_settings()
+        self.started = True
+        self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+        self._thread.start()
+        logger.info(f"📡 Лента изменений запущена: {len(self._channels)} активных каналов в реестре")
+
+    def stop(self):
+        self._stop.set()
+
+    def get_active_channels(self) -> List[Dict]:
+        """Активные каналы из реестра в порядке ChannelsDB.get_active_channels"""
+        with self._lock:
+            channels = list(self._channels.values())
+        channels.sort(key=lambda c: str(c.get('created_at') or ''))
+        channels.sort(key=lambda c: c.get('priority') or 0, reverse=True)
+        return [dict(c) for c in channels]
+
+    # --- Реестр каналов ---
+
+    def _reload_channels(self):
+        """Полная загрузка реестра (при старте, после переподключения и при смене отпечатка)"""
+        fingerprint = ChannelsDB.get_fingerprint()
+        channels = ChannelsDB.get_active_channels()
+        with self._lock:
+            self._channels = {c['id']: c for c in channels}
+            self._channels_fingerprint = fingerprint
+
+    def _apply_channel(self, op: str, channel_id: int, row: Optional[Dict]):
+        with self._lock:
+            if op == 'DELETE' or not row or not row.get('is_active'):
+                self._channels.pop(channel_id, None)
+            else:
+                self._channels[channel_id] = row
+
+    # --- LISTEN/NOTIFY ---
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.dsn:
+                try:
+                    self._listen()
+                except Exception as e:
+                    logger.warning(f"⚠️ LISTEN недоступен: {e}, переходим на опрос раз в {self.poll_interval}с")
+                finally:
+                    self.listening = False
+
+            # Опрос до следующей попытки подключения
+            deadline = time.monotonic() + RECONNECT_DELAY
+            while not self._stop.is_set():
+                self._poll()
+                if self.dsn and time.monotonic() >= deadline:
+                    break
+                self._stop.wait(self.poll_interval)
+
+    def _listen(self):
+        conn = psycopg2.connect(self.dsn, connect_timeout=5, cursor_factory=RealDictCursor,
+                                application_name='edu_digest_change_feed')
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANGE_FEED_CHANNEL}')
+
+            # Пока слушателя не было, изменения могли пройти мимо
+            self._reload_channels()
+            self._poll_settings()
+            self.listening = True
+            logger.info(f"👂 Подписка на {CHANGE_FEED_CHANNEL} активна")
+
+            while not self._stop.is_set():
+                # Ожидание уведомлений; по таймауту проверяем, что подключение живо
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    with conn.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                    continue
+
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    self._handle(conn, notify.payload)
+        finally:
+            conn.close()
+
+    def _handle(self, conn, payload: str):
+        """Точечное обновление по одному уведомлению"""
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            logger.warning(f"⚠️ Некорректное уведомление: {payload}")
+            return
+
+        table, op, key = change.get('table'), change.get('op'), change.get('key')
+        with conn.cursor() as cursor:
+            if table == 'channels':
+                row = None
+                if op != 'DELETE':
+                    cursor.execute('SELECT * FROM channels WHERE id = %s', (int(key),))
+                    row = cursor.fetchone()
+                self._apply_channel(op, int(key), dict(row) if row else None)
+            elif table == 'settings':
+                value = None
+                if op != 'DELETE':
+                    cursor.execute('SELECT value FROM settings WHERE key = %s', (key,))
+                    row = cursor.fetchone()
+                    value = row['value'] if row else None
+                settings_cache.apply(key, value)
+            else:
+                return
+
+        logger.info(f"🔔 Изменение {table}: {op} {key}")
+        self._emit(table, op, key)
+
+    # --- Опрос (PostgreSQL недоступен) ---
+
+    def _poll(self):
+        try:
+            self._poll_channels()
+            self._poll_settings()
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка опроса изменений: {e}")
+
+    def _poll_channels(self):
+        """Перезагрузка реестра, только если изменился отпечаток таблицы"""
+        if ChannelsDB.get_fingerprint() == self._channels_fingerprint:
+            return
+        self._reload_channels()
+        logger.info(f"🔄 Список каналов изменился: {len(self._channels)} активных")
+        self._emit('channels', 'RELOAD', None)
+
+    def _poll_settings(self):
+        """
+        Сверка settings_version (SettingsDB.get_all_settings после TTL кеша); при изменении
+        кеш перечитывается, а подписчики получают измененные ключи
+        """
+        before = dict(settings_cache.values or {})
+        after = SettingsDB.get_all_settings()
+        for key in set(before) | set(after):
+            if before.get(key) != after.get(key):
+                self._emit('settings', 'UPDATE', key)
+
+# Глобальный экземпляр для переиспользования
+_feed_instance: Optional[ChangeFeed] = None
+
+def get_change_feed() -> ChangeFeed:
+    """Получение общей ленты изменений (запускается явно через start())"""
+    global _feed_instance
+    if _feed_instance is None:
+        _feed_instance = ChangeFeed()
+    return _feed_instance
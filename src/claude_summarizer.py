@@ -8,7 +8,7 @@ from anthropic import AsyncAnthropic
 from anthropic.types import MessageParam
 
 from .config import ANTHROPIC_API_KEY
-from .database import SettingsDB
+from .async_database import AsyncSettingsDB
 
 # Настройка логирования
 import os
@@ -50,7 +50,7 @@ class ClaudeSummarizer:
         )
             
             # Получаем настройки из базы данных
-            max_length = SettingsDB.get_setting('summary_max_length', '150')
+            max_length = await AsyncSettingsDB.get_setting('summary_max_length', '150')
             self.max_tokens = int(max_length)
             
             self.initialized = True
@@ -160,6 +160,8 @@ class ClaudeSummarizer:
             messages = [{"role": "user", "content": user_prompt}]
             
             # Отправляем запрос к Claude API
+            start_time = time.time()
+            
             response = await self.client.messages.create(
                 model=self.model,
                 max_tokens=10,  # Нужно только число
@@ -168,6 +170,8 @@ class ClaudeSummarizer:
                 messages=messages
             )
             
+            latency_ms = (time.time() - start_time) * 1000
+            
             # Извлекаем оценку
             if response.content and len(response.content) > 0:
                 score_text = response.content[0].text.strip()
@@ -186,6 +190,9 @@ class ClaudeSummarizer:
                     "success": True,
                     "relevance_score": relevance_score,
                     "explanation": score_text,
+                    "input_tokens": response.usage.input_tokens,
+                    "output_tokens": response.usage.output_tokens,
+                    "latency_ms": latency_ms,
                     "fallback_used": False
                 }
             else:
@@ -257,6 +264,9 @@ class ClaudeSummarizer:
                     "quality_score": quality_check['score'],
                     "quality_issues": quality_check['issues'],
                     "tokens_used": response.usage.input_tokens + response.usage.output_tokens,
+                    "input_tokens": response.usage.input_tokens,
+                    "output_tokens": response.usage.output_tokens,
+                    "latency_ms": processing_time * 1000,
                     "fallback_used": False
                 }
             else:
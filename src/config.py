@@ -38,12 +38,25 @@ TELEGRAM_API_HASH = os.getenv('TELEGRAM_API_HASH')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TARGET_CHANNEL = os.getenv('TARGET_CHANNEL', '@vestnik_edtech')
 
+# Пул пользовательских сессий для чтения каналов (StringSession через запятую)
+TELEGRAM_SESSIONS = os.getenv('TELEGRAM_SESSIONS', '')
+TELEGRAM_MIN_REQUEST_INTERVAL = float(os.getenv('TELEGRAM_MIN_REQUEST_INTERVAL', 1.0))  # Пауза между запросами одной сессии, сек
+TELEGRAM_MAX_FLOOD_WAIT = int(os.getenv('TELEGRAM_MAX_FLOOD_WAIT', 60))  # Дольше этого FloodWait не ждем, сек
+TELEGRAM_EXPORT_MAX_FLOOD_WAIT = int(os.getenv('TELEGRAM_EXPORT_MAX_FLOOD_WAIT', 900))  # Предел ожидания FloodWait при выгрузке истории, сек
+
+# Локальный архив сырых постов каналов (SQLite)
+MESSAGE_ARCHIVE_PATH = os.getenv('MESSAGE_ARCHIVE_PATH', 'data/message_archive.db')
+
+# Локальный буфер записей на время недоступности Supabase (SQLite)
+WRITE_BUFFER_PATH = os.getenv('WRITE_BUFFER_PATH', 'data/write_buffer.db')
+
 # Логируем статус Telegram переменных
 logger.debug("📱 Telegram API variables:")
 logger.debug(f"   TELEGRAM_API_ID: {'✅ Set' if TELEGRAM_API_ID else '❌ Missing'}")
 logger.debug(f"   TELEGRAM_API_HASH: {'✅ Set' if TELEGRAM_API_HASH else '❌ Missing'}")
 logger.debug(f"   TELEGRAM_BOT_TOKEN: {'✅ Set' if TELEGRAM_BOT_TOKEN else '❌ Missing'}")
 logger.debug(f"   TARGET_CHANNEL: {TARGET_CHANNEL}")
+logger.debug(f"   TELEGRAM_SESSIONS: {len([s for s in TELEGRAM_SESSIONS.split(',') if s.strip()])} session(s)")
 
 if not TELEGRAM_API_ID or not TELEGRAM_API_HASH:
     logger.error("❌ Telegram API credentials missing")
@@ -72,6 +85,58 @@ SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')  # Anon/Public API Key
 SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY')  # Service Role Key (опционально)
 DATABASE_URL = os.getenv('DATABASE_URL')  # PostgreSQL connection string
 
+# Пул подключений PostgreSQL
+PG_POOL_MIN_SIZE = int(os.getenv('PG_POOL_MIN_SIZE', 1))
+PG_POOL_MAX_SIZE = int(os.getenv('PG_POOL_MAX_SIZE', 10))
+PG_POOL_CHECKOUT_TIMEOUT = float(os.getenv('PG_POOL_CHECKOUT_TIMEOUT', 5.0))  # Ожидание свободного подключения, сек
+PG_POOL_PING_INTERVAL = float(os.getenv('PG_POOL_PING_INTERVAL', 30.0))  # Проверять SELECT 1 после простоя дольше, сек
+
+# Переключение на REST API при недоступности PostgreSQL
+PG_FAILURE_THRESHOLD = int(os.getenv('PG_FAILURE_THRESHOLD', 2))  # Сбоев подключения подряд до переключения
+PG_PROBE_INTERVAL = float(os.getenv('PG_PROBE_INTERVAL', 15.0))  # Пауза между фоновыми проверками PostgreSQL, сек
+
+# HTTP сессия REST API Supabase (keep-alive)
+SUPABASE_HTTP_POOL_SIZE = int(os.getenv('SUPABASE_HTTP_POOL_SIZE', 10))
+SUPABASE_HTTP_RETRIES = int(os.getenv('SUPABASE_HTTP_RETRIES', 3))
+SUPABASE_HTTP_BACKOFF = float(os.getenv('SUPABASE_HTTP_BACKOFF', 0.3))  # Пауза перед повтором: backoff * 2^n, сек
+
+# Кеш настроек процесса: через сколько секунд сверять версию настроек с БД
+SETTINGS_CACHE_TTL = float(os.getenv('SETTINGS_CACHE_TTL', 60))
+
+# Лента изменений каналов и настроек (LISTEN/NOTIFY). Нужно подключение в режиме session:
+# pgbouncer в режиме transaction (порт 6543 Supabase) не доставляет NOTIFY
+CHANGE_FEED_DATABASE_URL = os.getenv('CHANGE_FEED_DATABASE_URL') or DATABASE_URL
+CHANGE_FEED_POLL_INTERVAL = float(os.getenv('CHANGE_FEED_POLL_INTERVAL', 60))  # Опрос, пока LISTEN недоступен, сек
+
+# Очистка старых данных (src/retention.py). Сроки хранения - настройки retention_text_days
+# и retention_pending_days в таблице settings; здесь размер пачки и пауза между пачками,
+# чтобы autovacuum успевал за удалениями
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 1000))
+RETENTION_BATCH_PAUSE = float(os.getenv('RETENTION_BATCH_PAUSE', 0.5))  # сек
+
+# Выгрузка корпуса (src/exporter.py): строк на одну выборку серверного курсора / группу строк Parquet
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 5000))
+
+# Аренда цикла сбора (src/run_lock.py): без продления держателем аренда освобождается через TTL
+RUN_LOCK_TTL = int(os.getenv('RUN_LOCK_TTL', 300))  # сек, продление каждые TTL/3
+
+# Очередь заданий (src/job_queue.py): воркер python main.py worker
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', 2))  # Заданий одновременно в одном процессе
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 120))  # Аренда задания, продление каждые /3
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 5.0))  # Опрос очереди, пока она пуста, сек
+JOB_RETRY_BASE_DELAY = float(os.getenv('JOB_RETRY_BASE_DELAY', 30))  # Пауза перед повтором: base * 2^(n-1), сек
+JOB_RETRY_MAX_DELAY = float(os.getenv('JOB_RETRY_MAX_DELAY', 3600))  # сек
+
+# Сбор перед публикацией (scheduler.py): цикл стартует за перцентиль PRECOLLECT_PERCENTILE
+# длительности последних PRECOLLECT_HISTORY_RUNS циклов до дедлайна = слот - PRECOLLECT_MARGIN
+PRECOLLECT_PLAN_AHEAD = int(os.getenv('PRECOLLECT_PLAN_AHEAD', 60))  # За сколько минут до слота планировать
+PRECOLLECT_MARGIN = int(os.getenv('PRECOLLECT_MARGIN', 120))  # Запас между концом сбора и публикацией, сек
+PRECOLLECT_PERCENTILE = float(os.getenv('PRECOLLECT_PERCENTILE', 0.9))
+PRECOLLECT_HISTORY_RUNS = int(os.getenv('PRECOLLECT_HISTORY_RUNS', 20))
+PRECOLLECT_DEFAULT_SECONDS = int(os.getenv('PRECOLLECT_DEFAULT_SECONDS', 600))  # Оценка, пока истории нет, сек
+PRECOLLECT_TRIM_SLACK = float(os.getenv('PRECOLLECT_TRIM_SLACK', 0.1))  # Каналы урезаются, если времени меньше ожидаемого больше чем на эту долю
+PRECOLLECT_REQUEUE_DELAY = int(os.getenv('PRECOLLECT_REQUEUE_DELAY', 15))  # Повтор сбора с дедлайном, пока идет чужой цикл, сек
+
 # Логируем статус Supabase переменных  
 logger.debug("🗄️ Supabase configuration:")
 logger.debug(f"   DATABASE_URL: {'✅ Set' if DATABASE_URL else '❌ Missing'}")
@@ -6,13 +6,19 @@
 """
 
 import os
+import json
 import logging
+import time
+import threading
 import requests
-from typing import List, Dict, Optional, Any
-from datetime import datetime
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List, Dict, Optional, Any, Callable
+from datetime import datetime, timedelta
 from supabase import create_client, Client
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 
 # Настройка логирования
 os.makedirs('logs', exist_ok=True)
@@ -29,19 +35,131 @@ logger = logging.getLogger(__name__)
 
 # Конфигурация Supabase
 try:
-    from .config import SUPABASE_URL, SUPABASE_KEY, DATABASE_URL
+    from .config import (SUPABASE_URL, SUPABASE_KEY, DATABASE_URL, PG_POOL_MIN_SIZE,
+                         PG_POOL_MAX_SIZE, PG_POOL_CHECKOUT_TIMEOUT, PG_POOL_PING_INTERVAL,
+                         SUPABASE_HTTP_POOL_SIZE, SUPABASE_HTTP_RETRIES, SUPABASE_HTTP_BACKOFF,
+                         SETTINGS_CACHE_TTL, PG_FAILURE_THRESHOLD, PG_PROBE_INTERVAL,
+                         RETENTION_BATCH_SIZE, RETENTION_BATCH_PAUSE)
+    from .db_pool import PGConnectionPool, PoolTimeoutError
+    from .backend_router import BackendRouter, RestAPIError, is_backend_failure, is_unavailable_error
+    from .write_buffer import get_write_buffer, PENDING_NEWS, PROCESSED_MESSAGES
 except ImportError:
-    from config import SUPABASE_URL, SUPABASE_KEY, DATABASE_URL
+    from config import (SUPABASE_URL, SUPABASE_KEY, DATABASE_URL, PG_POOL_MIN_SIZE,
+                        PG_POOL_MAX_SIZE, PG_POOL_CHECKOUT_TIMEOUT, PG_POOL_PING_INTERVAL,
+                        SUPABASE_HTTP_POOL_SIZE, SUPABASE_HTTP_RETRIES, SUPABASE_HTTP_BACKOFF,
+                        SETTINGS_CACHE_TTL, PG_FAILURE_THRESHOLD, PG_PROBE_INTERVAL,
+                        RETENTION_BATCH_SIZE, RETENTION_BATCH_PAUSE)
+    from db_pool import PGConnectionPool, PoolTimeoutError
+    from backend_router import BackendRouter, RestAPIError, is_backend_failure, is_unavailable_error
+    from write_buffer import get_write_buffer, PENDING_NEWS, PROCESSED_MESSAGES
+
+# Служебная настройка: увеличивается при каждом изменении настроек
+SETTINGS_VERSION_KEY = 'settings_version'
+
+# Канал NOTIFY, в который триггеры пишут изменения channels и settings (см. change_feed)
+CHANGE_FEED_CHANNEL = 'edu_digest_changes'
+
+# Сколько самых свежих совпадений search_news ранжирует (миграции 011, 013): ts_rank_cd читает
+# вектор каждой строки, и без предела частый термин ранжировал бы всю таблицу
+SEARCH_MAX_CANDIDATES = 2000
+
+class SettingsCache:
+    """
+    Кеш всех настроек процесса
+    
+    Свежие TTL секунд данные отдаются без запросов. После TTL сверяется только
+    settings_version, и таблица перечитывается целиком лишь если версия изменилась.
+    Локальные изменения сбрасывают кеш сразу.
+    """
+    
+    def __init__(self, ttl: float = SETTINGS_CACHE_TTL):
+        self.ttl = ttl
+        self.values: Optional[Dict[str, str]] = None
+        self.version: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+    
+    @property
+    def fresh(self) -> bool:
+        return self.values is not None and time.monotonic() - self._checked_at < self.ttl
+    
+    def store(self, values: Dict[str, str]):
+        """Сохранение полной выборки таблицы settings"""
+        with self._lock:
+            self.version = values.get(SETTINGS_VERSION_KEY)
+            self.values = {k: v for k, v in values.items() if k != SETTINGS_VERSION_KEY}
+            self._checked_at = time.monotonic()
+    
+    def confirm(self, version: Optional[str]) -> bool:
+        """Сверка версии после TTL: True - кеш актуален и продлен"""
+        with self._lock:
+            if self.values is None or version != self.version:
+                return False
+            self._checked_at = time.monotonic()
+            return True
+    
+    def apply(self, key: str, value: Optional[str]):
+        """Точечное обновление одной настройки из ленты изменений (None - настройка удалена)"""
+        with self._lock:
+            if self.values is None:
+                return
+            if key == SETTINGS_VERSION_KEY:
+                self.version = value
+            elif value is None:
+                self.values.pop(key, None)
+            else:
+                self.values[key] = value
+    
+    def invalidate(self):
+        with self._lock:
+            self.values = None
+            self.version = None
+
+settings_cache = SettingsCache()
+
+def create_http_session(pool_size: int = SUPABASE_HTTP_POOL_SIZE, retries: int = SUPABASE_HTTP_RETRIES,
+                        backoff: float = SUPABASE_HTTP_BACKOFF) -> requests.Session:
+    """
+    HTTP сессия с keep-alive пулом соединений и повторами
+    
+    Повторы с экспоненциальной паузой при ошибках соединения и ответах 5xx.
+    POST при 5xx/обрыве чтения не повторяется - вставка могла уже выполниться.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD', 'PATCH', 'DELETE'}),
+        raise_on_status=False,
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip'
+    return session
 
 class SupabaseDB:
     """Класс для работы с Supabase через REST API и PostgreSQL"""
     
     def __init__(self):
         self.supabase: Client = None
-        self.pg_connection = None
+        self.pg_pool = None
+        # Какой бэкенд сейчас здоров (переключение и фоновая проверка PostgreSQL)
+        self.router = BackendRouter(self._probe_postgres, failure_threshold=PG_FAILURE_THRESHOLD,
+                                    probe_interval=PG_PROBE_INTERVAL)
         self.initialized = False
         self.rest_api_url = None
         self.headers = None
+        # Одна keep-alive сессия на процесс для всех REST запросов
+        self.http = create_http_session()
+        self._rest_stats_lock = threading.Lock()
+        self._rest_stats: Dict[str, Dict[str, float]] = {}
     
     def initialize(self):
         """Инициализация подключения к Supabase"""
@@ -68,7 +186,7 @@ class SupabaseDB:
             
             # Проверяем доступность REST API
             try:
-                response = requests.get(f"{self.rest_api_url}/", headers=self.headers, timeout=5)
+                response = self.http.get(f"{self.rest_api_url}/", headers=self.headers, timeout=5)
                 if response.status_code == 200:
                     logger.info("✅ Supabase REST API доступен")
                 else:
@@ -86,20 +204,10 @@ class SupabaseDB:
                 self.supabase = None
             
             # Пытаемся настроить PostgreSQL подключение (если доступно)
-            if DATABASE_URL:
-                try:
-                    self.pg_connection = psycopg2.connect(
-                        DATABASE_URL,
-                        cursor_factory=RealDictCursor,
-                        connect_timeout=5,
-                        application_name="edu_digest_bot"
-                    )
-                    self.pg_connection.autocommit = True
-                    logger.info("✅ PostgreSQL подключение установлено")
-                except Exception as pg_error:
-                    logger.warning(f"⚠️ PostgreSQL подключение неудачно: {pg_error}")
-                    logger.info("📝 Будем использовать только REST API")
-                    self.pg_connection = None
+            if not DATABASE_URL:
+                self.router.disable("DATABASE_URL не настроен")
+            elif not self._create_pg_pool():
+                self.router.trip("пул подключений не создан")
             
             self.initialized = True
             return True
@@ -112,37 +220,43 @@ class SupabaseDB:
             logger.error("   - DATABASE_URL (PostgreSQL connection string)")
             raise
     
-    def execute_rest_query(self, table: str, method: str = 'GET', data: Dict = None, filters: Dict = None):
-        """Выполнение запроса через REST API"""
+    def rest_request(self, method: str, table: str, params=None, headers: Dict = None, data: Any = None) -> requests.Response:
+        """Низкоуровневый запрос к REST API через общую keep-alive сессию (с учетом задержки)"""
         if not self.initialized:
             self.initialize()
         
+        started = time.monotonic()
+        try:
+            response = self.http.request(method, f"{self.rest_api_url}/{table}",
+                                         headers={**self.headers, **(headers or {})}, params=params,
+                                         json=data if method in ('POST', 'PATCH') else None, timeout=10)
+        except requests.RequestException:
+            self._record_rest_call(method, table, time.monotonic() - started, failed=True)
+            raise
+        self._record_rest_call(method, table, time.monotonic() - started, failed=response.status_code >= 500)
+        return response
+    
+    def execute_rest_query(self, table: str, method: str = 'GET', data: Any = None, filters: Dict = None,
+                           params=None, headers: Dict = None):
+        """
+        Выполнение запроса через REST API
+        
+        filters - условия равенства {column: value},
+        params - дополнительные параметры PostgREST (dict или список пар, см. RestQuery),
+        headers - заголовки поверх стандартных (например, Prefer для upsert)
+        """
         try:
-            url = f"{self.rest_api_url}/{table}"
+            if method not in ('GET', 'POST', 'PATCH', 'DELETE'):
+                raise ValueError(f"Unsupported method: {method}")
             
-            # Добавляем фильтры
-            if filters:
-                params = []
-                for key, value in filters.items():
-                    if isinstance(value, str):
-                        params.append(f"{key}=eq.{value}")
-                    else:
-                        params.append(f"{key}=eq.{value}")
-                if params:
-                    url += "?" + "&".join(params)
+            # Фильтры равенства + дополнительные параметры; список пар допускает повтор колонки
+            query = [(key, f"eq.{value}") for key, value in (filters or {}).items()]
+            if params:
+                query.extend(params.items() if isinstance(params, dict) else params)
             
-            if method == 'GET':
-                response = requests.get(url, headers=self.headers, timeout=10)
-            elif method == 'POST':
-                response = requests.post(url, headers=self.headers, json=data, timeout=10)
-            elif method == 'PATCH':
-                response = requests.patch(url, headers=self.headers, json=data, timeout=10)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=self.headers, timeout=10)
-            else:
-                raise ValueError(f"Unsupported method: {method}")
+            response = self.rest_request(method, table, params=query, headers=headers, data=data)
             
-            if response.status_code in [200, 201, 204]:
+            if response.status_code in [200, 201, 204, 206]:
                 try:
                     return response.json() if response.content else []
                 except:
@@ -165,7 +279,7 @@ class SupabaseDB:
                     raise ValueError(f"Конфликт данных: {error_detail}")
             else:
                 logger.error(f"❌ REST API error {response.status_code}: {response.text}")
-                raise Exception(f"REST API error: {response.status_code}")
+                raise RestAPIError(response.status_code)
                 
         except ValueError:
             # Пробрасываем ValueError (это наши ошибки валидации)
@@ -174,145 +288,317 @@ class SupabaseDB:
             logger.error(f"❌ REST API запрос неудачен: {e}")
             raise
     
+    @contextmanager
+    def transaction(self):
+        """
+        Подключение с явной транзакцией: COMMIT при успешном выходе из блока, ROLLBACK при ошибке
+        
+        Отдает None, если PostgreSQL недоступен (REST API транзакций не поддерживает).
+        """
+        with self.get_connection() as conn:
+            if conn is None:
+                yield None
+                return
+            
+            conn.autocommit = False
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                if not conn.closed:
+                    conn.autocommit = True
+    
+    def _record_rest_call(self, method: str, table: str, elapsed: float, failed: bool = False):
+        """Учет задержки REST запроса (с учетом повторов)"""
+        key = f"{method} {table}"
+        with self._rest_stats_lock:
+            stats = self._rest_stats.setdefault(key, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            elapsed_ms = elapsed * 1000
+            stats['calls'] += 1
+            stats['errors'] += 1 if failed else 0
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    
+    def get_rest_stats(self) -> Dict[str, Dict[str, float]]:
+        """Задержки REST запросов по методу и таблице"""
+        with self._rest_stats_lock:
+            return {
+                key: {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'avg_ms': round(stats['total_ms'] / stats['calls'], 1) if stats['calls'] else 0.0,
+                    'max_ms': round(stats['max_ms'], 1)
+                }
+                for key, stats in self._rest_stats.items()
+            }
+    
+    def _create_pg_pool(self) -> bool:
+        """Создание пула подключений PostgreSQL (если доступно)"""
+        try:
+            self.pg_pool = PGConnectionPool(
+                DATABASE_URL,
+                min_size=PG_POOL_MIN_SIZE,
+                max_size=PG_POOL_MAX_SIZE,
+                checkout_timeout=PG_POOL_CHECKOUT_TIMEOUT,
+                ping_interval=PG_POOL_PING_INTERVAL,
+                cursor_factory=RealDictCursor,
+                connect_timeout=5,
+                application_name="edu_digest_bot"
+            )
+            logger.info(f"✅ Пул PostgreSQL подключений создан (до {PG_POOL_MAX_SIZE})")
+            return True
+        except Exception as pg_error:
+            logger.warning(f"⚠️ PostgreSQL подключение неудачно: {pg_error}")
+            logger.info("📝 Будем использовать REST API")
+            self.pg_pool = None
+            return False
+    
+    @contextmanager
     def get_connection(self):
-        """Получение подключения к PostgreSQL (если доступно)"""
+        """
+        Подключение к PostgreSQL из пула на время блока with
+        
+        Отдает None, если PostgreSQL недоступен - в этом случае используется REST API.
+        Пока router в состоянии rest, пул не трогается вовсе.
+        Подключение возвращается в пул при выходе из блока, сломанное - закрывается.
+        """
         if not self.initialized:
             self.initialize()
         
-        if self.pg_connection and not self.pg_connection.closed:
-            return self.pg_connection
+        conn = None
+        if self.pg_pool is not None and self.router.postgres_available:
+            try:
+                conn = self.pg_pool.acquire()
+            except PoolTimeoutError as e:
+                # Пул занят, но сервер жив - состояние не меняем
+                logger.warning(f"⚠️ {e}, используем REST API")
+            except psycopg2.Error as e:
+                logger.warning(f"⚠️ Не удалось получить подключение из пула: {e}, используем REST API")
+                self.router.record_failure(e)
+        
+        if conn is None:
+            yield None
+            return
+        
+        broken = False
+        try:
+            yield conn
+        except psycopg2.Error as e:
+            broken = is_backend_failure(e)
+            if broken:
+                self.router.record_failure(e)
+            raise
+        finally:
+            self.pg_pool.release(conn, broken)
+        self.router.record_success()
+    
+    def run(self, pg_fn: Callable, rest_fn: Callable, transaction: bool = False, idempotent: bool = False):
+        """
+        Выполнение операции на здоровом бэкенде
+        
+        Args:
+            pg_fn: Реализация через PostgreSQL, получает подключение
+            rest_fn: Реализация через REST API, без аргументов
+            transaction: Выполнить pg_fn в транзакции (см. transaction)
+            idempotent: Повтор операции безопасен (чтение, upsert, установка значений)
+            
+        Если PostgreSQL отключен router'ом, сразу вызывается rest_fn. Если подключение
+        оборвалось во время pg_fn, сервер мог успеть зафиксировать изменения, поэтому
+        через REST API повторяются только идемпотентные операции, остальные пробрасывают ошибку.
+        Остальные ошибки (в том числе IntegrityError) пробрасываются как есть.
+        """
+        try:
+            with (self.transaction() if transaction else self.get_connection()) as conn:
+                if conn is not None:
+                    result = pg_fn(conn)
+                    self.router.record_call(BackendRouter.POSTGRES)
+                    return result
+        except psycopg2.Error as e:
+            if not is_backend_failure(e):
+                raise
+            if not idempotent:
+                logger.error(f"❌ Сбой PostgreSQL во время запроса: {e}, результат неизвестен - не повторяем")
+                raise
+            logger.warning(f"⚠️ Сбой PostgreSQL во время запроса: {e}, повторяем через REST API")
+            self.router.record_failover()
         
-        # Если PostgreSQL недоступен, возвращаем None
-        # В этом случае будем использовать REST API
-        return None
+        self.router.record_call(BackendRouter.REST)
+        return rest_fn()
+    
+    def _probe_postgres(self) -> bool:
+        """Проверка PostgreSQL для router (из фонового потока)"""
+        if self.pg_pool is None and not self._create_pg_pool():
+            return False
+        with self.pg_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        return True
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Метрики пула подключений PostgreSQL"""
+        if self.pg_pool is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.pg_pool.get_stats()}
+    
+    def get_backend_stats(self) -> Dict[str, Any]:
+        """Состояние router: текущий бэкенд, переключения и число запросов по бэкендам"""
+        return self.router.get_stats()
 
 # Глобальный экземпляр
 supabase_db = SupabaseDB()
 
+class RestQuery:
+    """
+    Построитель запросов PostgREST
+    
+    Пример:
+        RestQuery('run_logs').select('id', 'status').gt('started_at', since) \
+            .order('started_at', desc=True).limit(10).execute()
+        RestQuery('channels').eq('is_active', True).count()
+    """
+    
+    def __init__(self, table: str):
+        self.table = table
+        self._params: List[tuple] = []
+        self._headers: Dict[str, str] = {}
+        self._order: List[str] = []
+    
+    @staticmethod
+    def _format(value) -> str:
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if value is None:
+            return 'null'
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+    
+    def _filter(self, column: str, operator: str, value) -> 'RestQuery':
+        self._params.append((column, f"{operator}.{self._format(value)}"))
+        return self
+    
+    def select(self, *columns: str) -> 'RestQuery':
+        """Только нужные колонки вместо SELECT *"""
+        self._params.append(('select', ','.join(columns)))
+        return self
+    
+    def eq(self, column: str, value) -> 'RestQuery':
+        return self._filter(column, 'eq', value)
+    
+    def neq(self, column: str, value) -> 'RestQuery':
+        return self._filter(column, 'neq', value)
+    
+    def gt(self, column: str, value) -> 'RestQuery':
+        return self._filter(column, 'gt', value)
+    
+    def gte(self, column: str, value) -> 'RestQuery':
+        return self._filter(column, 'gte', value)
+    
+    def lt(self, column: str, value) -> 'RestQuery':
+        return self._filter(column, 'lt', value)
+    
+    def lte(self, column: str, value) -> 'RestQuery':
+        return self._filter(column, 'lte', value)
+    
+    def in_(self, column: str, values) -> 'RestQuery':
+        return self._filter(column, 'in', f"({','.join(self._format(v) for v in values)})")
+    
+    def is_(self, column: str, value) -> 'RestQuery':
+        """IS NULL / IS TRUE / IS FALSE"""
+        return self._filter(column, 'is', value)
+    
+    def order(self, column: str, desc: bool = False, nulls_last: bool = None) -> 'RestQuery':
+        item = f"{column}.{'desc' if desc else 'asc'}"
+        if nulls_last is not None:
+            item += '.nullslast' if nulls_last else '.nullsfirst'
+        self._order.append(item)
+        return self
+    
+    def limit(self, count: int) -> 'RestQuery':
+        self._params.append(('limit', str(count)))
+        return self
+    
+    def offset(self, count: int) -> 'RestQuery':
+        self._params.append(('offset', str(count)))
+        return self
+    
+    def range(self, start: int, end: int) -> 'RestQuery':
+        """Пагинация заголовком Range (строки start..end включительно)"""
+        self._headers['Range-Unit'] = 'items'
+        self._headers['Range'] = f"{start}-{end}"
+        return self
+    
+    def params(self) -> List[tuple]:
+        return self._params + ([('order', ','.join(self._order))] if self._order else [])
+    
+    def execute(self, method: str = 'GET', data: Any = None) -> List[Dict]:
+        """Выполнение запроса (GET по умолчанию; PATCH/DELETE применяются к отфильтрованным строкам)"""
+        return supabase_db.execute_rest_query(self.table, method, data=data, params=self.params(),
+                                              headers=self._headers or None)
+    
+    def first(self) -> Optional[Dict]:
+        """Первая строка результата или None"""
+        rows = self.limit(1).execute()
+        return rows[0] if rows else None
+    
+    def count(self) -> int:
+        """Количество строк по фильтрам: HEAD с Prefer: count=exact, без загрузки данных"""
+        params = [(k, v) for k, v in self.params() if k not in ('select', 'order', 'limit', 'offset')]
+        response = supabase_db.rest_request('HEAD', self.table, params=params,
+                                            headers={'Prefer': 'count=exact'})
+        if response.status_code not in (200, 206):
+            raise RestAPIError(response.status_code)
+        
+        # Content-Range: 0-24/3573 или */0
+        content_range = response.headers.get('Content-Range', '')
+        total = content_range.rsplit('/', 1)[-1]
+        return int(total) if total.isdigit() else 0
+
 def init_database():
-    """Инициализация базы данных Supabase с созданием всех таблиц"""
+    """Инициализация базы данных Supabase: применение миграций схемы (см. migrations)"""
+    try:
+        from .migrations import migrate
+    except ImportError:
+        from migrations import migrate
+    
     try:
         logger.info("🚀 Инициализация базы данных Supabase...")
         
         if not supabase_db.initialize():
             raise Exception("Не удалось инициализировать Supabase")
         
-        # Создаем таблицы через SQL
-        conn = supabase_db.get_connection()
-        if conn is None:
-            logger.warning("⚠️ PostgreSQL недоступен, используем REST API для инициализации")
-            # Таблицы должны быть созданы в Supabase Dashboard или через SQL редактор
-            # Проверяем доступность через REST API
-            try:
-                result = supabase_db.execute_rest_query('channels', 'GET')
-                logger.info("✅ Таблица channels доступна через REST API")
-                return True
-            except Exception as api_error:
-                logger.error(f"❌ REST API тест неудачен: {api_error}")
-                raise Exception("База данных недоступна через REST API")
-        
-        cursor = conn.cursor()
-        
-        logger.info("📊 Создание таблиц...")
-        
-        # Таблица отслеживаемых каналов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS channels (
-                id SERIAL PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                display_name TEXT,
-                priority INTEGER DEFAULT 0 CHECK (priority >= 0 AND priority <= 10),
-                is_active BOOLEAN DEFAULT true,
-                last_message_id BIGINT DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Таблица обработанных сообщений
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS processed_messages (
-                id SERIAL PRIMARY KEY,
-                channel_id INTEGER NOT NULL REFERENCES channels(id) ON DELETE CASCADE,
-                message_id BIGINT NOT NULL,
-                message_text TEXT,
-                summary TEXT,
-                processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                published BOOLEAN DEFAULT false,
-                UNIQUE(channel_id, message_id)
-            )
-        ''')
-        
-        # Таблица накопленных новостей (ожидающих публикации)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pending_news (
-                id SERIAL PRIMARY KEY,
-                channel_id INTEGER NOT NULL REFERENCES channels(id) ON DELETE CASCADE,
-                message_id BIGINT NOT NULL,
-                channel_name TEXT NOT NULL,
-                message_text TEXT NOT NULL,
-                summary TEXT NOT NULL,
-                relevance_score INTEGER DEFAULT 5,
-                collected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                scheduled_for DATE,
-                digest_type VARCHAR(20),
-                is_approved BOOLEAN DEFAULT true,
-                is_deleted BOOLEAN DEFAULT false,
-                UNIQUE(channel_id, message_id)
-            )
-        ''')
-        
-        # Настройки системы
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                id SERIAL PRIMARY KEY,
-                key TEXT UNIQUE NOT NULL,
-                value TEXT NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Таблица логов запусков
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS run_logs (
-                id SERIAL PRIMARY KEY,
-                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                completed_at TIMESTAMP,
-                status TEXT CHECK (status IN ('started', 'completed', 'failed')),
-                channels_processed INTEGER DEFAULT 0,
-                messages_collected INTEGER DEFAULT 0,
-                news_published INTEGER DEFAULT 0,
-                error_message TEXT
-            )
-        ''')
-        
-        # Вставка настроек по умолчанию
-        default_settings = [
-            ('max_news_count', '7', 'Максимальное количество новостей в дайджесте'),
-            ('target_channel', '@vestnik_edtech', 'Целевой канал для публикации'),
-            ('digest_times', '12:00,18:00', 'Время публикации дайджестов'),
-            ('summary_max_length', '150', 'Максимальная длина суммаризации в символах'),
-            ('hours_lookback', '12', 'Сколько часов назад искать новости'),
-        ]
+        with supabase_db.get_connection() as conn:
+            if conn is None:
+                logger.warning("⚠️ PostgreSQL недоступен, используем REST API для инициализации")
+                # Таблицы должны быть созданы в Supabase Dashboard или через SQL редактор
+                # Проверяем доступность через REST API
+                try:
+                    result = supabase_db.execute_rest_query('channels', 'GET')
+                    logger.info("✅ Таблица channels доступна через REST API")
+                    return True
+                except Exception as api_error:
+                    logger.error(f"❌ REST API тест неудачен: {api_error}")
+                    raise Exception("База данных недоступна через REST API")
         
-        for key, value, description in default_settings:
-            cursor.execute('''
-                INSERT INTO settings (key, value, description, updated_at)
-                VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
-                ON CONFLICT (key) DO NOTHING
-            ''', (key, value, description))
+        logger.info("📊 Применение миграций схемы...")
+        migrate()
         
         logger.info("✅ База данных Supabase успешно инициализирована")
         
         # Проверка созданных таблиц
-        cursor.execute("""
-            SELECT table_name FROM information_schema.tables 
-            WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
-        """)
-        tables = [row['table_name'] for row in cursor.fetchall()]
-        logger.info(f"✅ Созданные таблицы: {', '.join(tables)}")
+        with supabase_db.get_connection() as conn:
+            if conn is not None:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT table_name FROM information_schema.tables 
+                    WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
+                """)
+                tables = [row['table_name'] for row in cursor.fetchall()]
+                logger.info(f"✅ Созданные таблицы: {', '.join(tables)}")
         
         return True
         
@@ -326,37 +612,37 @@ def test_db() -> bool:
         if not supabase_db.initialized:
             supabase_db.initialize()
         
-        conn = supabase_db.get_connection()
-        if conn:
-            cursor = conn.cursor()
+        with supabase_db.get_connection() as conn:
+            if conn:
+                cursor = conn.cursor()
             
-            # Простой тест
-            cursor.execute('SELECT 1 as test')
-            result = cursor.fetchone()
+                # Простой тест
+                cursor.execute('SELECT 1 as test')
+                result = cursor.fetchone()
             
-            if result and result['test'] == 1:
-                logger.info("✅ Подключение к Supabase через PostgreSQL работает")
-                return True
+                if result and result['test'] == 1:
+                    logger.info("✅ Подключение к Supabase через PostgreSQL работает")
+                    return True
+                else:
+                    logger.error("❌ Тест подключения к Supabase провалился")
+                    return False
             else:
-                logger.error("❌ Тест подключения к Supabase провалился")
-                return False
-        else:
-            # Тестируем REST API
-            logger.info("🔍 Тестируем подключение через REST API...")
-            try:
-                result = supabase_db.execute_rest_query('channels', 'GET')
-                logger.info("✅ Подключение к Supabase через REST API работает")
-                return True
-            except Exception as api_error:
-                logger.error(f"❌ REST API тест неудачен: {api_error}")
-                return False
+                # Тестируем REST API
+                logger.info("🔍 Тестируем подключение через REST API...")
+                try:
+                    result = supabase_db.execute_rest_query('channels', 'GET')
+                    logger.info("✅ Подключение к Supabase через REST API работает")
+                    return True
+                except Exception as api_error:
+                    logger.error(f"❌ REST API тест неудачен: {api_error}")
+                    return False
             
     except Exception as e:
         logger.error(f"❌ Ошибка тестирования Supabase DB: {e}")
         return False
 
 def create_connection():
-    """Создание подключения к базе данных"""
+    """Подключение к базе данных из пула (контекстный менеджер, см. SupabaseDB.get_connection)"""
     return supabase_db.get_connection()
 
 # Функции для работы с каналами
@@ -364,530 +650,355 @@ class ChannelsDB:
     @staticmethod
     def add_channel(username: str, display_name: str = None, priority: int = 0) -> int:
         """Добавление нового канала"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO channels (username, display_name, priority, updated_at)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                RETURNING id
+            ''', (username, display_name or username, priority))
+            return cursor.fetchone()['id']
+        
+        def rest():
+            result = supabase_db.execute_rest_query('channels', 'POST', {
+                'username': username,
+                'display_name': display_name or username,
+                'priority': priority,
+                'updated_at': datetime.now().isoformat()
+            })
+            if not result:
+                raise Exception("Не удалось добавить канал через REST API")
+            return result[0]['id']
+        
         try:
-            # Сначала пытаемся PostgreSQL
-            conn = supabase_db.get_connection()
-            if conn:
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    INSERT INTO channels (username, display_name, priority, updated_at)
-                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
-                    RETURNING id
-                ''', (username, display_name or username, priority))
-                
-                result = cursor.fetchone()
-                channel_id = result['id']
-                logger.info(f"✅ Добавлен канал через PostgreSQL: {username} (ID: {channel_id})")
-                return channel_id
-            else:
-                # Используем REST API
-                logger.info("📡 Используем REST API для добавления канала")
-                data = {
-                    'username': username,
-                    'display_name': display_name or username,
-                    'priority': priority,
-                    'updated_at': datetime.now().isoformat()
-                }
-                
-                result = supabase_db.execute_rest_query('channels', 'POST', data)
-                if result and len(result) > 0:
-                    channel_id = result[0]['id']
-                    logger.info(f"✅ Добавлен канал через REST API: {username} (ID: {channel_id})")
-                    return channel_id
-                else:
-                    raise Exception("Не удалось добавить канал через REST API")
+            channel_id = supabase_db.run(pg, rest)
+            logger.info(f"✅ Добавлен канал: {username} (ID: {channel_id})")
+            return channel_id
             
         except psycopg2.IntegrityError:
             logger.warning(f"⚠️ Канал {username} уже существует")
             raise ValueError(f"Канал {username} уже существует")
         except ValueError as ve:
-            # Если это уже ValueError (от REST API или другой валидации), просто пробрасываем
+            # ValueError от REST API (409) или другой валидации
             if "уже существует" in str(ve) or "already exists" in str(ve).lower():
                 logger.warning(f"⚠️ Канал {username} уже существует")
                 raise ValueError(f"Канал {username} уже существует")
-            else:
-                raise ve
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка добавления канала {username}: {e}")
-            
-            # Если PostgreSQL не сработал, пробуем REST API как fallback
-            if 'connection' in str(e).lower() or 'gssapi' in str(e).lower():
-                try:
-                    logger.info("📡 Fallback на REST API для добавления канала")
-                    data = {
-                        'username': username,
-                        'display_name': display_name or username,
-                        'priority': priority,
-                        'updated_at': datetime.now().isoformat()
-                    }
-                    
-                    result = supabase_db.execute_rest_query('channels', 'POST', data)
-                    if result and len(result) > 0:
-                        channel_id = result[0]['id']
-                        logger.info(f"✅ Добавлен канал через REST API fallback: {username} (ID: {channel_id})")
-                        return channel_id
-                    else:
-                        raise Exception("Не удалось добавить канал через REST API fallback")
-                except ValueError as ve:
-                    # Обрабатываем ошибки валидации от REST API
-                    if "уже существует" in str(ve) or "already exists" in str(ve).lower():
-                        logger.warning(f"⚠️ Канал {username} уже существует (REST API)")
-                        raise ValueError(f"Канал {username} уже существует")
-                    else:
-                        raise ve
-                except Exception as api_error:
-                    logger.error(f"❌ REST API fallback тоже не сработал: {api_error}")
-                    raise
-            else:
-                raise
+            raise
     
     @staticmethod
     def get_active_channels() -> List[Dict]:
         """Получение списка активных каналов по приоритету"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM channels 
+                WHERE is_active = true 
+                ORDER BY priority DESC, created_at ASC
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+        
+        def rest():
+            return RestQuery('channels').eq('is_active', True) \
+                .order('priority', desc=True).order('created_at').execute()
+        
         try:
-            # Сначала пытаемся PostgreSQL
-            conn = supabase_db.get_connection()
-            if conn:
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    SELECT * FROM channels 
-                    WHERE is_active = true 
-                    ORDER BY priority DESC, created_at ASC
-                ''')
-                
-                channels = [dict(row) for row in cursor.fetchall()]
-                logger.info(f"✅ Получено {len(channels)} каналов через PostgreSQL")
-                return channels
-            else:
-                # Используем REST API
-                logger.info("📡 Используем REST API для получения каналов")
-                result = supabase_db.execute_rest_query('channels', 'GET', filters={'is_active': 'true'})
-                
-                # Сортируем по приоритету
-                if result:
-                    result.sort(key=lambda x: (-x.get('priority', 0), x.get('created_at', '')))
-                
-                logger.info(f"✅ Получено {len(result)} каналов через REST API")
-                return result
-                
+            channels = supabase_db.run(pg, rest, idempotent=True)
+            logger.info(f"✅ Получено {len(channels)} каналов")
+            return channels
         except Exception as e:
             logger.error(f"❌ Ошибка получения каналов: {e}")
-            
-            # Fallback на REST API
-            if 'connection' in str(e).lower() or 'gssapi' in str(e).lower():
-                try:
-                    logger.info("📡 Fallback на REST API для получения каналов")
-                    result = supabase_db.execute_rest_query('channels', 'GET', filters={'is_active': 'true'})
-                    
-                    # Сортируем по приоритету
-                    if result:
-                        result.sort(key=lambda x: (-x.get('priority', 0), x.get('created_at', '')))
-                    
-                    logger.info(f"✅ Получено {len(result)} каналов через REST API fallback")
-                    return result
-                except Exception as api_error:
-                    logger.error(f"❌ REST API fallback тоже не сработал: {api_error}")
-                    return []
             return []
     
+    @staticmethod
+    def get_channel(channel_id: int) -> Optional[Dict]:
+        """Получение канала по id"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM channels WHERE id = %s', (channel_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        
+        def rest():
+            return RestQuery('channels').eq('id', channel_id).first()
+        
+        return supabase_db.run(pg, rest, idempotent=True)
+    
+    @staticmethod
+    def get_fingerprint() -> str:
+        """
+        Отпечаток списка каналов для проверки изменений без загрузки таблицы
+        
+        Все изменения каналов обновляют updated_at, удаление меняет количество.
+        """
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) AS count, MAX(updated_at) AS updated_at FROM channels')
+            row = cursor.fetchone()
+            updated_at = row['updated_at'].isoformat() if row['updated_at'] else ''
+            return f"{row['count']}:{updated_at}"
+        
+        def rest():
+            latest = RestQuery('channels').select('updated_at').order('updated_at', desc=True, nulls_last=True).first()
+            return f"{RestQuery('channels').count()}:{(latest or {}).get('updated_at') or ''}"
+        
+        return supabase_db.run(pg, rest, idempotent=True)
+    
     @staticmethod
     def delete_channel(channel_id: int) -> bool:
         """Удаление канала"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM channels WHERE id = %s', (channel_id,))
+            return cursor.rowcount > 0
+        
+        def rest():
+            return bool(supabase_db.execute_rest_query('channels', 'DELETE', filters={'id': channel_id}))
+        
         try:
-            # Сначала пытаемся PostgreSQL
-            conn = supabase_db.get_connection()
-            if conn:
-                cursor = conn.cursor()
-                
-                cursor.execute('DELETE FROM channels WHERE id = %s', (channel_id,))
-                
-                if cursor.rowcount > 0:
-                    logger.info(f"✅ Канал {channel_id} удален через PostgreSQL")
-                    return True
-                else:
-                    logger.warning(f"⚠️ Канал {channel_id} не найден для удаления")
-                    return False
+            deleted = supabase_db.run(pg, rest)
+            if deleted:
+                logger.info(f"✅ Канал {channel_id} удален")
             else:
-                # Используем REST API
-                logger.info("📡 Используем REST API для удаления канала")
-                result = supabase_db.execute_rest_query('channels', 'DELETE', filters={'id': channel_id})
-                logger.info(f"✅ Канал {channel_id} удален через REST API")
-                return True
-                
+                logger.warning(f"⚠️ Канал {channel_id} не найден для удаления")
+            return deleted
         except Exception as e:
             logger.error(f"❌ Ошибка удаления канала {channel_id}: {e}")
-            
-            # Fallback на REST API
-            if 'connection' in str(e).lower() or 'gssapi' in str(e).lower():
-                try:
-                    logger.info("📡 Fallback на REST API для удаления канала")
-                    result = supabase_db.execute_rest_query('channels', 'DELETE', filters={'id': channel_id})
-                    logger.info(f"✅ Канал {channel_id} удален через REST API fallback")
-                    return True
-                except Exception as api_error:
-                    logger.error(f"❌ REST API fallback тоже не сработал: {api_error}")
-                    raise
-            else:
-                raise
+            raise
     
     @staticmethod
     def update_channel(channel_id: int, username: str, display_name: str = None, priority: int = 0, is_active: bool = True) -> bool:
         """Обновление канала"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE channels 
+                SET username = %s, display_name = %s, priority = %s, is_active = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            ''', (username, display_name, priority, is_active, channel_id))
+            return cursor.rowcount > 0
+        
+        def rest():
+            return bool(supabase_db.execute_rest_query('channels', 'PATCH', data={
+                'username': username,
+                'display_name': display_name,
+                'priority': priority,
+                'is_active': is_active,
+                'updated_at': datetime.now().isoformat()
+            }, filters={'id': channel_id}))
+        
         try:
-            # Сначала пытаемся PostgreSQL
-            conn = supabase_db.get_connection()
-            if conn:
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    UPDATE channels 
-                    SET username = %s, display_name = %s, priority = %s, is_active = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                ''', (username, display_name, priority, is_active, channel_id))
-                
-                if cursor.rowcount > 0:
-                    logger.info(f"✅ Канал {channel_id} обновлен через PostgreSQL")
-                    return True
-                else:
-                    logger.warning(f"⚠️ Канал {channel_id} не найден для обновления")
-                    return False
+            updated = supabase_db.run(pg, rest, idempotent=True)
+            if updated:
+                logger.info(f"✅ Канал {channel_id} обновлен")
             else:
-                # Используем REST API
-                logger.info("📡 Используем REST API для обновления канала")
-                data = {
-                    'username': username,
-                    'display_name': display_name,
-                    'priority': priority,
-                    'is_active': is_active,
-                    'updated_at': 'now()'
-                }
-                result = supabase_db.execute_rest_query('channels', 'PATCH', data=data, filters={'id': channel_id})
-                logger.info(f"✅ Канал {channel_id} обновлен через REST API")
-                return True
-                
+                logger.warning(f"⚠️ Канал {channel_id} не найден для обновления")
+            return updated
         except Exception as e:
             logger.error(f"❌ Ошибка обновления канала {channel_id}: {e}")
-            
-            # Fallback на REST API
-            if 'connection' in str(e).lower() or 'gssapi' in str(e).lower():
-                try:
-                    logger.info("📡 Fallback на REST API для обновления канала")
-                    data = {
-                        'username': username,
-                        'display_name': display_name,
-                        'priority': priority,
-                        'is_active': is_active,
-                        'updated_at': 'now()'
-                    }
-                    result = supabase_db.execute_rest_query('channels', 'PATCH', data=data, filters={'id': channel_id})
-                    logger.info(f"✅ Канал {channel_id} обновлен через REST API fallback")
-                    return True
-                except Exception as api_error:
-                    logger.error(f"❌ REST API fallback тоже не сработал: {api_error}")
-                    raise
-            else:
-                raise
+            raise
 
     @staticmethod
     def toggle_channel_status(channel_id: int) -> bool:
         """Переключение статуса канала (активен/неактивен)"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE channels 
+                SET is_active = NOT is_active, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                RETURNING is_active
+            ''', (channel_id,))
+            row = cursor.fetchone()
+            return row['is_active'] if row else None
+        
+        def rest():
+            channels = RestQuery('channels').select('is_active').eq('id', channel_id).execute()
+            if not channels:
+                return None
+            new_status = not channels[0].get('is_active', True)
+            supabase_db.execute_rest_query('channels', 'PATCH', {
+                'is_active': new_status,
+                'updated_at': datetime.now().isoformat()
+            }, filters={'id': channel_id})
+            return new_status
+        
         try:
-            # Сначала получаем текущий статус
-            current_channel = None
-            
-            # Пытаемся PostgreSQL
-            conn = supabase_db.get_connection()
-            if conn:
-                cursor = conn.cursor()
-                
-                cursor.execute('SELECT is_active FROM channels WHERE id = %s', (channel_id,))
-                result = cursor.fetchone()
-                if result:
-                    current_channel = result
-                    new_status = not result['is_active']
-                    
-                    cursor.execute('''
-                        UPDATE channels 
-                        SET is_active = %s, updated_at = CURRENT_TIMESTAMP
-                        WHERE id = %s
-                    ''', (new_status, channel_id))
-                    
-                    if cursor.rowcount > 0:
-                        logger.info(f"✅ Статус канала {channel_id} изменен на {new_status} через PostgreSQL")
-                        return True
-            else:
-                # Используем REST API
-                logger.info("📡 Используем REST API для изменения статуса канала")
-                
-                # Получаем текущий статус
-                channels = supabase_db.execute_rest_query('channels', 'GET', filters={'id': channel_id})
-                if channels and len(channels) > 0:
-                    current_channel = channels[0]
-                    new_status = not current_channel.get('is_active', True)
-                    
-                    update_data = {
-                        'is_active': new_status,
-                        'updated_at': datetime.now().isoformat()
-                    }
-                    
-                    supabase_db.execute_rest_query('channels', 'PATCH', update_data, filters={'id': channel_id})
-                    logger.info(f"✅ Статус канала {channel_id} изменен на {new_status} через REST API")
-                    return True
-                    
-            if not current_channel:
+            new_status = supabase_db.run(pg, rest)
+            if new_status is None:
                 logger.warning(f"⚠️ Канал {channel_id} не найден")
                 return False
-                
+            logger.info(f"✅ Статус канала {channel_id} изменен на {new_status}")
+            return True
         except Exception as e:
             logger.error(f"❌ Ошибка изменения статуса канала {channel_id}: {e}")
-            
-            # Fallback на REST API
-            if 'connection' in str(e).lower() or 'gssapi' in str(e).lower():
-                try:
-                    logger.info("📡 Fallback на REST API для изменения статуса канала")
-                    
-                    # Получаем текущий статус
-                    channels = supabase_db.execute_rest_query('channels', 'GET', filters={'id': channel_id})
-                    if channels and len(channels) > 0:
-                        current_channel = channels[0]
-                        new_status = not current_channel.get('is_active', True)
-                        
-                        update_data = {
-                            'is_active': new_status,
-                            'updated_at': datetime.now().isoformat()
-                        }
-                        
-                        supabase_db.execute_rest_query('channels', 'PATCH', update_data, filters={'id': channel_id})
-                        logger.info(f"✅ Статус канала {channel_id} изменен на {new_status} через REST API fallback")
-                        return True
-                    else:
-                        logger.warning(f"⚠️ Канал {channel_id} не найден в fallback")
-                        return False
-                        
-                except Exception as api_error:
-                    logger.error(f"❌ REST API fallback тоже не сработал: {api_error}")
-                    raise
-            else:
-                raise
+            raise
     
     @staticmethod
     def update_last_message_id(channel_id: int, message_id: int):
         """Обновление ID последнего обработанного сообщения"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE channels 
+                SET last_message_id = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            ''', (message_id, channel_id))
+        
+        def rest():
+            supabase_db.execute_rest_query('channels', 'PATCH', {
+                'last_message_id': message_id,
+                'updated_at': datetime.now().isoformat()
+            }, filters={'id': channel_id})
+        
         try:
-            conn = supabase_db.get_connection()
-            if conn:
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    UPDATE channels 
-                    SET last_message_id = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                ''', (message_id, channel_id))
-                
-                logger.info(f"✅ Обновлен last_message_id для канала {channel_id}")
-            else:
-                # Используем REST API
-                logger.info("📡 Используем REST API для обновления last_message_id")
-                
-                update_data = {
-                    'last_message_id': message_id,
-                    'updated_at': datetime.now().isoformat()
-                }
-                
-                supabase_db.execute_rest_query('channels', 'PATCH', update_data, filters={'id': channel_id})
-                logger.info(f"✅ Обновлен last_message_id для канала {channel_id} через REST API")
-                
+            supabase_db.run(pg, rest, idempotent=True)
+            logger.info(f"✅ Обновлен last_message_id для канала {channel_id}")
         except Exception as e:
             logger.error(f"❌ Ошибка обновления last_message_id: {e}")
-            
-            # Fallback на REST API
-            if 'connection' in str(e).lower() or 'gssapi' in str(e).lower():
-                try:
-                    logger.info("📡 Fallback на REST API для обновления last_message_id")
-                    
-                    update_data = {
-                        'last_message_id': message_id,
-                        'updated_at': datetime.now().isoformat()
-                    }
-                    
-                    supabase_db.execute_rest_query('channels', 'PATCH', update_data, filters={'id': channel_id})
-                    logger.info(f"✅ Обновлен last_message_id для канала {channel_id} через REST API fallback")
-                    
-                except Exception as api_error:
-                    logger.error(f"❌ REST API fallback тоже не сработал: {api_error}")
-                    raise
-            else:
-                raise
+            raise
 
 # Функции для работы с настройками
 class SettingsDB:
     @staticmethod
-    def get_setting(key: str, default: str = None) -> Optional[str]:
-        """Получение значения настройки"""
+    def _load_all() -> Dict[str, str]:
+        """Все настройки одним запросом"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT key, value FROM settings')
+            return {row['key']: row['value'] for row in cursor.fetchall()}
+        
+        def rest():
+            result = RestQuery('settings').select('key', 'value').execute()
+            return {row['key']: row['value'] for row in result or []}
+        
+        return supabase_db.run(pg, rest, idempotent=True)
+    
+    @staticmethod
+    def _load_version() -> Optional[str]:
+        """Текущая версия настроек"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT value FROM settings WHERE key = %s', (SETTINGS_VERSION_KEY,))
+            row = cursor.fetchone()
+            return row['value'] if row else None
+        
+        def rest():
+            row = RestQuery('settings').select('value').eq('key', SETTINGS_VERSION_KEY).first()
+            return row['value'] if row else None
+        
+        return supabase_db.run(pg, rest, idempotent=True)
+    
+    @staticmethod
+    def get_all_settings() -> Dict[str, str]:
+        """Все настройки (через кеш процесса)"""
+        if settings_cache.fresh:
+            return dict(settings_cache.values)
+        
         try:
-            # Сначала пытаемся PostgreSQL
-            conn = supabase_db.get_connection()
-            if conn:
-                cursor = conn.cursor()
-                
-                cursor.execute('SELECT value FROM settings WHERE key = %s', (key,))
-                result = cursor.fetchone()
-                value = result['value'] if result else default
-                
-                logger.debug(f"✅ Настройка {key} = {value} (PostgreSQL)")
-                return value
+            if settings_cache.values is not None and settings_cache.confirm(SettingsDB._load_version()):
+                logger.debug("✅ Версия настроек не изменилась, используем кеш")
             else:
-                # Используем REST API
-                logger.debug("📡 Используем REST API для получения настройки")
-                result = supabase_db.execute_rest_query('settings', 'GET', filters={'key': key})
-                
-                if result and len(result) > 0:
-                    value = result[0]['value']
-                    logger.debug(f"✅ Настройка {key} = {value} (REST API)")
-                    return value
-                else:
-                    logger.debug(f"✅ Настройка {key} = {default} (default)")
-                    return default
-                
-        except Exception as e:
-            logger.error(f"❌ Ошибка получения настройки {key}: {e}")
+                settings_cache.store(SettingsDB._load_all())
+                logger.debug(f"✅ Загружено {len(settings_cache.values)} настроек (версия {settings_cache.version})")
+            return dict(settings_cache.values)
             
-            # Fallback на REST API
-            if 'connection' in str(e).lower() or 'gssapi' in str(e).lower():
-                try:
-                    logger.debug("📡 Fallback на REST API для получения настройки")
-                    result = supabase_db.execute_rest_query('settings', 'GET', filters={'key': key})
-                    
-                    if result and len(result) > 0:
-                        value = result[0]['value']
-                        logger.debug(f"✅ Настройка {key} = {value} (REST API fallback)")
-                        return value
-                    else:
-                        return default
-                except Exception as api_error:
-                    logger.error(f"❌ REST API fallback тоже не сработал: {api_error}")
-                    return default
-            return default
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения настроек: {e}")
+            # Устаревший кеш лучше значений по умолчанию
+            return dict(settings_cache.values or {})
+    
+    @staticmethod
+    def get_setting(key: str, default: str = None) -> Optional[str]:
+        """Получение значения настройки"""
+        value = SettingsDB.get_all_settings().get(key)
+        return value if value is not None else default
     
     @staticmethod
     def set_setting(key: str, value: str, description: str = None):
         """Установка значения настройки"""
+        SettingsDB.set_settings_many({key: value}, {key: description} if description else None)
+    
+    @staticmethod
+    def set_settings_many(values: Dict[str, str], descriptions: Dict[str, str] = None):
+        """
+        Установка нескольких настроек одним запросом
+        
+        Вместе с настройками увеличивается settings_version, чтобы другие процессы
+        перечитали кеш после своего TTL.
+        
+        Args:
+            values: {key: value}
+            descriptions: {key: description} (без описания сохраняется прежнее)
+        """
+        if not values:
+            return
+        descriptions = descriptions or {}
+        
+        def pg(conn):
+            cursor = conn.cursor()
+            execute_values(cursor, '''
+                INSERT INTO settings (key, value, description, updated_at)
+                VALUES %s
+                ON CONFLICT (key) DO UPDATE SET
+                    value = EXCLUDED.value,
+                    description = COALESCE(EXCLUDED.description, settings.description),
+                    updated_at = CURRENT_TIMESTAMP
+            ''', [(k, v, descriptions.get(k)) for k, v in values.items()],
+                template='(%s, %s, %s, CURRENT_TIMESTAMP)')
+            cursor.execute('''
+                INSERT INTO settings (key, value, description, updated_at)
+                VALUES (%s, '1', 'Счетчик изменений настроек (сброс кеша)', CURRENT_TIMESTAMP)
+                ON CONFLICT (key) DO UPDATE SET
+                    value = (COALESCE(NULLIF(settings.value, ''), '0')::bigint + 1)::text,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (SETTINGS_VERSION_KEY,))
+        
+        def rest():
+            # Upsert массивом; версию увеличиваем от последней известной
+            now = datetime.now().isoformat()
+            version = SettingsDB._load_version()
+            rows = [{'key': k, 'value': v, 'updated_at': now} for k, v in values.items()]
+            rows.append({'key': SETTINGS_VERSION_KEY, 'value': str(int(version or 0) + 1), 'updated_at': now})
+            upsert = {'Prefer': 'return=minimal,resolution=merge-duplicates'}
+            supabase_db.execute_rest_query('settings', 'POST', data=rows,
+                                           params={'on_conflict': 'key'}, headers=upsert)
+            if descriptions:
+                supabase_db.execute_rest_query('settings', 'POST', data=[
+                    {'key': k, 'value': values[k], 'description': d}
+                    for k, d in descriptions.items() if k in values
+                ], params={'on_conflict': 'key'}, headers=upsert)
+        
         try:
-            # Сначала пытаемся PostgreSQL
-            conn = supabase_db.get_connection()
-            if conn:
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    INSERT INTO settings (key, value, description, updated_at)
-                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
-                    ON CONFLICT (key) DO UPDATE SET
-                        value = EXCLUDED.value,
-                        description = COALESCE(EXCLUDED.description, settings.description),
-                        updated_at = CURRENT_TIMESTAMP
-                ''', (key, value, description))
-                
-                logger.info(f"✅ Настройка {key} установлена в {value} (PostgreSQL)")
-            else:
-                # Используем REST API - сначала пытаемся обновить, потом создать
-                logger.info("📡 Используем REST API для установки настройки")
-                
-                # Проверяем, существует ли настройка
-                existing = supabase_db.execute_rest_query('settings', 'GET', filters={'key': key})
-                
-                data = {
-                    'key': key,
-                    'value': value,
-                    'description': description,
-                    'updated_at': datetime.now().isoformat()
-                }
-                
-                if existing and len(existing) > 0:
-                    # Обновляем существующую
-                    update_data = {
-                        'value': value,
-                        'updated_at': datetime.now().isoformat()
-                    }
-                    if description:
-                        update_data['description'] = description
-                    
-                    supabase_db.execute_rest_query('settings', 'PATCH', update_data, filters={'key': key})
-                    logger.info(f"✅ Настройка {key} обновлена в {value} (REST API)")
-                else:
-                    # Создаем новую
-                    supabase_db.execute_rest_query('settings', 'POST', data)
-                    logger.info(f"✅ Настройка {key} создана в {value} (REST API)")
-            
+            supabase_db.run(pg, rest, transaction=True, idempotent=True)
+            logger.info(f"✅ Настройки {', '.join(values)} сохранены")
         except Exception as e:
-            logger.error(f"❌ Ошибка установки настройки {key}: {e}")
-            
-            # Fallback на REST API
-            if 'connection' in str(e).lower() or 'gssapi' in str(e).lower():
-                try:
-                    logger.info("📡 Fallback на REST API для установки настройки")
-                    
-                    # Проверяем, существует ли настройка
-                    existing = supabase_db.execute_rest_query('settings', 'GET', filters={'key': key})
-                    
-                    data = {
-                        'key': key,
-                        'value': value,
-                        'description': description,
-                        'updated_at': datetime.now().isoformat()
-                    }
-                    
-                    if existing and len(existing) > 0:
-                        # Обновляем существующую
-                        update_data = {
-                            'value': value,
-                            'updated_at': datetime.now().isoformat()
-                        }
-                        if description:
-                            update_data['description'] = description
-                        
-                        supabase_db.execute_rest_query('settings', 'PATCH', update_data, filters={'key': key})
-                        logger.info(f"✅ Настройка {key} обновлена в {value} (REST API fallback)")
-                    else:
-                        # Создаем новую
-                        supabase_db.execute_rest_query('settings', 'POST', data)
-                        logger.info(f"✅ Настройка {key} создана в {value} (REST API fallback)")
-                        
-                except Exception as api_error:
-                    logger.error(f"❌ REST API fallback тоже не сработал: {api_error}")
-                    raise
-            else:
-                raise
+            logger.error(f"❌ Ошибка установки настроек {', '.join(values)}: {e}")
+            raise
+        finally:
+            settings_cache.invalidate()
 
 # Функции для работы с обработанными сообщениями
 class ProcessedMessagesDB:
     @staticmethod
     def is_message_processed(channel_id: int, message_id: int) -> bool:
         """Проверка, было ли сообщение уже обработано"""
-        try:
-            conn = supabase_db.get_connection()
-            if conn is None:
-                # Используем REST API fallback
-                try:
-                    result = supabase_db.execute_rest_query(
-                        'processed_messages', 'GET', 
-                        filters={'channel_id': channel_id, 'message_id': message_id}
-                    )
-                    return len(result) > 0 if result else False
-                except Exception as api_error:
-                    logger.error(f"❌ REST API fallback failed for message check: {api_error}")
-                    return False
-            
+        def pg(conn):
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT 1 FROM processed_messages 
                 WHERE channel_id = %s AND message_id = %s
             ''', (channel_id, message_id))
-            
-            result = cursor.fetchone()
-            return result is not None
-            
+            return cursor.fetchone() is not None
+        
+        def rest():
+            return RestQuery('processed_messages').select('id') \
+                .eq('channel_id', channel_id).eq('message_id', message_id).first() is not None
+        
+        try:
+            return supabase_db.run(pg, rest, idempotent=True)
         except Exception as e:
             logger.error(f"❌ Ошибка проверки сообщения: {e}")
             return False
@@ -897,133 +1008,281 @@ class ProcessedMessagesDB:
                              message_text: str = None, summary: str = None) -> int:
         """Отметка сообщения как обработанного"""
         try:
-            conn = supabase_db.get_connection()
-            if conn is None:
-                # Используем REST API fallback
-                try:
-                    data = {
-                        'channel_id': channel_id,
-                        'message_id': message_id,
-                        'message_text': message_text,
-                        'summary': summary,
-                        'processed_at': datetime.now().isoformat()
-                    }
-                    result = supabase_db.execute_rest_query('processed_messages', 'POST', data=data)
-                    if result and len(result) > 0:
-                        record_id = result[0].get('id', 0)
-                        logger.info(f"✅ Сообщение {message_id} отмечено через REST API (ID: {record_id})")
-                        return record_id
-                    else:
-                        logger.warning(f"⚠️ REST API не вернул ID для сообщения {message_id}")
-                        return 0
-                except Exception as api_error:
-                    logger.error(f"❌ REST API fallback failed for marking message: {api_error}")
-                    return 0
+            ids = ProcessedMessagesDB.mark_processed_many([{
+                'channel_id': channel_id,
+                'message_id': message_id,
+                'message_text': message_text,
+                'summary': summary
+            }])
+            record_id = ids[0] or 0
+            logger.info(f"✅ Сообщение {message_id} отмечено как обработанное (ID: {record_id})")
+            return record_id
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка отметки сообщения: {e}")
+            raise
+
+    @staticmethod
+    def mark_processed_many(messages: List[Dict], conn=None, buffer_on_failure: bool = True) -> List[Optional[int]]:
+        """
+        Отметка пачки сообщений как обработанных одним запросом
+        
+        Args:
+            messages: Словари {'channel_id', 'message_id', 'message_text', 'summary'}
+            conn: Подключение открытой транзакции (см. PendingNewsDB.add_pending_news_many)
+            buffer_on_failure: Если база недоступна, сохранить отметки в локальный буфер
+                               (см. write_buffer) вместо исключения; ошибки данных пробрасываются
             
+        Returns:
+            id записей processed_messages в порядке входных сообщений (None - не записано)
+        """
+        if not messages:
+            return []
+        
+        keys = [(m['channel_id'], m['message_id']) for m in messages]
+        # ON CONFLICT DO UPDATE не обновляет строку дважды за запрос - повторы схлопываем (последний побеждает)
+        messages = list({key: m for key, m in zip(keys, messages)}.values())
+        
+        def pg(conn):
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO processed_messages 
-                (channel_id, message_id, message_text, summary, processed_at)
-                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+            rows = execute_values(cursor, '''
+                INSERT INTO processed_messages (channel_id, message_id, message_text, summary, processed_at)
+                VALUES %s
                 ON CONFLICT (channel_id, message_id) DO UPDATE SET
                     message_text = EXCLUDED.message_text,
                     summary = EXCLUDED.summary,
                     processed_at = CURRENT_TIMESTAMP
-                RETURNING id
-            ''', (channel_id, message_id, message_text, summary))
-            
-            result = cursor.fetchone()
-            record_id = result['id']
-            logger.info(f"✅ Сообщение {message_id} отмечено как обработанное (ID: {record_id})")
-            return record_id
-            
+                RETURNING channel_id, message_id, id
+            ''', [(m['channel_id'], m['message_id'], m.get('message_text'), m.get('summary')) for m in messages],
+                template='(%s, %s, %s, %s, CURRENT_TIMESTAMP)', fetch=True)
+            return {(row['channel_id'], row['message_id']): row['id'] for row in rows}
+        
+        def rest():
+            # Один POST с массивом, дубли обновляются
+            now = datetime.now().isoformat()
+            result = supabase_db.execute_rest_query('processed_messages', 'POST', data=[
+                {
+                    'channel_id': m['channel_id'],
+                    'message_id': m['message_id'],
+                    'message_text': m.get('message_text'),
+                    'summary': m.get('summary'),
+                    'processed_at': now
+                }
+                for m in messages
+            ], params={'on_conflict': 'channel_id,message_id'},
+               headers={'Prefer': 'return=representation,resolution=merge-duplicates'})
+            return {(row['channel_id'], row['message_id']): row['id'] for row in result or []}
+        
+        if conn is not None:
+            ids = pg(conn)
+        else:
+            try:
+                ids = supabase_db.run(pg, rest, idempotent=True)
+            except Exception as e:
+                # В буфер - только при недоступности базы; отвергнутые данные повтор не исправит
+                if not buffer_on_failure or not is_unavailable_error(e):
+                    raise
+                logger.error(f"❌ Ошибка отметки сообщений: {e}")
+                get_write_buffer().append(PROCESSED_MESSAGES, messages)
+                return [None] * len(messages)
+        return [ids.get(key) for key in keys]
+
+    @staticmethod
+    def prune_text(days_old: int = 30, batch_size: int = RETENTION_BATCH_SIZE,
+                   pause: float = RETENTION_BATCH_PAUSE) -> int:
+        """
+        Удаление текста и саммари у сообщений старше days_old дней
+
+        Строка с (channel_id, message_id) остается - по ней работает дедупликация,
+        а на ней держатся пересчет статистики (processed_at). Очистка идет пачками.
+        """
+        def pg(conn):
+            return run_in_batches(conn, '''
+                UPDATE processed_messages SET message_text = NULL, summary = NULL
+                WHERE id IN (
+                    SELECT id FROM processed_messages
+                    WHERE processed_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                      AND (message_text IS NOT NULL OR summary IS NOT NULL)
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            ''', days_old, batch_size, pause)
+
+        def rest():
+            logger.warning("⚠️ PostgreSQL недоступен, очистка текста processed_messages пропущена")
+            return 0
+
+        try:
+            pruned = supabase_db.run(pg, rest, idempotent=True)
+            logger.info(f"🧹 Текст удален у {pruned} обработанных сообщений старше {days_old} дн.")
+            return pruned
         except Exception as e:
-            logger.error(f"❌ Ошибка отметки сообщения: {e}")
-            raise
+            logger.error(f"❌ Ошибка очистки текста обработанных сообщений: {e}")
+            return 0
 
 # Функции для работы с накопленными новостями
 class PendingNewsDB:
     @staticmethod
     def add_pending_news(channel_id: int, message_id: int, channel_name: str, 
                         message_text: str, summary: str, relevance_score: int = 5,
-                        scheduled_for: datetime = None, digest_type: str = None) -> int:
+                        scheduled_for: datetime = None, digest_type: str = None,
+                        views: int = 0, forwards: int = 0) -> int:
         """Добавление новости в очередь на публикацию"""
-        try:
-            conn = supabase_db.get_connection()
-            if conn is None:
-                # REST API fallback
-                data = {
-                    'channel_id': channel_id,
-                    'message_id': message_id,
-                    'channel_name': channel_name,
-                    'message_text': message_text,
-                    'summary': summary,
-                    'relevance_score': relevance_score,
-                    'collected_at': datetime.now().isoformat(),
-                    'scheduled_for': scheduled_for.date().isoformat() if scheduled_for else datetime.now().date().isoformat(),
-                    'digest_type': digest_type,
-                    'is_approved': True,
-                    'is_deleted': False
+        outcome = PendingNewsDB.add_pending_news_many([{
+            'channel_id': channel_id,
+            'message_id': message_id,
+            'channel_name': channel_name,
+            'message_text': message_text,
+            'summary': summary,
+            'relevance_score': relevance_score,
+            'scheduled_for': scheduled_for,
+            'digest_type': digest_type,
+            'views': views,
+            'forwards': forwards
+        }], mark_processed=False)[0]
+        return outcome['id'] or 0
+    
+    @staticmethod
+    def add_pending_news_many(news: List[Dict], mark_processed: bool = True,
+                              buffer_on_failure: bool = True) -> List[Dict]:
+        """
+        Добавление пачки новостей в очередь одним запросом
+        
+        Вместе с очередью (mark_processed=True) сообщения отмечаются обработанными -
+        на PostgreSQL обе записи идут в одной транзакции.
+        
+        Args:
+            news: Словари с полями add_pending_news (channel_id, message_id, channel_name,
+                  message_text, summary, relevance_score, scheduled_for, digest_type, views, forwards)
+            buffer_on_failure: Если база недоступна, сохранить пачку в локальный буфер
+                               (см. write_buffer) - она будет дослана позже
+            
+        Returns:
+            Результат по каждой новости в порядке входа:
+            {'channel_id', 'message_id', 'id', 'status': 'inserted' | 'duplicate' | 'buffered' | 'error'}
+            (error - база недоступна, а буфер отключен). Ошибки данных пробрасываются.
+        """
+        if not news:
+            return []
+        
+        keys = [(n['channel_id'], n['message_id']) for n in news]
+        
+        def outcomes(inserted: Dict, status_missing: str) -> List[Dict]:
+            return [
+                {
+                    'channel_id': key[0],
+                    'message_id': key[1],
+                    'id': inserted.get(key),
+                    'status': 'inserted' if key in inserted else status_missing
                 }
-                result = supabase_db.execute_rest_query('pending_news', 'POST', data=data)
-                return result[0].get('id', 0) if result else 0
-                
+                for key in keys
+            ]
+        
+        def scheduled(n: Dict):
+            value = n.get('scheduled_for') or datetime.now()
+            return value.date() if isinstance(value, datetime) else value
+        
+        processed = [
+            {'channel_id': n['channel_id'], 'message_id': n['message_id'],
+             'message_text': n.get('message_text'), 'summary': n.get('summary')}
+            for n in news
+        ]
+        
+        def pg(conn):
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO pending_news 
-                (channel_id, message_id, channel_name, message_text, summary, 
-                 relevance_score, scheduled_for, digest_type)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            rows = execute_values(cursor, '''
+                INSERT INTO pending_news
+                (channel_id, message_id, channel_name, message_text, summary,
+                 relevance_score, scheduled_for, digest_type, views, forwards)
+                VALUES %s
                 ON CONFLICT (channel_id, message_id) DO NOTHING
-                RETURNING id
-            ''', (channel_id, message_id, channel_name, message_text, summary,
-                  relevance_score, scheduled_for or datetime.now().date(), digest_type))
+                RETURNING channel_id, message_id, id
+            ''', [
+                (n['channel_id'], n['message_id'], n['channel_name'], n.get('message_text'), n.get('summary'),
+                 n.get('relevance_score', 5), scheduled(n), n.get('digest_type'),
+                 n.get('views') or 0, n.get('forwards') or 0)
+                for n in news
+            ], fetch=True)
             
-            result = cursor.fetchone()
-            return result['id'] if result else 0
+            if mark_processed:
+                ProcessedMessagesDB.mark_processed_many(processed, conn)
             
+            return {(row['channel_id'], row['message_id']): row['id'] for row in rows}
+        
+        def rest():
+            # Массив одним POST, дубли пропускаются.
+            # Две таблицы пишутся разными запросами, оба идемпотентны
+            now = datetime.now().isoformat()
+            result = supabase_db.execute_rest_query('pending_news', 'POST', data=[
+                {
+                    'channel_id': n['channel_id'],
+                    'message_id': n['message_id'],
+                    'channel_name': n['channel_name'],
+                    'message_text': n.get('message_text'),
+                    'summary': n.get('summary'),
+                    'relevance_score': n.get('relevance_score', 5),
+                    'collected_at': now,
+                    'scheduled_for': scheduled(n).isoformat(),
+                    'digest_type': n.get('digest_type'),
+                    'is_approved': True,
+                    'is_deleted': False,
+                    'views': n.get('views') or 0,
+                    'forwards': n.get('forwards') or 0
+                }
+                for n in news
+            ], params={'on_conflict': 'channel_id,message_id'},
+               headers={'Prefer': 'return=representation,resolution=ignore-duplicates'})
+            if mark_processed:
+                ProcessedMessagesDB.mark_processed_many(processed, buffer_on_failure=buffer_on_failure)
+            return {(row['channel_id'], row['message_id']): row['id'] for row in result or []}
+        
+        try:
+            return outcomes(supabase_db.run(pg, rest, transaction=True, idempotent=True), 'duplicate')
         except Exception as e:
-            logger.error(f"❌ Ошибка добавления pending news: {e}")
-            return 0
+            logger.error(f"❌ Ошибка пакетного добавления pending news: {e}")
+            if not is_unavailable_error(e):
+                # Ошибка данных (нарушение ограничения и т.п.) - в буфере пачка застряла бы навсегда
+                raise
+            if buffer_on_failure:
+                get_write_buffer().append(PENDING_NEWS, news, mark_processed=mark_processed)
+                return outcomes({}, 'buffered')
+            return outcomes({}, 'error')
     
     @staticmethod
     def get_pending_news(scheduled_for: datetime = None, digest_type: str = None, 
                         include_deleted: bool = False) -> List[Dict]:
         """Получение накопленных новостей для дайджеста"""
-        try:
-            filters = {}
-            if scheduled_for:
-                filters['scheduled_for'] = scheduled_for.date().isoformat()
-            if digest_type:
-                filters['digest_type'] = digest_type
-            if not include_deleted:
-                filters['is_deleted'] = False
-                
-            conn = supabase_db.get_connection()
-            if conn is None:
-                # REST API fallback
-                result = supabase_db.execute_rest_query('pending_news', 'GET', filters=filters)
-                return sorted(result, key=lambda x: x.get('relevance_score', 0), reverse=True) if result else []
-                
+        def pg(conn):
             cursor = conn.cursor()
-            query = '''
-                SELECT * FROM pending_news 
-                WHERE is_deleted = false
-            '''
+            query = 'SELECT * FROM pending_news WHERE true'
             params = []
             
+            if not include_deleted:
+                query += ' AND is_deleted = false'
             if scheduled_for:
                 query += ' AND scheduled_for = %s'
                 params.append(scheduled_for.date())
             if digest_type:
                 query += ' AND digest_type = %s'
                 params.append(digest_type)
-                
+            
             query += ' ORDER BY relevance_score DESC, collected_at DESC'
             
             cursor.execute(query, params)
             return [dict(row) for row in cursor.fetchall()]
-            
+        
+        def rest():
+            query = RestQuery('pending_news')
+            if not include_deleted:
+                query.eq('is_deleted', False)
+            if scheduled_for:
+                query.eq('scheduled_for', scheduled_for.date())
+            if digest_type:
+                query.eq('digest_type', digest_type)
+            return query.order('relevance_score', desc=True).order('collected_at', desc=True).execute()
+        
+        try:
+            return supabase_db.run(pg, rest, idempotent=True)
         except Exception as e:
             logger.error(f"❌ Ошибка получения pending news: {e}")
             return []
@@ -1031,15 +1290,7 @@ class PendingNewsDB:
     @staticmethod
     def delete_pending_news(news_id: int) -> bool:
         """Мягкое удаление новости из очереди"""
-        try:
-            conn = supabase_db.get_connection()
-            if conn is None:
-                # REST API fallback
-                data = {'is_deleted': True}
-                result = supabase_db.execute_rest_query(f'pending_news', 'PATCH', data=data, 
-                                                       filters={'id': news_id})
-                return bool(result)
-                
+        def pg(conn):
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE pending_news 
@@ -1047,39 +1298,605 @@ class PendingNewsDB:
                 WHERE id = %s
                 RETURNING id
             ''', (news_id,))
-            
-            result = cursor.fetchone()
-            return result is not None
-            
+            return cursor.fetchone() is not None
+        
+        def rest():
+            return bool(supabase_db.execute_rest_query('pending_news', 'PATCH', data={'is_deleted': True},
+                                                       filters={'id': news_id}))
+        
+        try:
+            return supabase_db.run(pg, rest)
         except Exception as e:
             logger.error(f"❌ Ошибка удаления pending news: {e}")
             return False
     
-    @staticmethod 
-    def clear_old_pending_news(days_old: int = 7) -> int:
-        """Очистка старых накопленных новостей"""
+    @staticmethod
+    def update_engagement(updates: List[Dict]) -> int:
+        """
+        Обновление просмотров и репостов пачкой
+        
+        Args:
+            updates: Список словарей {'id', 'views', 'forwards'}
+        """
+        if not updates:
+            return 0
+        
+        def pg(conn):
+            cursor = conn.cursor()
+            execute_values(cursor, '''
+                UPDATE pending_news AS p SET
+                    views = v.views,
+                    forwards = v.forwards,
+                    engagement_updated_at = CURRENT_TIMESTAMP
+                FROM (VALUES %s) AS v(id, views, forwards)
+                WHERE p.id = v.id
+            ''', [(item['id'], item['views'], item['forwards']) for item in updates])
+            return cursor.rowcount
+        
+        def rest():
+            # PostgREST не умеет UPDATE из VALUES, обновляем по одной
+            for item in updates:
+                supabase_db.execute_rest_query('pending_news', 'PATCH', data={
+                    'views': item['views'],
+                    'forwards': item['forwards'],
+                    'engagement_updated_at': datetime.now().isoformat()
+                }, filters={'id': item['id']})
+            return len(updates)
+        
         try:
-            conn = supabase_db.get_connection()
-            cutoff_date = (datetime.now() - timedelta(days=days_old)).date()
-            
-            if conn is None:
-                # REST API не поддерживает bulk delete, пропускаем
-                return 0
-                
+            return supabase_db.run(pg, rest, idempotent=True)
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления вовлеченности pending news: {e}")
+            return 0
+    
+    @staticmethod
+    def clear_old_pending_news(days_old: int = 14, batch_size: int = RETENTION_BATCH_SIZE,
+                               pause: float = RETENTION_BATCH_PAUSE) -> int:
+        """Удаление накопленных новостей старше days_old дней пачками (см. run_in_batches)"""
+        def pg(conn):
+            return run_in_batches(conn, '''
+                DELETE FROM pending_news
+                WHERE id IN (
+                    SELECT id FROM pending_news
+                    WHERE collected_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            ''', days_old, batch_size, pause)
+        
+        def rest():
+            # REST API не удаляет пачками с паузами, очистка дождется PostgreSQL
+            logger.warning("⚠️ PostgreSQL недоступен, очистка pending_news пропущена")
+            return 0
+        
+        try:
+            deleted = supabase_db.run(pg, rest, idempotent=True)
+            logger.info(f"🧹 Удалено {deleted} накопленных новостей старше {days_old} дн.")
+            return deleted
+        except Exception as e:
+            logger.error(f"❌ Ошибка очистки старых pending news: {e}")
+            return 0
+
+# Функции для работы с пулом Telegram сессий
+class TelegramSessionsDB:
+    @staticmethod
+    def get_active_sessions() -> List[Dict]:
+        """Получение активных StringSession для пула чтения каналов"""
+        def pg(conn):
             cursor = conn.cursor()
             cursor.execute('''
-                DELETE FROM pending_news 
-                WHERE scheduled_for < %s OR collected_at < %s
-                RETURNING id
-            ''', (cutoff_date, cutoff_date))
-            
-            deleted = cursor.fetchall()
-            return len(deleted)
-            
+                SELECT name, session_string FROM telegram_sessions 
+                WHERE is_active = true 
+                ORDER BY name
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+        
+        def rest():
+            return RestQuery('telegram_sessions').select('name', 'session_string') \
+                .eq('is_active', True).order('name').execute()
+        
+        try:
+            return supabase_db.run(pg, rest, idempotent=True)
         except Exception as e:
-            logger.error(f"❌ Ошибка очистки старых pending news: {e}")
+            logger.error(f"❌ Ошибка получения Telegram сессий: {e}")
+            return []
+    
+    @staticmethod
+    def get_session(name: str) -> Optional[str]:
+        """Получение StringSession по имени (независимо от участия в пуле)"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT session_string FROM telegram_sessions WHERE name = %s', (name,))
+            row = cursor.fetchone()
+            return row['session_string'] if row else None
+        
+        def rest():
+            row = RestQuery('telegram_sessions').select('session_string').eq('name', name).first()
+            return row['session_string'] if row else None
+        
+        try:
+            return supabase_db.run(pg, rest, idempotent=True)
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения Telegram сессии {name}: {e}")
+            return None
+    
+    @staticmethod
+    def save_session(name: str, session_string: str, is_active: bool = True) -> bool:
+        """
+        Сохранение StringSession (is_active учитывается только при создании записи,
+        чтобы не возвращать в пул отключенные вручную сессии)
+        """
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO telegram_sessions (name, session_string, is_active)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (name) DO UPDATE SET
+                    session_string = EXCLUDED.session_string,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (name, session_string, is_active))
+            return True
+        
+        def rest():
+            existing = RestQuery('telegram_sessions').select('name').eq('name', name).first()
+            if existing:
+                result = supabase_db.execute_rest_query('telegram_sessions', 'PATCH', data={
+                    'session_string': session_string,
+                    'updated_at': datetime.now().isoformat()
+                }, filters={'name': name})
+            else:
+                result = supabase_db.execute_rest_query('telegram_sessions', 'POST', data={
+                    'name': name,
+                    'session_string': session_string,
+                    'is_active': is_active
+                })
+            return result is not None
+        
+        try:
+            return supabase_db.run(pg, rest, idempotent=True)
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения Telegram сессии {name}: {e}")
+            return False
+
+# Журнал запусков (запись ведет AsyncRunLogsDB в цикле сбора)
+class RunLogsDB:
+    @staticmethod
+    def get_recent(limit: int = 50) -> List[Dict]:
+        """Последние запуски (новые первыми) для дашборда и страницы логов"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM run_logs ORDER BY started_at DESC LIMIT %s', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+
+        def rest():
+            return RestQuery('run_logs').order('started_at', desc=True).limit(limit).execute()
+
+        return supabase_db.run(pg, rest, idempotent=True) or []
+
+    @staticmethod
+    def get_cycle_duration(fraction: float = 0.9, runs: int = 20) -> Optional[float]:
+        """
+        Перцентиль fraction длительности последних runs полных циклов сбора, сек
+        (функция collect_cycle_duration, миграция 009); None - завершенных циклов еще нет
+        """
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT collect_cycle_duration(%s, %s) AS duration', (fraction, runs))
+            return cursor.fetchone()['duration']
+
+        def rest():
+            return supabase_db.execute_rest_query('rpc/collect_cycle_duration', 'POST', data={
+                'p_fraction': fraction,
+                'p_runs': runs
+            })
+
+        duration = supabase_db.run(pg, rest, idempotent=True) or {}
+        return duration.get('seconds') if duration.get('runs') else None
+
+# Материализованная статистика дашборда (таблицы и функции - миграция 001 в src/migrations.py)
+class StatsDB:
+    # Пустая статистика, если сводка недоступна
+    EMPTY = {
+        'active_channels': 0,
+        'total_channels': 0,
+        'recent_messages': 0,
+        'published_news': 0,
+        'successful_runs_24h': 0,
+        'failed_runs_24h': 0,
+        'news_published_24h': 0,
+        'messages_collected_24h': 0,
+        'last_run': None
+    }
+
+    @staticmethod
+    def get_dashboard_stats() -> Dict[str, Any]:
+        """
+        Статистика дашборда одним чтением: строка dashboard_stats и сумма stats_hourly
+        за последние сутки (окно округляется до часа)
+        """
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT get_dashboard_stats() AS stats')
+            row = cursor.fetchone()
+            return row['stats'] if row else None
+
+        def rest():
+            return supabase_db.execute_rest_query('rpc/get_dashboard_stats', 'POST', data={})
+
+        stats = supabase_db.run(pg, rest, idempotent=True)
+        return {**StatsDB.EMPTY, **(stats or {})}
+
+    @staticmethod
+    def record(messages_processed: int = 0, messages_collected: int = 0, news_published: int = 0,
+               runs_completed: int = 0, runs_failed: int = 0, run_id: int = None):
+        """Прибавка к счетчикам текущего часа; run_id - запуск, который показывать последним"""
+        args = (messages_processed, messages_collected, news_published, runs_completed, runs_failed, run_id)
+
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT record_stats(%s, %s, %s, %s, %s, %s)', args)
+
+        def rest():
+            supabase_db.execute_rest_query('rpc/record_stats', 'POST', data=record_stats_payload(*args))
+
+        try:
+            supabase_db.run(pg, rest)
+        except Exception as e:
+            # Статистика не должна ломать сбор; расхождение исправит repair
+            logger.warning(f"⚠️ Не удалось обновить статистику дашборда: {e}")
+
+    @staticmethod
+    def repair(days: int = 7) -> bool:
+        """Пересчет счетчиков за последние days дней из processed_messages, run_logs и channels"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT repair_dashboard_stats(%s)', (days,))
+
+        def rest():
+            supabase_db.execute_rest_query('rpc/repair_dashboard_stats', 'POST', data={'p_days': days})
+
+        try:
+            supabase_db.run(pg, rest, transaction=True, idempotent=True)
+            logger.info(f"✅ Статистика дашборда пересчитана за {days} дн.")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка пересчета статистики дашборда: {e}")
+            return False
+
+# Временные ряды конвейера по каналам (таблицы и функции - миграция 001 в src/migrations.py)
+class ChannelStatsDB:
+    @staticmethod
+    def record_many(rows: List[Dict]):
+        """Прибавка счетчиков PipelineMetrics.rows() к строкам текущего часа"""
+        if not rows:
+            return
+
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT record_channel_stats(%s::jsonb)', (json.dumps(rows),))
+
+        def rest():
+            supabase_db.execute_rest_query('rpc/record_channel_stats', 'POST', data={'p_rows': rows})
+
+        try:
+            supabase_db.run(pg, rest)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось записать статистику каналов: {e}")
+
+    @staticmethod
+    def get_daily_series(days: int = 90, channel_id: int = None) -> List[Dict]:
+        """Дневные суммы за последние days дней (дни без данных отсутствуют)"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM get_channel_stats_series(%s, %s)', (days, channel_id))
+            return [dict(row) for row in cursor.fetchall()]
+
+        def rest():
+            return supabase_db.execute_rest_query('rpc/get_channel_stats_series', 'POST',
+                                                  data={'p_days': days, 'p_channel_id': channel_id})
+
+        return supabase_db.run(pg, rest, idempotent=True)
+
+    @staticmethod
+    def compact(keep_days: int = 30) -> int:
+        """Свертка почасовых строк старше keep_days дней в дневные"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT compact_channel_stats(%s) AS compacted', (keep_days,))
+            return cursor.fetchone()['compacted']
+
+        def rest():
+            return supabase_db.execute_rest_query('rpc/compact_channel_stats', 'POST', data={'p_keep_days': keep_days})
+
+        try:
+            compacted = supabase_db.run(pg, rest, idempotent=True) or 0
+            logger.info(f"🗜️ Статистика каналов: {compacted} дневных строк после свертки")
+            return compacted
+        except Exception as e:
+            logger.error(f"❌ Ошибка свертки статистики каналов: {e}")
+            return 0
+
+# Полнотекстовый поиск по обработанным сообщениям (функция search_news, миграция 004)
+class SearchDB:
+    # Маркеры совпадений в headline (см. ts_headline в search_news)
+    HIGHLIGHT_START = '⟦'
+    HIGHLIGHT_STOP = '⟧'
+
+    @staticmethod
+    def encode_cursor(row: Dict) -> str:
+        """Курсор следующей страницы: ранг и id последней строки"""
+        return f"{row['rank']!r}:{row['id']}"
+
+    @staticmethod
+    def decode_cursor(cursor: Optional[str]):
+        """(rank, id) из курсора; некорректный курсор - первая страница"""
+        if not cursor:
+            return None, None
+        try:
+            rank, row_id = cursor.rsplit(':', 1)
+            return float(rank), int(row_id)
+        except ValueError:
+            return None, None
+
+    @staticmethod
+    def search(query: str, limit: int = 20, cursor: str = None,
+               days: int = None, channel_id: int = None) -> Dict[str, Any]:
+        """
+        Поиск по саммари и тексту (russian, синтаксис websearch: "фраза", OR, -исключение)
+
+        Returns:
+            {'results': [...], 'next_cursor': str | None, 'truncated': bool}; строки в порядке
+            релевантности. truncated - совпадений больше SEARCH_MAX_CANDIDATES: ранжировались
+            только самые свежие, более старые находятся фильтрами days/channel_id или точнее запросом
+        """
+        query = (query or '').strip()
+        if not query:
+            return {'results': [], 'next_cursor': None, 'truncated': False}
+        after_rank, after_id = SearchDB.decode_cursor(cursor)
+        # Строка сверх limit показывает, есть ли следующая страница
+        args = (query, limit + 1, after_rank, after_id, days, channel_id)
+
+        def pg(conn):
+            cur = conn.cursor()
+            cur.execute('SELECT * FROM search_news(%s, %s, %s, %s, %s, %s)', args)
+            return [dict(row) for row in cur.fetchall()]
+
+        def rest():
+            return supabase_db.execute_rest_query('rpc/search_news', 'POST', data=dict(zip(
+                ('p_query', 'p_limit', 'p_after_rank', 'p_after_id', 'p_days', 'p_channel_id'), args
+            ))) or []
+
+        rows = supabase_db.run(pg, rest, idempotent=True)
+        return {
+            'results': rows[:limit],
+            'next_cursor': SearchDB.encode_cursor(rows[limit - 1]) if len(rows) > limit else None,
+            'truncated': bool(rows and rows[0].get('truncated'))
+        }
+
+# Срабатывания планировщика (таблица scheduler_fires, миграция 006)
+class SchedulerFiresDB:
+    @staticmethod
+    def claim(job: str, slot: datetime) -> bool:
+        """
+        Захват слота задания: True - слот еще не запускался и теперь принадлежит вызывающему
+
+        Первичный ключ (job, slot) делает захват атомарным между процессами и перезапусками.
+        """
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO scheduler_fires (job, slot) VALUES (%s, %s)
+                ON CONFLICT (job, slot) DO NOTHING
+                RETURNING job
+            ''', (job, slot))
+            return cursor.fetchone() is not None
+
+        def rest():
+            result = supabase_db.execute_rest_query('scheduler_fires', 'POST', data={
+                'job': job,
+                'slot': slot.isoformat()
+            }, params={'on_conflict': 'job,slot'},
+               headers={'Prefer': 'return=representation,resolution=ignore-duplicates'})
+            return bool(result)
+
+        return supabase_db.run(pg, rest)
+
+    @staticmethod
+    def finish(job: str, slot: datetime, status: str, error: str = None):
+        """Итог срабатывания: completed, failed или skipped"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE scheduler_fires SET status = %s, error = %s, finished_at = CURRENT_TIMESTAMP
+                WHERE job = %s AND slot = %s
+            ''', (status, error, job, slot))
+
+        def rest():
+            supabase_db.execute_rest_query('scheduler_fires', 'PATCH', data={
+                'status': status,
+                'error': error,
+                'finished_at': datetime.now().astimezone().isoformat()
+            }, filters={'job': job, 'slot': slot.isoformat()})
+
+        try:
+            supabase_db.run(pg, rest, idempotent=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось записать итог {job} {slot}: {e}")
+
+    @staticmethod
+    def prune(days_old: int = 30) -> int:
+        """Удаление записей о срабатываниях старше days_old дней"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM scheduler_fires WHERE slot < CURRENT_TIMESTAMP - make_interval(days => %s)
+            ''', (days_old,))
+            return cursor.rowcount
+
+        def rest():
+            cutoff = (datetime.now().astimezone() - timedelta(days=days_old)).isoformat()
+            supabase_db.execute_rest_query('scheduler_fires', 'DELETE', params={'slot': f'lt.{cutoff}'})
             return 0
 
+        try:
+            return supabase_db.run(pg, rest, idempotent=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось очистить scheduler_fires: {e}")
+            return 0
+
+# Очередь заданий (таблица jobs и функции, миграция 008): постановка и просмотр.
+# Выполнение - AsyncJobsDB и воркер src/job_queue.py
+class JobsDB:
+    @staticmethod
+    def enqueue(job_type: str, payload: Dict = None, run_at: datetime = None, priority: int = 0,
+                max_attempts: int = 5, dedupe_key: str = None) -> Dict:
+        """
+        Постановка задания в очередь
+
+        Returns:
+            {'id', 'created', 'run_at'}; created=False - такое же задание (dedupe_key) уже ждет в очереди
+        """
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT enqueue_job(%s, %s::jsonb, %s, %s, %s, %s) AS job',
+                           (job_type, json.dumps(payload or {}), run_at, priority, max_attempts, dedupe_key))
+            return cursor.fetchone()['job']
+
+        def rest():
+            return supabase_db.execute_rest_query('rpc/enqueue_job', 'POST', data={
+                'p_type': job_type,
+                'p_payload': payload or {},
+                'p_run_at': run_at.isoformat() if run_at else None,
+                'p_priority': priority,
+                'p_max_attempts': max_attempts,
+                'p_dedupe_key': dedupe_key
+            })
+
+        return supabase_db.run(pg, rest)
+
+    @staticmethod
+    def get_recent(limit: int = 100, status: str = None) -> List[Dict]:
+        """Последние задания, новые сначала"""
+        def pg(conn):
+            cursor = conn.cursor()
+            if status:
+                cursor.execute('SELECT * FROM jobs WHERE status = %s ORDER BY created_at DESC LIMIT %s', (status, limit))
+            else:
+                cursor.execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT %s', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+
+        def rest():
+            query = RestQuery('jobs').order('created_at', desc=True).limit(limit)
+            if status:
+                query = query.eq('status', status)
+            return query.execute()
+
+        return supabase_db.run(pg, rest, idempotent=True)
+
+    @staticmethod
+    def get_counts() -> Dict[str, int]:
+        """Число заданий по статусам"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT status, COUNT(*) AS count FROM jobs GROUP BY status')
+            return {row['status']: row['count'] for row in cursor.fetchall()}
+
+        def rest():
+            return {status: RestQuery('jobs').eq('status', status).count()
+                    for status in ('queued', 'running', 'completed', 'dead')}
+
+        return supabase_db.run(pg, rest, idempotent=True)
+
+    @staticmethod
+    def retry(job_id: int) -> bool:
+        """Повтор задания из dead с нуля попыток; False - задание не в dead или такое же уже ждет"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT retry_job(%s) AS retried', (job_id,))
+            return cursor.fetchone()['retried']
+
+        def rest():
+            return bool(supabase_db.execute_rest_query('rpc/retry_job', 'POST', data={'p_id': job_id}))
+
+        return supabase_db.run(pg, rest)
+
+    @staticmethod
+    def prune(days_old: int = 30, batch_size: int = RETENTION_BATCH_SIZE,
+              pause: float = RETENTION_BATCH_PAUSE) -> int:
+        """Удаление завершенных и dead заданий старше days_old дней пачками (см. run_in_batches)"""
+        def pg(conn):
+            return run_in_batches(conn, '''
+                DELETE FROM jobs
+                WHERE id IN (
+                    SELECT id FROM jobs
+                    WHERE status IN ('completed', 'dead')
+                      AND finished_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            ''', days_old, batch_size, pause)
+
+        def rest():
+            cutoff = (datetime.now().astimezone() - timedelta(days=days_old)).isoformat()
+            supabase_db.execute_rest_query('jobs', 'DELETE', params={
+                'status': 'in.(completed,dead)',
+                'finished_at': f'lt.{cutoff}'
+            })
+            return 0
+
+        try:
+            return supabase_db.run(pg, rest, idempotent=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось очистить jobs: {e}")
+            return 0
+
+# Размеры таблиц для админ-панели (функция get_table_sizes, миграция 003)
+class StorageDB:
+    @staticmethod
+    def get_table_sizes() -> List[Dict]:
+        """Размер, число живых и мертвых строк и последний autovacuum по таблицам public"""
+        def pg(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM get_table_sizes()')
+            return [dict(row) for row in cursor.fetchall()]
+
+        def rest():
+            return supabase_db.execute_rest_query('rpc/get_table_sizes', 'POST', data={}) or []
+
+        return supabase_db.run(pg, rest, idempotent=True)
+
+def run_in_batches(conn, sql: str, days_old: int, batch_size: int, pause: float) -> int:
+    """
+    Повтор UPDATE/DELETE ... WHERE id IN (SELECT ... LIMIT n) до исчерпания строк
+
+    Каждая пачка - отдельная короткая транзакция (подключения в autocommit), а пауза
+    между пачками дает autovacuum и репликам догнать удаления вместо одного большого
+    DELETE, который держит блокировки и разом оставляет миллионы мертвых строк.
+
+    Returns:
+        Общее число затронутых строк
+    """
+    cursor = conn.cursor()
+    total = 0
+    while True:
+        cursor.execute(sql, (days_old, batch_size))
+        total += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            return total
+        time.sleep(pause)
+
+def record_stats_payload(messages_processed: int, messages_collected: int, news_published: int,
+                          runs_completed: int, runs_failed: int, run_id: Optional[int]) -> Dict[str, Any]:
+    """Аргументы record_stats для вызова через REST API (rpc/record_stats)"""
+    return {
+        'p_messages_processed': messages_processed,
+        'p_messages_collected': messages_collected,
+        'p_news_published': news_published,
+        'p_runs_completed': runs_completed,
+        'p_runs_failed': runs_failed,
+        'p_run_id': run_id
+    }
+
 def get_database_info() -> Dict[str, Any]:
     """Возвращает информацию о базе данных"""
     return {
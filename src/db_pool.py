@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Пул подключений PostgreSQL
+Ограниченный потокобезопасный пул поверх psycopg2 ThreadedConnectionPool:
+таймаут ожидания свободного подключения, проверка SELECT 1 после простоя,
+выбрасывание сломанных подключений и метрики использования
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/database.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых подключение нельзя возвращать в пул
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+class PoolTimeoutError(Exception):
+    """Нет свободного подключения за отведенное время"""
+
+class PGConnectionPool:
+    """Пул подключений с pre-ping и метриками"""
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10,
+                 checkout_timeout: float = 5.0, ping_interval: float = 30.0, **connect_kwargs):
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self._pool = ThreadedConnectionPool(min_size, max_size, dsn, **connect_kwargs)
+        # Семафор дает ожидание с таймаутом (ThreadedConnectionPool при исчерпании сразу бросает PoolError)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._last_used: Dict[int, float] = {}
+        self._stats = {
+            'checkouts': 0,
+            'in_use': 0,
+            'max_in_use': 0,
+            'timeouts': 0,
+            'pings': 0,
+            'discarded': 0,
+            'wait_time_total': 0.0,
+            'max_wait_time': 0.0
+        }
+
+    def _update_stats(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+            self._stats['max_in_use'] = max(self._stats['max_in_use'], self._stats['in_use'])
+
+    def _is_alive(self, conn) -> bool:
+        """Проверка подключения, если оно простаивало дольше ping_interval"""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.ping_interval:
+            # Новое или недавно использованное подключение
+            return True
+
+        self._update_stats(pings=1)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def _discard(self, conn):
+        """Закрытие сломанного подключения (пул откроет новое при следующем запросе)"""
+        self._last_used.pop(id(conn), None)
+        self._update_stats(discarded=1)
+        try:
+            self._pool.putconn(conn, close=True)
+        except Exception as e:
+            logger.debug(f"🔍 Ошибка закрытия подключения: {e}")
+
+    def acquire(self):
+        """Получение живого подключения из пула"""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            self._update_stats(timeouts=1)
+            raise PoolTimeoutError(f"Нет свободного подключения за {self.checkout_timeout}с")
+
+        try:
+            # Одна попытка переподключения: мертвое подключение заменяется новым
+            for attempt in range(2):
+                conn = self._pool.getconn()
+                if self._is_alive(conn):
+                    break
+                logger.warning("⚠️ Подключение PostgreSQL разорвано, переподключаемся...")
+                self._discard(conn)
+            else:
+                raise psycopg2.OperationalError("Не удалось получить рабочее подключение")
+
+            if not conn.autocommit:
+                conn.autocommit = True
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.monotonic() - started
+        self._update_stats(checkouts=1, in_use=1, wait_time_total=waited)
+        with self._lock:
+            self._stats['max_wait_time'] = max(self._stats['max_wait_time'], waited)
+        return conn
+
+    def release(self, conn, broken: bool = False):
+        """Возврат подключения в пул"""
+        try:
+            if broken or conn.closed:
+                self._discard(conn)
+                return
+
+            # Незавершенная транзакция не должна достаться следующему потоку
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except CONNECTION_ERRORS:
+                    self._discard(conn)
+                    return
+
+            self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn)
+        finally:
+            self._update_stats(in_use=-1)
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Подключение на время блока with"""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики использования пула"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_size'] = self.max_size
+        stats['avg_wait_ms'] = round(stats['wait_time_total'] / stats['checkouts'] * 1000, 2) if stats['checkouts'] else 0.0
+        stats['max_wait_ms'] = round(stats.pop('max_wait_time') * 1000, 2)
+        stats.pop('wait_time_total')
+        return stats
+
+    def close(self):
+        """Закрытие всех подключений"""
+        self._pool.closeall()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Потоковая выгрузка корпуса новостей (текст, саммари, оценки, каналы) в CSV, JSONL и Parquet
+Строки читаются серверным курсором пачками по EXPORT_BATCH_SIZE и сразу пишутся в выходной
+поток, поэтому память не зависит от размера корпуса. Без PostgreSQL строки читаются
+страницами rpc/export_news по id. CSV и JSONL сжимаются gzip, Parquet - zstd по колонкам
+(нужен pyarrow). Используется командой python main.py export и эндпоинтом /export админки
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import uuid
+import zlib
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+
+try:
+    from .database import supabase_db
+    from .config import EXPORT_BATCH_SIZE
+except ImportError:
+    from database import supabase_db
+    from config import EXPORT_BATCH_SIZE
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/database.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'jsonl', 'parquet')
+
+# Колонки export_news в порядке выгрузки
+EXPORT_COLUMNS = (
+    'id',
+    'channel_id',
+    'channel_username',
+    'channel_name',
+    'message_id',
+    'message_text',
+    'summary',
+    'relevance_score',
+    'views',
+    'forwards',
+    'processed_at',
+    'collected_at',
+    'in_queue',
+)
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Для выгрузки в Parquet установите pyarrow: pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+def _plain(value):
+    """Значение для CSV/JSON: даты в ISO 8601"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+class _ChunkSink:
+    """Файлоподобный приемник для pyarrow: записанное забирается кусками через drain()"""
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._buffer.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+class CorpusExport:
+    """
+    Одна выгрузка с фильтрами
+
+    chunks() отдает байты файла по мере чтения строк; после исчерпания rows -
+    число выгруженных строк.
+    """
+
+    def __init__(self, fmt: str = 'csv', compress: bool = True, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None, channel_ids: Optional[Sequence[int]] = None,
+                 batch_size: int = EXPORT_BATCH_SIZE):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат {fmt!r}, доступны: {', '.join(EXPORT_FORMATS)}")
+        if fmt == 'parquet':
+            # Ошибку отсутствия pyarrow показываем до начала выгрузки, а не посреди ответа
+            _require_pyarrow()
+        self.fmt = fmt
+        self.compress = compress
+        self.since = since
+        self.until = until
+        self.channel_ids = list(channel_ids) if channel_ids else None
+        self.batch_size = batch_size
+        self.rows = 0
+
+    @property
+    def filename(self) -> str:
+        name = f"edu_digest_corpus_{datetime.now():%Y%m%d_%H%M}.{self.fmt}"
+        # Parquet сжимается внутри файла, gzip поверх не нужен
+        return name + '.gz' if self.compress and self.fmt != 'parquet' else name
+
+    @property
+    def mimetype(self) -> str:
+        return 'application/gzip' if self.compress and self.fmt != 'parquet' else MIMETYPES[self.fmt]
+
+    def iter_batches(self) -> Iterator[List[Dict]]:
+        """Пачки строк export_news по возрастанию id"""
+        args = (self.since, self.until, self.channel_ids)
+
+        with supabase_db.transaction() as conn:
+            if conn is not None:
+                # Именованный курсор живет до конца транзакции и отдает строки пачками
+                cursor = conn.cursor(name=f'export_{uuid.uuid4().hex[:12]}')
+                cursor.itersize = self.batch_size
+                try:
+                    cursor.execute('SELECT * FROM export_news(%s, %s, %s, 0, NULL)', args)
+                    while True:
+                        rows = cursor.fetchmany(self.batch_size)
+                        if not rows:
+                            break
+                        yield [dict(row) for row in rows]
+                    cursor.close()
+                except GeneratorExit:
+                    # Клиент прервал скачивание: transaction() ловит только Exception,
+                    # откатываем сами, чтобы подключение вернулось в пул без открытой транзакции
+                    cursor.close()
+                    conn.rollback()
+                    raise
+                return
+
+        logger.warning("⚠️ PostgreSQL недоступен, выгрузка страницами через REST API")
+        after_id = 0
+        while True:
+            rows = supabase_db.execute_rest_query('rpc/export_news', 'POST', data={
+                'p_since': self.since.isoformat() if self.since else None,
+                'p_until': self.until.isoformat() if self.until else None,
+                'p_channel_ids': self.channel_ids,
+                'p_after_id': after_id,
+                'p_limit': self.batch_size
+            }) or []
+            if rows:
+                yield rows
+            if len(rows) < self.batch_size:
+                return
+            after_id = rows[-1]['id']
+
+    def chunks(self) -> Iterator[bytes]:
+        """Байты выходного файла по мере чтения строк"""
+        logger.info(f"📦 Выгрузка корпуса в {self.fmt} (с {self.since or 'начала'} по {self.until or 'сейчас'}, "
+                    f"каналы: {self.channel_ids or 'все'})")
+        if self.fmt == 'parquet':
+            yield from self._parquet_chunks()
+        else:
+            encode = self._csv_lines if self.fmt == 'csv' else self._jsonl_lines
+            # wbits=31 - формат gzip, файл открывается gunzip/pandas без распаковки целиком
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if self.compress else None
+            for text in encode():
+                data = text.encode('utf-8')
+                if compressor:
+                    data = compressor.compress(data)
+                if data:
+                    yield data
+            if compressor:
+                yield compressor.flush()
+        logger.info(f"✅ Выгружено {self.rows} строк")
+
+    def _csv_lines(self) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for batch in self.iter_batches():
+            for row in batch:
+                writer.writerow([_plain(row.get(column)) for column in EXPORT_COLUMNS])
+            self.rows += len(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    def _jsonl_lines(self) -> Iterator[str]:
+        for batch in self.iter_batches():
+            self.rows += len(batch)
+            yield ''.join(
+                json.dumps({column: _plain(row.get(column)) for column in EXPORT_COLUMNS}, ensure_ascii=False) + '\n'
+                for row in batch
+            )
+
+    def _parquet_chunks(self) -> Iterator[bytes]:
+        pa, pq = _require_pyarrow()
+        schema = pa.schema([
+            ('id', pa.int32()),
+            ('channel_id', pa.int32()),
+            ('channel_username', pa.string()),
+            ('channel_name', pa.string()),
+            ('message_id', pa.int64()),
+            ('message_text', pa.string()),
+            ('summary', pa.string()),
+            ('relevance_score', pa.int32()),
+            ('views', pa.int32()),
+            ('forwards', pa.int32()),
+            ('processed_at', pa.timestamp('us')),
+            ('collected_at', pa.timestamp('us')),
+            ('in_queue', pa.bool_()),
+        ])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression='zstd' if self.compress else 'none')
+        try:
+            for batch in self.iter_batches():
+                # Через REST даты приходят строками ISO 8601 - cast приводит их к timestamp
+                table = pa.Table.from_pylist([{column: row.get(column) for column in EXPORT_COLUMNS}
+                                              for row in batch])
+                writer.write_table(table.cast(schema))
+                self.rows += len(batch)
+                data = sink.drain()
+                if data:
+                    yield data
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def write_to(self, path: str) -> int:
+        """Выгрузка в файл; возвращает число строк"""
+        with open(path, 'wb') as f:
+            for chunk in self.chunks():
+                f.write(chunk)
+        return self.rows
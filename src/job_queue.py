@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Очередь заданий в PostgreSQL и воркер для их выполнения
+Админка, планировщик и CLI только ставят задания в таблицу jobs (JobsDB.enqueue), а
+выполняют их процессы python main.py worker: каждый забирает до JOB_WORKER_CONCURRENCY
+заданий через claim_jobs (FOR UPDATE SKIP LOCKED), поэтому воркеров можно запускать
+сколько угодно - одно задание достанется одному. Аренда задания продлевается каждые
+JOB_LEASE_SECONDS/3; задание упавшего воркера забирается снова после истечения аренды.
+Ошибка попытки - повтор с экспоненциальной паузой, после max_attempts - статус dead
+(видно на странице /jobs админки, оттуда же повтор)
+"""
+
+import asyncio
+import logging
+import os
+import random
+import signal
+import socket
+import time
+import uuid
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+try:
+    from .async_database import AsyncJobsDB, AsyncChannelsDB, AsyncPendingNewsDB
+    from .database import JobsDB
+    from .change_feed import get_change_feed
+    from .timezone_utils import MOSCOW_TZ
+    from .config import (JOB_WORKER_CONCURRENCY, JOB_LEASE_SECONDS, JOB_POLL_INTERVAL,
+                         JOB_RETRY_BASE_DELAY, JOB_RETRY_MAX_DELAY, PRECOLLECT_REQUEUE_DELAY)
+except ImportError:
+    from async_database import AsyncJobsDB, AsyncChannelsDB, AsyncPendingNewsDB
+    from database import JobsDB
+    from change_feed import get_change_feed
+    from timezone_utils import MOSCOW_TZ
+    from config import (JOB_WORKER_CONCURRENCY, JOB_LEASE_SECONDS, JOB_POLL_INTERVAL,
+                        JOB_RETRY_BASE_DELAY, JOB_RETRY_MAX_DELAY, PRECOLLECT_REQUEUE_DELAY)
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/worker.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Типы заданий
+JOB_COLLECT = 'collect'
+JOB_PUBLISH = 'publish'
+JOB_BACKFILL_DATE = 'backfill_date'
+JOB_RESUMMARIZE = 'resummarize'
+
+# Выгрузка истории за один раз из админки - не больше этого числа дней
+MAX_BACKFILL_DAYS = 31
+
+# Приоритет сбора перед публикацией: выше планового почасового сбора, но ниже публикации
+PRECOLLECT_PRIORITY = 5
+
+class JobError(Exception):
+    """Попытка не удалась, задание будет повторено"""
+
+class PermanentJobError(JobError):
+    """Задание невыполнимо (например, неверный payload) - сразу в dead, без повторов"""
+
+class JobHandler:
+    """Обработчик типа заданий и параметры постановки по умолчанию"""
+
+    def __init__(self, job_type: str, run: Callable[[Dict], Awaitable[Dict]], priority: int, max_attempts: int):
+        self.job_type = job_type
+        self.run = run
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+HANDLERS: Dict[str, JobHandler] = {}
+
+def job_handler(job_type: str, priority: int = 0, max_attempts: int = 5):
+    """Регистрация async-функции run(payload) -> result как обработчика типа заданий"""
+    def register(run: Callable[[Dict], Awaitable[Dict]]) -> Callable:
+        if job_type in HANDLERS:
+            raise ValueError(f"Обработчик {job_type} уже зарегистрирован")
+        HANDLERS[job_type] = JobHandler(job_type, run, priority, max_attempts)
+        return run
+    return register
+
+def enqueue(job_type: str, payload: Dict = None, run_at: datetime = None,
+            dedupe_key: str = None, priority: int = None) -> Dict:
+    """
+    Постановка задания с приоритетом и числом попыток его типа
+
+    Returns:
+        {'id', 'created', 'run_at'} (см. JobsDB.enqueue)
+    """
+    handler = HANDLERS.get(job_type)
+    if handler is None:
+        raise ValueError(f"Неизвестный тип задания {job_type!r}, доступны: {', '.join(HANDLERS)}")
+
+    job = JobsDB.enqueue(job_type, payload, run_at=run_at,
+                         priority=handler.priority if priority is None else priority,
+                         max_attempts=handler.max_attempts, dedupe_key=dedupe_key)
+    if job.get('created'):
+        logger.info(f"📥 Задание #{job['id']} {job_type} поставлено в очередь {payload or ''}")
+    else:
+        logger.info(f"ℹ️ Задание {job_type} ({dedupe_key}) уже ждет в очереди: #{job.get('id')}")
+    return job
+
+def enqueue_backfill(start: date, end: date) -> List[Dict]:
+    """Задания backfill_date на каждый день периода [start, end] - дни выгружаются параллельно"""
+    days = (end - start).days + 1
+    if days < 1:
+        raise ValueError("Начало периода позже конца")
+    if days > MAX_BACKFILL_DAYS:
+        raise ValueError(f"Период больше {MAX_BACKFILL_DAYS} дней")
+    return [
+        enqueue(JOB_BACKFILL_DATE, {'date': day.isoformat()}, dedupe_key=f"{JOB_BACKFILL_DATE}:{day.isoformat()}")
+        for day in (start + timedelta(days=offset) for offset in range(days))
+    ]
+
+def precollect_dedupe_key(slot: datetime) -> str:
+    """Ключ сбора перед публикацией: один ожидающий сбор на слот"""
+    return f"{JOB_COLLECT}:precollect:{slot:%Y-%m-%dT%H:%M}"
+
+def retry_delay(attempts: int) -> float:
+    """Пауза перед повтором после attempts неудачных попыток: экспонента с разбросом 50-100%"""
+    delay = min(JOB_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), JOB_RETRY_MAX_DELAY)
+    # Разброс, чтобы задания, упавшие вместе (например, при сбое Telegram), не повторялись разом
+    return delay * random.uniform(0.5, 1.0)
+
+@job_handler(JOB_COLLECT, priority=0, max_attempts=3)
+async def run_collect(payload: Dict) -> Dict:
+    """
+    Полный цикл сбора в pending_news
+
+    Payload сбора перед публикацией: deadline (ISO, UTC), expected_seconds и slot -
+    к дедлайну цикл урезается до каналов с высшим приоритетом. Если идет чужой цикл, такой
+    сбор не схлопывается (дополнительный цикл держателя прошел бы без дедлайна), а ставится
+    заново через PRECOLLECT_REQUEUE_DELAY секунд, пока не наступит дедлайн
+    """
+    from .news_collector import NewsCollector
+
+    deadline = None
+    if payload.get('deadline'):
+        try:
+            deadline = datetime.fromisoformat(payload['deadline'])
+        except (TypeError, ValueError):
+            raise PermanentJobError(f"Некорректный deadline: {payload['deadline']!r}")
+        if deadline.tzinfo is None:
+            deadline = deadline.replace(tzinfo=timezone.utc)
+        if deadline <= datetime.now(timezone.utc):
+            # Слот уже прошел - дайджест собран из того, что было; сбор подхватит плановый цикл
+            return {'skipped': f"дедлайн {payload['deadline']} прошел", 'slot': payload.get('slot')}
+
+    result = await NewsCollector().run_full_cycle(deadline=deadline,
+                                                  expected_seconds=payload.get('expected_seconds'))
+    if result.get('already_running'):
+        if deadline:
+            run_at = datetime.now(timezone.utc) + timedelta(seconds=PRECOLLECT_REQUEUE_DELAY)
+            slot = payload.get('slot')
+            job = await asyncio.to_thread(
+                enqueue, JOB_COLLECT, payload, run_at=run_at, priority=PRECOLLECT_PRIORITY,
+                dedupe_key=precollect_dedupe_key(datetime.fromisoformat(slot)) if slot else None)
+            return {'requeued': job.get('id'), 'run_at': run_at.isoformat(), 'holder': result.get('error')}
+        # Держатель аренды сбора выполнит после своего цикла еще один - запрос учтен
+        return {'coalesced': True, 'holder': result.get('error')}
+    if not result['success']:
+        raise JobError(result.get('error', 'Unknown error'))
+    return {key: result.get(key) for key in ('channels_processed', 'messages_collected', 'messages_summarized',
+                                              'news_saved', 'execution_time', 'followup_runs', 'deadline_cuts')}
+
+@job_handler(JOB_PUBLISH, priority=10, max_attempts=5)
+async def run_publish(payload: Dict) -> Dict:
+    """Публикация накопленного дайджеста"""
+    from .news_collector import NewsCollector
+
+    collector = NewsCollector()
+    if not await collector.initialize():
+        raise JobError("Ошибка инициализации NewsCollector")
+    result = await collector.publish_accumulated_digest()
+    if not result['success']:
+        raise JobError(result.get('error', 'Unknown error'))
+    return {'news_count': result.get('news_count', 0)}
+
+# get_telegram_reader закрывает предыдущий экземпляр, поэтому выгрузки истории
+# в одном процессе идут по одной
+_backfill_lock: Optional[asyncio.Lock] = None
+
+@job_handler(JOB_BACKFILL_DATE, priority=-10, max_attempts=5)
+async def run_backfill_date(payload: Dict) -> Dict:
+    """Выгрузка истории активных каналов за один день (MSK) в локальный архив сообщений"""
+    global _backfill_lock
+    try:
+        day = date.fromisoformat(payload['date'])
+    except (KeyError, TypeError, ValueError):
+        raise PermanentJobError(f"payload.date должен быть датой YYYY-MM-DD, получено {payload.get('date')!r}")
+
+    from .telegram_reader import get_telegram_reader
+    from .message_archive import get_message_archive
+
+    channels = await AsyncChannelsDB.get_active_channels()
+    usernames = [channel['username'] for channel in channels if channel.get('username')]
+    if not usernames:
+        return {'date': day.isoformat(), 'channels': 0, 'messages': 0}
+
+    start = datetime.combine(day, dt_time(0, 0), MOSCOW_TZ).astimezone(timezone.utc)
+    end = start + timedelta(days=1)
+
+    if _backfill_lock is None:
+        _backfill_lock = asyncio.Lock()
+    async with _backfill_lock:
+        reader = await get_telegram_reader()
+        if not reader:
+            raise JobError("Не удалось инициализировать Telegram reader")
+        exported = await reader.export_history(usernames, start, end, get_message_archive())
+
+    return {'date': day.isoformat(), 'channels': len(exported), 'messages': sum(exported.values())}
+
+@job_handler(JOB_RESUMMARIZE, priority=0, max_attempts=3)
+async def run_resummarize(payload: Dict) -> Dict:
+    """Повторная суммаризация накопленных новостей payload.news_ids через Claude"""
+    try:
+        news_ids = [int(news_id) for news_id in payload['news_ids']]
+    except (KeyError, TypeError, ValueError):
+        raise PermanentJobError(f"payload.news_ids должен быть списком id, получено {payload.get('news_ids')!r}")
+
+    from .claude_summarizer import get_claude_summarizer
+
+    summarizer = await get_claude_summarizer()
+    news = await AsyncPendingNewsDB.get_news_many(news_ids)
+    updates = []
+    for item in news:
+        result = await summarizer.summarize_message(item['message_text'], item.get('channel_name', ''))
+        if result['success']:
+            updates.append({'id': item['id'], 'channel_id': item['channel_id'],
+                            'message_id': item['message_id'], 'summary': result['summary']})
+
+    if news and not updates:
+        raise JobError("Claude API не вернул ни одного саммари")
+    updated = await AsyncPendingNewsDB.update_summaries(updates)
+    return {'requested': len(news_ids), 'found': len(news), 'updated': updated,
+            'failed': len(news) - len(updates)}
+
+class Worker:
+    """Процесс-воркер: до concurrency заданий одновременно, каждое - отдельной задачей"""
+
+    def __init__(self, concurrency: int = JOB_WORKER_CONCURRENCY, job_types: Optional[List[str]] = None,
+                 lease_seconds: int = JOB_LEASE_SECONDS, poll_interval: float = JOB_POLL_INTERVAL):
+        unknown = [job_type for job_type in job_types or [] if job_type not in HANDLERS]
+        if unknown:
+            raise ValueError(f"Неизвестные типы заданий: {', '.join(unknown)}")
+        self.concurrency = max(concurrency, 1)
+        self.job_types = job_types or None
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: Set[asyncio.Task] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def stop(self):
+        """Перестать забирать задания; начатые дорабатывают"""
+        if not self._stopping:
+            logger.info(f"⏹️ Воркер {self.worker_id} останавливается, дожидаемся {len(self._tasks)} заданий")
+            self._stopping = True
+            self._wake.set()
+
+    async def _keep_alive(self, job: Dict):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await AsyncJobsDB.heartbeat(job['id'], self.worker_id, self.lease_seconds):
+                    logger.error(f"❌ Аренда задания #{job['id']} потеряна: его мог забрать другой воркер")
+                    return
+            except Exception as e:
+                # Следующая попытка через lease/3; аренда истечет только после нескольких пропусков
+                logger.warning(f"⚠️ Не удалось продлить аренду задания #{job['id']}: {e}")
+
+    async def _fail(self, job: Dict, error: Exception, retry: bool):
+        delay = retry_delay(job['attempts']) if retry else None
+        try:
+            outcome = await AsyncJobsDB.fail(job['id'], self.worker_id, str(error) or type(error).__name__, delay)
+        except Exception as e:
+            # Задание вернется в работу после истечения аренды
+            logger.error(f"❌ Не удалось записать ошибку задания #{job['id']}: {e}")
+            return
+
+        if outcome == 'queued':
+            logger.warning(f"🔁 Задание #{job['id']} {job['job_type']}: {error}. "
+                           f"Повтор через {delay:.0f} с (попытка {job['attempts']}/{job['max_attempts']})")
+        elif outcome == 'dead':
+            logger.error(f"💀 Задание #{job['id']} {job['job_type']} в dead после {job['attempts']} попыток: {error}")
+        elif outcome == 'merged':
+            logger.warning(f"🔁 Задание #{job['id']} {job['job_type']}: {error}. Повтор объединен с ожидающим таким же")
+        else:
+            logger.error(f"❌ Задание #{job['id']}: {error}; аренда уже не наша, итог не записан")
+
+    async def execute(self, job: Dict):
+        """Одна попытка задания с продлением аренды"""
+        handler = HANDLERS.get(job['job_type'])
+        started = time.monotonic()
+        logger.info(f"▶️ Задание #{job['id']} {job['job_type']} {job.get('payload') or ''} "
+                    f"(попытка {job['attempts']}/{job['max_attempts']})")
+        heartbeat = asyncio.create_task(self._keep_alive(job))
+        try:
+            if handler is None:
+                raise PermanentJobError(f"Нет обработчика для типа {job['job_type']!r}")
+            result = await handler.run(job.get('payload') or {})
+        except PermanentJobError as e:
+            await self._fail(job, e, retry=False)
+        except Exception as e:
+            await self._fail(job, e, retry=True)
+        else:
+            try:
+                if await AsyncJobsDB.complete(job['id'], self.worker_id, result):
+                    logger.info(f"✅ Задание #{job['id']} {job['job_type']} выполнено за "
+                                f"{time.monotonic() - started:.1f} с: {result}")
+                else:
+                    logger.warning(f"⚠️ Задание #{job['id']} выполнено, но аренда уже не наша - итог не записан")
+            except Exception as e:
+                logger.error(f"❌ Не удалось отметить задание #{job['id']} выполненным: {e}")
+        finally:
+            heartbeat.cancel()
+
+    def start_change_feed(self):
+        """
+        Реестр активных каналов для сбора в этом процессе (LISTEN/NOTIFY, при недоступности - опрос)
+
+        Без него каждый цикл сбора перечитывает каналы из базы
+        """
+        if self.job_types and JOB_COLLECT not in self.job_types:
+            return
+        try:
+            get_change_feed().start()
+        except Exception as e:
+            logger.error(f"❌ Не удалось запустить ленту изменений: {e}, сбор читает каналы из базы каждый цикл")
+
+    def _spawn(self, job: Dict):
+        task = asyncio.create_task(self.execute(job), name=f"job-{job['id']}")
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        # Освободился слот - сразу забираем следующее задание
+        self._wake.set()
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        logger.info(f"👷 Воркер {self.worker_id} запущен: {self.concurrency} заданий одновременно, "
+                    f"типы: {', '.join(self.job_types or HANDLERS)}")
+        # Первичная загрузка реестра - запросы к базе, не блокируем event loop
+        await asyncio.to_thread(self.start_change_feed)
+
+        while not self._stopping:
+            free = self.concurrency - len(self._tasks)
+            if free > 0:
+                try:
+                    for job in await AsyncJobsDB.claim(self.worker_id, free, self.lease_seconds, self.job_types):
+                        self._spawn(job)
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось забрать задания: {e}")
+
+            # Ждем освобождения слота, сигнала остановки или следующего опроса пустой очереди
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        get_change_feed().stop()
+        logger.info(f"🏁 Воркер {self.worker_id} остановлен")
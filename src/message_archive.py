@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Локальный архив сырых постов каналов
+Компактная SQLite база: история выгружается один раз и дальше досинхронизируется
+по watermark (последний id сообщения канала). Живой сбор, исторические дайджесты,
+перезапуски и эксперименты читают диапазоны отсюда без запросов к Telegram
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple
+
+try:
+    from .config import MESSAGE_ARCHIVE_PATH
+except ImportError:
+    from config import MESSAGE_ARCHIVE_PATH
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/message_archive.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+def _channel_key(channel_username: str) -> str:
+    """Нормализованный ключ канала: без @ и в нижнем регистре"""
+    return channel_username.lstrip('@').lower()
+
+def _to_timestamp(dt: datetime) -> int:
+    """Перевод даты в unix-время (наивные даты считаем UTC)"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+class MessageArchive:
+    """Архив сообщений каналов с покрытием по диапазонам дат"""
+
+    def __init__(self, path: str = MESSAGE_ARCHIVE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Ленивое открытие базы и создание схемы"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    channel TEXT NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    date INTEGER NOT NULL,
+                    text TEXT,
+                    media_type TEXT,
+                    views INTEGER DEFAULT 0,
+                    forwards INTEGER DEFAULT 0,
+                    is_reply INTEGER DEFAULT 0,
+                    sender_id INTEGER,
+                    external_links TEXT,
+                    PRIMARY KEY (channel, message_id)
+                ) WITHOUT ROWID;
+
+                CREATE INDEX IF NOT EXISTS idx_messages_channel_date ON messages(channel, date);
+
+                -- Непересекающиеся выгруженные диапазоны [covered_from, covered_to) канала
+                CREATE TABLE IF NOT EXISTS coverage_ranges (
+                    channel TEXT NOT NULL,
+                    covered_from INTEGER NOT NULL,
+                    covered_to INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL,
+                    PRIMARY KEY (channel, covered_from)
+                ) WITHOUT ROWID;
+
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    channel TEXT PRIMARY KEY,
+                    last_message_id INTEGER NOT NULL,
+                    synced_at INTEGER NOT NULL
+                );
+            ''')
+            self._migrate_coverage(self._conn)
+            logger.info(f"🗄️ Архив сообщений открыт: {self.path}")
+        return self._conn
+
+    @staticmethod
+    def _migrate_coverage(conn: sqlite3.Connection):
+        """Перенос покрытия из старой таблицы coverage (один диапазон на канал)"""
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'coverage'").fetchone():
+            return
+        with conn:
+            conn.execute('''
+                INSERT OR IGNORE INTO coverage_ranges (channel, covered_from, covered_to, updated_at)
+                SELECT channel, covered_from, covered_to, updated_at FROM coverage
+            ''')
+            conn.execute('DROP TABLE coverage')
+        logger.info("🔄 Покрытие архива перенесено в coverage_ranges")
+
+    def store_messages(self, channel_username: str, messages: List[Dict]) -> int:
+        """Сохранение пачки сообщений (повторная запись обновляет текст и счетчики)"""
+        if not messages:
+            return 0
+
+        key = _channel_key(channel_username)
+        rows = [
+            (
+                key, msg['id'], _to_timestamp(msg['date']), msg.get('text'),
+                msg.get('media_type'), msg.get('views') or 0, msg.get('forwards') or 0,
+                1 if msg.get('is_reply') else 0, msg.get('sender_id'),
+                json.dumps(msg.get('external_links') or [])
+            )
+            for msg in messages
+        ]
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany('''
+                    INSERT INTO messages (channel, message_id, date, text, media_type, views,
+                                          forwards, is_reply, sender_id, external_links)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (channel, message_id) DO UPDATE SET
+                        text = excluded.text,
+                        views = excluded.views,
+                        forwards = excluded.forwards
+                ''', rows)
+        return len(rows)
+
+    @staticmethod
+    def _merge_range(conn: sqlite3.Connection, key: str, start_ts: int, end_ts: int, now_ts: int):
+        """Добавление диапазона с объединением пересекающихся и смежных (вызывать под self._lock)"""
+        with conn:
+            overlapping = conn.execute('''
+                SELECT covered_from, covered_to FROM coverage_ranges
+                WHERE channel = ? AND covered_from <= ? AND covered_to >= ?
+            ''', (key, end_ts, start_ts)).fetchall()
+            for row in overlapping:
+                start_ts = min(start_ts, row['covered_from'])
+                end_ts = max(end_ts, row['covered_to'])
+            conn.execute('''
+                DELETE FROM coverage_ranges
+                WHERE channel = ? AND covered_from <= ? AND covered_to >= ?
+            ''', (key, end_ts, start_ts))
+            conn.execute('''
+                INSERT INTO coverage_ranges (channel, covered_from, covered_to, updated_at)
+                VALUES (?, ?, ?, ?)
+            ''', (key, start_ts, end_ts, now_ts))
+
+    def mark_covered(self, channel_username: str, start_date: datetime, end_date: datetime):
+        """
+        Отметка, что история канала за [start_date, end_date) выгружена полностью
+
+        Несмежные диапазоны (например, дни backfill, выгруженные параллельно) хранятся
+        по отдельности, пересекающиеся и смежные объединяются
+        """
+        with self._lock:
+            self._merge_range(self._connect(), _channel_key(channel_username),
+                              _to_timestamp(start_date), _to_timestamp(end_date),
+                              _to_timestamp(datetime.now(timezone.utc)))
+
+    def get_coverage(self, channel_username: str) -> List[Tuple[datetime, datetime]]:
+        """Выгруженные диапазоны канала [(начало, конец), ...] по возрастанию"""
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT covered_from, covered_to FROM coverage_ranges WHERE channel = ? ORDER BY covered_from',
+                (_channel_key(channel_username),)
+            ).fetchall()
+        return [
+            (datetime.fromtimestamp(row['covered_from'], tz=timezone.utc),
+             datetime.fromtimestamp(row['covered_to'], tz=timezone.utc))
+            for row in rows
+        ]
+
+    def get_watermark(self, channel_username: str) -> int:
+        """Последний синхронизированный id сообщения канала (0 - канал еще не синхронизировался)"""
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT last_message_id FROM watermarks WHERE channel = ?',
+                (_channel_key(channel_username),)
+            ).fetchone()
+        return row['last_message_id'] if row else 0
+
+    def advance_watermark(self, channel_username: str, last_message_id: int,
+                          synced_at: datetime, synced_from: datetime = None):
+        """
+        Фиксация результата инкрементальной синхронизации
+        
+        Args:
+            channel_username: Канал
+            last_message_id: Новый watermark (максимальный id среди полученных сообщений)
+            synced_at: Момент синхронизации - до него история канала в архиве полная
+            synced_from: Начало периода для первой синхронизации (без watermark)
+        """
+        key = _channel_key(channel_username)
+
+        if synced_from is not None:
+            self.mark_covered(channel_username, synced_from, synced_at)
+
+        with self._lock:
+            conn = self._connect()
+            if synced_from is None:
+                # Все сообщения после прошлого watermark получены - последний диапазон продлевается до synced_at
+                latest = conn.execute(
+                    'SELECT covered_from FROM coverage_ranges WHERE channel = ? ORDER BY covered_to DESC LIMIT 1',
+                    (key,)
+                ).fetchone()
+                if latest:
+                    self._merge_range(conn, key, latest['covered_from'], _to_timestamp(synced_at),
+                                      _to_timestamp(synced_at))
+            with conn:
+                if last_message_id:
+                    conn.execute('''
+                        INSERT INTO watermarks (channel, last_message_id, synced_at)
+                        VALUES (?, ?, ?)
+                        ON CONFLICT (channel) DO UPDATE SET
+                            last_message_id = MAX(watermarks.last_message_id, excluded.last_message_id),
+                            synced_at = excluded.synced_at
+                    ''', (key, last_message_id, _to_timestamp(synced_at)))
+
+    def covers(self, channel_username: str, start_date: datetime, end_date: datetime) -> bool:
+        """Покрывает ли архив период [start_date, end_date) для канала"""
+        # Диапазоны объединяются при записи, поэтому период должен лежать в одном из них
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT 1 FROM coverage_ranges WHERE channel = ? AND covered_from <= ? AND covered_to >= ?',
+                (_channel_key(channel_username), _to_timestamp(start_date), _to_timestamp(end_date))
+            ).fetchone()
+        return row is not None
+
+    def get_messages(self, channel_username: str, start_date: datetime, end_date: datetime,
+                     min_text_length: int = 50) -> List[Dict]:
+        """Сообщения канала за [start_date, end_date) в формате TelegramChannelReader"""
+        with self._lock:
+            rows = self._connect().execute('''
+                SELECT * FROM messages
+                WHERE channel = ? AND date >= ? AND date < ? AND length(trim(text)) >= ?
+                ORDER BY date DESC
+            ''', (_channel_key(channel_username), _to_timestamp(start_date),
+                  _to_timestamp(end_date), min_text_length)).fetchall()
+
+        clean_username = channel_username.lstrip('@')
+        return [
+            {
+                'id': row['message_id'],
+                'date': datetime.fromtimestamp(row['date'], tz=timezone.utc),
+                'text': row['text'],
+                'channel': channel_username,
+                'link': f"https://t.me/{clean_username}/{row['message_id']}",
+                'media_type': row['media_type'],
+                'views': row['views'],
+                'forwards': row['forwards'],
+                'is_reply': bool(row['is_reply']),
+                'sender_id': row['sender_id'],
+                'reactions_count': 0,
+                'external_links': json.loads(row['external_links'] or '[]')
+            }
+            for row in rows
+        ]
+
+    def close(self):
+        """Закрытие базы"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# Глобальный экземпляр для переиспользования
+_archive_instance: Optional[MessageArchive] = None
+
+def get_message_archive() -> MessageArchive:
+    """Получение общего экземпляра архива"""
+    global _archive_instance
+    if _archive_instance is None:
+        _archive_instance = MessageArchive()
+    return _archive_instance
@@ -0,0 +1,1305 @@
+#!/usr/bin/env python3
+"""
+Версионные миграции схемы Supabase (PostgreSQL)
+Каждая миграция применяется один раз и записывается в schema_migrations;
+python main.py migrate (и init_database) применяет недостающие по порядку версий.
+Обычная миграция выполняется в транзакции под advisory-локом, поэтому два процесса
+не применят одну версию дважды. Миграции с transactional=False (CREATE INDEX CONCURRENTLY)
+идут без транзакции и должны быть идемпотентными.
+Схема меняется только новой миграцией: уже примененные не редактируются
+"""
+
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    from .database import supabase_db, CHANGE_FEED_CHANNEL, SETTINGS_VERSION_KEY, SEARCH_MAX_CANDIDATES
+    from .pipeline_metrics import COUNTERS as CHANNEL_STATS_COUNTERS
+except ImportError:
+    from database import supabase_db, CHANGE_FEED_CHANNEL, SETTINGS_VERSION_KEY, SEARCH_MAX_CANDIDATES
+    from pipeline_metrics import COUNTERS as CHANNEL_STATS_COUNTERS
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/database.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_xact_lock, сериализующий применение миграций
+MIGRATIONS_LOCK_ID = 7_302_114_001
+
+# Диапазон id на одну транзакцию при заполнении search_vector (миграция 004)
+SEARCH_BACKFILL_BATCH = 5000
+
+class Migration:
+    """Одна версия схемы"""
+
+    def __init__(self, version: int, name: str, apply: Callable, transactional: bool = True):
+        self.version = version
+        self.name = name
+        self.apply = apply
+        self.transactional = transactional
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, name: str, transactional: bool = True):
+    """Регистрация функции apply(cursor) как миграции"""
+    def register(apply: Callable) -> Callable:
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Миграция {version} уже зарегистрирована")
+        MIGRATIONS.append(Migration(version, name, apply, transactional))
+        return apply
+    return register
+
+def create_index_concurrently(cursor, name: str, definition: str):
+    """
+    CREATE INDEX CONCURRENTLY без блокировки записи
+
+    Прерванная сборка оставляет невалидный индекс, который IF NOT EXISTS пропустил бы, -
+    такой индекс удаляется и строится заново.
+    """
+    cursor.execute('''
+        SELECT i.indisvalid FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+    ''', (name,))
+    row = cursor.fetchone()
+    if row and not row['indisvalid']:
+        logger.warning(f"⚠️ Индекс {name} невалиден (прерванная сборка), пересоздаем")
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}')
+
+@migration(1, 'baseline')
+def _baseline(cursor):
+    """Схема до введения миграций (бывший init_database, все операторы идемпотентны)"""
+
+    # Таблица отслеживаемых каналов
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS channels (
+            id SERIAL PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            display_name TEXT,
+            priority INTEGER DEFAULT 0 CHECK (priority >= 0 AND priority <= 10),
+            is_active BOOLEAN DEFAULT true,
+            last_message_id BIGINT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Таблица обработанных сообщений
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS processed_messages (
+            id SERIAL PRIMARY KEY,
+            channel_id INTEGER NOT NULL REFERENCES channels(id) ON DELETE CASCADE,
+            message_id BIGINT NOT NULL,
+            message_text TEXT,
+            summary TEXT,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            published BOOLEAN DEFAULT false,
+            UNIQUE(channel_id, message_id)
+        )
+    ''')
+
+    # Таблица накопленных новостей (ожидающих публикации)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pending_news (
+            id SERIAL PRIMARY KEY,
+            channel_id INTEGER NOT NULL REFERENCES channels(id) ON DELETE CASCADE,
+            message_id BIGINT NOT NULL,
+            channel_name TEXT NOT NULL,
+            message_text TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            relevance_score INTEGER DEFAULT 5,
+            collected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            scheduled_for DATE,
+            digest_type VARCHAR(20),
+            is_approved BOOLEAN DEFAULT true,
+            is_deleted BOOLEAN DEFAULT false,
+            views INTEGER DEFAULT 0,
+            forwards INTEGER DEFAULT 0,
+            engagement_updated_at TIMESTAMP,
+            UNIQUE(channel_id, message_id)
+        )
+    ''')
+
+    # Счетчики вовлеченности для уже существующих таблиц
+    cursor.execute('ALTER TABLE pending_news ADD COLUMN IF NOT EXISTS views INTEGER DEFAULT 0')
+    cursor.execute('ALTER TABLE pending_news ADD COLUMN IF NOT EXISTS forwards INTEGER DEFAULT 0')
+    cursor.execute('ALTER TABLE pending_news ADD COLUMN IF NOT EXISTS engagement_updated_at TIMESTAMP')
+
+    # Настройки системы
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            id SERIAL PRIMARY KEY,
+            key TEXT UNIQUE NOT NULL,
+            value TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Таблица логов запусков
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS run_logs (
+            id SERIAL PRIMARY KEY,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            status TEXT CHECK (status IN ('started', 'completed', 'failed')),
+            channels_processed INTEGER DEFAULT 0,
+            messages_collected INTEGER DEFAULT 0,
+            news_published INTEGER DEFAULT 0,
+            error_message TEXT
+        )
+    ''')
+
+    # Пул пользовательских сессий Telegram для шардирования чтения каналов
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS telegram_sessions (
+            id SERIAL PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            session_string TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT true,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Лента изменений: триггеры шлют NOTIFY с таблицей, операцией и ключом строки,
+    # долгоживущие процессы обновляют свои копии точечно (см. change_feed)
+    cursor.execute(f'''
+        CREATE OR REPLACE FUNCTION notify_edu_digest_change() RETURNS trigger AS $$
+        DECLARE
+            changed JSONB;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed := to_jsonb(OLD);
+            ELSE
+                changed := to_jsonb(NEW);
+            END IF;
+            PERFORM pg_notify('{CHANGE_FEED_CHANNEL}', json_build_object(
+                'table', TG_TABLE_NAME,
+                'op', TG_OP,
+                'key', changed ->> TG_ARGV[0]
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+        DROP TRIGGER IF EXISTS channels_notify_change ON channels;
+        CREATE TRIGGER channels_notify_change
+            AFTER INSERT OR DELETE ON channels
+            FOR EACH ROW EXECUTE FUNCTION notify_edu_digest_change('id');
+
+        -- last_message_id обновляется каждым сбором и в ленту не попадает
+        DROP TRIGGER IF EXISTS channels_notify_update ON channels;
+        CREATE TRIGGER channels_notify_update
+            AFTER UPDATE ON channels
+            FOR EACH ROW
+            WHEN ((OLD.username, OLD.display_name, OLD.priority, OLD.is_active)
+                  IS DISTINCT FROM (NEW.username, NEW.display_name, NEW.priority, NEW.is_active))
+            EXECUTE FUNCTION notify_edu_digest_change('id');
+
+        DROP TRIGGER IF EXISTS settings_notify_change ON settings;
+        CREATE TRIGGER settings_notify_change
+            AFTER INSERT OR UPDATE OR DELETE ON settings
+            FOR EACH ROW EXECUTE FUNCTION notify_edu_digest_change('key');
+    ''')
+
+    # Статистика дашборда: счетчики по часам и одна строка с текущим состоянием.
+    # Сборщик и публикатор прибавляют к ним по ходу работы (record_stats),
+    # repair_dashboard_stats пересчитывает их из первичных таблиц
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_hourly (
+            hour TIMESTAMP PRIMARY KEY,
+            messages_processed INTEGER DEFAULT 0,
+            messages_collected INTEGER DEFAULT 0,
+            news_published INTEGER DEFAULT 0,
+            runs_completed INTEGER DEFAULT 0,
+            runs_failed INTEGER DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dashboard_stats (
+            id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            active_channels INTEGER DEFAULT 0,
+            total_channels INTEGER DEFAULT 0,
+            last_run JSONB,
+            repaired_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('INSERT INTO dashboard_stats (id) VALUES (1) ON CONFLICT (id) DO NOTHING')
+
+    # Счетчики каналов меняются триггером на каждую вставку, удаление и смену is_active
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION count_channels_change() RETURNS trigger AS $$
+        DECLARE
+            delta_total INTEGER := 0;
+            delta_active INTEGER := 0;
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.is_active THEN
+                delta_active := delta_active + 1;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.is_active THEN
+                delta_active := delta_active - 1;
+            END IF;
+            IF TG_OP = 'INSERT' THEN
+                delta_total := 1;
+            ELSIF TG_OP = 'DELETE' THEN
+                delta_total := -1;
+            END IF;
+            UPDATE dashboard_stats SET
+                total_channels = total_channels + delta_total,
+                active_channels = active_channels + delta_active,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS channels_count_change ON channels;
+        CREATE TRIGGER channels_count_change
+            AFTER INSERT OR DELETE OR UPDATE OF is_active ON channels
+            FOR EACH ROW EXECUTE FUNCTION count_channels_change();
+    ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION record_stats(
+            p_messages_processed INTEGER DEFAULT 0,
+            p_messages_collected INTEGER DEFAULT 0,
+            p_news_published INTEGER DEFAULT 0,
+            p_runs_completed INTEGER DEFAULT 0,
+            p_runs_failed INTEGER DEFAULT 0,
+            p_run_id INTEGER DEFAULT NULL
+        ) RETURNS VOID AS $$
+        BEGIN
+            IF p_messages_processed <> 0 OR p_messages_collected <> 0 OR p_news_published <> 0
+               OR p_runs_completed <> 0 OR p_runs_failed <> 0 THEN
+                INSERT INTO stats_hourly AS s (hour, messages_processed, messages_collected,
+                                               news_published, runs_completed, runs_failed)
+                VALUES (date_trunc('hour', CURRENT_TIMESTAMP), p_messages_processed, p_messages_collected,
+                        p_news_published, p_runs_completed, p_runs_failed)
+                ON CONFLICT (hour) DO UPDATE SET
+                    messages_processed = s.messages_processed + EXCLUDED.messages_processed,
+                    messages_collected = s.messages_collected + EXCLUDED.messages_collected,
+                    news_published = s.news_published + EXCLUDED.news_published,
+                    runs_completed = s.runs_completed + EXCLUDED.runs_completed,
+                    runs_failed = s.runs_failed + EXCLUDED.runs_failed;
+            END IF;
+            IF p_run_id IS NOT NULL THEN
+                UPDATE dashboard_stats SET
+                    last_run = (SELECT to_jsonb(r) FROM run_logs r WHERE r.id = p_run_id),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = 1;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION get_dashboard_stats() RETURNS JSON AS $$
+            SELECT json_build_object(
+                'active_channels', s.active_channels,
+                'total_channels', s.total_channels,
+                'recent_messages', h.messages_processed,
+                'published_news', h.news_published,
+                'successful_runs_24h', h.runs_completed,
+                'failed_runs_24h', h.runs_failed,
+                'news_published_24h', h.news_published,
+                'messages_collected_24h', h.messages_collected,
+                'last_run', s.last_run,
+                'updated_at', s.updated_at,
+                'repaired_at', s.repaired_at
+            )
+            FROM dashboard_stats s CROSS JOIN (
+                SELECT COALESCE(SUM(messages_processed), 0) AS messages_processed,
+                       COALESCE(SUM(messages_collected), 0) AS messages_collected,
+                       COALESCE(SUM(news_published), 0) AS news_published,
+                       COALESCE(SUM(runs_completed), 0) AS runs_completed,
+                       COALESCE(SUM(runs_failed), 0) AS runs_failed
+                FROM stats_hourly
+                WHERE hour >= date_trunc('hour', CURRENT_TIMESTAMP - INTERVAL '24 hours')
+            ) h
+            WHERE s.id = 1
+        $$ LANGUAGE sql STABLE
+    ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION repair_dashboard_stats(p_days INTEGER DEFAULT 7) RETURNS VOID AS $$
+        DECLARE
+            since TIMESTAMP := date_trunc('hour', CURRENT_TIMESTAMP - make_interval(days => p_days));
+        BEGIN
+            DELETE FROM stats_hourly WHERE hour >= since;
+            INSERT INTO stats_hourly (hour, messages_processed, messages_collected,
+                                      news_published, runs_completed, runs_failed)
+            SELECT hour, SUM(mp), SUM(mc), SUM(np), SUM(rc), SUM(rf)
+            FROM (
+                SELECT date_trunc('hour', processed_at) AS hour,
+                       COUNT(*) AS mp, 0 AS mc, 0 AS np, 0 AS rc, 0 AS rf
+                FROM processed_messages
+                WHERE processed_at >= since
+                GROUP BY 1
+                UNION ALL
+                SELECT date_trunc('hour', COALESCE(completed_at, started_at)), 0,
+                       COALESCE(SUM(messages_collected), 0),
+                       COALESCE(SUM(news_published) FILTER (WHERE status = 'completed'), 0),
+                       COUNT(*) FILTER (WHERE status = 'completed'),
+                       COUNT(*) FILTER (WHERE status = 'failed')
+                FROM run_logs
+                WHERE COALESCE(completed_at, started_at) >= since
+                GROUP BY 1
+            ) AS buckets
+            GROUP BY hour;
+
+            INSERT INTO dashboard_stats (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+            UPDATE dashboard_stats SET
+                active_channels = (SELECT COUNT(*) FROM channels WHERE is_active),
+                total_channels = (SELECT COUNT(*) FROM channels),
+                last_run = (SELECT to_jsonb(r) FROM run_logs r ORDER BY started_at DESC LIMIT 1),
+                repaired_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+
+    # Временные ряды конвейера по каналам для графиков дашборда (см. pipeline_metrics):
+    # почасовые строки за последние 30 дней, дальше - дневные (compact_channel_stats)
+    counter_columns = ',\n'.join(f'{name} BIGINT DEFAULT 0' for name in CHANNEL_STATS_COUNTERS)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS channel_stats_hourly (
+            hour TIMESTAMP NOT NULL,
+            channel_id INTEGER NOT NULL,
+            {counter_columns},
+            llm_latency_hist INTEGER[],
+            PRIMARY KEY (hour, channel_id)
+        );
+        CREATE TABLE IF NOT EXISTS channel_stats_daily (
+            day DATE NOT NULL,
+            channel_id INTEGER NOT NULL,
+            {counter_columns},
+            llm_latency_hist INTEGER[],
+            PRIMARY KEY (day, channel_id)
+        )
+    ''')
+
+    # Поэлементная сумма гистограмм задержки (и агрегат для GROUP BY)
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION int_array_add(a INTEGER[], b INTEGER[]) RETURNS INTEGER[] AS $$
+            SELECT CASE
+                WHEN a IS NULL THEN b
+                WHEN b IS NULL THEN a
+                ELSE ARRAY(
+                    SELECT COALESCE(x, 0) + COALESCE(y, 0)
+                    FROM unnest(a, b) WITH ORDINALITY AS t(x, y, i)
+                    ORDER BY i
+                )
+            END
+        $$ LANGUAGE sql IMMUTABLE;
+
+        CREATE OR REPLACE AGGREGATE int_array_sum(INTEGER[]) (
+            SFUNC = int_array_add,
+            STYPE = INTEGER[]
+        )
+    ''')
+
+    counters = ', '.join(CHANNEL_STATS_COUNTERS)
+    summed = ', '.join(f'SUM({name})' for name in CHANNEL_STATS_COUNTERS)
+    increments = ',\n'.join(f'{name} = s.{name} + EXCLUDED.{name}' for name in CHANNEL_STATS_COUNTERS)
+    cursor.execute(f'''
+        CREATE OR REPLACE FUNCTION record_channel_stats(p_rows JSONB) RETURNS VOID AS $$
+            INSERT INTO channel_stats_hourly AS s (hour, channel_id, {counters}, llm_latency_hist)
+            SELECT date_trunc('hour', CURRENT_TIMESTAMP), r.channel_id,
+                   {', '.join(f'COALESCE(r.{name}, 0)' for name in CHANNEL_STATS_COUNTERS)},
+                   r.llm_latency_hist
+            FROM jsonb_to_recordset(p_rows) AS r(
+                channel_id INTEGER,
+                {', '.join(f'{name} BIGINT' for name in CHANNEL_STATS_COUNTERS)},
+                llm_latency_hist INTEGER[]
+            )
+            ON CONFLICT (hour, channel_id) DO UPDATE SET
+                {increments},
+                llm_latency_hist = int_array_add(s.llm_latency_hist, EXCLUDED.llm_latency_hist)
+        $$ LANGUAGE sql
+    ''')
+    cursor.execute(f'''
+        CREATE OR REPLACE FUNCTION compact_channel_stats(p_keep_days INTEGER DEFAULT 30) RETURNS INTEGER AS $$
+        DECLARE
+            cutoff TIMESTAMP := date_trunc('day', CURRENT_TIMESTAMP - make_interval(days => p_keep_days));
+            compacted INTEGER;
+        BEGIN
+            WITH moved AS (
+                DELETE FROM channel_stats_hourly WHERE hour < cutoff RETURNING *
+            )
+            INSERT INTO channel_stats_daily AS s (day, channel_id, {counters}, llm_latency_hist)
+            SELECT hour::date, channel_id, {summed}, int_array_sum(llm_latency_hist)
+            FROM moved
+            GROUP BY 1, 2
+            ON CONFLICT (day, channel_id) DO UPDATE SET
+                {increments},
+                llm_latency_hist = int_array_add(s.llm_latency_hist, EXCLUDED.llm_latency_hist);
+            GET DIAGNOSTICS compacted = ROW_COUNT;
+            RETURN compacted;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute(f'''
+        DROP FUNCTION IF EXISTS get_channel_stats_series(INTEGER, INTEGER);
+        CREATE FUNCTION get_channel_stats_series(p_days INTEGER, p_channel_id INTEGER DEFAULT NULL)
+        RETURNS TABLE (day DATE, {', '.join(f'{name} BIGINT' for name in CHANNEL_STATS_COUNTERS)},
+                       llm_latency_hist INTEGER[]) AS $$
+            SELECT t.day, {', '.join(f'SUM(t.{name})::BIGINT' for name in CHANNEL_STATS_COUNTERS)},
+                   int_array_sum(t.llm_latency_hist)
+            FROM (
+                SELECT day, channel_id, {counters}, llm_latency_hist
+                FROM channel_stats_daily
+                WHERE day > CURRENT_DATE - p_days
+                UNION ALL
+                SELECT hour::date, channel_id, {counters}, llm_latency_hist
+                FROM channel_stats_hourly
+                WHERE hour >= CURRENT_DATE - p_days + 1
+            ) AS t
+            WHERE p_channel_id IS NULL OR t.channel_id = p_channel_id
+            GROUP BY t.day
+            ORDER BY t.day
+        $$ LANGUAGE sql STABLE
+    ''')
+
+    # Вставка настроек по умолчанию
+    default_settings = [
+        ('max_news_count', '7', 'Максимальное количество новостей в дайджесте'),
+        ('target_channel', '@vestnik_edtech', 'Целевой канал для публикации'),
+        ('digest_times', '12:00,18:00', 'Время публикации дайджестов'),
+        ('summary_max_length', '150', 'Максимальная длина суммаризации в символах'),
+        ('hours_lookback', '12', 'Сколько часов назад искать новости'),
+        (SETTINGS_VERSION_KEY, '0', 'Счетчик изменений настроек (сброс кеша)'),
+    ]
+
+    for key, value, description in default_settings:
+        cursor.execute('''
+            INSERT INTO settings (key, value, description, updated_at)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (key) DO NOTHING
+        ''', (key, value, description))
+
+@migration(2, 'hot_query_indexes', transactional=False)
+def _hot_query_indexes(cursor):
+    """Индексы под фильтры дашборда, сборщика и публикации (см. scripts/benchmark_indexes.py)"""
+    # Пересчет статистики и очистка: WHERE processed_at >= ...
+    create_index_concurrently(cursor, 'idx_processed_messages_processed_at',
+                              'processed_messages (processed_at)')
+    # Последние запуски: ORDER BY started_at DESC LIMIT n
+    create_index_concurrently(cursor, 'idx_run_logs_started_at',
+                              'run_logs (started_at DESC)')
+    # Активные каналы: WHERE is_active ORDER BY priority DESC, created_at
+    create_index_concurrently(cursor, 'idx_channels_active_priority',
+                              'channels (is_active, priority DESC, created_at)')
+    # Очередь публикации: WHERE is_deleted = false ORDER BY relevance_score DESC, collected_at DESC
+    create_index_concurrently(cursor, 'idx_pending_news_queue',
+                              'pending_news (relevance_score DESC, collected_at DESC) WHERE is_deleted = false')
+    # Индекс по булевой колонке из create_pending_news_table.sql заменен частичным выше
+    cursor.execute('DROP INDEX CONCURRENTLY IF EXISTS idx_pending_news_is_deleted')
+
+@migration(3, 'retention', transactional=False)
+def _retention(cursor):
+    """Индексы и настройки очистки старых данных (src/retention.py), размеры таблиц для админки"""
+    # Очистка текста: старые строки, у которых текст еще не удален
+    create_index_concurrently(cursor, 'idx_processed_messages_text_retention',
+                              'processed_messages (processed_at) '
+                              'WHERE message_text IS NOT NULL OR summary IS NOT NULL')
+    # Удаление старых накопленных новостей: WHERE collected_at < ...
+    create_index_concurrently(cursor, 'idx_pending_news_collected_at',
+                              'pending_news (collected_at)')
+    # Очистка пачками оставляет мертвые строки постоянно - vacuum раньше порога по умолчанию (20%)
+    for table in ('processed_messages', 'pending_news'):
+        cursor.execute(f'''
+            ALTER TABLE {table} SET (
+                autovacuum_vacuum_scale_factor = 0.05,
+                autovacuum_analyze_scale_factor = 0.05
+            )
+        ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION get_table_sizes()
+        RETURNS TABLE (
+            table_name TEXT,
+            total_bytes BIGINT,
+            table_bytes BIGINT,
+            index_bytes BIGINT,
+            toast_bytes BIGINT,
+            live_rows BIGINT,
+            dead_rows BIGINT,
+            last_autovacuum TIMESTAMPTZ
+        ) AS $$
+            SELECT s.relname::TEXT,
+                   pg_total_relation_size(s.relid),
+                   pg_relation_size(s.relid),
+                   pg_indexes_size(s.relid),
+                   COALESCE(pg_total_relation_size(NULLIF(c.reltoastrelid, 0)), 0),
+                   s.n_live_tup,
+                   s.n_dead_tup,
+                   s.last_autovacuum
+            FROM pg_stat_user_tables s
+            JOIN pg_class c ON c.oid = s.relid
+            WHERE s.schemaname = 'public'
+            ORDER BY pg_total_relation_size(s.relid) DESC
+        $$ LANGUAGE sql STABLE
+    ''')
+    cursor.execute('''
+        INSERT INTO settings (key, value, description) VALUES
+            ('retention_text_days', '30', 'Через сколько дней удалять текст обработанных сообщений'),
+            ('retention_pending_days', '14', 'Через сколько дней удалять неопубликованные новости')
+        ON CONFLICT (key) DO NOTHING
+    ''')
+
+@migration(4, 'full_text_search', transactional=False)
+def _full_text_search(cursor):
+    """Полнотекстовый поиск (russian) по обработанным сообщениям: search_vector, GIN, search_news"""
+    # Без DEFAULT колонка добавляется без перезаписи таблицы
+    cursor.execute('ALTER TABLE processed_messages ADD COLUMN IF NOT EXISTS search_vector tsvector')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION news_search_vector(p_summary TEXT, p_text TEXT)
+        RETURNS tsvector AS $$
+            SELECT setweight(to_tsvector('russian', COALESCE(p_summary, '')), 'A') ||
+                   setweight(to_tsvector('russian', COALESCE(p_text, '')), 'B')
+        $$ LANGUAGE sql IMMUTABLE
+    ''')
+    # Очистка по срокам хранения обнуляет текст, но вектор остается - старые новости находятся поиском
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION processed_messages_search_vector() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.message_text IS NOT NULL OR NEW.summary IS NOT NULL THEN
+                NEW.search_vector := news_search_vector(NEW.summary, NEW.message_text);
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('DROP TRIGGER IF EXISTS processed_messages_search_vector ON processed_messages')
+    cursor.execute('''
+        CREATE TRIGGER processed_messages_search_vector
+        BEFORE INSERT OR UPDATE OF message_text, summary ON processed_messages
+        FOR EACH ROW EXECUTE FUNCTION processed_messages_search_vector()
+    ''')
+
+    # Заполнение существующих строк диапазонами id: короткие транзакции вместо одной на всю таблицу
+    cursor.execute('SELECT COALESCE(MIN(id), 0) AS first_id, COALESCE(MAX(id), 0) AS last_id FROM processed_messages')
+    bounds = cursor.fetchone()
+    for start in range(bounds['first_id'], bounds['last_id'] + 1, SEARCH_BACKFILL_BATCH):
+        cursor.execute('''
+            UPDATE processed_messages SET search_vector = news_search_vector(summary, message_text)
+            WHERE id >= %s AND id < %s AND search_vector IS NULL
+              AND (message_text IS NOT NULL OR summary IS NOT NULL)
+        ''', (start, start + SEARCH_BACKFILL_BATCH))
+
+    create_index_concurrently(cursor, 'idx_processed_messages_search',
+                              'processed_messages USING gin (search_vector)')
+
+    # Поиск с ранжированием и keyset-пагинацией по (rank, id): следующая страница -
+    # строки строго после последней показанной, без OFFSET
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION search_news(
+            p_query TEXT,
+            p_limit INTEGER DEFAULT 20,
+            p_after_rank FLOAT8 DEFAULT NULL,
+            p_after_id INTEGER DEFAULT NULL,
+            p_days INTEGER DEFAULT NULL,
+            p_channel_id INTEGER DEFAULT NULL
+        )
+        RETURNS TABLE (
+            id INTEGER,
+            channel_id INTEGER,
+            channel_username TEXT,
+            message_id BIGINT,
+            summary TEXT,
+            headline TEXT,
+            processed_at TIMESTAMP,
+            relevance_score INTEGER,
+            in_queue BOOLEAN,
+            rank FLOAT8
+        ) AS $$
+            WITH q AS (
+                SELECT websearch_to_tsquery('russian', p_query) AS query
+            ),
+            hits AS (
+                SELECT pm.id, pm.channel_id, pm.message_id, pm.summary, pm.processed_at, q.query,
+                       ts_rank_cd(pm.search_vector, q.query)::FLOAT8 AS rank
+                FROM processed_messages pm, q
+                WHERE pm.search_vector @@ q.query
+                  AND (p_days IS NULL OR pm.processed_at >= CURRENT_TIMESTAMP - make_interval(days => p_days))
+                  AND (p_channel_id IS NULL OR pm.channel_id = p_channel_id)
+            )
+            SELECT h.id, h.channel_id, c.username, h.message_id, h.summary,
+                   ts_headline('russian', COALESCE(h.summary, ''), h.query,
+                               'StartSel=⟦, StopSel=⟧, MaxWords=40, MinWords=15, HighlightAll=false'),
+                   h.processed_at, pn.relevance_score, COALESCE(NOT pn.is_deleted, false), h.rank
+            FROM hits h
+            LEFT JOIN channels c ON c.id = h.channel_id
+            LEFT JOIN pending_news pn ON pn.channel_id = h.channel_id AND pn.message_id = h.message_id
+            WHERE p_after_rank IS NULL OR (h.rank, h.id) < (p_after_rank, p_after_id)
+            ORDER BY h.rank DESC, h.id DESC
+            LIMIT LEAST(GREATEST(p_limit, 1), 100)
+        $$ LANGUAGE sql STABLE
+    ''')
+
+@migration(5, 'export_news')
+def _export_news(cursor):
+    """Выгрузка корпуса новостей (src/exporter.py): одна функция для курсора PostgreSQL и страниц REST API"""
+    # Инлайнится планировщиком (sql, STABLE, один SELECT), поэтому серверный курсор
+    # читает строки по мере выборки, а не после материализации всего результата
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION export_news(
+            p_since TIMESTAMP DEFAULT NULL,
+            p_until TIMESTAMP DEFAULT NULL,
+            p_channel_ids INTEGER[] DEFAULT NULL,
+            p_after_id INTEGER DEFAULT 0,
+            p_limit INTEGER DEFAULT NULL
+        )
+        RETURNS TABLE (
+            id INTEGER,
+            channel_id INTEGER,
+            channel_username TEXT,
+            channel_name TEXT,
+            message_id BIGINT,
+            message_text TEXT,
+            summary TEXT,
+            relevance_score INTEGER,
+            views INTEGER,
+            forwards INTEGER,
+            processed_at TIMESTAMP,
+            collected_at TIMESTAMP,
+            in_queue BOOLEAN
+        ) AS $$
+            SELECT pm.id, pm.channel_id, c.username, COALESCE(c.display_name, pn.channel_name),
+                   pm.message_id,
+                   COALESCE(pm.message_text, pn.message_text),
+                   COALESCE(pm.summary, pn.summary),
+                   pn.relevance_score, pn.views, pn.forwards,
+                   pm.processed_at, pn.collected_at, COALESCE(NOT pn.is_deleted, false)
+            FROM processed_messages pm
+            JOIN channels c ON c.id = pm.channel_id
+            LEFT JOIN pending_news pn ON pn.channel_id = pm.channel_id AND pn.message_id = pm.message_id
+            WHERE pm.id > COALESCE(p_after_id, 0)
+              AND (p_since IS NULL OR pm.processed_at >= p_since)
+              AND (p_until IS NULL OR pm.processed_at < p_until)
+              AND (p_channel_ids IS NULL OR pm.channel_id = ANY(p_channel_ids))
+            ORDER BY pm.id
+            LIMIT p_limit
+        $$ LANGUAGE sql STABLE
+    ''')
+
+@migration(6, 'scheduler_fires')
+def _scheduler_fires(cursor):
+    """Срабатывания планировщика: одна строка на (задание, слот) - защита от повторного запуска"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_fires (
+            job TEXT NOT NULL,
+            slot TIMESTAMPTZ NOT NULL,
+            fired_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMPTZ,
+            status TEXT NOT NULL DEFAULT 'running',
+            error TEXT,
+            PRIMARY KEY (job, slot)
+        )
+    ''')
+
+@migration(7, 'run_locks')
+def _run_locks(cursor):
+    """Аренда запуска (src/run_lock.py): один цикл сбора на все процессы, повторные запросы - в один follow-up"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS run_locks (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            acquired_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMPTZ NOT NULL,
+            rerun_requested BOOLEAN NOT NULL DEFAULT false
+        )
+    ''')
+    # Захват свободной или просроченной аренды; занятая аренда помечается rerun_requested.
+    # Если держатель отпустил аренду между INSERT и UPDATE, захват повторяется - запрос не теряется
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION acquire_run_lock(
+            p_name TEXT,
+            p_holder TEXT,
+            p_ttl_seconds INTEGER,
+            p_request_rerun BOOLEAN DEFAULT false
+        ) RETURNS JSONB AS $$
+        DECLARE
+            lock_row run_locks;
+        BEGIN
+            FOR attempt IN 1..3 LOOP
+                INSERT INTO run_locks (name, holder, expires_at)
+                VALUES (p_name, p_holder, CURRENT_TIMESTAMP + make_interval(secs => p_ttl_seconds))
+                ON CONFLICT (name) DO UPDATE SET
+                    holder = EXCLUDED.holder,
+                    acquired_at = CURRENT_TIMESTAMP,
+                    heartbeat_at = CURRENT_TIMESTAMP,
+                    expires_at = EXCLUDED.expires_at,
+                    rerun_requested = false
+                WHERE run_locks.expires_at < CURRENT_TIMESTAMP
+                RETURNING * INTO lock_row;
+
+                IF FOUND THEN
+                    RETURN jsonb_build_object('acquired', true, 'holder', lock_row.holder,
+                                              'acquired_at', lock_row.acquired_at, 'expires_at', lock_row.expires_at);
+                END IF;
+
+                UPDATE run_locks SET rerun_requested = rerun_requested OR p_request_rerun
+                WHERE name = p_name
+                RETURNING * INTO lock_row;
+
+                IF FOUND THEN
+                    RETURN jsonb_build_object('acquired', false, 'holder', lock_row.holder,
+                                              'acquired_at', lock_row.acquired_at, 'expires_at', lock_row.expires_at,
+                                              'rerun_requested', lock_row.rerun_requested);
+                END IF;
+            END LOOP;
+            RETURN jsonb_build_object('acquired', false);
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION heartbeat_run_lock(p_name TEXT, p_holder TEXT, p_ttl_seconds INTEGER)
+        RETURNS BOOLEAN AS $$
+        BEGIN
+            UPDATE run_locks SET
+                heartbeat_at = CURRENT_TIMESTAMP,
+                expires_at = CURRENT_TIMESTAMP + make_interval(secs => p_ttl_seconds)
+            WHERE name = p_name AND holder = p_holder;
+            RETURN FOUND;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    # Завершение запуска: без новых запросов аренда удаляется (false), иначе флаг снимается
+    # и держатель выполняет еще один запуск под той же арендой (true)
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION finish_run_lock(p_name TEXT, p_holder TEXT, p_ttl_seconds INTEGER)
+        RETURNS BOOLEAN AS $$
+        BEGIN
+            DELETE FROM run_locks WHERE name = p_name AND holder = p_holder AND NOT rerun_requested;
+            IF FOUND THEN
+                RETURN false;
+            END IF;
+            UPDATE run_locks SET
+                rerun_requested = false,
+                heartbeat_at = CURRENT_TIMESTAMP,
+                expires_at = CURRENT_TIMESTAMP + make_interval(secs => p_ttl_seconds)
+            WHERE name = p_name AND holder = p_holder;
+            RETURN FOUND;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+
+@migration(8, 'jobs')
+def _jobs(cursor):
+    """Очередь заданий (src/job_queue.py): воркеры забирают задания через FOR UPDATE SKIP LOCKED"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGSERIAL PRIMARY KEY,
+            job_type TEXT NOT NULL,
+            payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+            status TEXT NOT NULL DEFAULT 'queued',
+            priority INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            run_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_by TEXT,
+            locked_until TIMESTAMPTZ,
+            dedupe_key TEXT,
+            last_error TEXT,
+            result JSONB,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ,
+            CHECK (status IN ('queued', 'running', 'completed', 'dead'))
+        )
+    ''')
+    # Выборка воркера читает только ожидающие задания в порядке claim_jobs
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_queued
+        ON jobs (priority DESC, run_at, id) WHERE status = 'queued'
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_running_lease
+        ON jobs (locked_until) WHERE status = 'running'
+    ''')
+    # Одинаковые запросы (повторные нажатия в админке, слоты планировщика при остановленном
+    # воркере) схлопываются в одно ожидающее задание; выполняющееся не мешает поставить следующее
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe
+        ON jobs (dedupe_key) WHERE status = 'queued' AND dedupe_key IS NOT NULL
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at DESC)')
+
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION enqueue_job(
+            p_type TEXT,
+            p_payload JSONB DEFAULT '{}'::jsonb,
+            p_run_at TIMESTAMPTZ DEFAULT NULL,
+            p_priority INTEGER DEFAULT 0,
+            p_max_attempts INTEGER DEFAULT 5,
+            p_dedupe_key TEXT DEFAULT NULL
+        ) RETURNS JSONB AS $$
+        DECLARE
+            job_row jobs;
+        BEGIN
+            FOR attempt IN 1..3 LOOP
+                INSERT INTO jobs (job_type, payload, run_at, priority, max_attempts, dedupe_key)
+                VALUES (p_type, COALESCE(p_payload, '{}'::jsonb), COALESCE(p_run_at, CURRENT_TIMESTAMP),
+                        p_priority, p_max_attempts, p_dedupe_key)
+                ON CONFLICT (dedupe_key) WHERE status = 'queued' AND dedupe_key IS NOT NULL DO NOTHING
+                RETURNING * INTO job_row;
+
+                IF FOUND THEN
+                    RETURN jsonb_build_object('id', job_row.id, 'created', true, 'run_at', job_row.run_at);
+                END IF;
+
+                SELECT * INTO job_row FROM jobs WHERE dedupe_key = p_dedupe_key AND status = 'queued';
+                IF FOUND THEN
+                    RETURN jsonb_build_object('id', job_row.id, 'created', false, 'run_at', job_row.run_at);
+                END IF;
+            END LOOP;
+            RETURN jsonb_build_object('created', false);
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    # Захват до p_limit заданий: сначала задания с истекшей арендой (воркер упал), затем
+    # ожидающие. SKIP LOCKED - параллельные воркеры не ждут друг друга и не берут одно задание
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION claim_jobs(
+            p_worker TEXT,
+            p_limit INTEGER,
+            p_lease_seconds INTEGER,
+            p_types TEXT[] DEFAULT NULL
+        ) RETURNS SETOF jobs AS $$
+        DECLARE
+            claimed INTEGER;
+        BEGIN
+            -- Последняя попытка упала вместе с воркером - задание уходит в dead
+            UPDATE jobs SET
+                status = 'dead',
+                last_error = 'аренда истекла: воркер остановился во время выполнения',
+                locked_by = NULL,
+                locked_until = NULL,
+                finished_at = CURRENT_TIMESTAMP
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE status = 'running' AND locked_until < CURRENT_TIMESTAMP AND attempts >= max_attempts
+                FOR UPDATE SKIP LOCKED
+            );
+
+            RETURN QUERY
+            UPDATE jobs SET
+                attempts = attempts + 1,
+                locked_by = p_worker,
+                locked_until = CURRENT_TIMESTAMP + make_interval(secs => p_lease_seconds),
+                started_at = CURRENT_TIMESTAMP
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE status = 'running' AND locked_until < CURRENT_TIMESTAMP
+                  AND (p_types IS NULL OR job_type = ANY(p_types))
+                ORDER BY locked_until
+                LIMIT p_limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *;
+            GET DIAGNOSTICS claimed = ROW_COUNT;
+
+            IF claimed < p_limit THEN
+                RETURN QUERY
+                UPDATE jobs SET
+                    status = 'running',
+                    attempts = attempts + 1,
+                    locked_by = p_worker,
+                    locked_until = CURRENT_TIMESTAMP + make_interval(secs => p_lease_seconds),
+                    started_at = CURRENT_TIMESTAMP
+                WHERE id IN (
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' AND run_at <= CURRENT_TIMESTAMP
+                      AND (p_types IS NULL OR job_type = ANY(p_types))
+                    ORDER BY priority DESC, run_at, id
+                    LIMIT p_limit - claimed
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING *;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION extend_job_lease(p_id BIGINT, p_worker TEXT, p_lease_seconds INTEGER)
+        RETURNS BOOLEAN AS $$
+        BEGIN
+            UPDATE jobs SET locked_until = CURRENT_TIMESTAMP + make_interval(secs => p_lease_seconds)
+            WHERE id = p_id AND locked_by = p_worker AND status = 'running';
+            RETURN FOUND;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION complete_job(p_id BIGINT, p_worker TEXT, p_result JSONB DEFAULT NULL)
+        RETURNS BOOLEAN AS $$
+        BEGIN
+            UPDATE jobs SET
+                status = 'completed',
+                result = p_result,
+                locked_by = NULL,
+                locked_until = NULL,
+                finished_at = CURRENT_TIMESTAMP
+            WHERE id = p_id AND locked_by = p_worker AND status = 'running';
+            RETURN FOUND;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    # Ошибка попытки: повтор через p_retry_seconds, без повтора (NULL) или после последней
+    # попытки - dead. Если такое же задание уже ждет в очереди, повтор с ним объединяется.
+    # Возвращает queued, dead, merged или NULL, если аренда уже не наша
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION fail_job(
+            p_id BIGINT,
+            p_worker TEXT,
+            p_error TEXT,
+            p_retry_seconds DOUBLE PRECISION DEFAULT NULL
+        ) RETURNS TEXT AS $$
+        DECLARE
+            job_row jobs;
+            twin_id BIGINT;
+        BEGIN
+            SELECT * INTO job_row FROM jobs
+            WHERE id = p_id AND locked_by = p_worker AND status = 'running'
+            FOR UPDATE;
+            IF NOT FOUND THEN
+                RETURN NULL;
+            END IF;
+
+            IF p_retry_seconds IS NULL OR job_row.attempts >= job_row.max_attempts THEN
+                UPDATE jobs SET status = 'dead', last_error = p_error, locked_by = NULL, locked_until = NULL,
+                                finished_at = CURRENT_TIMESTAMP
+                WHERE id = p_id;
+                RETURN 'dead';
+            END IF;
+
+            IF job_row.dedupe_key IS NOT NULL THEN
+                SELECT id INTO twin_id FROM jobs WHERE dedupe_key = job_row.dedupe_key AND status = 'queued';
+                IF FOUND THEN
+                    UPDATE jobs SET status = 'completed', last_error = p_error,
+                                    result = jsonb_build_object('merged_into', twin_id),
+                                    locked_by = NULL, locked_until = NULL, finished_at = CURRENT_TIMESTAMP
+                    WHERE id = p_id;
+                    RETURN 'merged';
+                END IF;
+            END IF;
+
+            UPDATE jobs SET
+                status = 'queued',
+                last_error = p_error,
+                run_at = CURRENT_TIMESTAMP + make_interval(secs => p_retry_seconds),
+                locked_by = NULL,
+                locked_until = NULL
+            WHERE id = p_id;
+            RETURN 'queued';
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    # Ручной повтор из админки: попытки с нуля, если такое же задание еще не ждет в очереди
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION retry_job(p_id BIGINT)
+        RETURNS BOOLEAN AS $$
+        BEGIN
+            UPDATE jobs SET
+                status = 'queued',
+                attempts = 0,
+                run_at = CURRENT_TIMESTAMP,
+                finished_at = NULL
+            WHERE id = p_id AND status = 'dead'
+              AND NOT EXISTS (
+                  SELECT 1 FROM jobs twin
+                  WHERE twin.dedupe_key = jobs.dedupe_key AND twin.status = 'queued'
+              );
+            RETURN FOUND;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+
+@migration(9, 'collect_cycle_duration')
+def _collect_cycle_duration(cursor):
+    """Длительность последних циклов сбора для планирования сбора перед публикацией (scheduler.py)"""
+    # Циклы сбора - завершенные записи run_logs без публикации; циклы, урезанные по дедлайну,
+    # пишут причину в error_message и не учитываются, иначе оценка будет только уменьшаться
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION collect_cycle_duration(
+            p_fraction DOUBLE PRECISION DEFAULT 0.9,
+            p_runs INTEGER DEFAULT 20
+        ) RETURNS JSONB AS $$
+            SELECT jsonb_build_object(
+                'runs', COUNT(*),
+                'seconds', percentile_cont(p_fraction) WITHIN GROUP (ORDER BY seconds),
+                'max_seconds', MAX(seconds)
+            )
+            FROM (
+                SELECT EXTRACT(EPOCH FROM completed_at - started_at)::float8 AS seconds
+                FROM run_logs
+                WHERE status = 'completed'
+                  AND completed_at IS NOT NULL
+                  AND news_published = 0
+                  AND error_message IS NULL
+                ORDER BY started_at DESC
+                LIMIT p_runs
+            ) recent
+        $$ LANGUAGE sql STABLE
+    ''')
+
+@migration(10, 'seed_dashboard_stats')
+def _seed_dashboard_stats(cursor):
+    """Начальные значения счетчиков дашборда из первичных таблиц"""
+    # Baseline создает строку dashboard_stats с нулями, а триггер каналов дальше применяет
+    # только приращения: в базе, где каналы уже были, дашборд показывал 0 (или минус)
+    # до первой плановой сверки. Одна сверка выставляет абсолютные значения
+    cursor.execute('SELECT repair_dashboard_stats()')
+
+@migration(11, 'search_news_bounded')
+def _search_news_bounded(cursor):
+    """search_news: ранжирование только свежих совпадений и страница из 100 строк с признаком следующей"""
+    # Кандидаты - SEARCH_MAX_CANDIDATES самых новых совпадений (по id), ранжируются только они:
+    # для частого термина это самые релевантные из свежих, к старым ведут фильтры days/channel_id
+    # и более точный запрос. Предел строк 101: страница из 100 плюс строка-признак следующей
+    # страницы, которую запрашивает SearchDB.search. Сигнатура прежняя - REST вызовы не меняются
+    cursor.execute(f'''
+        CREATE OR REPLACE FUNCTION search_news(
+            p_query TEXT,
+            p_limit INTEGER DEFAULT 20,
+            p_after_rank FLOAT8 DEFAULT NULL,
+            p_after_id INTEGER DEFAULT NULL,
+            p_days INTEGER DEFAULT NULL,
+            p_channel_id INTEGER DEFAULT NULL
+        )
+        RETURNS TABLE (
+            id INTEGER,
+            channel_id INTEGER,
+            channel_username TEXT,
+            message_id BIGINT,
+            summary TEXT,
+            headline TEXT,
+            processed_at TIMESTAMP,
+            relevance_score INTEGER,
+            in_queue BOOLEAN,
+            rank FLOAT8
+        ) AS $$
+            WITH q AS (
+                SELECT websearch_to_tsquery('russian', p_query) AS query
+            ),
+            candidates AS (
+                SELECT pm.id, pm.channel_id, pm.message_id, pm.summary, pm.processed_at, pm.search_vector
+                FROM processed_messages pm, q
+                WHERE pm.search_vector @@ q.query
+                  AND (p_days IS NULL OR pm.processed_at >= CURRENT_TIMESTAMP - make_interval(days => p_days))
+                  AND (p_channel_id IS NULL OR pm.channel_id = p_channel_id)
+                ORDER BY pm.id DESC
+                LIMIT {SEARCH_MAX_CANDIDATES}
+            ),
+            hits AS (
+                SELECT c.id, c.channel_id, c.message_id, c.summary, c.processed_at, q.query,
+                       ts_rank_cd(c.search_vector, q.query)::FLOAT8 AS rank
+                FROM candidates c, q
+            )
+            SELECT h.id, h.channel_id, c.username, h.message_id, h.summary,
+                   ts_headline('russian', COALESCE(h.summary, ''), h.query,
+                               'StartSel=⟦, StopSel=⟧, MaxWords=40, MinWords=15, HighlightAll=false'),
+                   h.processed_at, pn.relevance_score, COALESCE(NOT pn.is_deleted, false), h.rank
+            FROM hits h
+            LEFT JOIN channels c ON c.id = h.channel_id
+            LEFT JOIN pending_news pn ON pn.channel_id = h.channel_id AND pn.message_id = h.message_id
+            WHERE p_after_rank IS NULL OR (h.rank, h.id) < (p_after_rank, p_after_id)
+            ORDER BY h.rank DESC, h.id DESC
+            LIMIT LEAST(GREATEST(p_limit, 1), 101)
+        $$ LANGUAGE sql STABLE
+    ''')
+
+@migration(12, 'release_run_lock')
+def _release_run_lock(cursor):
+    """Освобождение аренды прерванным запуском (ошибка или отмена цикла) без follow-up"""
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION release_run_lock(p_name TEXT, p_holder TEXT)
+        RETURNS BOOLEAN AS $$
+        BEGIN
+            DELETE FROM run_locks WHERE name = p_name AND holder = p_holder;
+            RETURN FOUND;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+
+@migration(13, 'search_news_truncated')
+def _search_news_truncated(cursor):
+    """search_news: колонка truncated - совпадений больше SEARCH_MAX_CANDIDATES, старые не ранжировались"""
+    # Новая колонка меняет тип результата - CREATE OR REPLACE не подходит, функция пересоздается
+    # в транзакции миграции. truncated одинаков во всех строках ответа
+    cursor.execute('DROP FUNCTION IF EXISTS search_news(TEXT, INTEGER, FLOAT8, INTEGER, INTEGER, INTEGER)')
+    cursor.execute(f'''
+        CREATE FUNCTION search_news(
+            p_query TEXT,
+            p_limit INTEGER DEFAULT 20,
+            p_after_rank FLOAT8 DEFAULT NULL,
+            p_after_id INTEGER DEFAULT NULL,
+            p_days INTEGER DEFAULT NULL,
+            p_channel_id INTEGER DEFAULT NULL
+        )
+        RETURNS TABLE (
+            id INTEGER,
+            channel_id INTEGER,
+            channel_username TEXT,
+            message_id BIGINT,
+            summary TEXT,
+            headline TEXT,
+            processed_at TIMESTAMP,
+            relevance_score INTEGER,
+            in_queue BOOLEAN,
+            rank FLOAT8,
+            truncated BOOLEAN
+        ) AS $$
+            WITH q AS (
+                SELECT websearch_to_tsquery('russian', p_query) AS query
+            ),
+            candidates AS (
+                SELECT pm.id, pm.channel_id, pm.message_id, pm.summary, pm.processed_at, pm.search_vector
+                FROM processed_messages pm, q
+                WHERE pm.search_vector @@ q.query
+                  AND (p_days IS NULL OR pm.processed_at >= CURRENT_TIMESTAMP - make_interval(days => p_days))
+                  AND (p_channel_id IS NULL OR pm.channel_id = p_channel_id)
+                ORDER BY pm.id DESC
+                LIMIT {SEARCH_MAX_CANDIDATES}
+            ),
+            hits AS (
+                SELECT c.id, c.channel_id, c.message_id, c.summary, c.processed_at, q.query,
+                       ts_rank_cd(c.search_vector, q.query)::FLOAT8 AS rank
+                FROM candidates c, q
+            )
+            SELECT h.id, h.channel_id, c.username, h.message_id, h.summary,
+                   ts_headline('russian', COALESCE(h.summary, ''), h.query,
+                               'StartSel=⟦, StopSel=⟧, MaxWords=40, MinWords=15, HighlightAll=false'),
+                   h.processed_at, pn.relevance_score, COALESCE(NOT pn.is_deleted, false), h.rank,
+                   (SELECT count(*) FROM candidates) >= {SEARCH_MAX_CANDIDATES}
+            FROM hits h
+            LEFT JOIN channels c ON c.id = h.channel_id
+            LEFT JOIN pending_news pn ON pn.channel_id = h.channel_id AND pn.message_id = h.message_id
+            WHERE p_after_rank IS NULL OR (h.rank, h.id) < (p_after_rank, p_after_id)
+            ORDER BY h.rank DESC, h.id DESC
+            LIMIT LEAST(GREATEST(p_limit, 1), 101)
+        $$ LANGUAGE sql STABLE
+    ''')
+
+def _ensure_migrations_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            execution_ms INTEGER
+        )
+    ''')
+
+def _applied_versions(cursor) -> Dict[int, Dict]:
+    cursor.execute('SELECT version, name, applied_at, execution_ms FROM schema_migrations ORDER BY version')
+    return {row['version']: dict(row) for row in cursor.fetchall()}
+
+def _record(cursor, m: Migration, started: float):
+    cursor.execute('''
+        INSERT INTO schema_migrations (version, name, execution_ms)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (version) DO NOTHING
+    ''', (m.version, m.name, int((time.monotonic() - started) * 1000)))
+
+def _apply(m: Migration) -> bool:
+    """Применение одной миграции; False - ее уже применил другой процесс"""
+    started = time.monotonic()
+    if m.transactional:
+        with supabase_db.transaction() as conn:
+            if conn is None:
+                raise Exception("PostgreSQL недоступен, миграции через REST API не применяются")
+            cursor = conn.cursor()
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATIONS_LOCK_ID,))
+            cursor.execute('SELECT 1 FROM schema_migrations WHERE version = %s', (m.version,))
+            if cursor.fetchone():
+                return False
+            m.apply(cursor)
+            _record(cursor, m, started)
+        return True
+
+    # CONCURRENTLY не работает внутри транзакции - каждый оператор в autocommit
+    with supabase_db.get_connection() as conn:
+        if conn is None:
+            raise Exception("PostgreSQL недоступен, миграции через REST API не применяются")
+        cursor = conn.cursor()
+        m.apply(cursor)
+        _record(cursor, m, started)
+    return True
+
+def _connection_or_fail():
+    if not supabase_db.initialized:
+        supabase_db.initialize()
+    return supabase_db.get_connection()
+
+def get_status() -> List[Dict]:
+    """Все известные миграции с отметкой о применении"""
+    with _connection_or_fail() as conn:
+        if conn is None:
+            raise Exception("PostgreSQL недоступен")
+        cursor = conn.cursor()
+        _ensure_migrations_table(cursor)
+        applied = _applied_versions(cursor)
+
+    return [
+        {
+            'version': m.version,
+            'name': m.name,
+            'applied_at': applied.get(m.version, {}).get('applied_at'),
+            'execution_ms': applied.get(m.version, {}).get('execution_ms')
+        }
+        for m in sorted(MIGRATIONS, key=lambda m: m.version)
+    ]
+
+def migrate(target: Optional[int] = None) -> List[int]:
+    """
+    Применение недостающих миграций по порядку версий
+
+    Args:
+        target: Последняя версия, которую нужно применить (None - все)
+
+    Returns:
+        Список примененных этим вызовом версий
+    """
+    with _connection_or_fail() as conn:
+        if conn is None:
+            raise Exception("PostgreSQL недоступен, миграции через REST API не применяются")
+        cursor = conn.cursor()
+        _ensure_migrations_table(cursor)
+        applied = _applied_versions(cursor)
+
+    pending = [m for m in sorted(MIGRATIONS, key=lambda m: m.version)
+               if m.version not in applied and (target is None or m.version <= target)]
+    if not pending:
+        logger.info("✅ Схема актуальна, новых миграций нет")
+        return []
+
+    done = []
+    for m in pending:
+        logger.info(f"🔧 Миграция {m.version:03d} {m.name}...")
+        try:
+            if _apply(m):
+                done.append(m.version)
+                logger.info(f"✅ Миграция {m.version:03d} {m.name} применена")
+            else:
+                logger.info(f"ℹ️ Миграция {m.version:03d} уже применена другим процессом")
+        except Exception as e:
+            logger.error(f"❌ Миграция {m.version:03d} {m.name} не применена: {e}")
+            raise
+
+    return done
@@ -7,13 +7,19 @@
 
 import asyncio
 import logging
+import math
+import time
 from typing import List, Dict, Optional, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 # Импорты внутренних модулей
-from .database import (ChannelsDB, ProcessedMessagesDB, SettingsDB, 
-                      create_connection)
+from .async_database import (AsyncChannelsDB, AsyncProcessedMessagesDB, AsyncSettingsDB,
+                             AsyncPendingNewsDB, AsyncRunLogsDB, AsyncStatsDB)
+from .pipeline_metrics import PipelineMetrics
+from .run_lock import RunLock, COLLECT_LOCK
 from .claude_summarizer import get_claude_summarizer
+from .write_buffer import get_write_buffer
+from .config import PRECOLLECT_TRIM_SLACK
 from .telegram_bot import get_telegram_bot, TelegramChannelReader
 
 # Настройка логирования
@@ -28,6 +34,12 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Сбор с дедлайном (перед публикацией): синхронизация каналов получает не больше этой доли
+# оставшегося времени, остальное - оценке и суммаризации Claude
+DEADLINE_SYNC_SHARE = 0.6
+# Время на сохранение в pending_news и запись лога после суммаризации, сек
+DEADLINE_SAVE_RESERVE = 20
+
 class NewsCollector:
     """Основной класс для сбора и обработки новостного дайджеста"""
     
@@ -37,6 +49,15 @@ class NewsCollector:
         self.channel_reader = None
         self.run_id = None
         
+        # Счетчики конвейера по каналам для графиков дашборда
+        self.metrics = PipelineMetrics()
+        
+        # Дедлайн цикла (сбор перед публикацией) и ожидаемая длительность полного цикла, сек
+        self.deadline: Optional[datetime] = None
+        self.expected_seconds: Optional[float] = None
+        # Что урезано ради дедлайна в текущем цикле
+        self.deadline_cuts: List[str] = []
+        
         # Настройки из базы данных
         self.max_news_count = 7
         self.hours_lookback = 24
@@ -56,7 +77,7 @@ class NewsCollector:
             await self._load_settings()
             
             # Создаем запись о запуске
-            self.run_id = self._create_run_log()
+            self.run_id = await self._create_run_log()
             
             logger.info("✅ NewsCollector инициализирован успешно")
             return True
@@ -67,121 +88,174 @@ class NewsCollector:
     
     async def _load_settings(self):
         """Загрузка настроек из базы данных"""
-        self.max_news_count = int(SettingsDB.get_setting('max_news_count', '7'))
-        self.hours_lookback = int(SettingsDB.get_setting('hours_lookback', '24'))
-        self.target_channel = SettingsDB.get_setting('target_channel', '@vestnik_edtech')
+        settings = await AsyncSettingsDB.get_all_settings()
+        self.max_news_count = int(settings.get('max_news_count', '7'))
+        self.hours_lookback = int(settings.get('hours_lookback', '24'))
+        self.target_channel = settings.get('target_channel', '@vestnik_edtech')
         
         logger.info(f"📊 Настройки: max_news={self.max_news_count}, lookback={self.hours_lookback}h, target={self.target_channel}")
     
-    def _create_run_log(self) -> int:
-        """Создание записи о запуске сбора новостей"""
-        conn = create_connection()
-        if conn is None:
-            logger.warning("⚠️ PostgreSQL недоступен, пропускаем создание лога запуска")
+    def _time_left(self) -> Optional[float]:
+        """Секунд до дедлайна; None - цикл без дедлайна"""
+        if self.deadline is None:
             return None
-            
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                INSERT INTO run_logs (started_at, status) 
-                VALUES (CURRENT_TIMESTAMP, 'started')
-                RETURNING id
-            ''')
-            result = cursor.fetchone()
-            run_id = result['id']
+        return (self.deadline - datetime.now(timezone.utc)).total_seconds()
+    
+    def _channels_within_deadline(self, channels: List[Dict]) -> List[Dict]:
+        """
+        Каналы, которые успеют к дедлайну
+        
+        Если до дедлайна заметно (больше PRECOLLECT_TRIM_SLACK) меньше ожидаемой длительности
+        цикла, остается доля каналов с высшим приоритетом, пропорциональная оставшемуся времени.
+        Задание стартует ровно за ожидаемую длительность до дедлайна, поэтому задержка забора
+        из очереди и инициализация не должны урезать цикл, пришедший вовремя
+        """
+        time_left = self._time_left()
+        if (time_left is None or not self.expected_seconds
+                or time_left >= self.expected_seconds * (1 - PRECOLLECT_TRIM_SLACK)):
+            return channels
+        
+        ordered = sorted(channels, key=lambda ch: ch.get('priority') or 0, reverse=True)
+        keep = max(1, math.ceil(len(ordered) * max(time_left, 0) / self.expected_seconds))
+        dropped = [ch['username'] for ch in ordered[keep:]]
+        if dropped:
+            logger.warning(f"⏰ До дедлайна {time_left:.0f} с при ожидаемых {self.expected_seconds:.0f} с: "
+                           f"пропускаем {len(dropped)} каналов с низким приоритетом: {', '.join(dropped)}")
+            self.deadline_cuts.append(f"пропущены каналы: {', '.join(dropped)}")
+        return ordered[:keep]
+    
+    async def _create_run_log(self) -> Optional[int]:
+        """Создание записи о запуске сбора новостей"""
+        run_id = await AsyncRunLogsDB.create_run_log()
+        if run_id:
             logger.info(f"📝 Создан лог запуска #{run_id}")
-            return run_id
-        except Exception as e:
-            logger.error(f"❌ Ошибка создания лога запуска: {e}")
-            return None
+            await AsyncStatsDB.record(run_id=run_id)
+        return run_id
     
-    def _update_run_log(self, status: str, channels_processed: int = 0, 
-                       messages_collected: int = 0, news_published: int = 0, 
-                       error_message: str = None):
+    async def _update_run_log(self, status: str, channels_processed: int = 0, 
+                              messages_collected: int = 0, news_published: int = 0, 
+                              error_message: str = None):
         """Обновление записи о запуске"""
         if not self.run_id:
             return
-            
-        conn = create_connection()
-        if conn is None:
-            logger.warning("⚠️ PostgreSQL недоступен, пропускаем обновление лога запуска")
-            return
-            
-        cursor = conn.cursor()
+        
+        await AsyncRunLogsDB.update_run_log(
+            self.run_id, status, channels_processed, messages_collected, news_published, error_message
+        )
+        await self._record_run_stats(self.run_id, status, messages_collected, news_published)
+    
+    async def _add_run_log(self, status: str, messages_collected: int = 0, news_published: int = 0):
+        """Отдельная запись о запуске (публикация накопленного дайджеста)"""
+        run_id = await AsyncRunLogsDB.create_run_log()
+        if run_id:
+            await AsyncRunLogsDB.update_run_log(
+                run_id, status, messages_collected=messages_collected, news_published=news_published
+            )
+            await self._record_run_stats(run_id, status, messages_collected, news_published)
+    
+    async def _record_run_stats(self, run_id: int, status: str, messages_collected: int, news_published: int):
+        """Учет завершенного запуска в статистике дашборда (как считает repair_dashboard_stats)"""
+        completed = status == 'completed'
+        await AsyncStatsDB.record(
+            messages_collected=messages_collected,
+            news_published=news_published if completed else 0,
+            runs_completed=1 if completed else 0,
+            runs_failed=1 if status == 'failed' else 0,
+            run_id=run_id
+        )
+    
+    async def _flush_metrics(self):
+        """Сброс накопленных счетчиков конвейера в channel_stats_hourly одним запросом"""
+        if self.metrics:
+            await AsyncStatsDB.record_channel_stats(self.metrics.rows())
+            self.metrics.reset()
+    
+    async def _replay_write_buffer(self):
+        """Досылка записей, отложенных в локальный буфер во время недоступности базы"""
+        write_buffer = get_write_buffer()
         try:
-            cursor.execute('''
-                UPDATE run_logs SET 
-                    completed_at = CURRENT_TIMESTAMP,
-                    status = %s,
-                    channels_processed = %s,
-                    messages_collected = %s,
-                    news_published = %s,
-                    error_message = %s
-                WHERE id = %s
-            ''', (status, channels_processed, messages_collected, 
-                  news_published, error_message, self.run_id))
+            if write_buffer.count():
+                await asyncio.to_thread(write_buffer.replay)
         except Exception as e:
-            logger.error(f"❌ Ошибка обновления лога запуска: {e}")
+            logger.warning(f"⚠️ Не удалось дослать локальный буфер записей: {e}")
     
     async def collect_news(self) -> Dict[str, Any]:
         """Сбор новых сообщений из всех активных каналов"""
         try:
             logger.info("📡 Начинаем сбор новостей из каналов...")
             
-            # Получаем список активных каналов
-            channels = ChannelsDB.get_active_channels()
+            # Получаем список активных каналов: в долгоживущем процессе - из реестра ленты изменений
+            from .change_feed import get_change_feed
+            change_feed = get_change_feed()
+            if change_feed.started:
+                channels = change_feed.get_active_channels()
+            else:
+                channels = await AsyncChannelsDB.get_active_channels()
             if not channels:
                 logger.warning("⚠️ Нет активных каналов для мониторинга")
                 return {"success": False, "error": "Нет активных каналов"}
             
             logger.info(f"📺 Найдено {len(channels)} активных каналов")
+            channels = self._channels_within_deadline(channels)
             
             all_messages = []
             channels_processed = 0
             
+            # Один пул сессий на весь цикл: каналы шардируются по аккаунтам и читаются параллельно
+            from .telegram_pool import get_telegram_pool
+            pool = await get_telegram_pool()
+            if not pool:
+                return {"success": False, "error": "Не удалось инициализировать Telegram сессии"}
+            
+            # Досинхронизируем локальный архив по watermark и читаем окно уже из него
+            from .message_archive import get_message_archive
+            archive = get_message_archive()
+            try:
+                sync = pool.sync_channels(channels, archive, hours_lookback=self.hours_lookback)
+                time_left = self._time_left()
+                if time_left is None:
+                    await sync
+                else:
+                    try:
+                        await asyncio.wait_for(sync, timeout=max(time_left * DEADLINE_SYNC_SHARE, 1))
+                    except asyncio.TimeoutError:
+                        # Уже выгруженное лежит в архиве - обрабатываем его, остальное догонит следующий цикл
+                        logger.warning("⏰ Синхронизация каналов прервана по дедлайну, обрабатываем то, что уже в архиве")
+                        self.deadline_cuts.append("синхронизация прервана")
+                logger.info(f"📡 Состояние пула сессий: {pool.get_stats()}")
+            finally:
+                await pool.close()
+            
+            from datetime import timezone
+            window_end = datetime.now(timezone.utc)
+            window_start = window_end - timedelta(hours=self.hours_lookback)
+            
             # Обрабатываем каждый канал
             for channel in channels:
                 try:
                     logger.info(f"🔍 Обрабатываем канал {channel['username']} (приоритет: {channel['priority']})")
                     
-                    # Получаем реальные сообщения через Telethon
-                    try:
-                        logger.info(f"📡 Получение реальных данных из {channel['username']}")
-                        from .telegram_reader import get_telegram_reader
-                        real_reader = await get_telegram_reader()
-                        
-                        if not real_reader:
-                            logger.warning(f"⚠️ Не удалось инициализировать Telegram reader для {channel['username']}, пропускаем")
-                            continue
-                            
-                        if not real_reader.initialized:
-                            logger.warning(f"⚠️ Telegram reader не инициализирован для {channel['username']}, пропускаем")
-                            continue
-                            
-                        # Получаем новые сообщения
-                        messages = await real_reader.get_channel_messages(channel['username'], limit=50, hours_lookback=self.hours_lookback)
-                        
-                        if not messages:
-                            logger.info(f"ℹ️ {channel['username']}: новых сообщений не найдено, пропускаем")
-                            continue
-                            
-                    except Exception as reader_error:
-                        logger.warning(f"⚠️ Ошибка получения данных из {channel['username']}: {reader_error} - пропускаем канал")
+                    messages = archive.get_messages(channel['username'], window_start, window_end)
+                    if not messages:
+                        logger.info(f"ℹ️ {channel['username']}: новых сообщений не найдено, пропускаем")
                         continue
                     
-                    # Фильтруем новые сообщения
+                    # Фильтруем новые сообщения (уже обработанные проверяем одним запросом на канал)
+                    processed_ids = await AsyncProcessedMessagesDB.get_processed_ids(
+                        channel['id'], [msg['id'] for msg in messages]
+                    )
                     new_messages = []
                     for msg in messages:
                         msg['channel_id'] = channel['id']
                         msg['priority'] = channel['priority']
                         msg['channel_display'] = channel.get('display_name', channel['username'])
                         
-                        # Проверяем, не было ли сообщение уже обработано
-                        if not ProcessedMessagesDB.is_message_processed(channel['id'], msg['id']):
+                        if msg['id'] not in processed_ids:
                             new_messages.append(msg)
                     
                     all_messages.extend(new_messages)
                     channels_processed += 1
+                    self.metrics.add(channel['id'], 'messages_fetched', len(new_messages))
                     
                     logger.info(f"✅ {channel['username']}: найдено {len(new_messages)} новых сообщений")
                     
@@ -220,6 +294,8 @@ class NewsCollector:
         for msg in messages:
             if msg['date'] >= time_threshold:
                 time_filtered.append(msg)
+            else:
+                self.metrics.add(msg.get('channel_id'), 'rejected_time')
         
         logger.info(f"⏰ После фильтрации по времени: {len(time_filtered)} сообщений")
         
@@ -239,6 +315,8 @@ class NewsCollector:
             if relevance_score > 0:  # Минимум одно EdTech ключевое слово
                 msg['relevance_score'] = relevance_score
                 content_filtered.append(msg)
+            else:
+                self.metrics.add(msg.get('channel_id'), 'rejected_keywords')
         
         logger.info(f"🎯 После фильтрации по релевантности: {len(content_filtered)} сообщений")
         
@@ -273,6 +351,7 @@ class NewsCollector:
             
             if is_ad:
                 logger.info(f"🚫 Отклоняем рекламу: {msg['text'][:50]}...")
+                self.metrics.add(msg.get('channel_id'), 'rejected_ads')
                 continue
             
             ad_filtered.append(msg)
@@ -291,6 +370,8 @@ class NewsCollector:
         
         # Ограничиваем количество
         final_messages = ad_filtered[:self.max_news_count]
+        for msg in ad_filtered[self.max_news_count:]:
+            self.metrics.add(msg.get('channel_id'), 'rejected_limit')
         
         logger.info(f"📋 Финальная выборка: {len(final_messages)} сообщений (макс. {self.max_news_count})")
         
@@ -305,8 +386,24 @@ class NewsCollector:
         logger.info(f"🤖 Оценка релевантности и суммаризация {len(messages)} сообщений...")
         
         processed_messages = []
+        started = time.monotonic()
         
-        for msg in messages:
+        for index, msg in enumerate(messages):
+            # Сообщения отсортированы по приоритету: при нехватке времени до дедлайна
+            # отбрасываются хвостовые, то есть из каналов с низким приоритетом
+            time_left = self._time_left()
+            per_message = (time.monotonic() - started) / index if index else 0
+            if time_left is not None and time_left - DEADLINE_SAVE_RESERVE < per_message:
+                skipped = messages[index:]
+                kept_channels = {m.get('channel') for m in processed_messages}
+                dropped = sorted({m.get('channel', '') for m in skipped} - kept_channels)
+                logger.warning(f"⏰ Дедлайн: пропускаем {len(skipped)} сообщений"
+                               f"{' из каналов ' + ', '.join(dropped) if dropped else ''}")
+                self.deadline_cuts.append(f"не суммаризировано {len(skipped)} сообщений")
+                for m in skipped:
+                    self.metrics.add(m.get('channel_id'), 'rejected_limit')
+                break
+            
             try:
                 # Сначала оцениваем релевантность
                 if self.claude_summarizer:
@@ -315,12 +412,15 @@ class NewsCollector:
                         msg.get('channel_display', msg.get('channel', ''))
                     )
                     
+                    self.metrics.observe_llm(msg.get('channel_id'), relevance_result)
+                    
                     relevance_score = relevance_result.get('relevance_score', 5)
                     msg['relevance_score'] = relevance_score
                     
                     # Фильтруем новости с оценкой меньше 3 (было 5)
                     if relevance_score < 3:
                         logger.info(f"🚫 Пропускаем новость (релевантность: {relevance_score}/10): {msg['text'][:50]}...")
+                        self.metrics.add(msg.get('channel_id'), 'rejected_relevance')
                         continue
                     
                     logger.info(f"✅ Новость релевантна ({relevance_score}/10): {msg['text'][:50]}...")
@@ -331,9 +431,12 @@ class NewsCollector:
                         msg.get('channel_display', msg.get('channel', ''))
                     )
                     
+                    self.metrics.observe_llm(msg.get('channel_id'), summary_result)
+                    
                     if summary_result['success']:
                         msg['summary'] = summary_result['summary']
                         msg['summary_quality'] = summary_result.get('quality_score', 8)
+                        self.metrics.add(msg.get('channel_id'), 'summarized')
                     else:
                         msg['summary'] = summary_result['summary']  # Fallback summary
                         msg['summary_quality'] = 3
@@ -376,6 +479,8 @@ class NewsCollector:
             logger.info(f"📏 Ограничиваем количество новостей: {len(messages)} → {max_news_count} для соблюдения лимита Telegram")
             # Берем новости с наивысшими оценками релевантности
             sorted_messages = sorted(messages, key=lambda x: x.get('relevance_score', 5), reverse=True)
+            for msg in sorted_messages[max_news_count:]:
+                self.metrics.add(msg.get('channel_id'), 'rejected_limit')
             return sorted_messages[:max_news_count]
         
         return messages
@@ -579,42 +684,44 @@ class NewsCollector:
             
             scheduled_for = now_msk.date()
             
-            # Сохраняем каждую новость
-            saved_count = 0
+            # Сохраняем всю пачку одним запросом вместе с отметкой обработанных
+            news_batch = []
             for msg in messages:
-                try:
-                    # Импортируем здесь чтобы избежать циклических импортов
-                    from .database import PendingNewsDB
-                    
-                    # Используем username канала для правильных ссылок
-                    channel_username = msg.get('channel', '@unknown')
-                    if not channel_username.startswith('@'):
-                        channel_username = '@' + channel_username
-                        
-                    news_id = PendingNewsDB.add_pending_news(
-                        channel_id=msg['channel_id'],
-                        message_id=msg['id'],
-                        channel_name=channel_username,  # Сохраняем @username
-                        message_text=msg.get('text', ''),
-                        summary=msg.get('summary', ''),
-                        relevance_score=msg.get('relevance_score', 5),
-                        scheduled_for=now_msk,
-                        digest_type=digest_type
-                    )
-                    
-                    if news_id:
-                        saved_count += 1
-                        logger.info(f"✅ Новость сохранена: {msg.get('summary', '')[:50]}...")
-                        
-                        # Отмечаем как обработанное
-                        ProcessedMessagesDB.mark_message_processed(
-                            msg['channel_id'], 
-                            msg['id'],
-                            msg.get('text', ''),
-                            msg.get('summary', '')
-                        )
-                except Exception as e:
-                    logger.error(f"❌ Ошибка сохранения новости: {e}")
+                # Используем username канала для правильных ссылок
+                channel_username = msg.get('channel', '@unknown')
+                if not channel_username.startswith('@'):
+                    channel_username = '@' + channel_username
+                
+                news_batch.append({
+                    'channel_id': msg['channel_id'],
+                    'message_id': msg['id'],
+                    'channel_name': channel_username,  # Сохраняем @username
+                    'message_text': msg.get('text', ''),
+                    'summary': msg.get('summary', ''),
+                    'relevance_score': msg.get('relevance_score', 5),
+                    'scheduled_for': now_msk,
+                    'digest_type': digest_type,
+                    'views': msg.get('views', 0),
+                    'forwards': msg.get('forwards', 0)
+                })
+            
+            outcomes = await AsyncPendingNewsDB.add_pending_news_many(news_batch)
+            saved_count = sum(1 for outcome in outcomes if outcome['status'] == 'inserted')
+            duplicates = sum(1 for outcome in outcomes if outcome['status'] == 'duplicate')
+            buffered = sum(1 for outcome in outcomes if outcome['status'] == 'buffered')
+            if saved_count + duplicates:
+                # Сохраненные и дубли отмечены в processed_messages этим же запросом
+                await AsyncStatsDB.record(messages_processed=saved_count + duplicates)
+            if duplicates:
+                logger.info(f"ℹ️ {duplicates} новостей уже были в очереди")
+            if buffered:
+                logger.warning(f"💾 {buffered} новостей сохранено в локальный буфер, будут досланы при следующем запуске")
+            if outcomes and all(outcome['status'] == 'error' for outcome in outcomes):
+                return {
+                    "success": False,
+                    "error": "Не удалось сохранить новости в очередь",
+                    "saved_count": 0
+                }
             
             logger.info(f"💾 Сохранено {saved_count} из {len(messages)} новостей")
             
@@ -633,16 +740,84 @@ class NewsCollector:
                 "saved_count": 0
             }
     
-    async def run_full_cycle(self) -> Dict[str, Any]:
+    async def run_full_cycle(self, deadline: Optional[datetime] = None,
+                             expected_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Полный цикл под арендой COLLECT_LOCK: один цикл на все процессы
+
+        Если цикл уже идет в другом процессе, возвращается already_running, а держатель
+        аренды выполнит после своего цикла один дополнительный (запросы схлопываются).
+        Цикл с дедлайном дополнительный не запрашивает - тот прошел бы без дедлайна;
+        такой сбор повторяет вызывающий (run_collect ставит задание заново).
+
+        Args:
+            deadline: К этому моменту новости должны быть в pending_news (сбор перед публикацией):
+                при опоздании пропускаются каналы с низким приоритетом
+            expected_seconds: Ожидаемая длительность цикла для оценки опоздания
+        """
+        self.deadline = deadline
+        self.expected_seconds = expected_seconds
+        lock = RunLock(COLLECT_LOCK)
+        try:
+            acquired = await lock.acquire(request_rerun=deadline is None)
+        except Exception as e:
+            # База недоступна целиком - аренду не проверить, сбор все равно уйдет в буфер записи
+            logger.warning(f"⚠️ Не удалось проверить аренду сбора: {e}, запускаем без нее")
+            return await self._run_cycle()
+
+        if not acquired:
+            return {
+                "success": False,
+                "already_running": True,
+                "error": f"Сбор уже выполняется ({lock.info.get('holder')} с {lock.info.get('acquired_at')})",
+                "rerun_requested": bool(lock.info.get('rerun_requested')),
+                "execution_time": 0,
+                "channels_processed": 0,
+                "messages_collected": 0,
+                "messages_filtered": 0,
+                "messages_summarized": 0,
+                "news_published": 0
+            }
+
+        followup_runs = 0
+        deadline_cuts = []
+        released = False
+        try:
+            while True:
+                result = await self._run_cycle()
+                # Дедлайн относится только к первому циклу: дополнительные идут уже после него
+                if self.deadline:
+                    deadline_cuts = result.get("deadline_cuts", [])
+                    self.deadline = None
+                if not await lock.finish():
+                    released = True
+                    break
+                followup_runs += 1
+        finally:
+            # Цикл упал или отменен: иначе продление держало бы аренду, и в долгоживущем
+            # воркере каждый следующий сбор получал бы already_running
+            if not released:
+                await lock.release()
+        result["followup_runs"] = followup_runs
+        result["deadline_cuts"] = deadline_cuts
+        return result
+
+    async def _run_cycle(self) -> Dict[str, Any]:
         """Полный цикл сбора, обработки и публикации новостей"""
         start_time = datetime.now()
         logger.info(f"🚀 Запуск полного цикла сбора новостей в {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        self.deadline_cuts = []
+        if self.deadline:
+            logger.info(f"⏰ Дедлайн цикла: {self.deadline.isoformat()} (через {self._time_left():.0f} с)")
         
         try:
             # Инициализация компонентов
             if not await self.initialize():
                 raise Exception("Ошибка инициализации")
             
+            # Сначала досылаем то, что не записалось во время прошлых сбоев базы
+            await self._replay_write_buffer()
+            
             # Сбор новостей
             collection_result = await self.collect_news()
             if not collection_result["success"]:
@@ -659,6 +834,8 @@ class NewsCollector:
             
             # Проверяем и ограничиваем количество новостей для соблюдения лимита Telegram
             summarized_messages = self._limit_messages_for_telegram(summarized_messages)
+            for msg in summarized_messages:
+                self.metrics.add(msg.get('channel_id'), 'accepted')
             
             # Сохраняем в очередь вместо публикации
             save_result = await self.save_to_pending(summarized_messages)
@@ -677,17 +854,27 @@ class NewsCollector:
                 "news_published": 0,  # Не публикуем сразу
                 "news_saved": save_result.get("saved_count", 0),
                 "digest_type": save_result.get("digest_type", "Unknown"),
-                "scheduled_for": save_result.get("scheduled_for", "")
+                "scheduled_for": save_result.get("scheduled_for", ""),
+                "deadline_cuts": list(self.deadline_cuts)
             }
             
-            # Обновляем лог запуска
+            await self._flush_metrics()
+            
+            # Обновляем лог запуска; урезанный по дедлайну цикл помечается, чтобы не занижать
+            # оценку длительности для планирования (collect_cycle_duration)
             status = "completed" if result["success"] else "failed"
-            self._update_run_log(
+            if not result["success"]:
+                error_message = save_result.get("error")
+            elif self.deadline_cuts:
+                error_message = f"Дедлайн: {'; '.join(self.deadline_cuts)}"
+            else:
+                error_message = None
+            await self._update_run_log(
                 status=status,
                 channels_processed=result["channels_processed"],
                 messages_collected=result["messages_collected"],
                 news_published=result["news_published"],
-                error_message=save_result.get("error") if not result["success"] else None
+                error_message=error_message
             )
             
             logger.info(f"🎉 Полный цикл завершен за {execution_time:.1f}с:")
@@ -706,8 +893,10 @@ class NewsCollector:
             
             logger.error(f"❌ Ошибка полного цикла: {e}")
             
+            await self._flush_metrics()
+            
             # Обновляем лог запуска с ошибкой
-            self._update_run_log(
+            await self._update_run_log(
                 status="failed",
                 error_message=str(e)
             )
@@ -723,16 +912,75 @@ class NewsCollector:
                 "news_published": 0
             }
     
+    async def refresh_pending_engagement(self, pending_news: List[Dict]) -> List[Dict]:
+        """
+        Обновление просмотров и репостов накопленных новостей перед публикацией
+        
+        Счетчики запрашиваются пачками по каналу через пул сессий, сохраняются в pending_news
+        и используются для переранжирования. При недоступности Telegram порядок не меняется.
+        """
+        from .telegram_pool import get_telegram_pool
+        
+        by_channel: Dict[str, List[Dict]] = {}
+        for news in pending_news:
+            by_channel.setdefault(news['channel_name'], []).append(news)
+        
+        pool = None
+        try:
+            pool = await get_telegram_pool()
+            if not pool:
+                logger.warning("⚠️ Пул сессий недоступен, публикуем без обновления просмотров")
+                return pending_news
+            
+            results = await asyncio.gather(*(
+                pool.run_for_channel(
+                    channel,
+                    lambda reader, channel=channel, items=items: reader.get_messages_engagement(
+                        channel, [news['message_id'] for news in items]
+                    ),
+                    default={}
+                )
+                for channel, items in by_channel.items()
+            ), return_exceptions=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось обновить просмотры: {e}")
+            return pending_news
+        finally:
+            if pool:
+                await pool.close()
+        
+        updates = []
+        for (channel, items), engagement in zip(by_channel.items(), results):
+            if isinstance(engagement, Exception):
+                logger.warning(f"⚠️ Ошибка обновления просмотров {channel}: {engagement}")
+                continue
+            for news in items:
+                if news['message_id'] in engagement:
+                    news['views'], news['forwards'] = engagement[news['message_id']]
+                    updates.append({'id': news['id'], 'views': news['views'], 'forwards': news['forwards']})
+        
+        if updates:
+            updated = await AsyncPendingNewsDB.update_engagement(updates)
+            logger.info(f"👁️ Обновлены просмотры {updated} из {len(pending_news)} новостей")
+        
+        def engagement_score(news):
+            views = news.get('views') or 0
+            forwards = news.get('forwards') or 0
+            return (news.get('relevance_score') or 0) * 10 + min(views, 1000) / 100 + min(forwards, 100) / 10
+        
+        # sorted стабилен: при равном счете сохраняется порядок get_pending_news
+        return sorted(pending_news, key=engagement_score, reverse=True)
+    
     async def publish_accumulated_digest(self) -> Dict[str, Any]:
         """Публикация накопленного дайджеста"""
         try:
             logger.info("📤 Публикация накопленного дайджеста...")
             
-            # Импортируем здесь чтобы избежать циклических импортов
-            from .database import PendingNewsDB
+            # Отложенные в буфер новости должны попасть в дайджест
+            await self._replay_write_buffer()
             
             # Получаем накопленные новости
-            pending_news = PendingNewsDB.get_pending_news()
+            pending_news = await AsyncPendingNewsDB.get_pending_news()
             
             if not pending_news:
                 logger.info("📭 Нет накопленных новостей для публикации")
@@ -742,6 +990,9 @@ class NewsCollector:
                     "news_count": 0
                 }
             
+            # Свежие просмотры/репосты влияют на отбор лучших новостей
+            pending_news = await self.refresh_pending_engagement(pending_news)
+            
             # Преобразуем в формат для публикации
             messages = []
             for news in pending_news[:self.max_news_count]:  # Ограничиваем количество
@@ -764,16 +1015,20 @@ class NewsCollector:
             if publication_success:
                 logger.info("✅ Дайджест успешно опубликован!")
                 
-                # Помечаем новости как удаленные (мягкое удаление)
+                # Помечаем новости как удаленные (мягкое удаление) одним запросом
+                await AsyncPendingNewsDB.delete_pending_news_many(
+                    [news['id'] for news in pending_news[:self.max_news_count]]
+                )
+                
                 for news in pending_news[:self.max_news_count]:
-                    PendingNewsDB.delete_pending_news(news['id'])
+                    self.metrics.add(news.get('channel_id'), 'published')
+                await self._flush_metrics()
                 
                 # Добавляем лог запуска
-                self._add_run_log(
+                await self._add_run_log(
                     status='completed',
                     messages_collected=0,
-                    news_published=len(messages),
-                    digest_text=digest[:500] + ('...' if len(digest) > 500 else '')
+                    news_published=len(messages)
                 )
                 
                 return {
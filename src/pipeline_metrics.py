@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Счетчики конвейера сбора по каналам для графиков дашборда
+Запуск копит их в памяти и сбрасывает одной пачкой в channel_stats_hourly (record_channel_stats).
+Задержки LLM хранятся гистограммой с фиксированными границами: в отличие от готовых
+перцентилей, гистограммы складываются между часами, днями и каналами
+"""
+
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence
+
+# Счетчики строки channel_stats_hourly/channel_stats_daily (порядок = порядок колонок)
+COUNTERS = (
+    'messages_fetched',     # новые (еще не обработанные) сообщения из архива
+    'rejected_time',        # отсеяны по окну hours_lookback
+    'rejected_keywords',    # нет EdTech ключевых слов
+    'rejected_ads',         # реклама
+    'rejected_limit',       # не вошли в max_news_count
+    'rejected_relevance',   # Claude оценил релевантность ниже порога
+    'accepted',             # прошли все фильтры
+    'summarized',           # успешно суммаризированы Claude
+    'published',            # опубликованы в дайджесте
+    'llm_calls',
+    'llm_input_tokens',
+    'llm_output_tokens',
+)
+
+# Верхние границы бакетов задержки LLM, мс; последний бакет - все, что дольше
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 4000, 8000, 16000)
+
+def latency_bucket(latency_ms: float) -> int:
+    """Индекс бакета гистограммы для задержки"""
+    return bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+
+def latency_percentiles(histogram: Optional[Sequence[int]],
+                        percentiles: Sequence[int] = (50, 90, 99)) -> Dict[str, Optional[int]]:
+    """
+    Перцентили задержки по гистограмме (верхняя граница бакета, мс)
+
+    Для последнего бакета границы нет - возвращается удвоенная последняя граница.
+    """
+    histogram = list(histogram or [])
+    total = sum(histogram)
+    result = {}
+    for p in percentiles:
+        if not total:
+            result[f'p{p}'] = None
+            continue
+        rank = total * p / 100
+        seen = 0
+        for index, count in enumerate(histogram):
+            seen += count
+            if seen >= rank:
+                break
+        result[f'p{p}'] = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else LATENCY_BUCKETS_MS[-1] * 2
+    return result
+
+class PipelineMetrics:
+    """Счетчики одного запуска по channel_id"""
+
+    def __init__(self):
+        self._counters: Dict[int, Dict[str, int]] = {}
+        self._latency: Dict[int, List[int]] = {}
+
+    def add(self, channel_id: Optional[int], counter: str, value: int = 1):
+        if channel_id is None or not value:
+            return
+        counters = self._counters.setdefault(channel_id, dict.fromkeys(COUNTERS, 0))
+        counters[counter] += value
+
+    def observe_llm(self, channel_id: Optional[int], result: Dict):
+        """Учет одного вызова Claude по результату ClaudeSummarizer (токены и latency_ms)"""
+        if channel_id is None or 'latency_ms' not in result:
+            return
+        self.add(channel_id, 'llm_calls')
+        self.add(channel_id, 'llm_input_tokens', result.get('input_tokens') or 0)
+        self.add(channel_id, 'llm_output_tokens', result.get('output_tokens') or 0)
+        histogram = self._latency.setdefault(channel_id, [0] * (len(LATENCY_BUCKETS_MS) + 1))
+        histogram[latency_bucket(result['latency_ms'])] += 1
+
+    def rows(self) -> List[Dict]:
+        """Строки для record_channel_stats"""
+        return [
+            {'channel_id': channel_id, **counters, 'llm_latency_hist': self._latency.get(channel_id)}
+            for channel_id, counters in self._counters.items()
+        ]
+
+    def reset(self):
+        self._counters.clear()
+        self._latency.clear()
+
+    def __bool__(self) -> bool:
+        return bool(self._counters)
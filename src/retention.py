@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Очистка старых данных по срокам хранения из настроек
+- processed_messages: через retention_text_days дней удаляется текст и саммари,
+  ключи (channel_id, message_id) остаются для дедупликации
+- pending_news: через retention_pending_days дней неопубликованные новости удаляются
+- channel_stats_hourly: старые часы сворачиваются в дневные строки
+- scheduler_fires: журнал срабатываний планировщика хранится SCHEDULER_FIRES_DAYS дней
+- jobs: выполненные и dead задания очереди хранятся JOBS_DAYS дней
+Запускается планировщиком раз в сутки и командой python main.py retention
+"""
+
+import logging
+import os
+import time
+from typing import Dict
+
+try:
+    from .database import SettingsDB, ProcessedMessagesDB, PendingNewsDB, ChannelStatsDB, SchedulerFiresDB, JobsDB
+except ImportError:
+    from database import SettingsDB, ProcessedMessagesDB, PendingNewsDB, ChannelStatsDB, SchedulerFiresDB, JobsDB
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/database.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Сроки по умолчанию, если настроек нет (миграция 003 добавляет их с этими значениями)
+DEFAULT_TEXT_DAYS = 30
+DEFAULT_PENDING_DAYS = 14
+# Почасовая статистика каналов хранится дольше окна графиков по часам
+CHANNEL_STATS_HOURLY_DAYS = 30
+SCHEDULER_FIRES_DAYS = 30
+JOBS_DAYS = 30
+
+def _days_setting(key: str, default: int) -> int:
+    try:
+        return max(int(SettingsDB.get_setting(key, str(default))), 1)
+    except ValueError:
+        logger.warning(f"⚠️ Некорректное значение настройки {key}, используем {default}")
+        return default
+
+def run_retention() -> Dict[str, int]:
+    """
+    Одна очистка по всем таблицам
+
+    Returns:
+        Число затронутых строк по каждому шагу
+    """
+    started = time.monotonic()
+    text_days = _days_setting('retention_text_days', DEFAULT_TEXT_DAYS)
+    pending_days = _days_setting('retention_pending_days', DEFAULT_PENDING_DAYS)
+    logger.info(f"🧹 Очистка: текст старше {text_days} дн., накопленные новости старше {pending_days} дн.")
+
+    result = {
+        'processed_text_pruned': ProcessedMessagesDB.prune_text(text_days),
+        'pending_news_deleted': PendingNewsDB.clear_old_pending_news(pending_days),
+        'channel_stats_daily_rows': ChannelStatsDB.compact(CHANNEL_STATS_HOURLY_DAYS),
+        'scheduler_fires_deleted': SchedulerFiresDB.prune(SCHEDULER_FIRES_DAYS),
+        'jobs_deleted': JobsDB.prune(JOBS_DAYS),
+    }
+
+    logger.info(f"✅ Очистка завершена за {time.monotonic() - started:.1f} с: {result}")
+    return result
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Аренда запуска между процессами (web, worker, scheduler)
+Строка run_locks с TTL: держатель продлевает ее каждые TTL/3, а аренда упавшего процесса
+освобождается сама через TTL. Запуск, пришедший во время чужого цикла, не ждет и не
+выполняется параллельно: он помечает аренду rerun_requested, и держатель после своего
+цикла выполняет ровно один дополнительный - сколько бы запросов ни пришло
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Dict, Optional
+
+try:
+    from .async_database import AsyncRunLockDB
+    from .config import RUN_LOCK_TTL
+except ImportError:
+    from async_database import AsyncRunLockDB
+    from config import RUN_LOCK_TTL
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/news_collector.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Аренда полного цикла сбора (NewsCollector.run_full_cycle)
+COLLECT_LOCK = 'collect'
+
+class RunLock:
+    """Аренда одного имени для этого процесса"""
+
+    def __init__(self, name: str, ttl: int = RUN_LOCK_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Ответ acquire_run_lock: кто держит аренду, с какого времени, поставлен ли повтор
+        self.info: Dict = {}
+        # Аренду продлить не удалось - ее мог захватить другой процесс
+        self.lost = False
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def acquire(self, request_rerun: bool = True) -> bool:
+        """
+        Захват аренды
+
+        Args:
+            request_rerun: Если аренда занята, попросить держателя выполнить еще один запуск
+
+        Returns:
+            True - аренда наша и продлевается в фоне до finish()
+        """
+        self.info = await AsyncRunLockDB.acquire(self.name, self.holder, self.ttl, request_rerun) or {}
+        if not self.info.get('acquired'):
+            logger.info(f"⏳ {self.name} уже выполняется ({self.info.get('holder')} с {self.info.get('acquired_at')})"
+                        f"{', повторный запуск поставлен в очередь' if self.info.get('rerun_requested') else ''}")
+            return False
+
+        self.lost = False
+        self._heartbeat = asyncio.create_task(self._keep_alive())
+        logger.info(f"🔒 Аренда {self.name} захвачена ({self.holder}, TTL {self.ttl}с)")
+        return True
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                if not await AsyncRunLockDB.heartbeat(self.name, self.holder, self.ttl):
+                    self.lost = True
+                    logger.error(f"❌ Аренда {self.name} потеряна: другой процесс мог начать параллельный запуск")
+                    return
+            except Exception as e:
+                # Следующая попытка через TTL/3; аренда истечет только после нескольких пропусков
+                logger.warning(f"⚠️ Не удалось продлить аренду {self.name}: {e}")
+
+    async def finish(self) -> bool:
+        """
+        Конец запуска
+
+        Returns:
+            True - пока шел запуск, пришли новые запросы: аренда остается у нас для еще одного
+            запуска (продление продолжается). False - аренда освобождена
+        """
+        rerun = False
+        try:
+            if not self.lost:
+                rerun = await AsyncRunLockDB.finish(self.name, self.holder, self.ttl)
+        except Exception as e:
+            # Аренда освободится сама через TTL
+            logger.warning(f"⚠️ Не удалось освободить аренду {self.name}: {e}")
+
+        if rerun:
+            logger.info(f"🔁 {self.name}: за время запуска пришли новые запросы, выполняем еще один")
+            return True
+
+        self._stop_heartbeat()
+        logger.info(f"🔓 Аренда {self.name} освобождена")
+        return False
+
+    async def release(self):
+        """
+        Освобождение аренды прерванным запуском (исключение или отмена)
+
+        Продление останавливается всегда; запрошенный за время запуска повтор не выполняется
+        """
+        self._stop_heartbeat()
+        if self.lost:
+            return
+        try:
+            await AsyncRunLockDB.release(self.name, self.holder)
+            logger.info(f"🔓 Аренда {self.name} освобождена после прерванного запуска")
+        except Exception as e:
+            # Продление остановлено - аренда освободится сама через TTL
+            logger.warning(f"⚠️ Не удалось освободить аренду {self.name}: {e}, она истечет через {self.ttl}с")
+
+    def _stop_heartbeat(self):
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            self._heartbeat = None
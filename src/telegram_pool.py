@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Пул Telegram аккаунтов для шардирования чтения каналов
+Каналы распределяются между сессиями консистентным хешированием,
+каждая сессия читает по одному каналу за раз в темпе своего пейсера,
+а при FloodWait или бане канал переходит на другую сессию
+"""
+
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, List, Dict, Optional, Tuple
+
+from .telegram_reader import (TelegramChannelReader, get_telegram_reader,
+                              SESSION_RATE_LIMIT_ERRORS, SESSION_BANNED_ERRORS)
+from .config import TELEGRAM_SESSIONS, TELEGRAM_MIN_REQUEST_INTERVAL, TELEGRAM_MAX_FLOOD_WAIT
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/telegram_pool.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Количество виртуальных узлов на одну сессию в кольце хешей
+VIRTUAL_NODES = 64
+
+def _hash(value: str) -> int:
+    """Стабильный между процессами хеш (встроенный hash() рандомизирован)"""
+    return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+class SessionPacer:
+    """Ограничитель частоты запросов одной сессии"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.blocked_until = 0.0  # time.monotonic() до которого сессия в FloodWait
+        self._next_request_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def blocked_for(self) -> float:
+        """Сколько секунд сессия еще заблокирована FloodWait"""
+        return max(0.0, self.blocked_until - time.monotonic())
+
+    def block(self, seconds: float):
+        """Блокировка сессии на время FloodWait"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def wait(self):
+        """Ожидание своей очереди на запрос"""
+        async with self._lock:
+            delay = max(self._next_request_at, self.blocked_until) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_request_at = time.monotonic() + self.min_interval
+
+class PooledSession:
+    """Одна сессия пула: читатель, пейсер и состояние"""
+
+    def __init__(self, name: str, reader: TelegramChannelReader, min_interval: float):
+        self.name = name
+        self.reader = reader
+        self.pacer = SessionPacer(min_interval)
+        # Операция над каналом (get_entity и все страницы iter_messages) целиком под замком:
+        # аккаунт не ведет параллельных чтений, пейсер задает паузу между операциями
+        self.busy = asyncio.Lock()
+        self.banned = False
+        self.requests = 0
+        self.flood_waits = 0
+
+    @property
+    def available(self) -> bool:
+        return not self.banned and self.reader is not None and self.reader.initialized
+
+class TelegramSessionPool:
+    """Пул сессий с консистентным хешированием каналов и failover"""
+
+    def __init__(self, min_interval: float = TELEGRAM_MIN_REQUEST_INTERVAL,
+                 max_flood_wait: int = TELEGRAM_MAX_FLOOD_WAIT):
+        self.min_interval = min_interval
+        self.max_flood_wait = max_flood_wait
+        self.sessions: Dict[str, PooledSession] = {}
+        self._ring: List[Tuple[int, str]] = []
+        self._ring_keys: List[int] = []
+
+    @staticmethod
+    def load_session_strings() -> List[Tuple[str, str, bool]]:
+        """
+        Загрузка StringSession из переменной окружения и таблицы telegram_sessions
+
+        Returns:
+            [(имя, StringSession, из БД)] - обновленный auth key записывается только для сессий из БД
+        """
+        sessions = []
+
+        # Формат TELEGRAM_SESSIONS: "name=session,name2=session2" или просто "session,session2"
+        for i, item in enumerate(s.strip() for s in TELEGRAM_SESSIONS.split(',')):
+            if not item:
+                continue
+            name, sep, value = item.partition('=')
+            # В самой StringSession могут встречаться '=' (base64), имя - только короткий префикс
+            if not sep or len(name) > 32:
+                name, value = f"env_{i}", item
+            sessions.append((name.strip(), value.strip(), False))
+
+        try:
+            from .database import TelegramSessionsDB
+            for row in TelegramSessionsDB.get_active_sessions():
+                sessions.append((row['name'], row['session_string'], True))
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось загрузить сессии из БД: {e}")
+
+        # Убираем дубли по имени, приоритет у переменной окружения
+        unique = {}
+        for name, value, from_database in sessions:
+            unique.setdefault(name, (name, value, from_database))
+        return list(unique.values())
+
+    async def initialize(self) -> bool:
+        """Подключение всех сессий пула"""
+        session_strings = self.load_session_strings()
+
+        if session_strings:
+            logger.info(f"🔧 Подключаем {len(session_strings)} сессий пула...")
+            readers = [TelegramChannelReader(session_string=value, name=name, persist=from_database)
+                       for name, value, from_database in session_strings]
+            results = await asyncio.gather(*(r.initialize() for r in readers), return_exceptions=True)
+
+            for reader, ok in zip(readers, results):
+                if ok is True:
+                    self.sessions[reader.name] = PooledSession(reader.name, reader, self.min_interval)
+                else:
+                    logger.error(f"❌ Сессия {reader.name} не подключилась: {ok}")
+
+        if not self.sessions:
+            # Обратная совместимость: одна основная сессия из хранилища сессий
+            logger.info("ℹ️ Пул сессий не настроен, используем основную сессию")
+            reader = await get_telegram_reader()
+            if reader and reader.initialized:
+                self.sessions[reader.name] = PooledSession(reader.name, reader, self.min_interval)
+
+        self._build_ring()
+        logger.info(f"✅ Пул Telegram сессий готов: {len(self.sessions)} аккаунтов ({', '.join(self.sessions)})")
+        return bool(self.sessions)
+
+    def _build_ring(self):
+        """Построение кольца консистентного хеширования"""
+        self._ring = sorted(
+            (_hash(f"{name}#{i}"), name)
+            for name in self.sessions
+            for i in range(VIRTUAL_NODES)
+        )
+        self._ring_keys = [key for key, _ in self._ring]
+
+    def sessions_for_channel(self, channel_username: str) -> List[PooledSession]:
+        """Сессии в порядке обхода кольца: первая - владелец канала, дальше - резерв"""
+        if not self._ring:
+            return []
+
+        start = bisect.bisect(self._ring_keys, _hash(channel_username.lstrip('@').lower()))
+        ordered = []
+        for offset in range(len(self._ring)):
+            _, name = self._ring[(start + offset) % len(self._ring)]
+            if name not in ordered:
+                ordered.append(name)
+                if len(ordered) == len(self.sessions):
+                    break
+        return [self.sessions[name] for name in ordered]
+
+    async def run_for_channel(self, channel_username: str, operation: Callable[[TelegramChannelReader], Awaitable[Any]],
+                              default: Any = None) -> Any:
+        """Выполнение операции чтения канала назначенной сессией с переключением при FloodWait/бане"""
+        while True:
+            candidates = [s for s in self.sessions_for_channel(channel_username) if s.available]
+            if not candidates:
+                logger.error(f"❌ Нет доступных сессий для {channel_username}")
+                return default
+
+            # Сначала пробуем сессии без активного FloodWait, сохраняя порядок кольца
+            ready = [s for s in candidates if s.pacer.blocked_for == 0]
+            if not ready:
+                session = min(candidates, key=lambda s: s.pacer.blocked_for)
+                if session.pacer.blocked_for > self.max_flood_wait:
+                    logger.warning(f"⚠️ Все сессии в FloodWait, пропускаем {channel_username}")
+                    return default
+                ready = [session]  # Пейсер дождется окончания блокировки
+
+            session = ready[0]
+            try:
+                async with session.busy:
+                    await session.pacer.wait()
+                    session.requests += 1
+                    return await operation(session.reader)
+            except SESSION_RATE_LIMIT_ERRORS as e:
+                session.flood_waits += 1
+                session.pacer.block(e.seconds)
+                logger.warning(f"⏳ [{session.name}] FloodWait {e.seconds}с на {channel_username}, переключаемся")
+            except SESSION_BANNED_ERRORS as e:
+                session.banned = True
+                logger.error(f"🚫 [{session.name}] Сессия заблокирована или отозвана: {type(e).__name__}, исключаем из пула")
+
+    async def get_channel_messages(self, channel_username: str, **kwargs) -> List[Dict]:
+        """Чтение последних сообщений канала через пул"""
+        return await self.run_for_channel(
+            channel_username,
+            lambda reader: reader.get_channel_messages(channel_username, **kwargs),
+            default=[]
+        )
+
+    async def _run_for_channels(self, channels: List[Dict], operation_factory, default: Any) -> Dict[str, Any]:
+        """Запуск операции по всем каналам: сессии работают параллельно, каждая - по одному каналу"""
+        usernames = [ch['username'] for ch in channels]
+        results = await asyncio.gather(
+            *(self.run_for_channel(username, operation_factory(username), default=default) for username in usernames),
+            return_exceptions=True
+        )
+
+        results_by_channel = {}
+        for username, result in zip(usernames, results):
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ Ошибка получения данных из {username}: {result}")
+                result = default
+            results_by_channel[username] = result
+        return results_by_channel
+
+    async def fetch_channels(self, channels: List[Dict], **kwargs) -> Dict[str, List[Dict]]:
+        """Параллельное чтение списка каналов всеми сессиями пула"""
+        return await self._run_for_channels(
+            channels,
+            lambda username: lambda reader: reader.get_channel_messages(username, **kwargs),
+            default=[]
+        )
+
+    async def sync_channels(self, channels: List[Dict], archive, hours_lookback: int = 24) -> Dict[str, int]:
+        """Инкрементальная синхронизация списка каналов в локальный архив"""
+        return await self._run_for_channels(
+            channels,
+            lambda username: lambda reader: reader.sync_channel_to_archive(username, archive, hours_lookback),
+            default=0
+        )
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Состояние сессий пула"""
+        return {
+            name: {
+                'available': s.available,
+                'banned': s.banned,
+                'blocked_for': round(s.pacer.blocked_for, 1),
+                'requests': s.requests,
+                'flood_waits': s.flood_waits
+            }
+            for name, s in self.sessions.items()
+        }
+
+    async def close(self):
+        """Отключение всех сессий"""
+        for session in self.sessions.values():
+            try:
+                await session.reader.close()
+            except Exception:
+                pass
+        self.sessions = {}
+        self._build_ring()
+
+async def get_telegram_pool() -> Optional[TelegramSessionPool]:
+    """Создание и подключение пула сессий"""
+    pool = TelegramSessionPool()
+    if not await pool.initialize():
+        logger.error("❌ Не удалось подключить ни одной Telegram сессии")
+        return None
+    return pool
@@ -5,15 +5,19 @@
 
 import asyncio
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta, timezone
-from telethon import TelegramClient
+from telethon import TelegramClient, errors
+from telethon.sessions import StringSession
+from telethon.tl.functions.messages import GetMessagesViewsRequest
 from telethon.tl.types import Message, MessageMediaPhoto, MessageMediaDocument
 
 try:
-    from .config import TELEGRAM_API_ID, TELEGRAM_API_HASH
+    from .config import TELEGRAM_API_ID, TELEGRAM_API_HASH, TELEGRAM_EXPORT_MAX_FLOOD_WAIT
+    from .telegram_sessions import get_session_store
 except ImportError:
-    from config import TELEGRAM_API_ID, TELEGRAM_API_HASH
+    from config import TELEGRAM_API_ID, TELEGRAM_API_HASH, TELEGRAM_EXPORT_MAX_FLOOD_WAIT
+    from telegram_sessions import get_session_store
 
 # Настройка детального логирования
 import os
@@ -30,12 +34,35 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.info("🚀 Telegram Reader Module - REAL DATA ONLY MODE")
 
+# Ошибки уровня сессии: их не глотаем, чтобы пул мог переключить канал на другой аккаунт
+SESSION_RATE_LIMIT_ERRORS = (errors.FloodWaitError,)
+SESSION_BANNED_ERRORS = (
+    errors.UserDeactivatedBanError,
+    errors.UserDeactivatedError,
+    errors.AuthKeyUnregisteredError,
+    errors.SessionRevokedError,
+)
+SESSION_ERRORS = SESSION_RATE_LIMIT_ERRORS + SESSION_BANNED_ERRORS
+
+# Аккаунты пула не спят в FloodWait внутри Telethon (по умолчанию до 60 с): ошибка сразу
+# доходит до пула, и он переключает канал на другую сессию
+POOL_FLOOD_SLEEP_THRESHOLD = 0
+
+# Максимум id в одном GetMessagesViewsRequest
+ENGAGEMENT_BATCH_SIZE = 100
+
 class TelegramChannelReader:
     """Класс для чтения реальных Telegram каналов"""
     
-    def __init__(self):
+    def __init__(self, session_string: Optional[str] = None, name: str = 'railway_session',
+                 persist: bool = True):
         self.client = None
         self.initialized = False
+        # StringSession аккаунта из пула; для основной сессии загружается из хранилища
+        self.session_string = session_string
+        self.name = name
+        # False - сессия из TELEGRAM_SESSIONS: обновленный auth key не пишется в БД
+        self.persist = persist
         
     async def initialize(self) -> bool:
         """Инициализация Telethon клиента"""
@@ -53,56 +80,32 @@ class TelegramChannelReader:
                 logger.error("🔗 Получить можно на https://my.telegram.org/auth")
                 return False
             
-            # Создаем клиент
-            logger.info("🔗 Creating Telethon client...")
-            
-            # Используем простое имя сессии
-            # Используем статичное имя сессии, которое есть в файле
-            self.client = TelegramClient(
-                'railway_session', 
-                int(TELEGRAM_API_ID), 
-                TELEGRAM_API_HASH
-            )
+            if not self.session_string:
+                # Основная сессия: StringSession из БД/окружения, кешируется в памяти процесса
+                self.session_string = get_session_store().load(self.name)
             
-            # Подключаемся
-            logger.info("🔗 Starting Telethon client connection...")
+            if self.session_string:
+                return await self._initialize_string_session()
             
-            # Проверяем наличие base64 сессии для Railway
-            session_base64 = os.getenv('TELEGRAM_SESSION_BASE64')
-            if session_base64:
-                logger.info("🔐 Found TELEGRAM_SESSION_BASE64 in environment, decoding...")
-                try:
-                    import base64
-                    session_data = base64.b64decode(session_base64)
-                    with open('railway_session.session', 'wb') as f:
-                        f.write(session_data)
-                    logger.info("✅ Session file decoded and saved")
-                except Exception as e:
-                    logger.error(f"❌ Failed to decode session: {e}")
+            # Fallback на bot token если нет сессии
+            bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
+            if not bot_token:
+                logger.error("❌ No session and no bot token available")
+                logger.error("💡 Add TELEGRAM_SESSION_STRING or a row in telegram_sessions table")
+                return False
             
-            # Проверяем если есть готовая сессия - используем её
-            if os.path.exists('railway_session.session'):
-                logger.info("🔑 Found existing session file, using it for user access")
-                await self.client.start()
-            else:
-                # Fallback на bot token если нет сессии
-                bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-                if bot_token:
-                    logger.info("🤖 No session file, trying bot token...")
-                    logger.warning("⚠️ Note: Bot API has limited access to channels")
-                    logger.warning("⚠️ For full access, use TELEGRAM_SESSION_BASE64 environment variable")
-                    try:
-                        await self.client.start(bot_token=bot_token)
-                        logger.info("✅ Telethon client started with bot token")
-                    except Exception as e:
-                        logger.error(f"❌ Bot token failed: {e}")
-                        if "bot users is restricted" in str(e):
-                            logger.error("💡 Bot users cannot read channels. You need a user session.")
-                            logger.error("💡 Run create_session_for_railway.py locally and add TELEGRAM_SESSION_BASE64 to Railway")
-                        return False
-                else:
-                    logger.error("❌ No session file and no bot token available")
-                    return False
+            logger.info("🤖 No session, trying bot token...")
+            logger.warning("⚠️ Note: Bot API has limited access to channels")
+            self.client = TelegramClient(StringSession(), int(TELEGRAM_API_ID), TELEGRAM_API_HASH)
+            try:
+                await self.client.start(bot_token=bot_token)
+                logger.info("✅ Telethon client started with bot token")
+            except Exception as e:
+                logger.error(f"❌ Bot token failed: {e}")
+                if "bot users is restricted" in str(e):
+                    logger.error("💡 Bot users cannot read channels. You need a user session.")
+                    logger.error("💡 Run create_session_for_railway.py locally and add TELEGRAM_SESSION_STRING")
+                return False
             logger.info("✅ Telethon client connection established")
             
             # Проверяем авторизацию
@@ -133,6 +136,31 @@ class TelegramChannelReader:
                 logger.error("💡 Проблема с сетевым подключением к Telegram API")
             return False
     
+    async def _initialize_string_session(self) -> bool:
+        """Подключение аккаунта из пула по StringSession (без интерактивного входа)"""
+        logger.info(f"🔐 [{self.name}] Connecting with StringSession...")
+        get_session_store().remember(self.name, self.session_string, persist=self.persist)
+        self.client = TelegramClient(
+            StringSession(self.session_string),
+            int(TELEGRAM_API_ID),
+            TELEGRAM_API_HASH,
+            flood_sleep_threshold=POOL_FLOOD_SLEEP_THRESHOLD
+        )
+        await self.client.connect()
+        
+        if not await self.client.is_user_authorized():
+            logger.error(f"❌ [{self.name}] StringSession не авторизована - пересоздайте сессию")
+            await self.client.disconnect()
+            return False
+        
+        # Telethon мог перейти на другой DC или получить новый auth key
+        get_session_store().save_if_changed(self.name, self.client.session)
+        
+        me = await self.client.get_me()
+        logger.info(f"✅ [{self.name}] Authorized as {me.first_name} (@{me.username or 'no_username'}), ID {me.id}")
+        self.initialized = True
+        return True
+    
     async def get_channel_messages(self, channel_username: str, limit: int = 10, hours_lookback: int = 12) -> List[Dict]:
         """Получение реальных сообщений из канала"""
         try:
@@ -148,6 +176,8 @@ class TelegramChannelReader:
             try:
                 entity = await self.client.get_entity(clean_username)
                 logger.info(f"✅ Канал найден: {entity.title if hasattr(entity, 'title') else clean_username}")
+            except SESSION_ERRORS:
+                raise
             except Exception as e:
                 logger.warning(f"⚠️ Не удалось найти канал {channel_username}: {e} - пропускаем")
                 return []
@@ -165,61 +195,43 @@ class TelegramChannelReader:
                 if not message.text or len(message.text.strip()) < 50:
                     continue
                 
-                # Определяем тип медиа
-                media_type = None
-                if hasattr(message, 'media') and message.media:
-                    if isinstance(message.media, MessageMediaPhoto):
-                        media_type = 'photo'
-                    elif isinstance(message.media, MessageMediaDocument):
-                        media_type = 'document'
-                    else:
-                        media_type = 'other'
-                
-                # Формируем ссылку на сообщение
-                link = f"https://t.me/{channel_username.replace('@', '')}/{message.id}"
-                
-                # Создаем объект сообщения
-                msg_data = {
-                    'id': message.id,
-                    'date': message.date,
-                    'text': message.text,
-                    'channel': channel_username,
-                    'link': link,
-                    'media_type': media_type,
-                    'views': getattr(message, 'views', 0),
-                    'forwards': getattr(message, 'forwards', 0),
-                    'is_reply': message.is_reply,
-                    'sender_id': getattr(message, 'sender_id', None),
-                    'reactions_count': 0,  # Можно добавить подсчет реакций
-                    'external_links': self._extract_links(message.text) if message.text else []
-                }
-                
-                messages.append(msg_data)
+                messages.append(self._build_message_data(message, channel_username))
             
             logger.info(f"📥 Получено {len(messages)} сообщений из {channel_username}")
             return messages
             
+        except SESSION_ERRORS:
+            raise
         except Exception as e:
             logger.warning(f"⚠️ Ошибка получения сообщений из {channel_username}: {e} - пропускаем канал")
             return []
     
     async def get_channel_messages_by_date_range(self, channel_username: str, 
                                                start_date: datetime, end_date: datetime, 
-                                               limit: int = 100) -> List[Dict]:
+                                               limit: Optional[int] = None) -> List[Dict]:
         """
         Получение сообщений из канала за определенный период времени
         
+        Сервер сразу отдает сообщения старше end_date (offset_date), поэтому
+        более новые посты не скачиваются; чтение идет страницами до start_date.
+        
         Args:
             channel_username: Имя канала
             start_date: Начальная дата (включительно)
             end_date: Конечная дата (исключительно)
-            limit: Максимальное количество сообщений для проверки
+            limit: Необязательный предел количества проверяемых сообщений (None - весь период)
         """
         try:
             if not self.initialized:
                 logger.error("❌ Клиент не инициализирован")
                 return []
             
+            # Даты для сравнения и offset_date должны иметь timezone
+            if start_date.tzinfo is None:
+                start_date = start_date.replace(tzinfo=timezone.utc)
+            if end_date.tzinfo is None:
+                end_date = end_date.replace(tzinfo=timezone.utc)
+            
             # Очищаем username от символа @ если он есть
             clean_username = channel_username.lstrip('@')
             logger.info(f"🔍 Исторический поиск в канале: {channel_username} -> {clean_username}")
@@ -229,6 +241,8 @@ class TelegramChannelReader:
             try:
                 entity = await self.client.get_entity(clean_username)
                 logger.info(f"✅ Канал найден: {entity.title if hasattr(entity, 'title') else clean_username}")
+            except SESSION_ERRORS:
+                raise
             except Exception as e:
                 logger.warning(f"⚠️ Не удалось найти канал {channel_username}: {e} - пропускаем")
                 return []
@@ -236,71 +250,226 @@ class TelegramChannelReader:
             messages = []
             checked_count = 0
             
-            async for message in self.client.iter_messages(entity, limit=limit):
+            # offset_date=end_date: первая страница начинается сразу с конца периода (end_date исключается)
+            async for message in self.client.iter_messages(entity, offset_date=end_date, limit=limit):
                 checked_count += 1
                 
-                # Убедимся, что дата сообщения имеет timezone
                 msg_date = message.date
                 if msg_date.tzinfo is None:
                     msg_date = msg_date.replace(tzinfo=timezone.utc)
-                elif msg_date.tzinfo != timezone.utc:
+                else:
                     msg_date = msg_date.astimezone(timezone.utc)
-                    
-                # Убедимся, что даты для сравнения тоже имеют timezone
-                if start_date.tzinfo is None:
-                    start_date = start_date.replace(tzinfo=timezone.utc)
-                if end_date.tzinfo is None:
-                    end_date = end_date.replace(tzinfo=timezone.utc)
                 
-                # Если сообщение старше конечной даты, прекращаем поиск
+                # Дошли до начала периода - дальше только более старые сообщения
                 if msg_date < start_date:
-                    logger.info(f"📊 Достигли начала периода поиска, проверено {checked_count} сообщений")
                     break
                 
-                # Если сообщение в нужном диапазоне времени
-                if start_date <= msg_date < end_date:
-                    # Пропускаем пустые сообщения
-                    if not message.text or len(message.text.strip()) < 50:
-                        continue
-                    
-                    # Определяем тип медиа
-                    media_type = None
-                    if hasattr(message, 'media') and message.media:
-                        if isinstance(message.media, MessageMediaPhoto):
-                            media_type = 'photo'
-                        elif isinstance(message.media, MessageMediaDocument):
-                            media_type = 'document'
-                        else:
-                            media_type = 'other'
-                    
-                    # Формируем ссылку на сообщение
-                    link = f"https://t.me/{channel_username.replace('@', '')}/{message.id}"
-                    
-                    # Создаем объект сообщения
-                    msg_data = {
-                        'id': message.id,
-                        'date': msg_date,
-                        'text': message.text,
-                        'channel': channel_username,
-                        'link': link,
-                        'media_type': media_type,
-                        'views': getattr(message, 'views', 0),
-                        'forwards': getattr(message, 'forwards', 0),
-                        'is_reply': message.is_reply,
-                        'sender_id': getattr(message, 'sender_id', None),
-                        'reactions_count': 0,
-                        'external_links': self._extract_links(message.text) if message.text else []
-                    }
-                    
-                    messages.append(msg_data)
+                # Пропускаем пустые сообщения
+                if not message.text or len(message.text.strip()) < 50:
+                    continue
+                
+                messages.append(self._build_message_data(message, channel_username, msg_date))
             
-            logger.info(f"📥 Получено {len(messages)} сообщений из {channel_username} за период {start_date.date()} - {end_date.date()}")
+            logger.info(f"📥 Получено {len(messages)} сообщений из {channel_username} за период {start_date.date()} - {end_date.date()} (проверено {checked_count})")
             return messages
             
+        except SESSION_ERRORS:
+            raise
         except Exception as e:
             logger.warning(f"⚠️ Ошибка получения исторических сообщений из {channel_username}: {e}")
             return []
     
+    async def sync_channel_to_archive(self, channel_username: str, archive, hours_lookback: int = 24) -> int:
+        """
+        Инкрементальная синхронизация канала в локальный архив
+        
+        Если у канала есть watermark - запрашиваются только сообщения новее него (min_id),
+        иначе выгружается окно hours_lookback. Возвращает количество сохраненных сообщений.
+        """
+        if not self.initialized:
+            logger.error("❌ Клиент не инициализирован")
+            return 0
+        
+        clean_username = channel_username.lstrip('@')
+        try:
+            entity = await self.client.get_entity(clean_username)
+        except SESSION_ERRORS:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось найти канал {channel_username}: {e} - пропускаем")
+            return 0
+        
+        synced_at = datetime.now(timezone.utc)
+        watermark = archive.get_watermark(channel_username)
+        synced_from = None if watermark else synced_at - timedelta(hours=hours_lookback)
+        
+        batch = []
+        last_message_id = watermark
+        async for message in self.client.iter_messages(entity, min_id=watermark):
+            if synced_from is not None and message.date < synced_from:
+                break
+            last_message_id = max(last_message_id, message.id)
+            if message.text:
+                batch.append(self._build_message_data(message, channel_username))
+        
+        stored = archive.store_messages(channel_username, batch)
+        archive.advance_watermark(channel_username, last_message_id, synced_at, synced_from)
+        
+        logger.info(f"🗄️ {channel_username}: синхронизировано {stored} сообщений (watermark {watermark} → {last_message_id})")
+        return stored
+    
+    async def get_messages_engagement(self, channel_username: str, message_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+        """
+        Актуальные просмотры и репосты сообщений канала
+        
+        Один запрос GetMessagesViewsRequest на пачку до 100 id вместо перечитывания постов.
+        Возвращает {message_id: (views, forwards)}
+        """
+        if not self.initialized or not message_ids:
+            return {}
+        
+        clean_username = channel_username.lstrip('@')
+        try:
+            entity = await self.client.get_entity(clean_username)
+        except SESSION_ERRORS:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось найти канал {channel_username}: {e} - пропускаем")
+            return {}
+        
+        engagement = {}
+        ids = sorted(set(message_ids))
+        for i in range(0, len(ids), ENGAGEMENT_BATCH_SIZE):
+            chunk = ids[i:i + ENGAGEMENT_BATCH_SIZE]
+            result = await self.client(GetMessagesViewsRequest(peer=entity, id=chunk, increment=False))
+            # Счетчики приходят в том же порядке, что и запрошенные id
+            for message_id, views in zip(chunk, result.views):
+                engagement[message_id] = (views.views or 0, views.forwards or 0)
+        
+        logger.info(f"👁️ {channel_username}: обновлены счетчики {len(engagement)} сообщений")
+        return engagement
+    
+    def _build_message_data(self, message, channel_username: str, msg_date: datetime = None) -> Dict:
+        """Преобразование сообщения Telethon в словарь, общий для всех путей чтения"""
+        # Определяем тип медиа
+        media_type = None
+        if hasattr(message, 'media') and message.media:
+            if isinstance(message.media, MessageMediaPhoto):
+                media_type = 'photo'
+            elif isinstance(message.media, MessageMediaDocument):
+                media_type = 'document'
+            else:
+                media_type = 'other'
+        
+        return {
+            'id': message.id,
+            'date': msg_date or message.date,
+            'text': message.text,
+            'channel': channel_username,
+            'link': f"https://t.me/{channel_username.replace('@', '')}/{message.id}",
+            'media_type': media_type,
+            'views': getattr(message, 'views', 0),
+            'forwards': getattr(message, 'forwards', 0),
+            'is_reply': message.is_reply,
+            'sender_id': getattr(message, 'sender_id', None),
+            'reactions_count': 0,  # Можно добавить подсчет реакций
+            'external_links': self._extract_links(message.text) if message.text else []
+        }
+    
+    async def export_history(self, channel_usernames: List[str], start_date: datetime,
+                             end_date: datetime, archive) -> Dict[str, int]:
+        """
+        Выгрузка истории каналов за период в локальный архив одним проходом
+        
+        Открывает takeout-сессию (ослабленные лимиты на экспорт истории) и читает
+        каждый канал от start_date к end_date. Если takeout недоступен, выгрузка
+        идет обычным клиентом - всё равно один проход вместо запроса на каждое окно.
+        FloodWait пережидается и выгрузка канала продолжается с последнего id.
+        
+        Args:
+            channel_usernames: Каналы для выгрузки
+            start_date: Начальная дата (включительно, UTC)
+            end_date: Конечная дата (исключительно, UTC)
+            archive: MessageArchive для сохранения
+        """
+        if not self.initialized:
+            logger.error("❌ Клиент не инициализирован")
+            return {}
+        
+        if start_date.tzinfo is None:
+            start_date = start_date.replace(tzinfo=timezone.utc)
+        if end_date.tzinfo is None:
+            end_date = end_date.replace(tzinfo=timezone.utc)
+        
+        logger.info(f"📦 Выгрузка истории {len(channel_usernames)} каналов за {start_date} - {end_date}")
+        
+        try:
+            async with self.client.takeout(finalize=True, channels=True, megagroups=True) as takeout:
+                logger.info("✅ Takeout-сессия открыта")
+                return await self._export_with_client(takeout, channel_usernames, start_date, end_date, archive)
+        except errors.TakeoutInitDelayError as e:
+            logger.warning(f"⚠️ Telegram требует подтвердить экспорт в другом клиенте (ожидание {e.seconds}с)")
+        except SESSION_ERRORS:
+            # FloodWait дольше TELEGRAM_EXPORT_MAX_FLOOD_WAIT: обычный клиент упрется в тот же лимит
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Takeout-сессия недоступна: {e}")
+        
+        logger.info("🔄 Выгружаем историю обычным клиентом")
+        return await self._export_with_client(self.client, channel_usernames, start_date, end_date, archive)
+    
+    async def _export_with_client(self, client, channel_usernames: List[str], start_date: datetime,
+                                  end_date: datetime, archive) -> Dict[str, int]:
+        """Потоковая выгрузка каналов от старых сообщений к новым пачками в архив"""
+        exported = {}
+        
+        for channel_username in channel_usernames:
+            clean_username = channel_username.lstrip('@')
+            try:
+                entity = await client.get_entity(clean_username)
+                
+                batch = []
+                count = 0
+                last_id = None
+                while True:
+                    # reverse=True + offset_date: сервер сразу отдает сообщения начиная с start_date;
+                    # после FloodWait продолжаем с последнего полученного id (offset_id при reverse - нижняя граница)
+                    resume = {'offset_date': start_date} if last_id is None else {'offset_id': last_id}
+                    try:
+                        async for message in client.iter_messages(entity, reverse=True, wait_time=0, **resume):
+                            if message.date >= end_date:
+                                break
+                            last_id = message.id
+                            if not message.text:
+                                continue
+                            
+                            batch.append(self._build_message_data(message, channel_username))
+                            if len(batch) >= 500:
+                                count += archive.store_messages(channel_username, batch)
+                                batch = []
+                        break
+                    except errors.FloodWaitError as e:
+                        if e.seconds > TELEGRAM_EXPORT_MAX_FLOOD_WAIT:
+                            raise
+                        # Ждем здесь, а не начинаем выгрузку заново другим клиентом
+                        count += archive.store_messages(channel_username, batch)
+                        batch = []
+                        logger.warning(f"⏳ {channel_username}: FloodWait {e.seconds}с при выгрузке, "
+                                       f"продолжим с id {last_id}")
+                        await asyncio.sleep(e.seconds + 1)
+                
+                count += archive.store_messages(channel_username, batch)
+                archive.mark_covered(channel_username, start_date, end_date)
+                exported[channel_username] = count
+                logger.info(f"📥 {channel_username}: выгружено {count} сообщений")
+                
+            except SESSION_ERRORS:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка выгрузки истории {channel_username}: {e} - пропускаем")
+        
+        return exported
+    
     def _extract_links(self, text: str) -> List[str]:
         """Извлечение внешних ссылок из текста"""
         import re
@@ -310,6 +479,8 @@ class TelegramChannelReader:
     async def close(self):
         """Закрытие соединения"""
         if self.client:
+            if self.session_string:
+                get_session_store().save_if_changed(self.name, self.client.session)
             await self.client.disconnect()
             logger.info("🔌 Telethon клиент отключен")
 
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Хранилище Telegram сессий
+Сессии хранятся как StringSession в таблице telegram_sessions (или в переменных окружения),
+кешируются в памяти процесса и записываются обратно только при смене auth key или DC.
+Сессии пула из TELEGRAM_SESSIONS обратно не пишутся: их источник - переменная окружения.
+Старый формат TELEGRAM_SESSION_BASE64 (base64 от SQLite файла сессии) конвертируется один раз
+"""
+
+import base64
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Set
+
+from telethon.sessions import SQLiteSession, StringSession
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/telegram_sessions.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Имя основной сессии (совпадает с именем старого файла сессии)
+PRIMARY_SESSION_NAME = 'railway_session'
+
+def session_file_to_string(path: str) -> Optional[str]:
+    """Конвертация SQLite файла сессии Telethon в StringSession"""
+    session = SQLiteSession(path)
+    try:
+        if not session.auth_key:
+            return None
+        return StringSession.save(session)
+    finally:
+        session.close()
+
+def base64_session_to_string(session_base64: str) -> Optional[str]:
+    """Конвертация TELEGRAM_SESSION_BASE64 (base64 от файла сессии) в StringSession"""
+    fd, path = tempfile.mkstemp(suffix='.session')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(base64.b64decode(session_base64))
+        return session_file_to_string(path)
+    finally:
+        os.remove(path)
+
+class TelegramSessionStore:
+    """Кеш StringSession с загрузкой из БД/окружения и записью только при изменениях"""
+
+    def __init__(self):
+        self._cache: Dict[str, str] = {}
+        # Сессии из переменной окружения: копия в БД не читалась бы (у окружения приоритет)
+        # и держала бы в пуле аккаунт, удаленный из TELEGRAM_SESSIONS
+        self._env_sessions: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def remember(self, name: str, session_string: str, persist: bool = True):
+        """
+        Запоминание уже загруженной сессии (например, из пула)
+
+        Args:
+            persist: False - сессия из переменной окружения, в БД не записывается
+        """
+        with self._lock:
+            self._cache.setdefault(name, session_string)
+            if not persist:
+                self._env_sessions.add(name)
+
+    def load(self, name: str = PRIMARY_SESSION_NAME) -> Optional[str]:
+        """
+        Получение StringSession по имени
+
+        Порядок: кеш процесса → таблица telegram_sessions → TELEGRAM_SESSION_STRING →
+        TELEGRAM_SESSION_BASE64 / файл railway_session.session (конвертируются и сохраняются в БД)
+        """
+        with self._lock:
+            if name in self._cache:
+                return self._cache[name]
+
+        session_string = self._load_from_database(name)
+        if not session_string and name == PRIMARY_SESSION_NAME:
+            session_string = os.getenv('TELEGRAM_SESSION_STRING') or self._convert_legacy_session()
+            if session_string:
+                # Дальше сессия читается из БД и может разделяться репликами
+                self._persist(name, session_string)
+
+        if session_string:
+            with self._lock:
+                self._cache[name] = session_string
+        return session_string
+
+    def save_if_changed(self, name: str, session) -> bool:
+        """
+        Запись сессии клиента, если изменились auth key или DC
+
+        Args:
+            name: Имя сессии
+            session: Сессия Telethon клиента (client.session)
+        """
+        session_string = StringSession.save(session)
+        if not session_string:
+            return False
+
+        with self._lock:
+            if self._cache.get(name) == session_string:
+                return False
+            self._cache[name] = session_string
+            from_env = name in self._env_sessions
+
+        if from_env:
+            logger.warning(f"🔑 [{name}] Изменились auth key или DC у сессии из TELEGRAM_SESSIONS - "
+                           f"обновите переменную окружения")
+            return False
+
+        logger.info(f"🔑 [{name}] Изменились auth key или DC, сохраняем сессию")
+        return self._persist(name, session_string)
+
+    @staticmethod
+    def _load_from_database(name: str) -> Optional[str]:
+        try:
+            from .database import TelegramSessionsDB
+            return TelegramSessionsDB.get_session(name)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось загрузить сессию {name} из БД: {e}")
+            return None
+
+    @staticmethod
+    def _persist(name: str, session_string: str) -> bool:
+        try:
+            from .database import TelegramSessionsDB
+            # Основная сессия не добавляется в пул автоматически
+            return TelegramSessionsDB.save_session(name, session_string, is_active=name != PRIMARY_SESSION_NAME)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить сессию {name} в БД: {e}")
+            return False
+
+    @staticmethod
+    def _convert_legacy_session() -> Optional[str]:
+        """Однократная конвертация старого формата сессии"""
+        session_base64 = os.getenv('TELEGRAM_SESSION_BASE64')
+        try:
+            if session_base64:
+                logger.info("🔐 Конвертируем TELEGRAM_SESSION_BASE64 в StringSession...")
+                return base64_session_to_string(session_base64)
+            if os.path.exists(f'{PRIMARY_SESSION_NAME}.session'):
+                logger.info("🔐 Конвертируем файл railway_session.session в StringSession...")
+                return session_file_to_string(PRIMARY_SESSION_NAME)
+        except Exception as e:
+            logger.error(f"❌ Не удалось конвертировать старую сессию: {e}")
+        return None
+
+# Глобальный экземпляр для переиспользования
+_store_instance: Optional[TelegramSessionStore] = None
+
+def get_session_store() -> TelegramSessionStore:
+    """Получение общего хранилища сессий"""
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = TelegramSessionStore()
+    return _store_instance
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Локальный буфер записей на время недоступности Supabase
+Если запись не прошла ни через PostgreSQL, ни через REST API, новости очереди и отметки
+обработанных сообщений складываются в SQLite (WAL) и досылаются пакетными методами
+database.py, когда база снова доступна. Повторная отправка идемпотентна:
+pending_news пропускает дубли, processed_messages обновляет их по UNIQUE(channel_id, message_id).
+Записи, которые база отвергает по содержимому (например, канал уже удален), переносятся
+в dead_writes, чтобы не блокировать очередь
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, date
+from typing import List, Dict, Optional, Any
+
+try:
+    from .config import WRITE_BUFFER_PATH
+    from .backend_router import is_unavailable_error
+except ImportError:
+    from config import WRITE_BUFFER_PATH
+    from backend_router import is_unavailable_error
+
+# Настройка логирования
+os.makedirs('logs', exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/write_buffer.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Виды буферизуемых записей
+PENDING_NEWS = 'pending_news'
+PROCESSED_MESSAGES = 'processed_messages'
+
+def _encode(record: Dict) -> str:
+    """JSON записи; даты сохраняются в ISO формате"""
+    def default(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        raise TypeError(f"Не сериализуется: {type(value).__name__}")
+    return json.dumps(record, ensure_ascii=False, default=default)
+
+def _decode(kind: str, payload: str) -> Dict:
+    record = json.loads(payload)
+    if kind == PENDING_NEWS and isinstance(record.get('scheduled_for'), str):
+        record['scheduled_for'] = date.fromisoformat(record['scheduled_for'][:10])
+    return record
+
+class WriteBuffer:
+    """Журнал отложенных записей (одна строка - одна запись в таблицу Supabase)"""
+
+    def __init__(self, path: str = WRITE_BUFFER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Ленивое открытие базы и создание схемы"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            # Буфер существует ради сохранности данных - fsync на каждый коммит
+            self._conn.execute('PRAGMA synchronous=FULL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS writes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    options TEXT,
+                    created_at INTEGER NOT NULL,
+                    attempts INTEGER DEFAULT 0,
+                    last_error TEXT
+                );
+
+                -- Записи, которые база не примет никогда (ошибка данных), - для разбора вручную
+                CREATE TABLE IF NOT EXISTS dead_writes (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    options TEXT,
+                    created_at INTEGER NOT NULL,
+                    failed_at INTEGER NOT NULL,
+                    error TEXT
+                );
+            ''')
+        return self._conn
+
+    def append(self, kind: str, records: List[Dict], **options) -> int:
+        """
+        Сохранение записей, которые не удалось отправить в базу
+
+        Args:
+            kind: PENDING_NEWS или PROCESSED_MESSAGES
+            records: Словари в формате пакетных методов database.py
+            options: Параметры пакетного метода (например, mark_processed)
+        """
+        if not records:
+            return 0
+
+        now = int(time.time())
+        encoded_options = json.dumps(options) if options else None
+        rows = [(kind, _encode(record), encoded_options, now) for record in records]
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    'INSERT INTO writes (kind, payload, options, created_at) VALUES (?, ?, ?, ?)', rows
+                )
+        logger.warning(f"💾 {len(rows)} записей {kind} сохранено в локальный буфер до восстановления базы")
+        return len(rows)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM writes').fetchone()[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Размер буфера, возраст самой старой записи и число отвергнутых записей для /health"""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute('''
+                SELECT kind, COUNT(*) AS count, MIN(created_at) AS oldest
+                FROM writes GROUP BY kind
+            ''').fetchall()
+            dead = conn.execute('SELECT COUNT(*) FROM dead_writes').fetchone()[0]
+
+        oldest = min((row['oldest'] for row in rows), default=None)
+        return {
+            'buffered': sum(row['count'] for row in rows),
+            'by_kind': {row['kind']: row['count'] for row in rows},
+            'dead': dead,
+            'oldest_age_seconds': int(time.time()) - oldest if oldest is not None else None
+        }
+
+    def get_dead(self, limit: int = 100) -> List[Dict]:
+        """Отвергнутые базой записи (новые первыми)"""
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT id, kind, payload, options, created_at, failed_at, error FROM dead_writes '
+                'ORDER BY failed_at DESC, id DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _take(self, limit: int) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._connect().execute(
+                'SELECT id, kind, payload, options FROM writes ORDER BY id LIMIT ?', (limit,)
+            ).fetchall()
+
+    def _remove(self, ids: List[int]):
+        if not ids:
+            return
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany('DELETE FROM writes WHERE id = ?', [(i,) for i in ids])
+
+    def _mark_failed(self, ids: List[int], error: str):
+        if not ids:
+            return
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    'UPDATE writes SET attempts = attempts + 1, last_error = ? WHERE id = ?',
+                    [(error, i) for i in ids]
+                )
+
+    def _bury(self, row: sqlite3.Row, error: str):
+        """Перенос записи, которую база не примет, в dead_writes"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO dead_writes (id, kind, payload, options, created_at, failed_at, error)
+                    SELECT id, kind, payload, options, created_at, ?, ? FROM writes WHERE id = ?
+                ''', (int(time.time()), error, row['id']))
+                conn.execute('DELETE FROM writes WHERE id = ?', (row['id'],))
+        logger.error(f"☠️ Запись {row['kind']} #{row['id']} отвергнута базой ({error}), перенесена в dead_writes")
+
+    def _write(self, kind: str, records: List[Dict], options: Dict):
+        """Отправка пачки одного вида пакетным методом database.py; исключение - пачка не принята"""
+        try:
+            from .database import PendingNewsDB, ProcessedMessagesDB
+        except ImportError:
+            from database import PendingNewsDB, ProcessedMessagesDB
+
+        if kind == PENDING_NEWS:
+            outcomes = PendingNewsDB.add_pending_news_many(records, buffer_on_failure=False, **options)
+            # error без исключения - база недоступна (ошибки данных пробрасываются)
+            if any(outcome['status'] == 'error' for outcome in outcomes):
+                raise ConnectionError("база не приняла пачку pending_news")
+        elif kind == PROCESSED_MESSAGES:
+            ProcessedMessagesDB.mark_processed_many(records, buffer_on_failure=False)
+        else:
+            raise ValueError(f"неизвестный вид записи: {kind}")
+
+    def replay(self, batch_size: int = 200) -> Dict[str, int]:
+        """
+        Досылка буфера в базу пачками в порядке записи
+
+        Останавливается на первой пачке, которую база не приняла из-за недоступности,
+        чтобы не перемешивать порядок записей. Если пачку отвергли данные, она досылается
+        по одной записи: принятые удаляются, отвергнутые переносятся в dead_writes.
+
+        Returns:
+            {'replayed': досланные, 'dead': отвергнутые, 'remaining': оставшиеся в буфере}
+        """
+        replayed = 0
+        dead = 0
+        # Досылка из нескольких потоков сразу дублировала бы запросы
+        with self._replay_lock:
+            stopped = False
+            while not stopped:
+                rows = self._take(batch_size)
+                if not rows:
+                    break
+
+                # Подряд идущие записи одного вида и с одинаковыми параметрами - одним запросом
+                first = rows[0]
+                group = []
+                for row in rows:
+                    if row['kind'] != first['kind'] or row['options'] != first['options']:
+                        break
+                    group.append(row)
+
+                options = json.loads(first['options']) if first['options'] else {}
+                try:
+                    self._write(first['kind'], [_decode(row['kind'], row['payload']) for row in group], options)
+                except Exception as e:
+                    if is_unavailable_error(e):
+                        logger.warning(f"⚠️ Буфер пока не досылается: {e}")
+                        self._mark_failed([row['id'] for row in group], str(e))
+                        break
+
+                    # Пачку отвергли данные: по одной, чтобы не терять соседние записи
+                    logger.warning(f"⚠️ База отвергла пачку {first['kind']} ({e}), досылаем по одной записи")
+                    for row in group:
+                        try:
+                            self._write(row['kind'], [_decode(row['kind'], row['payload'])], options)
+                        except Exception as row_error:
+                            if is_unavailable_error(row_error):
+                                logger.warning(f"⚠️ Буфер пока не досылается: {row_error}")
+                                self._mark_failed([row['id']], str(row_error))
+                                stopped = True
+                                break
+                            self._bury(row, str(row_error))
+                            dead += 1
+                            continue
+                        self._remove([row['id']])
+                        replayed += 1
+                    continue
+
+                self._remove([row['id'] for row in group])
+                replayed += len(group)
+
+        remaining = self.count()
+        if replayed or dead:
+            logger.info(f"✅ Из локального буфера дослано {replayed} записей, отвергнуто {dead}, осталось {remaining}")
+        return {'replayed': replayed, 'dead': dead, 'remaining': remaining}
+
+    def close(self):
+        """Закрытие базы"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# Глобальный экземпляр для переиспользования
+_buffer_instance: Optional[WriteBuffer] = None
+
+def get_write_buffer() -> WriteBuffer:
+    """Получение общего буфера записей"""
+    global _buffer_instance
+    if _buffer_instance is None:
+        _buffer_instance = WriteBuffer()
+    return _buffer_instance
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Тест гистограммы задержек LLM и перцентилей по ней (без базы данных)
+"""
+
+import os
+import sys
+
+# Добавляем путь к модулям
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from pipeline_metrics import LATENCY_BUCKETS_MS, PipelineMetrics, latency_bucket, latency_percentiles
+
+def histogram(**counts) -> list:
+    """Гистограмма из {'b<индекс бакета>': количество}"""
+    result = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for key, count in counts.items():
+        result[int(key[1:])] = count
+    return result
+
+def test_latency_bucket_bounds():
+    """Граница бакета входит в него, все дольше последней границы - в последний бакет"""
+    assert latency_bucket(0) == 0
+    assert latency_bucket(250) == 0
+    assert latency_bucket(251) == 1
+    assert latency_bucket(16000) == len(LATENCY_BUCKETS_MS) - 1
+    assert latency_bucket(60000) == len(LATENCY_BUCKETS_MS)
+
+def test_percentiles_empty():
+    """Без вызовов перцентилей нет"""
+    assert latency_percentiles(None) == {'p50': None, 'p90': None, 'p99': None}
+    assert latency_percentiles(histogram()) == {'p50': None, 'p90': None, 'p99': None}
+
+def test_percentiles_single_bucket():
+    """Все вызовы в одном бакете - все перцентили равны его верхней границе"""
+    assert latency_percentiles(histogram(b2=7)) == {'p50': 1000, 'p90': 1000, 'p99': 1000}
+
+def test_percentiles_spread():
+    """Перцентиль - верхняя граница бакета, в котором набирается его доля вызовов"""
+    # 50 вызовов до 250 мс, 40 до 1000 мс, 9 до 4000 мс, 1 дольше 16 с
+    hist = histogram(b0=50, b2=40, b4=9, b7=1)
+    assert latency_percentiles(hist) == {'p50': 250, 'p90': 1000, 'p99': 4000}
+    assert latency_percentiles(hist, percentiles=(100,)) == {'p100': LATENCY_BUCKETS_MS[-1] * 2}
+
+def test_histograms_add_up():
+    """Сумма гистограмм двух часов дает те же перцентили, что и общий поток вызовов"""
+    first = histogram(b0=10, b3=10)
+    second = histogram(b3=30, b5=50)
+    merged = [a + b for a, b in zip(first, second)]
+    assert latency_percentiles(merged) == {'p50': 2000, 'p90': 8000, 'p99': 8000}
+
+def test_observe_llm():
+    """Вызов Claude учитывается в счетчиках и гистограмме своего канала"""
+    metrics = PipelineMetrics()
+    metrics.observe_llm(1, {'latency_ms': 300, 'input_tokens': 100, 'output_tokens': 20})
+    metrics.observe_llm(1, {'latency_ms': 20000, 'input_tokens': 50})
+    metrics.observe_llm(None, {'latency_ms': 300})
+    metrics.observe_llm(2, {'error': 'timeout'})
+
+    rows = metrics.rows()
+    assert len(rows) == 1
+    row = rows[0]
+    assert row['channel_id'] == 1
+    assert (row['llm_calls'], row['llm_input_tokens'], row['llm_output_tokens']) == (2, 150, 20)
+    assert row['llm_latency_hist'] == histogram(b1=1, b7=1)
+
+def main():
+    """Запуск тестов без pytest"""
+    tests = [
+        test_latency_bucket_bounds,
+        test_percentiles_empty,
+        test_percentiles_single_bucket,
+        test_percentiles_spread,
+        test_histograms_add_up,
+        test_observe_llm,
+    ]
+
+    print("🧪 Тестирование перцентилей задержки LLM")
+    print("=" * 50)
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("=" * 50)
+    print("✅ Тест завершен!")
+
+if __name__ == "__main__":
+    main()
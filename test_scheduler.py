@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Тест расчета слотов планировщика (без базы данных)
+Проверяет last_slot/next_slot, допуск опоздания и смену расписания в Job
+"""
+
+from datetime import datetime, timedelta
+
+import pytz
+
+from scheduler import MOSCOW_TZ, Job, last_slot, next_slot, parse_times
+
+async def noop() -> bool:
+    return True
+
+def msk(day: int, hour: int, minute: int = 0) -> datetime:
+    return MOSCOW_TZ.localize(datetime(2025, 7, day, hour, minute))
+
+def make_job(times, grace=timedelta(minutes=50)) -> Job:
+    return Job('test', lambda: times, noop, grace)
+
+def test_parse_times():
+    """Времена сортируются, дубли и неверные значения отбрасываются"""
+    assert parse_times(['18:00', ' 09:30', '09:30', '25:00', 'утро']) == [(9, 30), (18, 0)]
+
+def test_slots_within_day():
+    """Последний слот не позже now и первый слот позже now"""
+    times = [(9, 0), (18, 0)]
+    assert last_slot(times, msk(22, 12)) == msk(22, 9)
+    assert next_slot(times, msk(22, 12)) == msk(22, 18)
+    # Слот ровно в now - уже прошедший
+    assert last_slot(times, msk(22, 9)) == msk(22, 9)
+    assert next_slot(times, msk(22, 9)) == msk(22, 18)
+
+def test_slots_across_midnight():
+    """До первого слота дня последним считается вчерашний, после последнего следующим - завтрашний"""
+    times = [(9, 0), (18, 0)]
+    assert last_slot(times, msk(22, 7)) == msk(21, 18)
+    assert next_slot(times, msk(22, 20)) == msk(23, 9)
+    assert last_slot([], msk(22, 12)) is None
+    assert next_slot([], msk(22, 12)) is None
+
+def test_slots_from_utc_now():
+    """now в UTC сравнивается с московскими слотами"""
+    now = msk(22, 8, 59).astimezone(pytz.utc)
+    assert next_slot([(9, 0)], now) == msk(22, 9)
+
+def test_due_slot_fires_once():
+    """Слот выполняется один раз: после обработки due_slot возвращает None до следующего слота"""
+    job = make_job([(9, 0), (18, 0)])
+    job.refresh(msk(22, 9, 1))
+    slot = job.due_slot(msk(22, 9, 1))
+    assert slot == msk(22, 9)
+
+    job.last_handled = slot
+    assert job.due_slot(msk(22, 9, 30)) is None
+    assert job.due_slot(msk(22, 18)) == msk(22, 18)
+
+def test_due_slot_grace_window():
+    """Опоздание в пределах grace догоняется, сверх grace слот пропускается и помечается обработанным"""
+    job = make_job([(9, 0)], grace=timedelta(minutes=50))
+    job.refresh(msk(22, 9, 50))
+    assert job.due_slot(msk(22, 9, 50)) == msk(22, 9)
+
+    late = make_job([(9, 0)], grace=timedelta(minutes=50))
+    late.refresh(msk(22, 9, 51))
+    assert late.due_slot(msk(22, 9, 51)) is None
+    assert late.last_handled == msk(22, 9)
+
+def test_refresh_schedule_change_skips_past_slots():
+    """Добавленный в расписание слот из прошлого не выполняется задним числом"""
+    schedule = {'times': [(9, 0)]}
+    job = Job('test', lambda: schedule['times'], noop, timedelta(hours=2))
+    job.refresh(msk(22, 9, 5))
+    job.last_handled = job.due_slot(msk(22, 9, 5))
+
+    schedule['times'] = [(9, 0), (10, 0)]
+    job.refresh(msk(22, 10, 30))
+    assert job.current_times == [(9, 0), (10, 0)]
+    assert job.due_slot(msk(22, 10, 30)) is None
+
+    # Следующие слоты нового расписания выполняются как обычно
+    assert job.due_slot(msk(23, 9)) == msk(23, 9)
+
+def test_refresh_first_load_keeps_missed_slot():
+    """Первая загрузка расписания (старт процесса) не отменяет догон пропущенного слота"""
+    job = make_job([(9, 0)], grace=timedelta(hours=2))
+    job.refresh(msk(22, 10))
+    assert job.last_handled is None
+    assert job.due_slot(msk(22, 10)) == msk(22, 9)
+
+def main():
+    """Запуск тестов без pytest"""
+    tests = [
+        test_parse_times,
+        test_slots_within_day,
+        test_slots_across_midnight,
+        test_slots_from_utc_now,
+        test_due_slot_fires_once,
+        test_due_slot_grace_window,
+        test_refresh_schedule_change_skips_past_slots,
+        test_refresh_first_load_keeps_missed_slot,
+    ]
+
+    print("🧪 Тестирование слотов планировщика")
+    print("=" * 50)
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("=" * 50)
+    print("✅ Тест завершен!")
+
+if __name__ == "__main__":
+    main()
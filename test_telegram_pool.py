@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Тест кольца консистентного хеширования пула Telegram сессий (без подключения к Telegram)
+Проверяет порядок обхода сессий, то, что при изменении пула переезжает
+только небольшая часть каналов, и что каждая сессия читает по одному каналу за раз
+"""
+
+import asyncio
+import os
+import sys
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(__file__))
+
+from src.telegram_pool import TelegramSessionPool, PooledSession
+
+CHANNELS = [f"@channel_{i}" for i in range(2000)]
+
+class FakeReader:
+    """Читатель, который запоминает, сколько операций шло одновременно"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.initialized = True
+        self.active = 0
+        self.max_active = 0
+        self.channels = []
+
+    async def read(self, channel_username: str):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.001)  # get_entity и страницы iter_messages
+        self.channels.append(channel_username)
+        self.active -= 1
+        return [channel_username]
+
+def make_pool(*names, readers: bool = False) -> TelegramSessionPool:
+    pool = TelegramSessionPool(min_interval=0)
+    for name in names:
+        pool.sessions[name] = PooledSession(name, FakeReader(name) if readers else None, 0)
+    pool._build_ring()
+    return pool
+
+def owners(pool: TelegramSessionPool) -> dict:
+    return {channel: pool.sessions_for_channel(channel)[0].name for channel in CHANNELS}
+
+def test_empty_pool():
+    """Без сессий каналу некого назначить"""
+    assert make_pool().sessions_for_channel('@edtech') == []
+
+def test_failover_order():
+    """Каждая сессия встречается в порядке обхода ровно один раз, первая - владелец"""
+    pool = make_pool('a', 'b', 'c')
+    for channel in CHANNELS[:100]:
+        order = [session.name for session in pool.sessions_for_channel(channel)]
+        assert sorted(order) == ['a', 'b', 'c']
+
+def test_owner_is_stable():
+    """Владелец не зависит от процесса, порядка добавления сессий, регистра и @"""
+    assert owners(make_pool('a', 'b', 'c')) == owners(make_pool('c', 'a', 'b'))
+    pool = make_pool('a', 'b', 'c')
+    assert pool.sessions_for_channel('@EdTech_News')[0] is pool.sessions_for_channel('edtech_news')[0]
+
+def test_channels_spread_over_sessions():
+    """Каналы распределяются между сессиями примерно поровну"""
+    counts = {}
+    for name in owners(make_pool('a', 'b', 'c', 'd')).values():
+        counts[name] = counts.get(name, 0) + 1
+    # Ожидается по 500 каналов, 64 виртуальных узла дают разброс в пределах десятков процентов
+    assert all(250 < count < 750 for count in counts.values()), counts
+
+def test_adding_session_moves_only_its_share():
+    """Новая сессия забирает около 1/N каналов, остальные каналы не переезжают"""
+    before = owners(make_pool('a', 'b', 'c'))
+    after = owners(make_pool('a', 'b', 'c', 'd'))
+    moved = [channel for channel in CHANNELS if before[channel] != after[channel]]
+    assert all(after[channel] == 'd' for channel in moved)
+    assert 0.1 < len(moved) / len(CHANNELS) < 0.4
+
+def test_removing_session_moves_only_its_channels():
+    """После удаления сессии переезжают только ее каналы - к следующей сессии кольца"""
+    pool = make_pool('a', 'b', 'c')
+    before = owners(pool)
+    after = owners(make_pool('a', 'c'))
+    for channel in CHANNELS:
+        if before[channel] == 'b':
+            assert after[channel] == pool.sessions_for_channel(channel)[1].name
+        else:
+            assert after[channel] == before[channel]
+
+def test_session_reads_one_channel_at_a_time():
+    """Каналы одной сессии читаются по очереди, разные сессии работают параллельно"""
+    pool = make_pool('a', 'b', readers=True)
+    channels = [{'username': channel} for channel in CHANNELS[:40]]
+
+    results = asyncio.run(pool._run_for_channels(
+        channels, lambda username: lambda reader: reader.read(username), default=[]))
+
+    assert results == {ch['username']: [ch['username']] for ch in channels}
+    readers = [session.reader for session in pool.sessions.values()]
+    assert all(reader.max_active == 1 for reader in readers)
+    assert all(reader.channels for reader in readers)
+    assert sum(session.requests for session in pool.sessions.values()) == len(channels)
+
+def main():
+    """Запуск тестов без pytest"""
+    tests = [
+        test_empty_pool,
+        test_failover_order,
+        test_owner_is_stable,
+        test_channels_spread_over_sessions,
+        test_adding_session_moves_only_its_share,
+        test_removing_session_moves_only_its_channels,
+        test_session_reads_one_channel_at_a_time,
+    ]
+
+    print("🧪 Тестирование кольца сессий Telegram")
+    print("=" * 50)
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("=" * 50)
+    print("✅ Тест завершен!")
+
+if __name__ == "__main__":
+    main()
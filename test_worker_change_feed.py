@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Тест запуска ленты изменений в воркере очереди (без базы данных)
+Воркер, выполняющий сбор, поднимает реестр каналов до первого забора заданий,
+а при ошибке запуска ленты продолжает работать (сбор читает каналы из базы)
+"""
+
+import asyncio
+import os
+import sys
+
+# Добавляем путь к модулям
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+import job_queue
+from job_queue import Worker, JOB_COLLECT, JOB_PUBLISH
+
+class FakeFeed:
+    """Лента изменений, которая только запоминает вызовы"""
+
+    def __init__(self, events, fail=False):
+        self.events = events
+        self.fail = fail
+        self.started = False
+
+    def start(self):
+        if self.fail:
+            raise ConnectionError("база недоступна")
+        self.started = True
+        self.events.append('feed_start')
+
+    def stop(self):
+        self.events.append('feed_stop')
+
+class FakeJobsDB:
+    """Очередь без заданий: первый забор останавливает воркер"""
+
+    def __init__(self, events):
+        self.events = events
+        self.worker = None
+
+    async def claim(self, worker_id, limit, lease_seconds, job_types):
+        self.events.append('claim')
+        self.worker.stop()
+        return []
+
+def run_worker(job_types=None, fail=False):
+    events = []
+    feed = FakeFeed(events, fail=fail)
+    jobs_db = FakeJobsDB(events)
+    original = job_queue.get_change_feed, job_queue.AsyncJobsDB
+    job_queue.get_change_feed = lambda: feed
+    job_queue.AsyncJobsDB = jobs_db
+    try:
+        worker = Worker(concurrency=1, job_types=job_types, poll_interval=0.01)
+        jobs_db.worker = worker
+        asyncio.run(worker.run())
+    finally:
+        job_queue.get_change_feed, job_queue.AsyncJobsDB = original
+    return feed, events
+
+def test_feed_started_before_claim():
+    """Реестр каналов загружается до первого задания и останавливается вместе с воркером"""
+    feed, events = run_worker()
+    assert feed.started
+    assert events == ['feed_start', 'claim', 'feed_stop']
+
+def test_feed_started_for_collect_worker():
+    """Воркер с типами, включающими collect, тоже поднимает ленту"""
+    feed, events = run_worker(job_types=[JOB_COLLECT, JOB_PUBLISH])
+    assert feed.started and events[0] == 'feed_start'
+
+def test_feed_skipped_without_collect():
+    """Воркеру без сбора реестр каналов не нужен"""
+    feed, events = run_worker(job_types=[JOB_PUBLISH])
+    assert not feed.started
+    assert 'feed_start' not in events and 'claim' in events
+
+def test_feed_failure_does_not_stop_worker():
+    """Если лента не запустилась, воркер все равно забирает задания"""
+    feed, events = run_worker(fail=True)
+    assert not feed.started
+    assert 'claim' in events
+
+def main():
+    """Запуск тестов без pytest"""
+    tests = [
+        test_feed_started_before_claim,
+        test_feed_started_for_collect_worker,
+        test_feed_skipped_without_collect,
+        test_feed_failure_does_not_stop_worker,
+    ]
+
+    print("🧪 Тестирование ленты изменений в воркере")
+    print("=" * 50)
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("=" * 50)
+    print("✅ Тест завершен!")
+
+if __name__ == "__main__":
+    main()
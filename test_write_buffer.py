@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Тест досылки локального буфера записей (без базы данных)
+Проверяет порядок досылки, остановку при недоступности базы и перенос
+отвергнутых записей в dead_writes
+"""
+
+import os
+import sys
+import tempfile
+
+# Добавляем путь к модулям
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from write_buffer import WriteBuffer, PENDING_NEWS, PROCESSED_MESSAGES
+
+class FakeBuffer(WriteBuffer):
+    """Буфер, который вместо базы записывает отправленные пачки"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.sent = []
+        self.down = False
+        self.rejected = set()
+
+    def _write(self, kind, records, options):
+        if self.down:
+            raise ConnectionError("база недоступна")
+        bad = [r['message_id'] for r in records if r['message_id'] in self.rejected]
+        if bad:
+            raise ValueError(f"нарушение внешнего ключа: {bad}")
+        self.sent.append((kind, [r['message_id'] for r in records]))
+
+def news(*message_ids):
+    return [{'channel_id': 1, 'message_id': i, 'channel_name': '@test', 'summary': 's'} for i in message_ids]
+
+def make_buffer() -> FakeBuffer:
+    directory = tempfile.mkdtemp()
+    return FakeBuffer(os.path.join(directory, 'write_buffer.db'))
+
+def test_replay_keeps_order():
+    """Пачки досылаются в порядке записи, подряд идущие записи одного вида - одним запросом"""
+    buffer = make_buffer()
+    buffer.append(PENDING_NEWS, news(1, 2), mark_processed=True)
+    buffer.append(PROCESSED_MESSAGES, news(3))
+    buffer.append(PENDING_NEWS, news(4), mark_processed=True)
+
+    result = buffer.replay()
+
+    assert buffer.sent == [(PENDING_NEWS, [1, 2]), (PROCESSED_MESSAGES, [3]), (PENDING_NEWS, [4])]
+    assert result == {'replayed': 4, 'dead': 0, 'remaining': 0}
+
+def test_unavailable_database_stops_replay():
+    """Пока база недоступна, записи остаются в буфере и досылаются позже в том же порядке"""
+    buffer = make_buffer()
+    buffer.append(PENDING_NEWS, news(1), mark_processed=True)
+    buffer.append(PROCESSED_MESSAGES, news(2))
+
+    buffer.down = True
+    result = buffer.replay()
+    assert result == {'replayed': 0, 'dead': 0, 'remaining': 2}
+    assert buffer.get_stats()['dead'] == 0
+
+    buffer.down = False
+    result = buffer.replay()
+    assert buffer.sent == [(PENDING_NEWS, [1]), (PROCESSED_MESSAGES, [2])]
+    assert result['remaining'] == 0
+
+def test_poison_row_goes_to_dead_writes():
+    """Отвергнутая запись уходит в dead_writes, соседние и последующие записи досылаются"""
+    buffer = make_buffer()
+    buffer.rejected = {2}
+    buffer.append(PENDING_NEWS, news(1, 2, 3), mark_processed=True)
+    buffer.append(PROCESSED_MESSAGES, news(4))
+
+    result = buffer.replay()
+
+    assert buffer.sent == [(PENDING_NEWS, [1]), (PENDING_NEWS, [3]), (PROCESSED_MESSAGES, [4])]
+    assert result == {'replayed': 3, 'dead': 1, 'remaining': 0}
+    dead = buffer.get_dead()
+    assert len(dead) == 1 and dead[0]['kind'] == PENDING_NEWS and '"message_id": 2' in dead[0]['payload']
+
+def test_outage_during_row_replay_keeps_rest():
+    """Если база пропала во время досылки по одной, необработанные записи остаются в буфере"""
+    buffer = make_buffer()
+    buffer.rejected = {1}
+    buffer.append(PENDING_NEWS, news(1, 2), mark_processed=True)
+
+    original_bury = buffer._bury
+
+    def bury_then_go_down(row, error):
+        original_bury(row, error)
+        buffer.down = True
+
+    buffer._bury = bury_then_go_down
+    result = buffer.replay()
+
+    assert result == {'replayed': 0, 'dead': 1, 'remaining': 1}
+    buffer.down = False
+    assert buffer.replay()['replayed'] == 1
+    assert buffer.sent == [(PENDING_NEWS, [2])]
+
+def main():
+    """Запуск тестов без pytest"""
+    tests = [
+        test_replay_keeps_order,
+        test_unavailable_database_stops_replay,
+        test_poison_row_goes_to_dead_writes,
+        test_outage_during_row_replay_keeps_rest,
+    ]
+
+    print("🧪 Тестирование досылки буфера записей")
+    print("=" * 50)
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("=" * 50)
+    print("✅ Тест завершен!")
+
+if __name__ == "__main__":
+    main()